@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the bytes sent on the wire by the delta transfer used when saving an edited remote file.
+
+The remote side of the delta transfer is run locally through the same python3 script as the one sent to the remote
+servers so that the benchmark does not need any SSH server.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import subprocess
+import tempfile
+import time
+
+from passhfiles.kernel.DeltaTransfer import BLOCK_SIZE, _remoteScriptCmd, computeDelta, encodeDelta, parseSignatures
+
+def _edits(data):
+    """Returns the edits applied to the original file.
+
+    Args:
+        data (bytes): the contents of the original file
+
+    Returns:
+        dict: the edited contents keyed by the name of the edit
+    """
+
+    middle = len(data)//2
+
+    return {'unchanged' : data,
+            'overwrite 16 bytes' : data[:middle] + b'x'*16 + data[middle+16:],
+            'insert 16 bytes' : data[:middle] + b'x'*16 + data[middle:],
+            'delete 16 bytes' : data[:middle] + data[middle+16:],
+            'append 4 KiB' : data + b'x'*4096}
+
+def benchmark(size, blockSize):
+    """Run the benchmark for a file of a given size.
+
+    Args:
+        size (int): the size of the file in bytes
+        blockSize (int): the size of the blocks
+
+    Returns:
+        list of dict: the results for each edit
+    """
+
+    results = []
+
+    original = os.urandom(size)
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        remoteFile = pathlib.Path(tempDir).joinpath('remote.bin')
+
+        for name, edited in _edits(original).items():
+            remoteFile.write_bytes(original)
+
+            start = time.perf_counter()
+            output = subprocess.run(_remoteScriptCmd('signatures',remoteFile,blockSize),shell=True,check=True,capture_output=True).stdout
+            remoteSize, signatures = parseSignatures(output.decode())
+            lastBlockSize = remoteSize - blockSize*(len(signatures) - 1)
+            records = list(encodeDelta(computeDelta(edited,signatures,blockSize,lastBlockSize)))
+            deltaTime = time.perf_counter() - start
+
+            tempFile = remoteFile.with_suffix('.tmp')
+            cmd = _remoteScriptCmd('patch',remoteFile,blockSize,tempFile,hashlib.md5(edited).hexdigest())
+            subprocess.run(cmd,shell=True,check=True,input=b''.join(records),capture_output=True)
+            if tempFile.read_bytes() != edited:
+                raise RuntimeError('The rebuilt file does not match the edited one')
+
+            sentBytes = sum([len(r) for r in records])
+            results.append({'size' : size,
+                            'edit' : name,
+                            'full_transfer_bytes' : len(edited),
+                            'signatures_bytes' : len(output),
+                            'delta_bytes' : sentBytes,
+                            'wire_ratio' : (len(output) + sentBytes)/len(edited),
+                            'delta_time_s' : deltaTime})
+
+    return results
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the delta transfer of edited files')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 128], help='the sizes of the files in MiB')
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE, help='the size of the blocks in bytes')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark(size*1024*1024,args.block_size))
+
+    for r in results:
+        print('{size:>12d} B  {edit:<20s} sent {delta_bytes:>10d} B + {signatures_bytes:>8d} B of signatures ({wire_ratio:.5f} of a full transfer) in {delta_time_s:.2f} s'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'delta_transfer', 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
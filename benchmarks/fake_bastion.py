@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+
+"""A local SSH server standing in for a PassHport bastion.
+
+The server accepts any user with any key or password. It follows the forwarding convention of PassHport:
+
+- a "{server} {cmd}" exec request runs cmd on the server. The command is run locally through sh, the message of the
+  day being printed first on stdout.
+- a scp request ("scp -t {server}/{path}" or "scp -f {server}/{path}") is run by the local scp binary on path.
+- a shell prints the list of the servers the user can access.
+
+A latency can be injected at the start of each request (the hop from the bastion to the server) and the bandwidth of
+each connection can be limited. The server can be used by the benchmarks or run standalone for trying the GUI against
+it (python fake_bastion.py --port 2222).
+"""
+
+import argparse
+import logging
+import shlex
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+# The size of the chunks pumped between the channels and the processes
+CHUNK_SIZE = 32*1024
+
+class _Throttle:
+    """Limit the throughput of the data sent through a connection.
+    """
+
+    def __init__(self, bandwidth):
+        """Constructor.
+
+        Args:
+            bandwidth (float): the bandwidth in bytes per second. If None, the throughput is not limited.
+        """
+
+        self._bandwidth = bandwidth
+
+        self._next = time.perf_counter()
+
+        self._lock = threading.Lock()
+
+    def wait(self, nBytes):
+        """Wait for the time needed for sending some bytes at the given bandwidth.
+
+        Args:
+            nBytes (int): the number of bytes
+        """
+
+        if not self._bandwidth:
+            return
+
+        with self._lock:
+            now = time.perf_counter()
+            self._next = max(self._next,now) + nBytes/self._bandwidth
+            delay = self._next - now
+
+        time.sleep(delay)
+
+class _ServerInterface(paramiko.ServerInterface):
+    """Implements the requests accepted by the bastion for a given connection.
+    """
+
+    def __init__(self, bastion, throttle):
+        """Constructor.
+
+        Args:
+            bastion (FakeBastion): the bastion
+            throttle (_Throttle): the throttle of the connection
+        """
+
+        self._bastion = bastion
+
+        self._throttle = throttle
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self._bastion._runCommand,args=(channel,command.decode(),self._throttle),daemon=True).start()
+        return True
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_shell_request(self, channel):
+        threading.Thread(target=self._bastion._runShell,args=(channel,),daemon=True).start()
+        return True
+
+    def get_allowed_auths(self, username):
+        return 'publickey,password'
+
+class FakeBastion:
+    """Implements a local SSH server standing in for a PassHport bastion.
+    """
+
+    def __init__(self, servers=('server1','server2'), latency=0.0, bandwidth=None, motd='', host='127.0.0.1', port=0):
+        """Constructor.
+
+        Args:
+            servers (list of str): the names of the servers reachable through the bastion
+            latency (float): the delay in seconds injected at the start of each request
+            bandwidth (float): the bandwidth of each connection in bytes per second. If None, it is not limited.
+            motd (str): the message of the day printed before the output of each command
+            host (str): the address to listen to
+            port (int): the port to listen to. If 0, a free port is chosen.
+        """
+
+        self.servers = list(servers)
+
+        self.latency = latency
+
+        self.bandwidth = bandwidth
+
+        self.motd = motd
+
+        self._hostKey = paramiko.RSAKey.generate(2048)
+
+        self._socket = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET,socket.SO_REUSEADDR,1)
+        self._socket.bind((host,port))
+
+        self._transports = []
+
+        self._thread = None
+
+        self._running = False
+
+    def __enter__(self):
+
+        self.start()
+
+        return self
+
+    def __exit__(self, *args):
+
+        self.stop()
+
+    def _acceptConnections(self):
+        """Accept the connections until the server is stopped.
+        """
+
+        while self._running:
+            try:
+                client, _ = self._socket.accept()
+            except OSError:
+                break
+            client.setsockopt(socket.IPPROTO_TCP,socket.TCP_NODELAY,1)
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self._hostKey)
+            self._transports.append(transport)
+            try:
+                transport.start_server(server=_ServerInterface(self,_Throttle(self.bandwidth)))
+            except (paramiko.SSHException,EOFError) as e:
+                logging.warning(str(e))
+                continue
+            # The channels are handled by the exec and shell requests. They still have to be accepted to be opened.
+            threading.Thread(target=self._acceptChannels,args=(transport,),daemon=True).start()
+
+    def _acceptChannels(self, transport):
+        """Accept the channels opened on a connection until it is closed.
+
+        Args:
+            transport (paramiko.Transport): the connection
+        """
+
+        # A channel is closed when it is garbage collected so that the open ones must be referenced
+        channels = []
+        while transport.is_active():
+            channel = transport.accept(1)
+            channels = [c for c in channels if not c.closed]
+            if channel is not None:
+                channels.append(channel)
+
+    def address(self):
+        """Returns the address of the server.
+
+        Returns:
+            tuple: the host and the port
+        """
+
+        return self._socket.getsockname()
+
+    def _pumpInput(self, channel, process):
+        """Forward the data received through a channel to the stdin of a process.
+
+        Args:
+            channel (paramiko.Channel): the channel
+            process (subprocess.Popen): the process
+        """
+
+        try:
+            while True:
+                data = channel.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                process.stdin.write(data)
+                process.stdin.flush()
+        except (OSError,ValueError):
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def _pumpOutput(self, stream, send, throttle):
+        """Forward the output of a process to a channel.
+
+        Args:
+            stream (file): the stdout or the stderr of the process
+            send (callable): the channel method sending the data
+            throttle (_Throttle): the throttle of the connection
+        """
+
+        try:
+            while True:
+                data = stream.read1(CHUNK_SIZE)
+                if not data:
+                    break
+                throttle.wait(len(data))
+                send(data)
+        except (OSError,EOFError,paramiko.SSHException):
+            pass
+
+    def _resolveCommand(self, command):
+        """Translate a command received by the bastion into the command run on the server.
+
+        Args:
+            command (str): the command
+
+        Returns:
+            str: the command to run locally or None if the server is unknown
+        """
+
+        if command.startswith('scp '):
+            # The remote path of a scp command is prefixed by the server name
+            words = shlex.split(command)
+            for i, w in enumerate(words[1:],1):
+                server, sep, path = w.partition('/')
+                if sep and server in self.servers:
+                    words[i] = path
+                    return ' '.join([shlex.quote(w) for w in words])
+            return None
+
+        server, _, cmd = command.partition(' ')
+        if server not in self.servers:
+            return None
+
+        return cmd
+
+    def _runCommand(self, channel, command, throttle):
+        """Run the command of an exec request.
+
+        Args:
+            channel (paramiko.Channel): the channel of the request
+            command (str): the command
+            throttle (_Throttle): the throttle of the connection
+        """
+
+        time.sleep(self.latency)
+
+        cmd = self._resolveCommand(command)
+        if cmd is None:
+            channel.sendall_stderr('Unknown server: {}\n'.format(command.split()[0] if command else '').encode())
+            channel.send_exit_status(1)
+            channel.close()
+            return
+
+        isScp = command.startswith('scp ')
+        if self.motd and not isScp:
+            channel.sendall(self.motd.encode())
+
+        process = subprocess.Popen(['sh','-c',cmd],stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=subprocess.PIPE,start_new_session=True)
+
+        threads = [threading.Thread(target=self._pumpInput,args=(channel,process),daemon=True),
+                   threading.Thread(target=self._pumpOutput,args=(process.stdout,channel.sendall,throttle),daemon=True),
+                   threading.Thread(target=self._pumpOutput,args=(process.stderr,channel.sendall_stderr,throttle),daemon=True)]
+        for t in threads:
+            t.start()
+
+        # Like the bastion, the process is hung up when the client closes the channel
+        while process.poll() is None:
+            if channel.closed:
+                process.kill()
+                break
+            time.sleep(0.01)
+        process.wait()
+
+        for t in threads[1:]:
+            t.join()
+
+        try:
+            channel.send_exit_status(process.returncode)
+            channel.shutdown_write()
+            channel.close()
+        except (OSError,EOFError,paramiko.SSHException):
+            pass
+
+    def _runShell(self, channel):
+        """Run a shell request which prints the list of the servers.
+
+        Args:
+            channel (paramiko.Channel): the channel of the request
+        """
+
+        time.sleep(self.latency)
+
+        lines = [self.motd.rstrip('\n'),'Here is the list of servers you can access:']
+        lines.extend(['{:d} {}'.format(i,s) for i, s in enumerate(self.servers,1)])
+        try:
+            channel.sendall(('\n'.join(lines) + '\npasshport> ').encode())
+        except (OSError,EOFError,paramiko.SSHException):
+            pass
+
+    def start(self):
+        """Start to accept the connections in the background.
+        """
+
+        self._socket.listen(16)
+
+        self._running = True
+
+        self._thread = threading.Thread(target=self._acceptConnections,daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the server and close its connections.
+        """
+
+        self._running = False
+
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._socket.close()
+
+        for transport in self._transports:
+            transport.close()
+
+def main():
+
+    parser = argparse.ArgumentParser(description='A local SSH server standing in for a PassHport bastion')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen to')
+    parser.add_argument('--port', type=int, default=2222, help='the port to listen to')
+    parser.add_argument('--servers', nargs='+', default=['server1','server2'], help='the names of the servers')
+    parser.add_argument('--latency', type=float, default=0.0, help='the latency injected at the start of each request in ms')
+    parser.add_argument('--bandwidth', type=float, default=None, help='the bandwidth of each connection in MiB/s')
+    parser.add_argument('--motd', default='', help='the message of the day')
+    args = parser.parse_args()
+
+    bandwidth = None if args.bandwidth is None else args.bandwidth*1024*1024
+
+    with FakeBastion(args.servers,args.latency/1000.0,bandwidth,args.motd,args.host,args.port) as bastion:
+        print('Fake bastion listening on {}:{}'.format(*bastion.address()))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the painting of the sessions tree and of the file system table.
+
+The icons shared through the icon registry are compared to an icon built from its file for each decoration request,
+which is what the models used to do. A display or QT_QPA_PLATFORM=offscreen is needed.
+"""
+
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from passhfiles.models.LocalFileSystemModel import LocalFileSystemModel
+from passhfiles.models.SessionsModel import SessionsModel
+from passhfiles.utils.Gui import loadIcon
+from passhfiles.utils.Icons import ICON_REGISTRY
+
+# The extensions of the files of the listed directory
+EXTENSIONS = ['txt','log','py','c','h','png','jpg','pdf','gz','tar','json','yml','xml','html','nxs','hdf','dat','']
+
+class _PerCallIconSessionsModel(SessionsModel):
+    """A sessions model building its icons on each decoration request.
+    """
+
+    def data(self, index, role):
+
+        if role == QtCore.Qt.DecorationRole and index.isValid():
+            name = 'session.png' if index.parent() == QtCore.QModelIndex() else 'server.png'
+            return loadIcon(name)
+
+        return super(_PerCallIconSessionsModel,self).data(index,role)
+
+class _PerCallIconLocalFileSystemModel(LocalFileSystemModel):
+    """A file system model building its icons on each decoration request.
+    """
+
+    def data(self, index, role):
+
+        if role == QtCore.Qt.DecorationRole and index.isValid() and index.column() == 0:
+            name = 'directory.png' if self._entries[index.row()][2] == 'Folder' else 'file.png'
+            return loadIcon(name)
+
+        return super(_PerCallIconLocalFileSystemModel,self).data(index,role)
+
+def _paint(view, repeats):
+    """Time the painting of a view.
+
+    Args:
+        view (PyQt5.QtWidgets.QAbstractItemView): the view
+        repeats (int): the number of paintings
+
+    Returns:
+        list of float: the duration of each painting in seconds
+    """
+
+    pixmap = QtGui.QPixmap(view.viewport().size())
+
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        view.viewport().render(pixmap)
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+def _result(name, method, nRows, durations):
+    """Build the result of a benchmark.
+
+    Args:
+        name (str): the name of the benchmark
+        method (str): the way the icons are provided
+        nRows (int): the number of painted rows
+        durations (list of float): the duration of each painting in seconds
+
+    Returns:
+        dict: the result
+    """
+
+    return {'name' : name,
+            'method' : method,
+            'rows' : nRows,
+            'mean_s' : sum(durations)/len(durations),
+            'min_s' : min(durations),
+            'max_s' : max(durations)}
+
+def benchmarkFileSystemTable(app, directory, modelClass, repeats):
+    """Time the painting of the table of a local directory.
+
+    Args:
+        app (PyQt5.QtWidgets.QApplication): the application
+        directory (pathlib.Path): the directory
+        modelClass (type): the file system model class
+        repeats (int): the number of paintings
+
+    Returns:
+        list of float: the duration of each painting in seconds
+    """
+
+    sessionsModel = SessionsModel()
+    sessionsModel.addSession({'name' : 'benchmark', 'servers' : {'server' : {'local' : [], 'remote' : []}}})
+    serverIndex = sessionsModel.index(0,0,sessionsModel.index(0,0))
+
+    model = modelClass(serverIndex,directory)
+
+    # The directory is listed in the background
+    start = time.perf_counter()
+    while model.rowCount() <= 1 and time.perf_counter() - start < 30:
+        app.processEvents()
+
+    view = QtWidgets.QTableView()
+    view.setModel(model)
+    view.resize(800,view.verticalHeader().defaultSectionSize()*(model.rowCount() + 2))
+    view.show()
+    app.processEvents()
+
+    return model.rowCount(), _paint(view,repeats)
+
+def benchmarkSessionsTree(app, nSessions, nServers, modelClass, repeats):
+    """Time the painting of a fully expanded sessions tree.
+
+    Args:
+        app (PyQt5.QtWidgets.QApplication): the application
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+        modelClass (type): the sessions model class
+        repeats (int): the number of paintings
+
+    Returns:
+        list of float: the duration of each painting in seconds
+    """
+
+    model = modelClass()
+    for i in range(nSessions):
+        servers = {'server{:04d}'.format(j) : {'local' : [], 'remote' : []} for j in range(nServers)}
+        model.addSession({'name' : 'session{:03d}'.format(i), 'servers' : servers})
+
+    view = QtWidgets.QTreeView()
+    view.setModel(model)
+    view.setHeaderHidden(True)
+    view.expandAll()
+    nRows = nSessions*(nServers + 1)
+    view.resize(400,view.sizeHintForRow(0)*(nRows + 2))
+    view.show()
+    app.processEvents()
+
+    return nRows, _paint(view,repeats)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the painting of the sessions tree and of the file system table')
+    parser.add_argument('--sessions', type=int, default=10, help='the number of sessions')
+    parser.add_argument('--servers', type=int, default=50, help='the number of servers per session')
+    parser.add_argument('--files', type=int, default=500, help='the number of files of the listed directory')
+    parser.add_argument('--repeats', type=int, default=20, help='the number of paintings')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    results = []
+    for method, modelClass in (('per call',_PerCallIconSessionsModel),('registry',SessionsModel)):
+        ICON_REGISTRY.clear()
+        nRows, durations = benchmarkSessionsTree(app,args.sessions,args.servers,modelClass,args.repeats)
+        results.append(_result('sessions tree',method,nRows,durations))
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        directory = pathlib.Path(tempDir)
+        for i in range(args.files):
+            extension = EXTENSIONS[i % len(EXTENSIONS)]
+            directory.joinpath('file{:05d}{}'.format(i,'.' + extension if extension else '')).touch()
+        for method, modelClass in (('per call',_PerCallIconLocalFileSystemModel),('registry',LocalFileSystemModel)):
+            ICON_REGISTRY.clear()
+            nRows, durations = benchmarkFileSystemTable(app,directory,modelClass,args.repeats)
+            results.append(_result('file system table',method,nRows,durations))
+
+    for r in results:
+        print('{name:<18s} {method:<9s} {rows:>6d} rows  mean {mean_s:8.4f} s  min {min_s:8.4f} s  max {max_s:8.4f} s'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'icon_paint', 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
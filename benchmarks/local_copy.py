@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the local copy of a directory tree.
+
+The parallel copy engine used for the local drops and pastes is compared to shutil.copytree which was used before.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+
+from passhfiles.kernel.LocalCopy import copyEntries
+
+def _createTree(root, nSmallFiles, nLargeFiles, largeFileSize):
+    """Create a directory tree with many small files and a few large ones.
+
+    Args:
+        root (pathlib.Path): the root of the tree
+        nSmallFiles (int): the number of small files (4 KiB)
+        nLargeFiles (int): the number of large files
+        largeFileSize (int): the size of the large files in bytes
+
+    Returns:
+        int: the total size of the tree in bytes
+    """
+
+    total = 0
+    for i in range(nSmallFiles):
+        directory = root.joinpath('dir{:03d}'.format(i % 50))
+        directory.mkdir(parents=True,exist_ok=True)
+        directory.joinpath('small{:05d}.dat'.format(i)).write_bytes(os.urandom(4096))
+        total += 4096
+
+    chunk = os.urandom(1024*1024)
+    for i in range(nLargeFiles):
+        with open(str(root.joinpath('large{:02d}.dat'.format(i))),'wb') as fout:
+            for _ in range(largeFileSize//len(chunk)):
+                fout.write(chunk)
+        total += (largeFileSize//len(chunk))*len(chunk)
+
+    return total
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the local copy of a directory tree')
+    parser.add_argument('--small-files', type=int, default=5000, help='the number of small files')
+    parser.add_argument('--large-files', type=int, default=4, help='the number of large files')
+    parser.add_argument('--large-file-size', type=int, default=256, help='the size of the large files in MiB')
+    parser.add_argument('--workers', type=int, default=8, help='the number of threads of the copy engine')
+    parser.add_argument('--directory', type=pathlib.Path, default=None, help='the directory where to create the trees (the filesystem matters)')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.directory) as tempDir:
+        source = pathlib.Path(tempDir).joinpath('source')
+        totalBytes = _createTree(source,args.small_files,args.large_files,args.large_file_size*1024*1024)
+
+        methods = [('shutil.copytree',lambda destination : shutil.copytree(str(source),str(destination))),
+                   ('copyEntries',lambda destination : copyEntries([(source,destination)],maxWorkers=args.workers))]
+
+        for name, method in methods:
+            destination = pathlib.Path(tempDir).joinpath('destination')
+            # Flush the dirty pages of the previous run so that it does not slow down the next one
+            os.sync()
+            start = time.perf_counter()
+            method(destination)
+            duration = time.perf_counter() - start
+            results.append({'method' : name,
+                            'n_files' : args.small_files + args.large_files,
+                            'total_bytes' : totalBytes,
+                            'duration_s' : duration,
+                            'throughput_mib_s' : totalBytes/duration/1024/1024})
+            shutil.rmtree(str(destination))
+
+    for r in results:
+        print('{method:<16s} {n_files:>6d} files {total_bytes:>12d} B in {duration_s:7.3f} s ({throughput_mib_s:8.1f} MiB/s)'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'local_copy', 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the open and save times of the file editor.
+
+The piece table document used by the editor is compared to reading and writing back the whole file, which is what
+the editor used to do. With --gui, the editor dialog itself is also timed (a display or QT_QPA_PLATFORM=offscreen is
+needed).
+"""
+
+import argparse
+import json
+import pathlib
+import tempfile
+import time
+
+from passhfiles.kernel.PieceTable import PieceTable
+
+# The size of the first chunk of lines loaded by the editor
+CHUNK_SIZE = 1024*1024
+
+def _createFile(path, size):
+    """Create a text file of a given size.
+
+    Args:
+        path (pathlib.Path): the path to the file
+        size (int): the size of the file in bytes
+    """
+
+    line = b'2021-01-01 00:00:00 INFO some log message which is long enough to look like a real one\n'
+    block = line*(1024*1024//len(line))
+    with open(str(path),'wb') as fout:
+        written = 0
+        while written < size:
+            chunk = block[:size - written]
+            fout.write(chunk)
+            written += len(chunk)
+
+def benchmarkFullFile(path):
+    """Time the opening and the saving of a file read and written back entirely.
+
+    Args:
+        path (pathlib.Path): the path to the file
+
+    Returns:
+        dict: the results
+    """
+
+    start = time.perf_counter()
+    with open(str(path),'r') as fin:
+        text = fin.read()
+    openTime = time.perf_counter() - start
+
+    text = 'edited line\n' + text
+
+    start = time.perf_counter()
+    with open(str(path),'w') as fout:
+        fout.write(text)
+    saveTime = time.perf_counter() - start
+
+    return {'open_s' : openTime, 'save_s' : saveTime, 'written_bytes' : len(text.encode())}
+
+def benchmarkPieceTable(path, sameSize):
+    """Time the opening and the saving of a file through a piece table.
+
+    Args:
+        path (pathlib.Path): the path to the file
+        sameSize (bool): if True the edit keeps the size of the file, otherwise some data are inserted
+
+    Returns:
+        dict: the results
+    """
+
+    start = time.perf_counter()
+    document = PieceTable(path)
+    document.readLines(0,CHUNK_SIZE).decode()
+    openTime = time.perf_counter() - start
+
+    offset = len(document.readLines(0,1024))
+    if sameSize:
+        document.replace(offset,6,b'edited')
+    else:
+        document.insert(offset,b'edited line\n')
+
+    start = time.perf_counter()
+    written = document.save()
+    saveTime = time.perf_counter() - start
+
+    document.close()
+
+    return {'open_s' : openTime, 'save_s' : saveTime, 'written_bytes' : written}
+
+def benchmarkEditor(path):
+    """Time the opening and the saving of a file in the editor dialog.
+
+    Args:
+        path (pathlib.Path): the path to the file
+
+    Returns:
+        dict: the results
+    """
+
+    from PyQt5 import QtGui, QtWidgets
+    from passhfiles.dialogs.FileEditorDialog import FileEditorDialog
+
+    _ = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+    start = time.perf_counter()
+    dialog = FileEditorDialog(path,pathlib.PurePosixPath(path))
+    openTime = time.perf_counter() - start
+
+    cursor = QtGui.QTextCursor(dialog._scrollableTextArea.document())
+    cursor.insertText('edited line\n')
+
+    start = time.perf_counter()
+    dialog.saveCurrentFile()
+    saveTime = time.perf_counter() - start
+
+    dialog.done(0)
+
+    return {'open_s' : openTime, 'save_s' : saveTime}
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the open and save times of the file editor')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='the sizes of the files in MiB')
+    parser.add_argument('--gui', action='store_true', help='also time the editor dialog')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tempDir:
+        path = pathlib.Path(tempDir).joinpath('file.log')
+        for size in args.sizes:
+            methods = [('full file',lambda : benchmarkFullFile(path)),
+                       ('piece table same size',lambda : benchmarkPieceTable(path,True)),
+                       ('piece table insertion',lambda : benchmarkPieceTable(path,False))]
+            if args.gui:
+                methods.append(('editor dialog',lambda : benchmarkEditor(path)))
+            for name, method in methods:
+                _createFile(path,size*1024*1024)
+                result = method()
+                result.update({'size' : size*1024*1024, 'method' : name})
+                results.append(result)
+
+    for r in results:
+        print('{size:>12d} B  {method:<22s} open {open_s:8.4f} s  save {save_s:8.4f} s  written {written:>12s}'.format(written=str(r.get('written_bytes','-')),**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'piece_table_editor', 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the remote operations through a local stand-in of the PassHport bastion.
+
+The connection to the bastion, the remote commands, the discovery of the servers, the listing of directories of
+various sizes and the transfers are timed against the fake bastion of fake_bastion.py, with an optional injected
+latency and bandwidth limit. The uploads of passhfiles-cli are also run for each compression mode and their copies
+checked against the sources. The results are written as JSON so that two runs can be compared (--compare).
+"""
+
+import argparse
+import datetime
+import filecmp
+import json
+import logging
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import paramiko
+import yaml
+
+from fake_bastion import FakeBastion
+
+from passhfiles.kernel.Bastion import listServers
+from passhfiles.kernel.Listings import listRemoteDirectory
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.kernel.Transfers import download, upload
+from passhfiles.kernel.Sessions import RootNode, ServerNode, SessionNode
+from passhfiles.utils.Security import runRemoteCmd
+
+# The command line client of the source tree
+COMMAND_LINE_CLIENT = pathlib.Path(__file__).resolve().parent.parent.joinpath('scripts','passhfiles-cli')
+
+def _connect(bastion, key, compression='none'):
+    """Open a SSH session to the bastion the same way the application does.
+
+    Args:
+        bastion (fake_bastion.FakeBastion): the bastion
+        key (paramiko.PKey): the key used for the authentication
+        compression (str): the compression mode of the session
+
+    Returns:
+        paramiko.SSHClient: the session
+    """
+
+    host, port = bastion.address()
+
+    sshSession = paramiko.SSHClient()
+    sshSession.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    sshSession.connect(host, username='benchmark', pkey=key, port=port, compress=(compression == 'zlib'))
+
+    return sshSession
+
+def _sameFiles(file1, file2):
+    """Returns whether two files have the same contents.
+
+    Args:
+        file1 (pathlib.Path): the first file
+        file2 (pathlib.Path): the second file
+
+    Returns:
+        bool: True if both files exist and have the same contents
+    """
+
+    return file1.is_file() and file2.is_file() and filecmp.cmp(str(file1),str(file2),shallow=False)
+
+def _sameTrees(directory1, directory2):
+    """Returns whether two directories hold the same entries with the same contents.
+
+    Args:
+        directory1 (pathlib.Path): the first directory
+        directory2 (pathlib.Path): the second directory
+
+    Returns:
+        bool: True if both directories exist and have the same contents
+    """
+
+    if not directory1.is_dir() or not directory2.is_dir():
+        return False
+
+    entries1 = sorted(p.relative_to(directory1) for p in directory1.rglob('*'))
+    entries2 = sorted(p.relative_to(directory2) for p in directory2.rglob('*'))
+    if entries1 != entries2:
+        return False
+
+    return all(_sameFiles(directory1.joinpath(e),directory2.joinpath(e)) for e in entries1 if directory1.joinpath(e).is_file())
+
+def _serverNode(sshSession, serverName, compression='none'):
+    """Create the node of a server and fetch its message of the day as the application does.
+
+    Args:
+        sshSession (paramiko.SSHClient): the session to the bastion
+        serverName (str): the name of the server
+        compression (str): the compression mode of the session
+
+    Returns:
+        passhfiles.kernel.Sessions.ServerNode: the node
+    """
+
+    sessionNode = SessionNode({'name' : 'benchmark', 'compression' : compression},RootNode())
+    serverNode = ServerNode(serverName,sessionNode)
+
+    _, stdout, stderr = sshSession.exec_command('{} echo -n'.format(serverName))
+    serverNode.setStdoutMotd(stdout.read().decode())
+    serverNode.setStderrMotd(stderr.read().decode())
+
+    return serverNode
+
+def _result(name, parameters, durations, nBytes=None, phases=None):
+    """Build the result of a benchmark.
+
+    Args:
+        name (str): the name of the benchmark
+        parameters (dict): the parameters of the benchmark
+        durations (list of float): the duration of each repeat in seconds
+        nBytes (int): the number of bytes processed by each repeat (if any)
+        phases (dict): the mean duration in seconds of each traced phase (if any)
+
+    Returns:
+        dict: the result
+    """
+
+    result = {'name' : name,
+              'parameters' : parameters,
+              'durations_s' : durations,
+              'mean_s' : statistics.mean(durations),
+              'median_s' : statistics.median(durations),
+              'min_s' : min(durations),
+              'max_s' : max(durations),
+              'stdev_s' : statistics.stdev(durations) if len(durations) > 1 else 0.0}
+
+    if nBytes is not None:
+        result['bytes'] = nBytes
+        result['throughput_mib_s'] = nBytes/result['median_s']/1024/1024
+
+    if phases is not None:
+        result['phases_s'] = phases
+
+    return result
+
+def _phases(repeats):
+    """Returns the mean duration of the traced phases recorded since the tracer was cleared.
+
+    Args:
+        repeats (int): the number of repeats the spans were recorded for
+
+    Returns:
+        dict: the mean duration in seconds per repeat of each traced operation
+    """
+
+    return {'{}/{}'.format(category,name) : total/repeats for name, category, _, total, _, _ in TRACER.summary()}
+
+def benchmarkCommand(sshSession, serverNode, repeats):
+    """Time the round trip of an empty remote command.
+
+    Args:
+        sshSession (paramiko.SSHClient): the session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        repeats (int): the number of repeats
+
+    Returns:
+        dict: the result
+    """
+
+    TRACER.clear()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        runRemoteCmd(sshSession,serverNode,'true')
+        durations.append(time.perf_counter() - start)
+
+    return _result('command',{},durations,phases=_phases(repeats))
+
+def benchmarkCommandLinePut(bastion, key, directory, compression, repeats):
+    """Time the upload of a file and of a directory into a remote directory with passhfiles-cli put.
+
+    Each upload is checked against its source.
+
+    Args:
+        bastion (fake_bastion.FakeBastion): the bastion
+        key (paramiko.PKey): the key used for the authentication
+        directory (pathlib.Path): the directory where to create the files
+        compression (str): the compression mode of the session
+        repeats (int): the number of repeats
+
+    Returns:
+        dict: the result
+
+    Raises:
+        RuntimeError: if the client failed or if the uploaded copies differ from their sources
+    """
+
+    cliDirectory = directory.joinpath('cli_{}'.format(compression))
+    cliDirectory.mkdir()
+
+    keyFile = cliDirectory.joinpath('id_rsa')
+    key.write_private_key_file(str(keyFile),password='benchmark')
+    passwordFile = cliDirectory.joinpath('password')
+    passwordFile.write_text('benchmark\n')
+
+    host, port = bastion.address()
+    sessionsFile = cliDirectory.joinpath('sessions.yml')
+    with open(str(sessionsFile),'w') as fout:
+        yaml.safe_dump([{'name' : 'benchmark', 'address' : host, 'port' : port, 'user' : 'benchmark', 'key' : str(keyFile),
+                         'keytype' : 'RSA', 'compression' : compression, 'servers' : {'server1' : {'local' : [], 'remote' : []}}}],fout)
+
+    # A compressible file and a directory holding compressible and random data
+    sourceFile = cliDirectory.joinpath('file.txt')
+    sourceFile.write_bytes(b'passhfiles\n'*100000)
+    sourceDirectory = cliDirectory.joinpath('tree')
+    sourceDirectory.joinpath('sub').mkdir(parents=True)
+    sourceDirectory.joinpath('notes.txt').write_bytes(b'notes\n'*1000)
+    sourceDirectory.joinpath('sub','data.bin').write_bytes(os.urandom(256*1024))
+    nBytes = sum(p.stat().st_size for p in (sourceFile,sourceDirectory.joinpath('notes.txt'),sourceDirectory.joinpath('sub','data.bin')))
+
+    # The host keys of the fake bastion must not end up in the store of the user
+    env = dict(os.environ)
+    env['HOME'] = str(cliDirectory)
+
+    durations = []
+    for i in range(repeats):
+        target = cliDirectory.joinpath('target_{}'.format(i))
+        target.mkdir()
+        cmd = [sys.executable,str(COMMAND_LINE_CLIENT),'--quiet','--sessions',str(sessionsFile),'--password-file',str(passwordFile),
+               '--server','server1','put',str(sourceFile),str(sourceDirectory),str(target)]
+        start = time.perf_counter()
+        process = subprocess.run(cmd,env=env,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
+        durations.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            raise RuntimeError('passhfiles-cli put failed with {} compression: {}'.format(compression,process.stderr.decode().strip()))
+        if not _sameFiles(sourceFile,target.joinpath(sourceFile.name)) or not _sameTrees(sourceDirectory,target.joinpath(sourceDirectory.name)):
+            raise RuntimeError('passhfiles-cli put with {} compression did not copy {} and {} into {}'.format(compression,sourceFile,sourceDirectory,target))
+
+    return _result('cli put',{'compression' : compression},durations,nBytes=nBytes)
+
+def benchmarkConnect(bastion, key, repeats):
+    """Time the connection to the bastion.
+
+    Args:
+        bastion (fake_bastion.FakeBastion): the bastion
+        key (paramiko.PKey): the key used for the authentication
+        repeats (int): the number of repeats
+
+    Returns:
+        dict: the result
+    """
+
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sshSession = _connect(bastion,key)
+        durations.append(time.perf_counter() - start)
+        sshSession.close()
+
+    return _result('connect',{},durations)
+
+def benchmarkDiscovery(sshSession, repeats, delay):
+    """Time the discovery of the servers bound to the session.
+
+    Args:
+        sshSession (paramiko.SSHClient): the session to the bastion
+        repeats (int): the number of repeats
+        delay (float): the time given to the bastion for printing the servers
+
+    Returns:
+        dict: the result
+    """
+
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        listServers(sshSession,delay)
+        durations.append(time.perf_counter() - start)
+
+    return _result('discovery',{'delay_s' : delay},durations)
+
+def benchmarkListing(sshSession, serverNode, directory, nEntries, repeats):
+    """Time the listing of a remote directory: remote command, parsing and sorting.
+
+    Args:
+        sshSession (paramiko.SSHClient): the session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        directory (pathlib.Path): the directory, seen by the bastion as a remote one
+        nEntries (int): the number of entries of the directory
+        repeats (int): the number of repeats
+
+    Returns:
+        dict: the result
+    """
+
+    directory.mkdir()
+    for i in range(nEntries):
+        if i % 10 == 0:
+            directory.joinpath('dir{:06d}'.format(i)).mkdir()
+        else:
+            directory.joinpath('file{:06d}.dat'.format(i)).write_bytes(b'x'*(i % 4096))
+
+    TRACER.clear()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        listRemoteDirectory(sshSession,serverNode,pathlib.PurePosixPath(directory))
+        durations.append(time.perf_counter() - start)
+
+    return _result('listing',{'n_entries' : nEntries},durations,phases=_phases(repeats))
+
+def benchmarkTransfer(sshSession, serverNode, directory, size, direction, repeats):
+    """Time the transfer of a file.
+
+    Args:
+        sshSession (paramiko.SSHClient): the session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server whose session sets the compression mode
+        directory (pathlib.Path): the directory where to create the files
+        size (int): the size of the file in bytes
+        direction (str): 'upload' or 'download'
+        repeats (int): the number of repeats
+
+    Returns:
+        dict: the result
+    """
+
+    # Half random and half repetitive data so that the compressed transfers are neither favoured nor penalised
+    source = directory.joinpath('source_{}'.format(size))
+    if not source.exists():
+        with open(str(source),'wb') as fout:
+            chunk = os.urandom(512*1024) + b'passhfiles'*(512*1024//10)
+            for _ in range(max(size//len(chunk),1)):
+                fout.write(chunk)
+    size = source.stat().st_size
+
+    durations = []
+    for i in range(repeats):
+        target = directory.joinpath('target_{}_{}'.format(direction,i))
+        start = time.perf_counter()
+        if direction == 'upload':
+            upload(sshSession,serverNode,source,pathlib.PurePosixPath(target),recursive=False)
+        else:
+            download(sshSession,serverNode,pathlib.PurePosixPath(source),target,recursive=False)
+        durations.append(time.perf_counter() - start)
+        target.unlink()
+
+    compression = serverNode.parent().data(0)['compression']
+
+    return _result('transfer',{'direction' : direction, 'size' : size, 'compression' : compression},durations,nBytes=size)
+
+def compare(results, reference):
+    """Print the relative change of the median durations between two runs.
+
+    Args:
+        results (list of dict): the results of this run
+        reference (dict): the JSON output of a previous run
+    """
+
+    referenceResults = {(r['name'],json.dumps(r['parameters'],sort_keys=True)) : r for r in reference['results']}
+
+    print('\nComparison with the run of {}'.format(reference.get('timestamp','?')))
+    for r in results:
+        ref = referenceResults.get((r['name'],json.dumps(r['parameters'],sort_keys=True)))
+        if ref is None:
+            continue
+        change = 100.0*(r['median_s'] - ref['median_s'])/ref['median_s']
+        print('{:<12s} {:<60s} {:10.4f} s -> {:10.4f} s ({:+6.1f} %)'.format(r['name'],json.dumps(r['parameters']),ref['median_s'],r['median_s'],change))
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the remote operations through a local stand-in of the bastion')
+    parser.add_argument('--latency', type=float, default=0.0, help='the latency injected at the start of each request in ms')
+    parser.add_argument('--bandwidth', type=float, default=None, help='the bandwidth of the connections in MiB/s')
+    parser.add_argument('--motd', default='Welcome to the benchmark bastion\n', help='the message of the day of the bastion')
+    parser.add_argument('--repeats', type=int, default=5, help='the number of repeats of each measure')
+    parser.add_argument('--listing-sizes', type=int, nargs='+', default=[10,100,1000,10000], help='the number of entries of the listed directories')
+    parser.add_argument('--transfer-sizes', type=int, nargs='+', default=[1,32], help='the size of the transferred files in MiB')
+    parser.add_argument('--compressions', nargs='+', default=['none','gzip'], help='the compression modes of the transfers')
+    parser.add_argument('--cli-compressions', nargs='+', default=['none','gzip','zstd','auto'], help='the compression modes of the uploads of passhfiles-cli')
+    parser.add_argument('--discovery-delay', type=float, default=1.0, help='the time given to the bastion for printing the servers in s')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    parser.add_argument('--compare', type=pathlib.Path, default=None, help='a JSON file of a previous run to compare with')
+    args = parser.parse_args()
+
+    bandwidth = None if args.bandwidth is None else args.bandwidth*1024*1024
+
+    # The server side of the connections closed by the client would log a reset for each of them
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+
+    key = paramiko.RSAKey.generate(2048)
+
+    results = []
+    with FakeBastion(['server1'],args.latency/1000.0,bandwidth,args.motd) as bastion, tempfile.TemporaryDirectory() as tempDir:
+        tempDir = pathlib.Path(tempDir)
+
+        results.append(benchmarkConnect(bastion,key,args.repeats))
+
+        sshSession = _connect(bastion,key)
+        serverNode = _serverNode(sshSession,'server1')
+
+        results.append(benchmarkCommand(sshSession,serverNode,args.repeats))
+
+        results.append(benchmarkDiscovery(sshSession,args.repeats,args.discovery_delay))
+
+        for nEntries in args.listing_sizes:
+            results.append(benchmarkListing(sshSession,serverNode,tempDir.joinpath('listing_{}'.format(nEntries)),nEntries,args.repeats))
+
+        sshSession.close()
+
+        # zlib compresses the whole connection so that each compression mode gets its own session
+        for compression in args.compressions:
+            sshSession = _connect(bastion,key,compression)
+            serverNode = _serverNode(sshSession,'server1',compression)
+            for size in args.transfer_sizes:
+                for direction in ('upload','download'):
+                    results.append(benchmarkTransfer(sshSession,serverNode,tempDir,size*1024*1024,direction,args.repeats))
+            sshSession.close()
+
+        for compression in args.cli_compressions:
+            results.append(benchmarkCommandLinePut(bastion,key,tempDir,compression,args.repeats))
+
+    for r in results:
+        line = '{:<12s} {:<60s} median {:10.4f} s (min {:10.4f} s, max {:10.4f} s)'.format(r['name'],json.dumps(r['parameters']),r['median_s'],r['min_s'],r['max_s'])
+        if 'throughput_mib_s' in r:
+            line += ' {:8.1f} MiB/s'.format(r['throughput_mib_s'])
+        print(line)
+
+    output = {'benchmark' : 'remote_operations',
+              'timestamp' : datetime.datetime.now().isoformat(),
+              'environment' : {'python' : platform.python_version(), 'platform' : platform.platform(), 'paramiko' : paramiko.__version__},
+              'parameters' : {'latency_ms' : args.latency, 'bandwidth_mib_s' : args.bandwidth, 'repeats' : args.repeats},
+              'results' : results}
+
+    if args.compare is not None:
+        with open(str(args.compare),'r') as fin:
+            compare(results,json.load(fin))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump(output,fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
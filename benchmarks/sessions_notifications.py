@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the change notifications of the sessions model.
+
+A tree view showing all the servers of several sessions is refreshed after the servers of one session were found
+again, a few servers having disappeared and a few new ones having appeared. The legacy method removed all the servers
+of the session one by one, added the found ones without notifying the view and emitted layoutChanged, which is what
+the model used to do. The current method only removes and inserts the changed rows. The notifications emitted by the
+model, the calls the view made to update itself (index(), parent() and rowCount() for its layout, data() for painting),
+the number of distinct rows it painted and whether the expanded sessions stayed expanded are reported. A display or
+QT_QPA_PLATFORM=offscreen is needed.
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+from PyQt5 import QtCore, QtWidgets
+
+from passhfiles.kernel.Sessions import ServerNode
+from passhfiles.models.SessionsModel import SessionsModel
+
+class _CountingSessionsModel(SessionsModel):
+    """The sessions model counting the calls made by the views and its notifications.
+    """
+
+    def __init__(self):
+
+        super(_CountingSessionsModel,self).__init__()
+
+        self.resetCounters()
+
+        for signal in (self.dataChanged,self.layoutChanged,self.modelReset,self.rowsInserted,self.rowsRemoved):
+            signal.connect(self._onNotified)
+
+    def data(self, index, role):
+
+        self.queries += 1
+        if index.isValid():
+            self.queriedRows.add(id(index.internalPointer()))
+
+        return super(_CountingSessionsModel,self).data(index,role)
+
+    def index(self, row, column, parentIndex=QtCore.QModelIndex()):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).index(row,column,parentIndex)
+
+    def _onNotified(self, *args):
+
+        self.notifications += 1
+
+    def parent(self, index):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).parent(index)
+
+    def resetCounters(self):
+
+        self.notifications = 0
+        self.layoutQueries = 0
+        self.queries = 0
+        self.queriedRows = set()
+
+    def rowCount(self, index=None):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).rowCount(index)
+
+class _LegacySessionsModel(_CountingSessionsModel):
+    """The sessions model updating the servers of a session as the legacy model did.
+    """
+
+    def updateServers(self, sessionIndex, serverNames):
+
+        for i in range(self.rowCount(sessionIndex))[::-1]:
+            serverIndex = self.index(i,0,sessionIndex)
+            self.removeRow(serverIndex,sessionIndex)
+        self.layoutChanged.emit()
+
+        sessionNode = sessionIndex.internalPointer()
+        for name in serverNames:
+            sessionNode.addChild(ServerNode(name,sessionNode))
+
+        self.layoutChanged.emit()
+
+def _refresh(app, modelClass, nSessions, nServers, nChanged):
+    """Refresh the servers of a session shown in a tree view.
+
+    Args:
+        app (PyQt5.QtWidgets.QApplication): the application
+        modelClass (type): the class of the model
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+        nChanged (int): the number of servers which disappeared and of new servers
+
+    Returns:
+        dict: the results
+    """
+
+    model = modelClass()
+    for i in range(nSessions):
+        servers = {'server{:05d}'.format(j) : {'local' : [], 'remote' : []} for j in range(nServers)}
+        model.addSession({'name' : 'session{:03d}'.format(i),'address' : 'localhost','port' : 22,'user' : 'user','key' : None,'keytype' : 'RSA','servers' : servers})
+
+    view = QtWidgets.QTreeView()
+    view.setHeaderHidden(True)
+    view.setModel(model)
+    view.resize(400,800)
+    view.show()
+    view.expandAll()
+    app.processEvents()
+
+    # Some servers in the middle of the session, which is scrolled to, were replaced by new ones
+    sessionIndex = model.index(nSessions//2,0)
+    names = ['server{:05d}'.format(j) for j in range(nServers)]
+    middle = nServers//2
+    view.scrollTo(model.index(middle,0,sessionIndex),QtWidgets.QAbstractItemView.PositionAtCenter)
+    app.processEvents()
+    found = names[:middle] + ['new{:05d}'.format(j) for j in range(nChanged)] + names[middle+nChanged:]
+
+    model.resetCounters()
+
+    start = time.perf_counter()
+    model.updateServers(sessionIndex,found)
+    app.processEvents()
+    duration = time.perf_counter() - start
+
+    result = {'notifications' : model.notifications,
+              'layout_queries' : model.layoutQueries,
+              'queries' : model.queries,
+              'queried_rows' : len(model.queriedRows),
+              'duration_s' : duration,
+              'expanded_sessions' : sum(view.isExpanded(model.index(i,0)) for i in range(nSessions)),
+              'servers' : model.rowCount(sessionIndex)}
+
+    view.close()
+
+    return result
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the change notifications of the sessions model')
+    parser.add_argument('--sessions', type=int, default=10, help='the number of sessions')
+    parser.add_argument('--servers', type=int, default=1000, help='the number of servers per session')
+    parser.add_argument('--changed', type=int, default=5, help='the number of servers which disappeared and appeared')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+
+    results = []
+    for method, modelClass in (('legacy',_LegacySessionsModel),('current',_CountingSessionsModel)):
+        result = _refresh(app,modelClass,args.sessions,args.servers,args.changed)
+        result['method'] = method
+        results.append(result)
+
+    for r in results:
+        print('{method:<8s} notifications {notifications:5d}  layout calls {layout_queries:9d}  data() calls {queries:6d}  rows painted {queried_rows:4d}  refresh {duration_s:7.3f} s  expanded sessions {expanded_sessions:3d}  servers {servers:6d}'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'sessions_notifications', 'sessions' : args.sessions, 'servers' : args.servers, 'changed' : args.changed, 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the lookups and of the search in the sessions tree.
+
+The lookups compare the linear scans the sessions model used to do (a list of the server names for the duplicate
+check of addServer, list.index for the row of a node) with the name index and the cached rows of the nodes. The search
+types a pattern character by character and compares a QSortFilterProxyModel filtering the display names with a
+fuzzy regular expression (recursive filtering) with the SessionsFilterModel and its precomputed search index.
+"""
+
+import argparse
+import json
+import pathlib
+import re
+import statistics
+import sys
+import time
+
+from PyQt5 import QtCore
+
+from passhfiles.models.SessionsFilterModel import SessionsFilterModel
+from passhfiles.models.SessionsModel import SessionsModel
+
+# The words the names of the servers are made of
+WORDS = ['web','db','cache','node','gpu','login','batch','storage','proxy','monitor']
+
+def _buildModel(nSessions, nServers):
+    """Build a sessions model.
+
+    Args:
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+
+    Returns:
+        SessionsModel: the model
+    """
+
+    model = SessionsModel()
+    for i in range(nSessions):
+        servers = {}
+        for j in range(nServers):
+            name = '{}-{}{:05d}'.format(WORDS[j % len(WORDS)],WORDS[(i + j // len(WORDS)) % len(WORDS)],j)
+            servers[name] = {'local' : [], 'remote' : []}
+        model.addSession({'name' : 'session {} {}'.format(WORDS[i % len(WORDS)],i),'address' : 'localhost','port' : 22,'user' : 'user','key' : None,'keytype' : 'RSA','servers' : servers})
+
+    return model
+
+def _shownRows(proxyModel):
+    """Returns the number of rows shown by a proxy model, as a tree view expanding all the sessions would query them.
+
+    Args:
+        proxyModel (PyQt5.QtCore.QSortFilterProxyModel): the proxy model
+
+    Returns:
+        int: the number of rows
+    """
+
+    nRows = 0
+    for i in range(proxyModel.rowCount()):
+        nRows += 1 + proxyModel.rowCount(proxyModel.index(i,0))
+
+    return nRows
+
+def _typing(proxyModel, setPattern, pattern):
+    """Type a pattern character by character in a proxy model.
+
+    Args:
+        proxyModel (PyQt5.QtCore.QSortFilterProxyModel): the proxy model
+        setPattern (callable): the function setting the pattern of the proxy model
+        pattern (str): the pattern
+
+    Returns:
+        tuple: the duration of each keystroke in seconds and the number of rows shown for the whole pattern
+    """
+
+    durations = []
+    for i in range(1,len(pattern) + 1):
+        start = time.perf_counter()
+        setPattern(pattern[:i])
+        nRows = _shownRows(proxyModel)
+        durations.append(time.perf_counter() - start)
+    setPattern('')
+
+    return durations, nRows
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the lookups and of the search in the sessions tree')
+    parser.add_argument('--sessions', type=int, default=10, help='the number of sessions')
+    parser.add_argument('--servers', type=int, default=1000, help='the number of servers per session')
+    parser.add_argument('--lookups', type=int, default=1000, help='the number of lookups')
+    parser.add_argument('--pattern', type=str, default='dbgpu001', help='the search pattern')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv[:1])
+
+    model = _buildModel(args.sessions,args.servers)
+    root = model.root()
+    sessionNode = root.child(root.childCount() - 1)
+    serverNodes = [sessionNode.child(j) for j in range(sessionNode.childCount())]
+    lastServer = serverNodes[-1]
+
+    results = {}
+
+    # Duplicate check of addServer, for a server which is not in the session
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        'unknown' in [sessionNode.child(j).name() for j in range(sessionNode.childCount())]
+    results['duplicate_check_linear_s'] = (time.perf_counter() - start)/args.lookups
+
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        sessionNode.childByName('unknown') is not None
+    results['duplicate_check_indexed_s'] = (time.perf_counter() - start)/args.lookups
+
+    # Row of the last server, as asked by the parent() of the model for each of its indexes
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        sessionNode._children.index(lastServer)
+    results['row_linear_s'] = (time.perf_counter() - start)/args.lookups
+
+    start = time.perf_counter()
+    for _ in range(args.lookups):
+        lastServer.row()
+    results['row_cached_s'] = (time.perf_counter() - start)/args.lookups
+
+    # Search with a QSortFilterProxyModel filtering on the display role
+    regexpModel = QtCore.QSortFilterProxyModel()
+    regexpModel.setRecursiveFilteringEnabled(True)
+    regexpModel.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
+    regexpModel.setSourceModel(model)
+    setRegexp = lambda p : regexpModel.setFilterRegExp('.*'.join(re.escape(c) for c in p))
+    durations, nRows = _typing(regexpModel,setRegexp,args.pattern)
+    results['regexp_keystroke_median_s'] = statistics.median(durations)
+    results['regexp_keystroke_max_s'] = max(durations)
+    results['regexp_rows'] = nRows
+
+    # Search with the search index, built on the first keystroke
+    filterModel = SessionsFilterModel()
+    filterModel.setSourceModel(model)
+    durations, nRows = _typing(filterModel,filterModel.setPattern,args.pattern)
+    results['indexed_keystroke_median_s'] = statistics.median(durations)
+    results['indexed_keystroke_max_s'] = max(durations)
+    results['indexed_rows'] = nRows
+
+    del app
+
+    print('servers                 {:9d}'.format(args.sessions*args.servers))
+    print('duplicate check         linear {:10.2f} us  indexed {:10.2f} us'.format(1e6*results['duplicate_check_linear_s'],1e6*results['duplicate_check_indexed_s']))
+    print('row of a server         linear {:10.2f} us  cached  {:10.2f} us'.format(1e6*results['row_linear_s'],1e6*results['row_cached_s']))
+    print('keystroke (median)      regexp {:10.2f} ms  indexed {:10.2f} ms'.format(1e3*results['regexp_keystroke_median_s'],1e3*results['indexed_keystroke_median_s']))
+    print('keystroke (max)         regexp {:10.2f} ms  indexed {:10.2f} ms'.format(1e3*results['regexp_keystroke_max_s'],1e3*results['indexed_keystroke_max_s']))
+    print('rows shown              regexp {:10d}     indexed {:10d}'.format(results['regexp_rows'],results['indexed_rows']))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'sessions_search', 'sessions' : args.sessions, 'servers' : args.servers, 'pattern' : args.pattern, 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
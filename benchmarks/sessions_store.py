@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the persistence of the sessions file.
+
+The legacy method writes the sessions with yaml.dump, which tags the paths and the ordered dictionaries as Python
+objects, and reads them back with yaml.unsafe_load. The current method writes plain data atomically with the safe
+dumper of the LibYAML bindings and reads it with their safe loader. The burst measures the time the caller spends
+when saving the sessions several times in a row, which the legacy method did on the GUI thread for each change.
+"""
+
+import argparse
+import collections
+import json
+import pathlib
+import statistics
+import tempfile
+import time
+
+import yaml
+
+from passhfiles.kernel.Sessions import dumpSessions, readSessions
+from passhfiles.kernel.SessionsStore import SESSIONS_STORE
+
+def _legacySessions(nSessions, nServers):
+    """Returns sessions as they were stored by the legacy method.
+
+    Args:
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+
+    Returns:
+        list of dict: the sessions
+    """
+
+    sessions = []
+    for i in range(nSessions):
+        servers = {'server{:04d}'.format(j) : {'local' : [pathlib.Path('/tmp')], 'remote' : [pathlib.PurePosixPath('/home/user')]} for j in range(nServers)}
+        sessions.append(collections.OrderedDict([('name','session{:04d}'.format(i)),
+                                                 ('address','localhost'),
+                                                 ('port',22),
+                                                 ('user','user'),
+                                                 ('key',pathlib.Path('/nonexistent')),
+                                                 ('keepalive',30),
+                                                 ('servers',servers)]))
+
+    return sessions
+
+def _time(func, repeats):
+    """Returns the median duration of a function.
+
+    Args:
+        func (callable): the function
+        repeats (int): the number of calls
+
+    Returns:
+        float: the median duration in seconds
+    """
+
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    return statistics.median(durations)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the persistence of the sessions file')
+    parser.add_argument('--sessions', type=int, default=1000, help='the number of sessions')
+    parser.add_argument('--servers', type=int, default=5, help='the number of servers per session')
+    parser.add_argument('--burst', type=int, default=10, help='the number of saves in a row')
+    parser.add_argument('--repeats', type=int, default=3, help='the number of runs per measure')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    legacy = _legacySessions(args.sessions,args.servers)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sessionsFile = pathlib.Path(tmpdir).joinpath('sessions.yml')
+
+        def legacyDump():
+            with open(str(sessionsFile),'w') as fout:
+                yaml.dump(legacy,fout)
+
+        def legacyLoad():
+            with open(str(sessionsFile),'r') as fin:
+                yaml.unsafe_load(fin)
+
+        def legacyBurst():
+            for _ in range(args.burst):
+                legacyDump()
+
+        legacyDump()
+        result = {'method' : 'legacy',
+                  'dump_s' : _time(legacyDump,args.repeats),
+                  'load_s' : _time(legacyLoad,args.repeats),
+                  'burst_s' : _time(legacyBurst,args.repeats),
+                  'size_bytes' : sessionsFile.stat().st_size}
+        results.append(result)
+
+        # Migrate the legacy file, which also gives the plain data of the sessions
+        sessionsFile.unlink()
+        legacyDump()
+        readSessions(sessionsFile)
+        with open(str(sessionsFile),'r') as fin:
+            sessions = yaml.safe_load(fin)
+
+        def burst():
+            for _ in range(args.burst):
+                SESSIONS_STORE.save(sessionsFile,sessions)
+
+        result = {'method' : 'safe',
+                  'dump_s' : _time(lambda : dumpSessions(sessionsFile,sessions),args.repeats),
+                  'load_s' : _time(lambda : readSessions(sessionsFile),args.repeats),
+                  'burst_s' : _time(burst,args.repeats),
+                  'size_bytes' : sessionsFile.stat().st_size}
+        SESSIONS_STORE.flush()
+        results.append(result)
+
+    for r in results:
+        print('{method:<6s} dump {dump_s:7.3f} s  load {load_s:7.3f} s  burst of saves {burst_s:7.3f} s  size {size_bytes:9d} bytes'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'sessions_store', 'sessions' : args.sessions, 'servers' : args.servers, 'burst' : args.burst, 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""Microbenchmark of the index() and parent() methods of the sessions model and of the memory of its nodes.
+
+A tree view calls parent() for each index it lays out or paints. The legacy model computed the row of the parent
+node with list.index over its siblings, the current one reads the row maintained by the node. The memory of the
+nodes is compared with the same nodes without __slots__.
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+import tracemalloc
+
+from PyQt5 import QtCore
+
+from passhfiles.kernel.Sessions import ServerNode
+from passhfiles.models.SessionsModel import SessionsModel
+
+class _LegacySessionsModel(SessionsModel):
+    """The sessions model computing the rows of the parent nodes as the legacy model did.
+    """
+
+    def parent(self, index):
+
+        if index.isValid():
+            p = index.internalPointer().parent()
+            if p is not None and p is not self.root():
+                return QtCore.QAbstractItemModel.createIndex(self, p.parent()._children.index(p), 0, p)
+        return QtCore.QModelIndex()
+
+class _DictServerNode:
+    """A server node storing its attributes in a dictionary, as the nodes did before they used __slots__.
+    """
+
+    def __init__(self, name, parent):
+
+        self._name = name
+        self._parent = parent
+        self._row = -1
+        self._stderrMotd = ''
+        self._stdoutMotd = ''
+        self._favorites = {'local': [], 'remote': []}
+
+def _buildModel(modelClass, nSessions, nServers):
+    """Build a sessions model.
+
+    Args:
+        modelClass (type): the class of the model
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+
+    Returns:
+        SessionsModel: the model
+    """
+
+    model = modelClass()
+    for i in range(nSessions):
+        servers = {'server{:05d}'.format(j) : {'local' : [], 'remote' : []} for j in range(nServers)}
+        model.addSession({'name' : 'session{:04d}'.format(i),'address' : 'localhost','port' : 22,'user' : 'user','key' : None,'keytype' : 'RSA','servers' : servers})
+
+    return model
+
+def _nodesMemory(nodeClass, nNodes):
+    """Returns the memory allocated per server node.
+
+    Args:
+        nodeClass (type): the class of the nodes
+        nNodes (int): the number of nodes to allocate
+
+    Returns:
+        float: the number of bytes per node
+    """
+
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    nodes = [nodeClass('server{:05d}'.format(i),None) for i in range(nNodes)]
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del nodes
+
+    return size/nNodes
+
+def _throughput(model, repeats):
+    """Returns the number of index() and parent() calls per second when walking all the servers of a model.
+
+    Args:
+        model (SessionsModel): the model
+        repeats (int): the number of walks
+
+    Returns:
+        float: the number of calls per second
+    """
+
+    sessionIndexes = [model.index(i,0) for i in range(model.rowCount())]
+
+    nCalls = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for sessionIndex in sessionIndexes:
+            for j in range(model.rowCount(sessionIndex)):
+                model.parent(model.index(j,0,sessionIndex))
+                nCalls += 2
+
+    return nCalls/(time.perf_counter() - start)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Microbenchmark of the index() and parent() methods of the sessions model')
+    parser.add_argument('--sessions', type=int, default=100, help='the number of sessions')
+    parser.add_argument('--servers', type=int, default=100, help='the number of servers per session')
+    parser.add_argument('--repeats', type=int, default=3, help='the number of walks over all the servers')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(sys.argv[:1])
+
+    results = []
+    for method, modelClass, nodeClass in (('legacy',_LegacySessionsModel,_DictServerNode),('current',SessionsModel,ServerNode)):
+        model = _buildModel(modelClass,args.sessions,args.servers)
+        results.append({'method' : method,
+                        'calls_per_s' : _throughput(model,args.repeats),
+                        'bytes_per_server_node' : _nodesMemory(nodeClass,args.sessions*args.servers)})
+
+    del app
+
+    for r in results:
+        print('{method:<8s} index()/parent() {calls_per_s:12.0f} calls/s  server node {bytes_per_server_node:7.1f} bytes'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'sessions_tree', 'sessions' : args.sessions, 'servers' : args.servers, 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
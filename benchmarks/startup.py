@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the startup of the application.
+
+Each run starts a fresh interpreter with a home directory holding a sessions file of the requested size and times the
+import of the main window, the first paint of the window and the loading of the sessions. The eager method imports
+the modules needed for connecting and browsing and loads the sessions before the window is shown, which is what the
+application used to do. A display or QT_QPA_PLATFORM=offscreen is needed.
+"""
+
+import time
+
+START = time.perf_counter()
+
+import argparse
+import importlib
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# The modules the application used to import before showing its window
+EAGER_MODULES = ['paramiko','scp','yaml','passhfiles.models.LocalFileSystemModel','passhfiles.models.RemoteFileSystemModel']
+
+def _child(eager):
+    """Start the application and time its startup. The timings are printed as JSON on the standard output.
+
+    Args:
+        eager (bool): whether the deferred modules are imported and the sessions loaded before the window is shown
+    """
+
+    from PyQt5 import QtCore, QtWidgets
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+
+    timings = {}
+
+    start = time.perf_counter()
+    from passhfiles.views.MainWindow import MainWindow
+    timings['import_s'] = time.perf_counter() - start
+
+    if eager:
+        for module in EAGER_MODULES:
+            importlib.import_module(module)
+        from passhfiles.kernel.SSHAgent import runningAgents
+        # The sessions are loaded below, before the event loop starts
+        loadSessions = MainWindow.loadSessions
+        MainWindow.loadSessions = lambda self : None
+
+    class _FirstPaintFilter(QtCore.QObject):
+
+        def eventFilter(self, watched, event):
+
+            if event.type() == QtCore.QEvent.Paint and 'first_paint_s' not in timings:
+                if isinstance(watched,QtWidgets.QWidget) and isinstance(watched.window(),MainWindow):
+                    timings['first_paint_s'] = time.perf_counter() - START
+                    timings['paramiko_at_first_paint'] = 'paramiko' in sys.modules
+            return False
+
+    paintFilter = _FirstPaintFilter()
+    app.installEventFilter(paintFilter)
+
+    window = MainWindow()
+    if eager:
+        loadSessions(window)
+        runningAgents()
+
+    def poll():
+        if 'first_paint_s' in timings and window.sessionsTreeView.sessionsModel().rowCount() > 0:
+            timings['sessions_loaded_s'] = time.perf_counter() - START
+            app.quit()
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(poll)
+    timer.start(1)
+    QtCore.QTimer.singleShot(30000,app.quit)
+
+    app.exec_()
+
+    print(json.dumps(timings))
+
+def _writeSessions(home, nSessions, nServers):
+    """Write a sessions file in the settings directory of a home directory.
+
+    Args:
+        home (pathlib.Path): the home directory
+        nSessions (int): the number of sessions
+        nServers (int): the number of servers per session
+    """
+
+    import yaml
+
+    sessions = []
+    for i in range(nSessions):
+        servers = {'server{:04d}'.format(j) : {'local' : [], 'remote' : []} for j in range(nServers)}
+        sessions.append({'name' : 'session{:03d}'.format(i),
+                         'address' : 'localhost',
+                         'port' : 22,
+                         'user' : 'user',
+                         'keytype' : 'RSA',
+                         'keyfile' : '/nonexistent',
+                         'servers' : servers})
+
+    settings = home.joinpath('.passhfiles')
+    settings.mkdir()
+    with open(str(settings.joinpath('sessions.yml')),'w') as fout:
+        yaml.dump(sessions,fout)
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Benchmark of the startup of the application')
+    parser.add_argument('--sessions', type=int, default=20, help='the number of sessions of the sessions file')
+    parser.add_argument('--servers', type=int, default=20, help='the number of servers per session')
+    parser.add_argument('--repeats', type=int, default=5, help='the number of startups per method')
+    parser.add_argument('--output', type=pathlib.Path, default=None, help='the JSON file where to store the results')
+    parser.add_argument('--child', choices=['lazy','eager'], default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        _child(args.child == 'eager')
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as home:
+        _writeSessions(pathlib.Path(home),args.sessions,args.servers)
+
+        env = dict(os.environ)
+        env['HOME'] = home
+        env.setdefault('QT_QPA_PLATFORM','offscreen')
+        env.pop('SSH_AUTH_SOCK',None)
+
+        for method in ('eager','lazy'):
+            runs = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                output = subprocess.run([sys.executable,__file__,'--child',method],env=env,check=True,stdout=subprocess.PIPE).stdout
+                timings = json.loads(output.decode().strip().split('\n')[-1])
+                timings['process_s'] = time.perf_counter() - start
+                runs.append(timings)
+
+            result = {'method' : method, 'paramiko_at_first_paint' : runs[0].get('paramiko_at_first_paint')}
+            for k in ('import_s','first_paint_s','sessions_loaded_s','process_s'):
+                values = [r[k] for r in runs if k in r]
+                result[k] = statistics.median(values) if values else None
+            results.append(result)
+
+    for r in results:
+        print('{method:<6s} import {import_s:7.3f} s  first paint {first_paint_s:7.3f} s  sessions loaded {sessions_loaded_s:7.3f} s  process {process_s:7.3f} s  paramiko at first paint {paramiko_at_first_paint}'.format(**r))
+
+    if args.output is not None:
+        with open(str(args.output),'w') as fout:
+            json.dump({'benchmark' : 'startup', 'sessions' : args.sessions, 'servers' : args.servers, 'results' : results},fout,indent=4)
+
+if __name__ == '__main__':
+
+    main()
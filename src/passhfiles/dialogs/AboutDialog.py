@@ -1,7 +1,7 @@
-from PyQt5 import QtGui, QtWidgets
+from PyQt5 import QtWidgets
 
 from passhfiles.__pkginfo__ import __version__
-from passhfiles.utils.Platform import iconsDirectory
+from passhfiles.utils.Icons import ICON_REGISTRY
 
 class AboutDialog(QtWidgets.QDialog):
     """Dialog used for showing global information about the application.
@@ -24,7 +24,7 @@ class AboutDialog(QtWidgets.QDialog):
         """Setup the dialog.
         """
 
-        pixmap = QtGui.QPixmap(str(iconsDirectory()/'passhfiles.png'))
+        pixmap = ICON_REGISTRY.pixmap('passhfiles.png')
         pixmap = pixmap.scaled(180,180)
         label = QtWidgets.QLabel()
         label.setPixmap(pixmap)
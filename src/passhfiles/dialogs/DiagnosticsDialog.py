@@ -0,0 +1,157 @@
+import logging
+
+from PyQt5 import QtCore, QtWidgets
+
+from passhfiles.kernel.Tracing import TRACER
+
+class DiagnosticsDialog(QtWidgets.QDialog):
+    """Implements a dialog which shows the durations of the traced operations.
+
+    The summary tab aggregates the spans per operation, which tells where the time goes (opening the channel through
+    the bastion, running the remote command, parsing the listing, updating the views ...). The spans tab lists the most
+    recent spans. The spans can be exported in the Chrome trace format for an offline analysis.
+    """
+
+    # The maximum number of spans displayed in the spans tab
+    MAXIMUM_DISPLAYED_SPANS = 2000
+
+    def __init__(self, *args, **kwargs):
+        """Constructor.
+        """
+
+        super(DiagnosticsDialog,self).__init__(*args,**kwargs)
+
+        self._initUi()
+
+        self.setWindowTitle('Diagnostics')
+
+        self.onRefresh()
+
+    def _initUi(self):
+        """Setup the dialog.
+        """
+
+        vbox = QtWidgets.QVBoxLayout()
+
+        self._enabled = QtWidgets.QCheckBox('Record the durations of the operations')
+        self._enabled.setChecked(TRACER.enabled)
+        self._enabled.toggled.connect(self.onEnableTracing)
+        vbox.addWidget(self._enabled)
+
+        tabs = QtWidgets.QTabWidget()
+
+        self._summary = self._createTable(['Operation','Category','Calls','Total (ms)','Mean (ms)','Max (ms)'])
+        tabs.addTab(self._summary,'Summary')
+
+        self._spans = self._createTable(['Start (s)','Thread','Category','Operation','Duration (ms)','Details'])
+        tabs.addTab(self._spans,'Spans')
+
+        vbox.addWidget(tabs)
+
+        hbox = QtWidgets.QHBoxLayout()
+
+        refreshButton = QtWidgets.QPushButton('Refresh')
+        refreshButton.clicked.connect(self.onRefresh)
+        hbox.addWidget(refreshButton)
+
+        clearButton = QtWidgets.QPushButton('Clear')
+        clearButton.clicked.connect(self.onClear)
+        hbox.addWidget(clearButton)
+
+        exportButton = QtWidgets.QPushButton('Export Chrome trace ...')
+        exportButton.clicked.connect(self.onExport)
+        hbox.addWidget(exportButton)
+
+        hbox.addStretch()
+
+        closeButton = QtWidgets.QPushButton('Close')
+        closeButton.clicked.connect(self.accept)
+        hbox.addWidget(closeButton)
+
+        vbox.addLayout(hbox)
+
+        self.setLayout(vbox)
+
+        self.resize(900,500)
+
+    def _createTable(self, headers):
+        """Create a read-only table.
+
+        Args:
+            headers (list of str): the headers of the columns
+
+        Returns:
+            PyQt5.QtWidgets.QTableWidget: the table
+        """
+
+        table = QtWidgets.QTableWidget(0,len(headers))
+        table.setHorizontalHeaderLabels(headers)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().hide()
+
+        return table
+
+    def _fillTable(self, table, rows):
+        """Fill a table with some rows.
+
+        Args:
+            table (PyQt5.QtWidgets.QTableWidget): the table
+            rows (list of list): the values of the cells of each row
+        """
+
+        table.setSortingEnabled(False)
+        table.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                item = QtWidgets.QTableWidgetItem()
+                # Storing the numbers as such allows to sort the columns numerically
+                item.setData(QtCore.Qt.DisplayRole,value)
+                table.setItem(i,j,item)
+        table.setSortingEnabled(True)
+        table.resizeColumnsToContents()
+
+    def onClear(self):
+        """Remove all the recorded spans.
+        """
+
+        TRACER.clear()
+        self.onRefresh()
+
+    def onEnableTracing(self, enabled):
+        """Enable or disable the recording of the spans.
+
+        Args:
+            enabled (bool): True for enabling the recording
+        """
+
+        TRACER.enabled = enabled
+
+    def onExport(self):
+        """Export the recorded spans in the Chrome trace format.
+        """
+
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self,'Export Chrome trace','passhfiles_trace.json','JSON files (*.json)')
+        if not path:
+            return
+
+        try:
+            TRACER.exportChromeTrace(path)
+        except Exception as e:
+            logging.error(str(e))
+        else:
+            logging.info('Trace exported to {}'.format(path))
+
+    def onRefresh(self):
+        """Update the tables with the recorded spans.
+        """
+
+        summary = [[name,category,count,round(1000*total,3),round(1000*mean,3),round(1000*maximum,3)]
+                   for name, category, count, total, mean, maximum in TRACER.summary()]
+        self._fillTable(self._summary,summary)
+
+        spans = TRACER.spans()[-DiagnosticsDialog.MAXIMUM_DISPLAYED_SPANS:][::-1]
+        rows = [[round(s.start,6),s.threadName,s.category,s.name,round(1000*s.duration,3),
+                 ', '.join(['{}={}'.format(k,v) for k, v in s.args.items()])] for s in spans]
+        self._fillTable(self._spans,rows)
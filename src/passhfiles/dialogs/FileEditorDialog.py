@@ -1,8 +1,26 @@
+import array
+import logging
 import pathlib
+import re
+import time
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from passhfiles.kernel.PieceTable import PieceTable
+
+# The line breaks on which the editor splits the text into blocks
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+
 class FileEditorDialog(QtWidgets.QDialog):
+    """Implements an editor for text files of any size.
+
+    The file is opened as a memory-mapped piece table and loaded lazily in the editor by chunks of lines as the user
+    scrolls down. The edits are tracked at the block (line) level so that, on save, only the lines which changed are
+    encoded and written back, the rest of the file being left untouched.
+    """
+
+    # The approximate size of the chunks of lines loaded in the editor
+    CHUNK_SIZE = 1024*1024
 
     fileSaved = QtCore.pyqtSignal(pathlib.Path,pathlib.PurePath)
 
@@ -23,8 +41,8 @@ class FileEditorDialog(QtWidgets.QDialog):
         self._title.setAlignment(QtCore.Qt.AlignCenter)
         vbox.addWidget(self._title)
 
-        self._scrollableTextArea = QtWidgets.QTextEdit()
-        self._scrollableTextArea.setText(open(str(self._tempFile),'r').read())
+        self._scrollableTextArea = QtWidgets.QPlainTextEdit()
+        self._scrollableTextArea.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
         vbox.addWidget(self._scrollableTextArea)
 
         self._buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
@@ -36,6 +54,107 @@ class FileEditorDialog(QtWidgets.QDialog):
 
         self.setGeometry(0, 0, 800, 400)
 
+        start = time.perf_counter()
+
+        self._document = PieceTable(self._tempFile)
+
+        # The offsets in the file of the lines loaded in the editor
+        self._lineOffsets = array.array('Q',[0])
+
+        # The offset in the file following the last loaded line
+        self._loadedEnd = 0
+
+        # The first modified block and the number of unmodified blocks at the end of the editor
+        self._firstModifiedBlock = None
+        self._unmodifiedTailBlocks = 1
+
+        # The line break used for writing the modified lines. Set to the one of the file when loading its first chunk.
+        self._newline = None
+
+        self._loading = False
+
+        self._scrollableTextArea.document().contentsChange.connect(self.onContentsChange)
+        self._scrollableTextArea.verticalScrollBar().valueChanged.connect(self.onScroll)
+
+        self._loadNextChunk()
+
+        logging.debug('Opened {} in {:.3f} s'.format(self._actualFile,time.perf_counter() - start))
+
+    def _loadNextChunk(self):
+        """Append the next chunk of lines of the file to the editor.
+
+        Returns:
+            bool: True if a chunk was loaded
+        """
+
+        if self._loadedEnd >= self._document.size():
+            return False
+
+        data = self._document.readLines(self._loadedEnd,FileEditorDialog.CHUNK_SIZE)
+
+        lineBreaks = list(LINE_BREAK.finditer(data))
+
+        if self._newline is None and lineBreaks:
+            if b'\r\n' in data:
+                self._newline = '\r\n'
+            elif b'\n' in data:
+                self._newline = '\n'
+            else:
+                self._newline = '\r'
+
+        self._lineOffsets.extend([self._loadedEnd + m.end() for m in lineBreaks])
+
+        self._unmodifiedTailBlocks += len(lineBreaks)
+
+        textDocument = self._scrollableTextArea.document()
+
+        # The undo stack is reset as undoing the loading of a chunk would be taken for the deletion of its lines
+        self._loading = True
+        textDocument.setUndoRedoEnabled(False)
+        cursor = QtGui.QTextCursor(textDocument)
+        cursor.movePosition(QtGui.QTextCursor.End)
+        cursor.insertText(data.decode('utf-8',errors='replace'))
+        textDocument.setUndoRedoEnabled(True)
+        self._loading = False
+
+        self._loadedEnd += len(data)
+
+        return True
+
+    def _modifiedData(self):
+        """Returns the modified lines of the editor and the range of the file they replace.
+
+        Returns:
+            tuple: the offset and the length of the range of the file and the encoded lines. None if no line was
+            modified.
+        """
+
+        if self._firstModifiedBlock is None:
+            return None
+
+        textDocument = self._scrollableTextArea.document()
+
+        nBlocks = textDocument.blockCount()
+        nLines = len(self._lineOffsets)
+
+        firstBlock = self._firstModifiedBlock
+        lastBlock = nBlocks - self._unmodifiedTailBlocks
+
+        lines = []
+        block = textDocument.findBlockByNumber(firstBlock)
+        for _ in range(firstBlock,lastBlock):
+            lines.append(block.text())
+            block = block.next()
+        newline = self._newline or '\n'
+        text = newline.join(lines)
+        if self._unmodifiedTailBlocks > 0:
+            text += newline
+
+        start = self._lineOffsets[firstBlock]
+        end = self._lineOffsets[nLines - self._unmodifiedTailBlocks] if self._unmodifiedTailBlocks > 0 else self._loadedEnd
+
+        return start, end - start, text.encode('utf-8')
+
     def accept(self):
         """Called when the user accepts the changes made in the file.
         """
@@ -48,7 +167,7 @@ class FileEditorDialog(QtWidgets.QDialog):
         messageBox = QtWidgets.QMessageBox()
         title = "Quit Editor?"
         message = "WARNING !!\n\nIf you quit without saving, any changes made to the file will be lost.\n\nSave file before quitting?"
-       
+
         reply = messageBox.question(self, title, message, messageBox.Yes | messageBox.No |
                 messageBox.Cancel, messageBox.Cancel)
         if reply == messageBox.Yes:
@@ -60,13 +179,89 @@ class FileEditorDialog(QtWidgets.QDialog):
         else:
             event.ignore()
 
+    def done(self, result):
+        """Unmap the file when the dialog is closed.
+
+        Args:
+            result (int): the result of the dialog
+        """
+
+        self._document.close()
+
+        super(FileEditorDialog,self).done(result)
+
+    def onContentsChange(self, position, charsRemoved, charsAdded):
+        """Called when the contents of the editor changes. Keep track of the blocks which were modified.
+
+        Args:
+            position (int): the position of the change
+            charsRemoved (int): the number of removed characters
+            charsAdded (int): the number of added characters
+        """
+
+        if self._loading:
+            return
+
+        textDocument = self._scrollableTextArea.document()
+
+        firstBlock = textDocument.findBlock(position).blockNumber()
+        lastBlock = textDocument.findBlock(position + charsAdded).blockNumber()
+        if lastBlock < 0:
+            lastBlock = textDocument.blockCount() - 1
+
+        if self._firstModifiedBlock is None:
+            self._firstModifiedBlock = firstBlock
+        else:
+            self._firstModifiedBlock = min(self._firstModifiedBlock,firstBlock)
+
+        self._unmodifiedTailBlocks = min(self._unmodifiedTailBlocks,textDocument.blockCount() - 1 - lastBlock)
+
+    def onScroll(self, value):
+        """Called when the editor is scrolled. Load the next chunk of lines when the end of the editor is reached.
+
+        Args:
+            value (int): the position of the scroll bar
+        """
+
+        if value >= self._scrollableTextArea.verticalScrollBar().maximum():
+            self._loadNextChunk()
+
     def saveCurrentFile(self):
         """Save the file.
+
+        Only the modified lines are written to the file.
         """
-        
-        contents = self._scrollableTextArea.toPlainText()
 
-        with open(str(self._tempFile),'w') as fout:
-            fout.write(contents)
+        modifiedData = self._modifiedData()
+        if modifiedData is None:
+            return
+
+        start = time.perf_counter()
+
+        offset, length, data = modifiedData
+
+        self._document.replace(offset,length,data)
+        try:
+            written = self._document.save()
+        except Exception as e:
+            logging.error(str(e))
+            return False
+
+        # Update the offsets of the lines following the modified ones
+        shift = len(data) - length
+        tail = self._lineOffsets[len(self._lineOffsets) - self._unmodifiedTailBlocks:] if self._unmodifiedTailBlocks > 0 else []
+        lineOffsets = self._lineOffsets[:self._firstModifiedBlock]
+        lineOffsets.append(offset)
+        lineOffsets.extend([offset + m.end() for m in LINE_BREAK.finditer(data)])
+        if self._unmodifiedTailBlocks > 0:
+            lineOffsets.pop()
+            lineOffsets.extend([o + shift for o in tail])
+        self._lineOffsets = lineOffsets
+        self._loadedEnd += shift
+
+        self._firstModifiedBlock = None
+        self._unmodifiedTailBlocks = self._scrollableTextArea.document().blockCount()
+
+        logging.debug('Saved {} ({} bytes written) in {:.3f} s'.format(self._actualFile,written,time.perf_counter() - start))
 
         self.fileSaved.emit(self._tempFile,self._actualFile)
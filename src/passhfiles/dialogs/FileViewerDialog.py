@@ -0,0 +1,305 @@
+import codecs
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from passhfiles.utils.Jobs import JOB_MANAGER, Job
+from passhfiles.utils.Numbers import sizeOf
+
+class FileViewerDialog(QtWidgets.QDialog):
+    """Implements a read-only viewer which displays a file one page at a time.
+
+    The pages are fetched on demand through a range reader so that only a bounded part of the file is held in memory
+    whatever its size. In follow mode, the end of the file is polled and the appended data are displayed as they come
+    (as tail -f does). The file is read in background jobs so that a slow server does not freeze the application.
+    """
+
+    # The period in ms at which the size of the file is polled in follow mode
+    FOLLOW_PERIOD = 1000
+
+    # The maximum number of lines kept in the viewer in follow mode
+    MAXIMUM_FOLLOWED_LINES = 10000
+
+    # Emitted by the follow job with the size of the file, the offset of the appended data, the data and whether the
+    # file was truncated since the last poll
+    dataAppendedSignal = QtCore.pyqtSignal(object,object,object,bool)
+
+    def __init__(self, reader, *args, **kwargs):
+        """Constructor.
+
+        Args:
+            reader (passhfiles.kernel.RangeReaders.IRangeReader): the reader of the file to view
+        """
+
+        super(FileViewerDialog,self).__init__(*args,**kwargs)
+
+        self._reader = reader
+
+        self._size = 0
+
+        self._currentPage = 0
+
+        self._followOffset = 0
+
+        self._decoder = None
+
+        self._job = None
+
+        self._closed = False
+
+        vbox = QtWidgets.QVBoxLayout()
+        self._title = QtWidgets.QLabel(str(self._reader.path()))
+        self._title.setWordWrap(True)
+        self._title.setAlignment(QtCore.Qt.AlignCenter)
+        vbox.addWidget(self._title)
+
+        self._textArea = QtWidgets.QPlainTextEdit()
+        self._textArea.setReadOnly(True)
+        self._textArea.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+        self._textArea.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        vbox.addWidget(self._textArea)
+
+        hbox = QtWidgets.QHBoxLayout()
+
+        self._firstPageButton = QtWidgets.QPushButton('<<')
+        self._firstPageButton.clicked.connect(lambda : self.onGoToPage(0))
+        hbox.addWidget(self._firstPageButton)
+
+        self._previousPageButton = QtWidgets.QPushButton('<')
+        self._previousPageButton.clicked.connect(lambda : self.onGoToPage(self._currentPage - 1))
+        hbox.addWidget(self._previousPageButton)
+
+        self._pageSlider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self._pageSlider.setTracking(False)
+        self._pageSlider.valueChanged.connect(self.onGoToPage)
+        hbox.addWidget(self._pageSlider)
+
+        self._nextPageButton = QtWidgets.QPushButton('>')
+        self._nextPageButton.clicked.connect(lambda : self.onGoToPage(self._currentPage + 1))
+        hbox.addWidget(self._nextPageButton)
+
+        self._lastPageButton = QtWidgets.QPushButton('>>')
+        self._lastPageButton.clicked.connect(lambda : self.onGoToPage(self._nPages() - 1))
+        hbox.addWidget(self._lastPageButton)
+
+        self._followCheckBox = QtWidgets.QCheckBox('Follow')
+        self._followCheckBox.setToolTip('Display the data appended to the file as they come')
+        self._followCheckBox.toggled.connect(self.onFollow)
+        hbox.addWidget(self._followCheckBox)
+
+        vbox.addLayout(hbox)
+
+        self._positionLabel = QtWidgets.QLabel()
+        vbox.addWidget(self._positionLabel)
+
+        self._buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close)
+        self._buttonBox.rejected.connect(self.reject)
+        vbox.addWidget(self._buttonBox)
+
+        self.setLayout(vbox)
+
+        self.dataAppendedSignal.connect(self.onDataAppended)
+
+        self.setWindowTitle('View {}'.format(self._reader.path().name))
+
+        self.setGeometry(0, 0, 800, 400)
+
+        self._fetchPage(0,updateSize=True)
+
+    def _fetchPage(self, page, updateSize=False):
+        """Read a page of the file in the background. It is displayed once read.
+
+        The page or the follow job still running is cancelled.
+
+        Args:
+            page (int): the index of the page. If None, the last page.
+            updateSize (bool): if True, the size of the file is read again before the page
+        """
+
+        reader = self._reader
+
+        knownSize = self._size
+
+        def fetch(job):
+            size = reader.size() if updateSize else knownSize
+            # The cached pages may be outdated if the file has changed
+            if size != knownSize:
+                reader.clearCache()
+            nPages = self._nPages(size)
+            index = nPages - 1 if page is None else min(max(page,0),nPages - 1)
+            return size, index, reader.page(index)
+
+        self._job = JOB_MANAGER.submit('view',
+                                       'Read {}'.format(reader.path()),
+                                       fetch,
+                                       self.onPageRead,
+                                       key=('view',id(self)))
+
+    def _nPages(self, size=None):
+        """Returns the number of pages of the file.
+
+        Args:
+            size (int): the size of the file. If None, the last known size.
+
+        Returns:
+            int: the number of pages
+        """
+
+        pageSize = self._reader.pageSize()
+
+        size = self._size if size is None else size
+
+        return max(1,(size + pageSize - 1)//pageSize)
+
+    def _pollFile(self, job):
+        """Poll the end of the file until the job is cancelled and send the appended data through the
+        dataAppendedSignal.
+
+        Called in a worker thread.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the follow job
+        """
+
+        pageSize = self._reader.pageSize()
+
+        offset = None
+        while not job.token.isCancelled():
+            size = self._reader.size()
+
+            # The file has been truncated (e.g. log rotation), restart from its last page
+            truncated = offset is not None and size < offset
+            if offset is None or truncated:
+                offset = max(0,size - pageSize)
+
+            # Skip the data which would not be displayed anyway when the file grows faster than it is polled
+            if size - offset > pageSize:
+                offset = size - pageSize
+
+            data = self._reader.read(offset,size - offset) if size > offset else b''
+            if job.token.isCancelled():
+                break
+            self.dataAppendedSignal.emit(size,offset,data,truncated)
+            offset += len(data)
+
+            job.token.wait(FileViewerDialog.FOLLOW_PERIOD/1000)
+
+    def _updatePosition(self, start, end):
+        """Update the label showing the range of the file being displayed.
+
+        Args:
+            start (int): the offset of the first displayed byte
+            end (int): the offset following the last displayed byte
+        """
+
+        self._positionLabel.setText('Bytes {} - {} of {} ({})'.format(start,end,self._size,sizeOf(self._size)))
+
+    def done(self, result):
+        """Stop reading the file when the dialog is closed.
+
+        Args:
+            result (int): the result of the dialog
+        """
+
+        self._closed = True
+
+        if self._job is not None:
+            JOB_MANAGER.cancel(self._job)
+
+        super(FileViewerDialog,self).done(result)
+
+    def onDataAppended(self, size, offset, data, truncated):
+        """Called when the follow job read the data appended to the file. Append them to the viewer.
+
+        Args:
+            size (int): the size of the file
+            offset (int): the offset of the data
+            data (bytes): the data
+            truncated (bool): whether the file was truncated (e.g. log rotation) since the last poll
+        """
+
+        if self._closed or not self._followCheckBox.isChecked():
+            return
+
+        if truncated:
+            self._textArea.clear()
+
+        if size != self._size:
+            self._reader.clearCache()
+            self._size = size
+
+        if data:
+            cursor = self._textArea.textCursor()
+            cursor.movePosition(QtGui.QTextCursor.End)
+            cursor.insertText(self._decoder.decode(data))
+            self._textArea.setTextCursor(cursor)
+            self._textArea.ensureCursorVisible()
+
+        self._followOffset = offset + len(data)
+
+        self._updatePosition(max(0,self._followOffset - self._reader.pageSize()),self._followOffset)
+
+    def onFollow(self, follow):
+        """Called when the user toggles the follow mode.
+
+        Args:
+            follow (bool): whether or not the end of the file should be followed
+        """
+
+        for w in [self._firstPageButton,self._previousPageButton,self._pageSlider,self._nextPageButton,self._lastPageButton]:
+            w.setEnabled(not follow)
+
+        if follow:
+            self._textArea.setMaximumBlockCount(FileViewerDialog.MAXIMUM_FOLLOWED_LINES)
+            self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self._textArea.clear()
+            self._job = JOB_MANAGER.submit('view',
+                                           'Follow {}'.format(self._reader.path()),
+                                           self._pollFile,
+                                           key=('view',id(self)),
+                                           onDone=self.onFollowStopped)
+        else:
+            self._textArea.setMaximumBlockCount(0)
+            self._fetchPage(None,updateSize=True)
+
+    def onFollowStopped(self, job):
+        """Called when the follow job is over. Leave the follow mode if the file could not be read anymore.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        if job.status == Job.FAILED and not self._closed and job is self._job:
+            self._followCheckBox.setChecked(False)
+
+    def onGoToPage(self, page):
+        """Display a given page of the file once it is read.
+
+        Args:
+            page (int): the index of the page
+        """
+
+        self._currentPage = min(max(page,0),self._nPages() - 1)
+
+        self._fetchPage(self._currentPage)
+
+    def onPageRead(self, result):
+        """Called when a page of the file has been read. Display it.
+
+        Args:
+            result (tuple): the size of the file, the index of the page and its contents
+        """
+
+        if self._closed:
+            return
+
+        self._size, self._currentPage, data = result
+
+        self._textArea.setPlainText(data.decode('utf-8',errors='replace'))
+
+        self._pageSlider.blockSignals(True)
+        self._pageSlider.setRange(0,self._nPages() - 1)
+        self._pageSlider.setValue(self._currentPage)
+        self._pageSlider.blockSignals(False)
+
+        start = self._currentPage*self._reader.pageSize()
+        self._updatePosition(start,start + len(data))
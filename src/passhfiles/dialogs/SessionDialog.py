@@ -7,6 +7,8 @@ import subprocess
 
 from PyQt5 import QtCore, QtWidgets
 
+from passhfiles.kernel.Compression import COMPRESSION_MODES
+from passhfiles.kernel.Sessions import DEFAULT_KEEPALIVE
 from passhfiles.utils.Gui import mainWindow
 
 class SessionDialog(QtWidgets.QDialog):
@@ -18,7 +20,10 @@ class SessionDialog(QtWidgets.QDialog):
                    'user':'passhport',
                    'port':22,
                    'key':'',
-                   'keytype': 'ED25519'}
+                   'keytype': 'ED25519',
+                   'compression': 'none',
+                   'keepalive': DEFAULT_KEEPALIVE,
+                   'backups': 1}
 
     def __init__(self, parent, newSession, data=None):
         """Constructor.
@@ -81,6 +86,27 @@ class SessionDialog(QtWidgets.QDialog):
         keyTypeLayout.addWidget(self._keytypesRadioBUttons['ECDSA'])
         keyTypeLayout.addWidget(self._keytypesRadioBUttons['ED25519'])
 
+        self._compression = QtWidgets.QComboBox()
+        self._compression.addItems(COMPRESSION_MODES)
+        self._compression.setCurrentText(self._data.get('compression','none'))
+        self._compression.setToolTip('none: no compression\n'
+                                     'zlib: compression of the whole SSH connection\n'
+                                     'gzip, zstd: compression of the transfers through a pipe\n'
+                                     'auto: compression of the transfers through a pipe for compressible data on slow links')
+
+        self._keepalive = QtWidgets.QSpinBox()
+        self._keepalive.setMinimum(0)
+        self._keepalive.setMaximum(3600)
+        self._keepalive.setSuffix(' s')
+        self._keepalive.setValue(self._data.get('keepalive',DEFAULT_KEEPALIVE))
+        self._keepalive.setToolTip('The interval between the keepalive messages sent on an idle connection. 0 for none')
+
+        self._backups = QtWidgets.QSpinBox()
+        self._backups.setMinimum(0)
+        self._backups.setMaximum(100)
+        self._backups.setValue(self._data.get('backups',1))
+        self._backups.setToolTip('The number of backups (name_N.ext) kept when saving an edited file. 0 for no backup')
+
         self._buttonBox = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel)
         self._buttonBox.accepted.connect(self.accept)
         self._buttonBox.rejected.connect(self.reject)
@@ -95,6 +121,9 @@ class SessionDialog(QtWidgets.QDialog):
         formLayout.addRow(QtWidgets.QLabel('Port'),self._port)
         formLayout.addRow(QtWidgets.QLabel('Private key'),keyHLayout)
         formLayout.addRow(QtWidgets.QLabel('Key type'),keyTypeLayout)
+        formLayout.addRow(QtWidgets.QLabel('Compression'),self._compression)
+        formLayout.addRow(QtWidgets.QLabel('Keepalive'),self._keepalive)
+        formLayout.addRow(QtWidgets.QLabel('Backups kept'),self._backups)
 
         mainLayout.addLayout(formLayout)
 
@@ -217,6 +246,9 @@ class SessionDialog(QtWidgets.QDialog):
                                               ('user',user),
                                               ('port',port),
                                               ('key',key),
-                                              ('keytype',keyType)))
+                                              ('keytype',keyType),
+                                              ('compression',self._compression.currentText()),
+                                              ('keepalive',self._keepalive.value()),
+                                              ('backups',self._backups.value())))
 
         return True, None
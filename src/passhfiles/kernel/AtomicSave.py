@@ -0,0 +1,199 @@
+import os
+import pathlib
+import re
+import shlex
+import shutil
+
+# The format of the version of a remote file (inode, size and modification time with nanoseconds) as output by stat
+REMOTE_VERSION_FORMAT = '%i %s %y'
+
+# The exit status of the remote commit command when the remote file was modified since it was opened
+_CONFLICT_STATUS = 3
+
+class SaveConflictError(Exception):
+    """Raised when a file is saved while it has been modified by someone else since it was opened.
+    """
+
+def backupNames(existingNames, fileName, maxBackups):
+    """Returns the name of the backup to create when saving a file and the names of the obsolete backups to remove.
+
+    The backups of name.ext are named name_N.ext where N increases with each backup.
+
+    Args:
+        existingNames (list of str): the names of the entries of the directory of the file
+        fileName (str): the name of the file
+        maxBackups (int): the number of backups to keep (0 for no backup)
+
+    Returns:
+        tuple: the name of the backup to create (None if no backup must be created) and the list of the names of the
+        backups to remove
+    """
+
+    if maxBackups <= 0:
+        return None, []
+
+    stem, suffix = os.path.splitext(fileName)
+    pattern = re.compile('^{}_(\\d+){}$'.format(re.escape(stem),re.escape(suffix)))
+
+    numbers = []
+    for name in existingNames:
+        match = pattern.match(name)
+        if match is not None:
+            numbers.append(int(match.group(1)))
+    numbers.sort()
+
+    backupName = '{}_{}{}'.format(stem,numbers[-1] + 1 if numbers else 1,suffix)
+
+    obsoleteNames = ['{}_{}{}'.format(stem,n,suffix) for n in numbers[:max(len(numbers) - maxBackups + 1,0)]]
+
+    return backupName, obsoleteNames
+
+def localVersion(path):
+    """Returns the version of a local file.
+
+    Args:
+        path (pathlib.Path): the path to the file
+
+    Returns:
+        tuple: the inode, size and modification time in ns of the file. None if the file does not exist.
+    """
+
+    try:
+        stat = os.stat(str(path))
+    except FileNotFoundError:
+        return None
+
+    return (stat.st_ino,stat.st_size,stat.st_mtime_ns)
+
+def remoteTempPath(remotePath):
+    """Returns the path of the temporary file to which a remote file is uploaded before replacing it.
+
+    Args:
+        remotePath (pathlib.PurePosixPath): the path to the remote file
+
+    Returns:
+        pathlib.PurePosixPath: the path to the temporary file
+    """
+
+    return remotePath.parent.joinpath('.{}.passhfiles'.format(remotePath.name))
+
+def remoteVersion(sshSession, serverNode, path):
+    """Returns the version of a remote file.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        path (pathlib.PurePosixPath): the path to the remote file
+
+    Returns:
+        str: the inode, size and modification time of the file. None if the file does not exist.
+    """
+
+    _, stdout, stderr = sshSession.exec_command('{} stat -L -c {} {}'.format(serverNode.name(),shlex.quote(REMOTE_VERSION_FORMAT),shlex.quote(str(path))))
+
+    output = stdout.read().decode().replace(serverNode.stdoutMotd(),'').strip()
+    stderr.read()
+
+    if stdout.channel.recv_exit_status() != 0:
+        return None
+
+    return output
+
+def commitRemoteSave(sshSession, serverNode, remotePath, expectedVersion=None, backupName=None, obsoleteNames=None):
+    """Replace a remote file with its temporary file in a single remote command.
+
+    The version of the remote file is checked against the one it had when it was opened, then the file is backed up
+    and atomically replaced by its temporary file by a rename. The temporary file is removed in case of conflict.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        remotePath (pathlib.PurePosixPath): the path to the remote file
+        expectedVersion (str): the version of the file when it was opened. If None, the file is overwritten whatever
+        its version.
+        backupName (str): the name of the backup of the file to create. None for no backup.
+        obsoleteNames (list of str): the names of the old backups to remove
+
+    Returns:
+        str: the version of the saved file
+
+    Raises:
+        SaveConflictError: if the remote file was modified since it was opened
+        IOError: if the file could not be saved
+    """
+
+    directory = remotePath.parent
+
+    cmd = ['p={}'.format(shlex.quote(str(remotePath))),
+           't={}'.format(shlex.quote(str(remoteTempPath(remotePath)))),
+           'v=$(stat -L -c {} "$p" 2>/dev/null)'.format(shlex.quote(REMOTE_VERSION_FORMAT))]
+    if expectedVersion is not None:
+        cmd.append('if [ "$v" != {} ]; then rm -f "$t"; echo "$p was modified since it was opened" >&2; exit {}; fi'.format(shlex.quote(expectedVersion),_CONFLICT_STATUS))
+    # Edit the target of a symbolic link rather than replacing the link
+    cmd.append('if [ -L "$p" ]; then p=$(readlink -f "$p"); fi')
+    cmd.append('if [ -e "$p" ]; then chmod --reference="$p" "$t" 2>/dev/null; fi')
+    if backupName is not None:
+        cmd.append('if [ -e "$p" ]; then cp -p "$p" {} || exit 1; fi'.format(shlex.quote(str(directory.joinpath(backupName)))))
+    if obsoleteNames:
+        cmd.append('rm -f {}'.format(' '.join([shlex.quote(str(directory.joinpath(n))) for n in obsoleteNames])))
+    cmd.append('mv -f "$t" "$p" && stat -L -c {} "$p"'.format(shlex.quote(REMOTE_VERSION_FORMAT)))
+
+    # The script is run by a single remote shell so that the bastion forwards it as a whole
+    _, stdout, stderr = sshSession.exec_command('{} sh -c {}'.format(serverNode.name(),shlex.quote('; '.join(cmd))))
+
+    output = stdout.read().decode().replace(serverNode.stdoutMotd(),'').strip()
+    error = stderr.read().decode().replace(serverNode.stderrMotd(),'').strip()
+
+    status = stdout.channel.recv_exit_status()
+    if status == _CONFLICT_STATUS:
+        raise SaveConflictError(error)
+    elif status != 0:
+        raise IOError(error)
+
+    return output
+
+def saveLocal(tempFile, actualFile, expectedVersion=None, backupName=None, obsoleteNames=None):
+    """Replace a local file with the contents of a temporary file.
+
+    The contents are copied next to the file which is then atomically replaced by a rename.
+
+    Args:
+        tempFile (pathlib.Path): the file that contains the saved data
+        actualFile (pathlib.Path): the file to replace
+        expectedVersion (tuple): the version of the file when it was opened. If None, the file is overwritten
+        whatever its version.
+        backupName (str): the name of the backup of the file to create. None for no backup.
+        obsoleteNames (list of str): the names of the old backups to remove
+
+    Returns:
+        tuple: the version of the saved file
+
+    Raises:
+        SaveConflictError: if the file was modified since it was opened
+    """
+
+    if expectedVersion is not None and localVersion(actualFile) != expectedVersion:
+        raise SaveConflictError('{} was modified since it was opened'.format(actualFile))
+
+    directory = actualFile.parent
+
+    # Edit the target of a symbolic link rather than replacing the link
+    actualFile = pathlib.Path(actualFile).resolve()
+
+    savedFile = actualFile.parent.joinpath('.{}.passhfiles'.format(actualFile.name))
+    shutil.copyfile(str(tempFile),str(savedFile))
+
+    if os.path.exists(str(actualFile)):
+        shutil.copymode(str(actualFile),str(savedFile))
+        if backupName is not None:
+            shutil.copy2(str(actualFile),str(directory.joinpath(backupName)))
+
+    for name in obsoleteNames or []:
+        try:
+            os.remove(str(directory.joinpath(name)))
+        except OSError:
+            pass
+
+    os.replace(str(savedFile),str(actualFile))
+
+    return localVersion(actualFile)
@@ -0,0 +1,58 @@
+import time
+
+from passhfiles.kernel.Tracing import TRACER
+
+# The line printed by the bastion before the list of the servers the user can access
+SERVERS_HEADER = 'Here is the list of servers you can access'
+
+def parseServersList(output):
+    """Parse the welcome message of the bastion shell which lists the servers the user can access.
+
+    Args:
+        output (str): the output of the shell
+
+    Returns:
+        list of str: the sorted names of the servers
+    """
+
+    lines = output.split('\n')
+
+    comp = 0
+    for line in lines:
+        if line.startswith(SERVERS_HEADER):
+            break
+        comp += 1
+
+    # The last line is the prompt of the shell
+    lines = lines[comp+1:-1]
+
+    return sorted([l.split()[1].strip() for l in lines if len(l.split()) >= 2])
+
+def listServers(sshSession, delay=1.0):
+    """Returns the servers bound to a bastion session.
+
+    The bastion prints the list of the servers when a shell is opened.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        delay (float): the time in seconds given to the bastion for printing its welcome message
+
+    Returns:
+        list of str: the sorted names of the servers
+    """
+
+    with TRACER.span('findServers','ssh') as args:
+        shell = sshSession.invoke_shell()
+
+        out = ''
+        time.sleep(delay)
+
+        while shell.recv_ready():
+            out += shell.recv(2048).decode()
+
+        shell.close()
+
+        servers = parseServersList(out)
+        args['servers'] = len(servers)
+
+    return servers
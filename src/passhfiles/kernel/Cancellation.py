@@ -0,0 +1,135 @@
+import contextlib
+import logging
+import threading
+
+class JobCancelledError(Exception):
+    """Raised by an operation which stops because it was cancelled.
+    """
+
+class CancellationToken:
+    """This class implements a token shared between an operation and the code which may cancel it.
+
+    The cancellation is cooperative: the operation checks the token at its safe points and stops there. Some callbacks
+    can also be registered for interrupting the blocking calls of the operation (e.g. closing a SSH channel) as soon
+    as the token is cancelled.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._event = threading.Event()
+
+        self._callbacks = []
+
+        self._lock = threading.Lock()
+
+    def addCallback(self, callback):
+        """Register a callback to call when the token is cancelled.
+
+        The callback is called immediately if the token is already cancelled.
+
+        Args:
+            callback (callable): the callback, called without argument
+        """
+
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback()
+
+    def cancel(self):
+        """Cancel the token.
+        """
+
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.warning(str(e))
+
+    def isCancelled(self):
+        """Returns whether the token was cancelled.
+
+        Returns:
+            bool: True if the token was cancelled
+        """
+
+        return self._event.is_set()
+
+    def raiseIfCancelled(self):
+        """Stop the current operation if the token was cancelled.
+
+        Raises:
+            JobCancelledError: if the token was cancelled
+        """
+
+        if self._event.is_set():
+            raise JobCancelledError('Operation cancelled')
+
+    def removeCallback(self, callback):
+        """Unregister a callback.
+
+        Args:
+            callback (callable): the callback
+        """
+
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout):
+        """Wait until the token is cancelled or a timeout expires.
+
+        Args:
+            timeout (float): the timeout in seconds
+
+        Returns:
+            bool: True if the token was cancelled
+        """
+
+        return self._event.wait(timeout)
+
+@contextlib.contextmanager
+def interruptOnCancel(token, interrupt):
+    """Run a block of blocking calls which are interrupted as soon as a token is cancelled.
+
+    The errors raised by the interrupted calls are turned into a JobCancelledError. It is also raised if the block
+    completes after the token was cancelled as an interrupted call may return early without error (e.g. a read from a
+    closed channel returns an end of file).
+
+    Args:
+        token (CancellationToken): the token. If None, the block can not be cancelled.
+        interrupt (callable): called without argument when the token is cancelled (e.g. the close method of the
+        SSH channel on which the block is blocked)
+
+    Raises:
+        JobCancelledError: if the token was cancelled before or while running the block
+    """
+
+    if token is None:
+        yield
+        return
+
+    token.raiseIfCancelled()
+    token.addCallback(interrupt)
+    try:
+        yield
+        token.raiseIfCancelled()
+    except JobCancelledError:
+        raise
+    except Exception:
+        if token.isCancelled():
+            raise JobCancelledError('Operation cancelled')
+        raise
+    finally:
+        token.removeCallback(interrupt)
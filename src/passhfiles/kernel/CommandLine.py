@@ -0,0 +1,496 @@
+import argparse
+import concurrent.futures
+import getpass
+import logging
+import os
+import pathlib
+import signal
+import sys
+import time
+
+from passhfiles.kernel.AtomicSave import remoteVersion
+from passhfiles.kernel.Bastion import listServers
+from passhfiles.kernel.Cancellation import CancellationToken, JobCancelledError
+from passhfiles.kernel.Deletions import removeRemoteEntries
+from passhfiles.kernel.DirectorySizes import localDirectorySize
+from passhfiles.kernel.KeyStore import KEYSTORE
+from passhfiles.kernel.Listings import listRemoteDirectory
+from passhfiles.kernel.Sessions import RootNode, ServerNode, connectSession, createSessionNode, reachServer, readSessions
+from passhfiles.kernel.SSHAgent import agentKey
+from passhfiles.kernel.Synchronization import synchronizeFromRemote, synchronizeToRemote
+from passhfiles.kernel.Transfers import download, upload
+from passhfiles.utils.Numbers import sizeOf
+from passhfiles.utils.Platform import sessionsDatabasePath
+
+# The environment variable which can hold the password of the SSH key
+PASSWORD_ENVIRONMENT_VARIABLE = 'PASSHFILES_KEY_PASSWORD'
+
+# The exit codes of the command line client
+EXIT_SUCCESS = 0
+EXIT_FAILURE = 1
+EXIT_CANCELLED = 130
+
+class CommandLineClient:
+    """Implements a headless client running the file operations of the GUI on a server behind a bastion.
+
+    The sessions are read from the sessions file of the GUI. The transfers go through the same session, transfer and
+    synchronization layers, several entries being transferred simultaneously through the SSH session.
+    """
+
+    def __init__(self, sessionData, token, maxWorkers=4):
+        """Constructor.
+
+        Args:
+            sessionData (dict): the data of the session to use
+            token (passhfiles.kernel.Cancellation.CancellationToken): the token cancelled when the user interrupts
+            the client
+            maxWorkers (int): the maximum number of entries transferred simultaneously
+        """
+
+        self._sessionNode = createSessionNode(sessionData,RootNode())
+
+        self._token = token
+
+        self._maxWorkers = maxWorkers
+
+        self._serverNode = None
+
+        self._remoteHome = None
+
+    def _progress(self, i, n, action, source, target, size, duration):
+        """Log the completion of a transfer.
+
+        Args:
+            i (int): the number of entries transferred so far
+            n (int): the number of entries to transfer
+            action (str): the transfer action
+            source (str): the source of the transfer
+            target (str): the target of the transfer
+            size (int): the number of bytes transferred
+            duration (float): the duration of the transfer in seconds
+        """
+
+        rate = sizeOf(size/duration) + '/s' if duration > 0 else '-'
+        logging.info('[{}/{}] {} {} -> {} ({}, {})'.format(i,n,action,source,target,sizeOf(size),rate))
+
+    def _remotePath(self, path):
+        """Returns the absolute path of a remote path. Relative paths are relative to the home directory on the server.
+
+        Args:
+            path (str): the remote path
+
+        Returns:
+            pathlib.PurePosixPath: the absolute path
+        """
+
+        return pathlib.PurePosixPath(self._remoteHome).joinpath(path)
+
+    def _transfer(self, items, action, transfer):
+        """Run some transfers in parallel.
+
+        Args:
+            items (list of tuple): the source and the target of each transfer
+            action (str): the transfer action used for the progress
+            transfer (callable): called with a source and a target, runs the transfer and returns the number of
+            transferred bytes
+
+        Returns:
+            int: the exit code
+        """
+
+        def run(source, target):
+            self._token.raiseIfCancelled()
+            start = time.perf_counter()
+            size = transfer(source,target)
+            return size, time.perf_counter() - start
+
+        nErrors = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._maxWorkers) as executor:
+            futures = {executor.submit(run,source,target) : (source,target) for source, target in items}
+            for i, future in enumerate(concurrent.futures.as_completed(futures)):
+                source, target = futures[future]
+                try:
+                    size, duration = future.result()
+                except JobCancelledError:
+                    continue
+                except Exception as e:
+                    logging.error('{}: {}'.format(source,e))
+                    nErrors += 1
+                else:
+                    self._progress(i+1,len(items),action,source,target,size,duration)
+
+        if self._token.isCancelled():
+            return EXIT_CANCELLED
+
+        return EXIT_FAILURE if nErrors else EXIT_SUCCESS
+
+    def close(self):
+        """Close the SSH session.
+        """
+
+        sshSession = self._sessionNode.sshSession()
+        if sshSession is not None:
+            sshSession.close()
+            self._sessionNode.setSSHSession(None)
+
+    def connect(self, password=None):
+        """Unlock the key of the session and connect to the bastion. The key of the SSH agent is used when it holds
+        the key of the session.
+
+        Args:
+            password (callable): if not None, returns the password of the key. Only called when the key is not held by
+            the SSH agent.
+
+        Returns:
+            bool: True if the connection succeeded
+        """
+
+        sessionData = self._sessionNode.data(0)
+
+        keyfile = sessionData.get('key')
+        if keyfile is None:
+            key = None
+        else:
+            key = agentKey(keyfile)
+            if key is None:
+                if not KEYSTORE.unlockKey(keyfile,sessionData['keytype'],password() if password is not None else ''):
+                    return False
+                key = KEYSTORE.getKey(keyfile)
+
+        try:
+            self._sessionNode.setSSHSession(connectSession(sessionData,key))
+        except Exception as e:
+            logging.error('Can not connect to {}: {}'.format(sessionData['address'],e))
+            return False
+
+        return True
+
+    def get(self, remotePaths, localDirectory, preserveTimes=False):
+        """Download some remote files or directories into a local directory.
+
+        Args:
+            remotePaths (list of str): the remote paths
+            localDirectory (pathlib.Path): the local directory
+            preserveTimes (bool): if True, the modification times of the remote files are preserved
+
+        Returns:
+            int: the exit code
+        """
+
+        sshSession = self._sessionNode.sshSession()
+
+        def transfer(source, target):
+            localPath = target.joinpath(source.name)
+            download(sshSession,self._serverNode,source,target,recursive=True,preserveTimes=preserveTimes,
+                     token=self._token,removeOnCancel=not localPath.exists())
+            return localDirectorySize(localPath) if localPath.is_dir() else localPath.stat().st_size
+
+        items = [(self._remotePath(p),localDirectory) for p in remotePaths]
+
+        return self._transfer(items,'Downloaded',transfer)
+
+    def ls(self, remoteDirectory, showHiddenFiles=False):
+        """Print the contents of a remote directory.
+
+        Args:
+            remoteDirectory (str): the remote directory
+            showHiddenFiles (bool): if True, the hidden files are listed
+
+        Returns:
+            int: the exit code
+        """
+
+        try:
+            entries = listRemoteDirectory(self._sessionNode.sshSession(),self._serverNode,self._remotePath(remoteDirectory),
+                                          showHiddenFiles,self._token)
+        except IOError as e:
+            logging.error(str(e))
+            return EXIT_FAILURE
+
+        for name, size, typ, owner, modificationTime in entries:
+            print('{}\t{}\t{}\t{}\t{}'.format('d' if typ == 'Folder' else '-','-' if size is None else size,owner,modificationTime,name))
+
+        return EXIT_SUCCESS
+
+    def put(self, localPaths, remoteDirectory, preserveTimes=False):
+        """Upload some local files or directories into a remote directory.
+
+        Args:
+            localPaths (list of pathlib.Path): the local paths
+            remoteDirectory (str): the remote directory
+            preserveTimes (bool): if True, the modification times of the local files are preserved
+
+        Returns:
+            int: the exit code
+        """
+
+        sshSession = self._sessionNode.sshSession()
+
+        remoteDirectory = self._remotePath(remoteDirectory)
+
+        def transfer(source, target):
+            upload(sshSession,self._serverNode,source,target,recursive=True,preserveTimes=preserveTimes,
+                   token=self._token,removeOnCancel=remoteVersion(sshSession,self._serverNode,target) is None)
+            return localDirectorySize(source) if source.is_dir() else source.stat().st_size
+
+        # upload expects the path of the remote copy, not the directory where to put it
+        items = [(p,remoteDirectory.joinpath(p.resolve().name)) for p in localPaths]
+
+        return self._transfer(items,'Uploaded',transfer)
+
+    def rm(self, remotePaths):
+        """Remove some remote files or directories.
+
+        Args:
+            remotePaths (list of str): the remote paths
+
+        Returns:
+            int: the exit code
+        """
+
+        paths = [self._remotePath(p) for p in remotePaths]
+
+        report = removeRemoteEntries(self._sessionNode.sshSession(),self._serverNode,paths,self._token,
+                                     lambda i : logging.info('[{}/{}] Removed {}'.format(i,len(paths),paths[i-1])))
+        for error in report.errors:
+            logging.error(error)
+        logging.info(str(report))
+
+        if report.cancelled:
+            return EXIT_CANCELLED
+
+        return EXIT_FAILURE if report.errors else EXIT_SUCCESS
+
+    def selectServer(self, serverName):
+        """Reach a server behind the bastion. The following operations run on that server.
+
+        Args:
+            serverName (str): the name of the server
+
+        Returns:
+            bool: True if the server could be reached
+        """
+
+        servers = [self._sessionNode.child(i) for i in range(self._sessionNode.childCount())]
+        serverNodes = [s for s in servers if s.name() == serverName]
+        if serverNodes:
+            self._serverNode = serverNodes[0]
+        else:
+            # The server may not have been discovered in the GUI yet
+            self._serverNode = ServerNode(serverName,self._sessionNode)
+            self._sessionNode.addChild(self._serverNode)
+
+        try:
+            self._remoteHome = reachServer(self._sessionNode.sshSession(),self._serverNode)
+        except Exception as e:
+            logging.error('Can not reach {}: {}'.format(serverName,e))
+            return False
+
+        return True
+
+    def servers(self):
+        """Print the servers bound to the session.
+
+        Returns:
+            int: the exit code
+        """
+
+        for server in listServers(self._sessionNode.sshSession()):
+            print(server)
+
+        return EXIT_SUCCESS
+
+    def sync(self, direction, source, target, checksum=False):
+        """Synchronize a remote path with a local one or the other way round, only the files which differ being
+        transferred.
+
+        Args:
+            direction (str): 'push' for synchronizing the remote target with the local source, 'pull' for synchronizing
+            the local target with the remote source
+            source (str): the source path
+            target (str): the target path
+            checksum (bool): if True, the files with the same size are compared through their checksums
+
+        Returns:
+            int: the exit code
+        """
+
+        sshSession = self._sessionNode.sshSession()
+
+        transferred = []
+
+        def progress(path, size):
+            transferred.append(path)
+            logging.info('[{}] {} {} ({})'.format(len(transferred),'Uploaded' if direction == 'push' else 'Downloaded',path,sizeOf(size)))
+
+        try:
+            if direction == 'push':
+                report = synchronizeToRemote(sshSession,self._serverNode,pathlib.Path(source),self._remotePath(target),
+                                             checksum,self._token,self._maxWorkers,progress)
+            else:
+                report = synchronizeFromRemote(sshSession,self._serverNode,self._remotePath(source),pathlib.Path(target),
+                                               checksum,self._token,self._maxWorkers,progress)
+        except JobCancelledError:
+            return EXIT_CANCELLED
+
+        for error in report.errors:
+            logging.error(error)
+        logging.info(str(report))
+
+        if report.cancelled:
+            return EXIT_CANCELLED
+
+        return EXIT_FAILURE if report.errors else EXIT_SUCCESS
+
+def _keyPassword(passwordFile):
+    """Returns the password of the SSH key.
+
+    The password is read from a file, from the PASSHFILES_KEY_PASSWORD environment variable or prompted when the
+    client runs in a terminal, in that order.
+
+    Args:
+        passwordFile (pathlib.Path): the file containing the password. Can be None.
+
+    Returns:
+        str: the password
+    """
+
+    if passwordFile is not None:
+        with open(str(passwordFile),'r') as fin:
+            return fin.read().strip()
+
+    if PASSWORD_ENVIRONMENT_VARIABLE in os.environ:
+        return os.environ[PASSWORD_ENVIRONMENT_VARIABLE]
+
+    if sys.stdin.isatty():
+        return getpass.getpass('Please enter SSH key password: ').strip()
+
+    return ''
+
+def _parser():
+    """Returns the parser of the command line.
+
+    Returns:
+        argparse.ArgumentParser: the parser
+    """
+
+    parser = argparse.ArgumentParser(prog='passhfiles-cli',description='Transfer files through a PassHport bastion using the passhfiles sessions')
+    parser.add_argument('--sessions', type=pathlib.Path, default=None, help='the sessions file (default: the one of passhfiles)')
+    parser.add_argument('--session', default=None, help='the name of the session (default: the only session of the sessions file)')
+    parser.add_argument('--server', default=None, help='the server behind the bastion')
+    parser.add_argument('--password-file', type=pathlib.Path, default=None,
+                        help='a file containing the password of the SSH key (default: the {} environment variable or a prompt)'.format(PASSWORD_ENVIRONMENT_VARIABLE))
+    parser.add_argument('-j', '--jobs', type=int, default=4, help='the number of entries transferred simultaneously')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report the errors')
+
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    subparsers.add_parser('sessions', help='list the sessions and their servers')
+
+    subparsers.add_parser('servers', help='list the servers bound to the session')
+
+    lsParser = subparsers.add_parser('ls', help='list a remote directory')
+    lsParser.add_argument('-a', '--all', action='store_true', help='list the hidden files')
+    lsParser.add_argument('path', nargs='?', default='.', help='the remote directory (default: the home directory)')
+
+    getParser = subparsers.add_parser('get', help='download remote files or directories')
+    getParser.add_argument('-p', '--preserve-times', action='store_true', help='preserve the modification times')
+    getParser.add_argument('remote', nargs='+', help='the remote files or directories')
+    getParser.add_argument('local', type=pathlib.Path, help='the local directory')
+
+    putParser = subparsers.add_parser('put', help='upload local files or directories')
+    putParser.add_argument('-p', '--preserve-times', action='store_true', help='preserve the modification times')
+    putParser.add_argument('local', type=pathlib.Path, nargs='+', help='the local files or directories')
+    putParser.add_argument('remote', help='the remote directory')
+
+    syncParser = subparsers.add_parser('sync', help='transfer only the files which differ between a source and a target')
+    syncParser.add_argument('-c', '--checksum', action='store_true', help='compare the files with the same size through their checksums')
+    syncParser.add_argument('direction', choices=['push','pull'], help='push: from local to remote, pull: from remote to local')
+    syncParser.add_argument('source', help='the source path')
+    syncParser.add_argument('target', help='the target path')
+
+    rmParser = subparsers.add_parser('rm', help='remove remote files or directories')
+    rmParser.add_argument('remote', nargs='+', help='the remote files or directories')
+
+    return parser
+
+def main(argv=None):
+    """Run the command line client.
+
+    Args:
+        argv (list of str): the command line arguments. If None, sys.argv is used.
+
+    Returns:
+        int: the exit code
+    """
+
+    args = _parser().parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO,format='%(asctime)s %(levelname)s %(message)s')
+
+    # Only the messages of the client are of interest
+    logging.getLogger('paramiko').setLevel(logging.WARNING)
+
+    sessionsFile = args.sessions if args.sessions is not None else sessionsDatabasePath()
+    sessions = readSessions(sessionsFile)
+    if sessions is None:
+        return EXIT_FAILURE
+
+    if args.command == 'sessions':
+        for session in sessions:
+            print('{}\t{}@{}:{}\t{}'.format(session['name'],session['user'],session['address'],session['port'],' '.join(sorted(session.get('servers',[])))))
+        return EXIT_SUCCESS
+
+    if args.session is None:
+        if len(sessions) != 1:
+            logging.error('The session must be given with --session. Available sessions: {}'.format(', '.join([s['name'] for s in sessions])))
+            return EXIT_FAILURE
+        sessionData = sessions[0]
+    else:
+        matches = [s for s in sessions if s['name'] == args.session]
+        if not matches:
+            logging.error('Unknown session {}'.format(args.session))
+            return EXIT_FAILURE
+        sessionData = matches[0]
+
+    if args.command != 'servers' and args.server is None:
+        logging.error('The server must be given with --server')
+        return EXIT_FAILURE
+
+    token = CancellationToken()
+
+    def onInterrupt(signum, frame):
+        logging.warning('Interrupted, cancelling the pending operations')
+        token.cancel()
+
+    signal.signal(signal.SIGINT,onInterrupt)
+    signal.signal(signal.SIGTERM,onInterrupt)
+
+    client = CommandLineClient(sessionData,token,max(args.jobs,1))
+    if not client.connect(lambda : _keyPassword(args.password_file)):
+        return EXIT_FAILURE
+
+    try:
+        if args.command == 'servers':
+            return client.servers()
+
+        if not client.selectServer(args.server):
+            return EXIT_FAILURE
+
+        if args.command == 'ls':
+            return client.ls(args.path,args.all)
+        elif args.command == 'get':
+            return client.get(args.remote,args.local,args.preserve_times)
+        elif args.command == 'put':
+            return client.put(args.local,args.remote,args.preserve_times)
+        elif args.command == 'sync':
+            return client.sync(args.direction,args.source,args.target,args.checksum)
+        elif args.command == 'rm':
+            return client.rm(args.remote)
+    except JobCancelledError:
+        return EXIT_CANCELLED
+    finally:
+        client.close()
+
+    return EXIT_SUCCESS
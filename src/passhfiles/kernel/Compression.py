@@ -0,0 +1,205 @@
+import collections
+import gzip
+import logging
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.utils.Numbers import sizeOf
+
+# The compression modes of a session:
+# - none: no compression
+# - zlib: compression at the SSH transport level (applies to the transfers and to the listings)
+# - gzip, zstd: each transfer is compressed through a gzip or zstd pipe
+# - auto: each transfer is compressed through a pipe when its data is compressible and the link is slow
+COMPRESSION_MODES = ['none','zlib','gzip','zstd','auto']
+
+# The size of the chunk of data sampled for estimating its compressibility
+SAMPLE_SIZE = 64*1024
+
+# In auto mode, the data is compressed only if its compression ratio is lower than that value
+AUTO_MAXIMUM_RATIO = 0.8
+
+# In auto mode, the data is not compressed if the link is faster than that value (in bytes/s)
+AUTO_MAXIMUM_THROUGHPUT = 50*1024*1024
+
+# The remote commands for compressing and decompressing a stream with each codec
+REMOTE_COMPRESS_COMMANDS = {'gzip' : 'gzip -c', 'zstd' : 'zstd -c -q'}
+
+REMOTE_DECOMPRESS_COMMANDS = {'gzip' : 'gzip -dc', 'zstd' : 'zstd -dc -q'}
+
+def compressibility(sample):
+    """Returns the compression ratio of a sample of data.
+
+    The sample is compressed with the fastest zlib level.
+
+    Args:
+        sample (bytes): the sample
+
+    Returns:
+        float: the ratio between the compressed and the raw sizes of the sample
+    """
+
+    if not sample:
+        return 1.0
+
+    return len(zlib.compress(sample,1))/len(sample)
+
+def chooseCodec(mode, sample, throughput, remoteZstd=False):
+    """Returns the codec to use for a transfer.
+
+    Args:
+        mode (str): the compression mode of the session (one of COMPRESSION_MODES)
+        sample (bytes): the first chunk of the data to transfer
+        throughput (float): the link throughput measured on the previous transfers in bytes/s. None if unknown.
+        remoteZstd (bool): whether or not zstd is available on the remote server
+
+    Returns:
+        str: 'gzip' or 'zstd'. None if the transfer must not be compressed through a pipe.
+    """
+
+    if mode == 'gzip':
+        return 'gzip'
+
+    if mode == 'zstd':
+        if zstandard is None or not remoteZstd:
+            logging.warning('zstd is not available. Fall back to gzip')
+            return 'gzip'
+        return 'zstd'
+
+    if mode != 'auto':
+        return None
+
+    # Small data are not worth the compression overhead
+    if len(sample) < SAMPLE_SIZE:
+        return None
+
+    if compressibility(sample) > AUTO_MAXIMUM_RATIO:
+        return None
+
+    if throughput is not None and throughput > AUTO_MAXIMUM_THROUGHPUT:
+        return None
+
+    return 'zstd' if (zstandard is not None and remoteZstd) else 'gzip'
+
+def compressor(codec):
+    """Returns a streaming compressor for a given codec.
+
+    Args:
+        codec (str): 'gzip' or 'zstd'
+
+    Returns:
+        object: an object with compress and flush methods
+    """
+
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    else:
+        return zlib.compressobj(6,zlib.DEFLATED,31)
+
+def decompressedStream(codec, fileobj):
+    """Returns a file-like object decompressing the data read from another one.
+
+    The data are decompressed as they are read, no more than the requested size at a time.
+
+    Args:
+        codec (str): 'gzip' or 'zstd'
+        fileobj (file-like): the object from which the compressed data are read
+
+    Returns:
+        file-like: the decompressed data
+    """
+
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    else:
+        return gzip.GzipFile(fileobj=fileobj,mode='rb')
+
+class TransferMetrics(metaclass=SingletonMeta):
+    """This class implements a structure for storing in memory the metrics of the last transfers.
+    """
+
+    # The smoothing factor of the throughput moving average
+    SMOOTHING = 0.3
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._history = collections.deque(maxlen=100)
+
+        self._throughputs = {}
+
+        self._lock = threading.Lock()
+
+    def history(self):
+        """Returns the metrics of the last transfers.
+
+        Returns:
+            list of dict: the metrics
+        """
+
+        with self._lock:
+            return list(self._history)
+
+    def record(self, host, codec, rawBytes, wireBytes, duration):
+        """Record the metrics of a transfer.
+
+        Args:
+            host (str): the remote host
+            codec (str): the codec used for the transfer (None if uncompressed)
+            rawBytes (int): the size of the transferred data
+            wireBytes (int): the number of bytes sent through the SSH channel
+            duration (float): the duration of the transfer in seconds
+        """
+
+        duration = max(duration,1.0e-6)
+
+        metrics = {'host' : host,
+                   'codec' : codec,
+                   'raw_bytes' : rawBytes,
+                   'wire_bytes' : wireBytes,
+                   'ratio' : wireBytes/rawBytes if rawBytes else 1.0,
+                   'throughput' : rawBytes/duration,
+                   'time' : time.time()}
+
+        with self._lock:
+            self._history.append(metrics)
+            # Small transfers are dominated by the latency and do not tell anything about the link throughput
+            if wireBytes >= SAMPLE_SIZE:
+                throughput = wireBytes/duration
+                previous = self._throughputs.get(host)
+                if previous is not None:
+                    throughput = TransferMetrics.SMOOTHING*throughput + (1.0 - TransferMetrics.SMOOTHING)*previous
+                self._throughputs[host] = throughput
+
+        message = 'Transferred {} with {} ({} on the wire, ratio {:.2f}) at an effective throughput of {}/s'.format(sizeOf(rawBytes),
+                                                                                                                    host,
+                                                                                                                    sizeOf(wireBytes),
+                                                                                                                    metrics['ratio'],
+                                                                                                                    sizeOf(metrics['throughput']))
+        if codec is None:
+            logging.debug(message)
+        else:
+            logging.info('{} compression: {}'.format(codec,message))
+
+    def throughput(self, host):
+        """Returns the link throughput measured on the previous transfers with a given host.
+
+        Args:
+            host (str): the host
+
+        Returns:
+            float: the throughput in bytes/s. None if no transfer has been recorded for that host.
+        """
+
+        with self._lock:
+            return self._throughputs.get(host)
+
+TRANSFER_METRICS = TransferMetrics()
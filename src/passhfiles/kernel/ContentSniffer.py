@@ -0,0 +1,185 @@
+import mimetypes
+import os
+import shlex
+import threading
+
+from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.utils.Security import readRemoteBytes
+from passhfiles.utils.String import isBinaryString
+
+# The number of bytes read at the beginning of a file for guessing whether it is a binary
+SNIFF_SIZE = 4096
+
+# Above that size, a file is shown in the streaming viewer instead of being opened in the editor
+MAXIMUM_EDITABLE_SIZE = 100*1024*1024
+
+class ContentInfo:
+    """This class stores what could be guessed about the contents of a file without reading it entirely.
+    """
+
+    def __init__(self, size, mime, head):
+        """Constructor.
+
+        Args:
+            size (int): the size of the file in bytes
+            mime (str): the MIME type of the file as output by file --mime. None if unknown.
+            head (bytes): the first bytes of the file
+        """
+
+        self.size = size
+
+        self.mime = mime
+
+        if size == 0:
+            self.isBinary = False
+        elif mime and mime.startswith('text/'):
+            self.isBinary = False
+        elif mime and 'charset=binary' in mime:
+            self.isBinary = True
+        else:
+            self.isBinary = isBinaryString(head)
+
+    def __str__(self):
+
+        return 'size={} mime={} binary={}'.format(self.size,self.mime,self.isBinary)
+
+    def isEditable(self):
+        """Returns whether or not the file can be opened in the editor.
+
+        Returns:
+            bool: True if the file is a text file small enough for being edited
+        """
+
+        return not self.isBinary and self.size <= MAXIMUM_EDITABLE_SIZE
+
+def parseRemoteProbe(output):
+    """Parse the output of the remote probe.
+
+    Args:
+        output (bytes): the output of the command returned by remoteProbeCmd
+
+    Returns:
+        passhfiles.kernel.ContentSniffer.ContentInfo: the content info
+    """
+
+    statLine, mimeLine, head = output.split(b'\n',2)
+
+    size = int(statLine.split()[0])
+
+    mime = mimeLine.decode(errors='replace').strip() or None
+
+    return ContentInfo(size,mime,head)
+
+def remoteProbeCmd(path):
+    """Returns the command which outputs in a single round trip the size, the MIME type and the first bytes of a
+    remote file.
+
+    The MIME type line is left empty when the file command is not available on the remote server.
+
+    Args:
+        path (pathlib.PurePosixPath): the path to the remote file
+
+    Returns:
+        str: the command
+    """
+
+    path = shlex.quote(str(path))
+
+    return 'stat -L -c %s {0} && (file -b --mime {0} 2>/dev/null || echo) && head -c {1} {0}'.format(path,SNIFF_SIZE)
+
+class ContentSniffer(metaclass=SingletonMeta):
+    """This class implements a cache of the content info of the files keyed by their path and version.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._infos = {}
+
+        self._lock = threading.Lock()
+
+    def _cached(self, key, version):
+        """Returns the content info of a file if it was cached for the given version of the file.
+
+        Args:
+            key (tuple): the host and path of the file
+            version (tuple): the version of the file
+
+        Returns:
+            passhfiles.kernel.ContentSniffer.ContentInfo: the content info. None if not cached.
+        """
+
+        with self._lock:
+            cachedVersion, info = self._infos.get(key,(None,None))
+
+        return info if cachedVersion == version else None
+
+    def _store(self, key, version, info):
+        """Cache the content info of a file.
+
+        Args:
+            key (tuple): the host and path of the file
+            version (tuple): the version of the file
+            info (passhfiles.kernel.ContentSniffer.ContentInfo): the content info
+        """
+
+        with self._lock:
+            self._infos[key] = (version,info)
+
+    def clear(self):
+        """Clear the cache.
+        """
+
+        with self._lock:
+            self._infos.clear()
+
+    def sniffLocal(self, path):
+        """Returns the content info of a local file.
+
+        Args:
+            path (pathlib.Path): the path to the file
+
+        Returns:
+            passhfiles.kernel.ContentSniffer.ContentInfo: the content info
+        """
+
+        stat = os.stat(str(path))
+
+        key = (None,str(path))
+        version = (stat.st_mtime_ns,stat.st_size)
+        info = self._cached(key,version)
+        if info is None:
+            with open(str(path),'rb') as fin:
+                head = fin.read(SNIFF_SIZE)
+            mime, _ = mimetypes.guess_type(str(path))
+            # Only trust the extension for text files, the binary detection is done on the contents otherwise
+            info = ContentInfo(stat.st_size,mime if (mime and mime.startswith('text/')) else None,head)
+            self._store(key,version,info)
+
+        return info
+
+    def sniffRemote(self, sshSession, serverNode, path, version):
+        """Returns the content info of a remote file.
+
+        Only the first SNIFF_SIZE bytes of the file are transferred.
+
+        Args:
+            sshSession (paramiko.client.SSHClient): the SSH session
+            serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+            path (pathlib.PurePosixPath): the path to the file
+            version (tuple): the modification time and size of the file as shown in the listing
+
+        Returns:
+            passhfiles.kernel.ContentSniffer.ContentInfo: the content info
+        """
+
+        key = (serverNode.name(),str(path))
+        info = self._cached(key,version)
+        if info is None:
+            info = parseRemoteProbe(readRemoteBytes(sshSession,serverNode,remoteProbeCmd(path)))
+            self._store(key,version,info)
+
+        return info
+
+CONTENT_SNIFFER = ContentSniffer()
@@ -0,0 +1,136 @@
+import os
+import pathlib
+import shlex
+
+from passhfiles.kernel.Cancellation import JobCancelledError
+from passhfiles.utils.Security import runRemoteCmd
+
+class DeletionReport:
+    """This class stores the outcome of a deletion.
+    """
+
+    def __init__(self, nEntries):
+        """Constructor.
+
+        Args:
+            nEntries (int): the number of entries to remove
+        """
+
+        self.nEntries = nEntries
+
+        self.nRemovedEntries = 0
+
+        self.errors = []
+
+        self.cancelled = False
+
+    def __str__(self):
+
+        s = '{} of {} entries removed, {} errors'.format(self.nRemovedEntries,self.nEntries,len(self.errors))
+        if self.cancelled:
+            s += ' (cancelled)'
+
+        return s
+
+def _removeLocalTree(path, token):
+    """Remove a local directory and its contents, checking a token between the directories.
+
+    Args:
+        path (str): the path to the directory
+        token (passhfiles.kernel.Cancellation.CancellationToken): the token. Can be None.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled. The contents already removed are
+        not restored.
+    """
+
+    def onError(e):
+        raise e
+
+    # Bottom-up so that each directory is empty when it is removed. The symbolic links to directories are removed
+    # as links, their target being left untouched.
+    for root, directories, files in os.walk(path,topdown=False,onerror=onError):
+        if token is not None:
+            token.raiseIfCancelled()
+        for f in files:
+            os.unlink(os.path.join(root,f))
+        for d in directories:
+            d = os.path.join(root,d)
+            if os.path.islink(d):
+                os.unlink(d)
+            else:
+                os.rmdir(d)
+
+    os.rmdir(path)
+
+def removeLocalEntries(paths, token=None, progress=None):
+    """Remove local files and directories.
+
+    Args:
+        paths (list of pathlib.Path): the paths of the entries to remove
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the deletion stops once the token is
+        cancelled
+        progress (callable): if not None, called with the number of entries processed so far
+
+    Returns:
+        passhfiles.kernel.Deletions.DeletionReport: the report of the deletion
+    """
+
+    report = DeletionReport(len(paths))
+
+    for i, path in enumerate(paths):
+        if token is not None and token.isCancelled():
+            report.cancelled = True
+            break
+        path = pathlib.Path(path)
+        try:
+            if path.is_dir() and not path.is_symlink():
+                _removeLocalTree(str(path),token)
+            else:
+                path.unlink()
+        except JobCancelledError:
+            report.cancelled = True
+            break
+        except OSError as e:
+            report.errors.append(str(e))
+        else:
+            report.nRemovedEntries += 1
+        if progress is not None:
+            progress(i+1)
+
+    return report
+
+def removeRemoteEntries(sshSession, serverNode, paths, token=None, progress=None):
+    """Remove files and directories stored on a server behind the bastion.
+
+    Each entry is removed by its own remote command so that the deletion can stop between two entries. When the token
+    is cancelled, the channel of the running command is closed, which makes the bastion hang up the remote process.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        paths (list of pathlib.PurePosixPath): the paths of the entries to remove
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the deletion stops once the token is
+        cancelled
+        progress (callable): if not None, called with the number of entries processed so far
+
+    Returns:
+        passhfiles.kernel.Deletions.DeletionReport: the report of the deletion
+    """
+
+    report = DeletionReport(len(paths))
+
+    for i, path in enumerate(paths):
+        try:
+            _, error = runRemoteCmd(sshSession,serverNode,'rm -rf {}'.format(shlex.quote(str(path))),token)
+        except JobCancelledError:
+            report.cancelled = True
+            break
+        if error:
+            report.errors.append(error)
+        else:
+            report.nRemovedEntries += 1
+        if progress is not None:
+            progress(i+1)
+
+    return report
@@ -0,0 +1,308 @@
+import base64
+import hashlib
+import logging
+import mmap
+import os
+import shlex
+import struct
+import zlib
+
+from passhfiles.utils.Security import runRemoteCmd
+
+# The size of the blocks whose checksums are compared
+BLOCK_SIZE = 64*1024
+
+# Below that size, a file is always fully uploaded
+MINIMUM_DELTA_SIZE = 1024*1024
+
+# The maximum number of blocks over which the checksum is rolled when a mismatch follows a match
+ROLLING_BLOCKS = 2
+
+# The maximum size of the literal data held in memory when computing a delta
+MAXIMUM_LITERAL_SIZE = 16*BLOCK_SIZE
+
+# The modulus of the adler32 checksum
+_ADLER_MOD = 65521
+
+# The script run remotely for computing the block signatures of a file and for rebuilding a file from a delta.
+# It is sent base64-encoded to avoid any quoting issue through the bastion.
+_REMOTE_SCRIPT = '''
+import hashlib, os, struct, sys, zlib
+
+def signatures(path, blockSize):
+    out = sys.stdout
+    out.write('%d\\n' % os.path.getsize(path))
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(blockSize)
+            if not block:
+                break
+            out.write('%d %s\\n' % (zlib.adler32(block), hashlib.md5(block).hexdigest()))
+
+def patch(path, blockSize, tempPath, checksum):
+    stdin = sys.stdin.buffer
+    md5 = hashlib.md5()
+    try:
+        with open(path, 'rb') as f, open(tempPath, 'wb') as o:
+            while True:
+                op = stdin.read(1)
+                if op == b'C':
+                    index, count = struct.unpack('>QI', stdin.read(12))
+                    f.seek(index*blockSize)
+                    for _ in range(count):
+                        block = f.read(blockSize)
+                        md5.update(block)
+                        o.write(block)
+                elif op == b'D':
+                    length, = struct.unpack('>I', stdin.read(4))
+                    data = stdin.read(length)
+                    md5.update(data)
+                    o.write(data)
+                else:
+                    break
+        if md5.hexdigest() != checksum:
+            raise IOError('the checksum of the rebuilt file does not match')
+        os.chmod(tempPath, os.stat(path).st_mode & 0o7777)
+    except Exception as e:
+        if os.path.exists(tempPath):
+            os.unlink(tempPath)
+        sys.stderr.write('Delta transfer of %s failed: %s' % (path, e))
+        sys.exit(1)
+
+if sys.argv[1] == 'signatures':
+    signatures(sys.argv[2], int(sys.argv[3]))
+else:
+    patch(sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5])
+'''
+
+def _remoteScriptCmd(*args):
+    """Returns the command for running the remote script with a set of arguments.
+
+    Args:
+        args (list of str): the arguments
+
+    Returns:
+        str: the command
+    """
+
+    encodedScript = base64.b64encode(_REMOTE_SCRIPT.encode()).decode()
+
+    return 'python3 -c "import base64;exec(base64.b64decode(\'{}\'))" {}'.format(encodedScript,' '.join([shlex.quote(str(a)) for a in args]))
+
+def parseSignatures(output):
+    """Parse the block signatures output by the remote script.
+
+    Args:
+        output (str): the output of the remote script
+
+    Returns:
+        tuple: the size of the file and the list of (weak,strong) checksums of its blocks
+    """
+
+    lines = output.splitlines()
+
+    size = int(lines[0])
+
+    signatures = []
+    for line in lines[1:]:
+        weak, strong = line.split()
+        signatures.append((int(weak),strong))
+
+    return size, signatures
+
+def computeDelta(data, signatures, blockSize=BLOCK_SIZE, lastBlockSize=None):
+    """Compute the delta between a new version of a file and the block signatures of the old one.
+
+    The blocks of the new file which are found in the old one are searched for at block boundaries and, when a mismatch
+    follows a match, by rolling the adler32 checksum over at most ROLLING_BLOCKS blocks. This finds back blocks shifted
+    by insertions or deletions without rolling byte per byte over the whole file when it mostly differs.
+
+    Args:
+        data (bytes-like): the contents of the new file
+        signatures (list): the (weak,strong) checksums of the blocks of the old file
+        blockSize (int): the size of the blocks
+        lastBlockSize (int): the size of the last block of the old file
+
+    Yields:
+        tuple: ('C',index,count) for copying count blocks of the old file starting at index or ('D',bytes) for
+        sending literal data
+    """
+
+    blocks = {}
+    for index, (weak, strong) in enumerate(signatures):
+        blocks.setdefault(weak,[]).append((index,strong))
+
+    if lastBlockSize is None:
+        lastBlockSize = blockSize
+
+    def findBlock(weak, start, length):
+        candidates = blocks.get(weak)
+        if candidates is None:
+            return None
+        strong = hashlib.md5(data[start:start+length]).hexdigest()
+        for index, s in candidates:
+            if s != strong:
+                continue
+            # Only the last block of the old file can be shorter than the block size
+            size = lastBlockSize if index == len(signatures) - 1 else blockSize
+            if size == length:
+                return index
+        return None
+
+    pending = None
+    def copy(index):
+        nonlocal pending
+        if pending is not None and pending[1] + pending[2] == index:
+            pending[2] += 1
+            return None
+        previous, pending = pending, ['C',index,1]
+        return tuple(previous) if previous is not None else None
+
+    def flush():
+        nonlocal pending
+        previous, pending = pending, None
+        return tuple(previous) if previous is not None else None
+
+    n = len(data)
+    literalStart = 0
+    pos = 0
+    rollingBlocks = ROLLING_BLOCKS
+    while pos < n:
+        length = min(blockSize,n - pos)
+        weak = zlib.adler32(data[pos:pos+length])
+        index = findBlock(weak,pos,length)
+        if index is None and rollingBlocks > 0 and length == blockSize:
+            a, b = weak & 0xffff, weak >> 16
+            end = min(pos + blockSize,n - blockSize)
+            p = pos
+            while p < end:
+                outByte, inByte = data[p], data[p+blockSize]
+                a = (a - outByte + inByte) % _ADLER_MOD
+                b = (b - blockSize*outByte + a - 1) % _ADLER_MOD
+                p += 1
+                index = findBlock((b << 16) | a,p,blockSize)
+                if index is not None:
+                    pos = p
+                    break
+            rollingBlocks -= 1
+        if index is None:
+            pos += length
+            # Bound the memory used by the literal data when the files mostly differ
+            if pos - literalStart >= MAXIMUM_LITERAL_SIZE:
+                op = flush()
+                if op is not None:
+                    yield op
+                yield ('D',bytes(data[literalStart:pos]))
+                literalStart = pos
+            continue
+        if literalStart < pos:
+            op = flush()
+            if op is not None:
+                yield op
+            yield ('D',bytes(data[literalStart:pos]))
+        op = copy(index)
+        if op is not None:
+            yield op
+        pos += length
+        literalStart = pos
+        rollingBlocks = ROLLING_BLOCKS
+
+    op = flush()
+    if op is not None:
+        yield op
+    if literalStart < n:
+        yield ('D',bytes(data[literalStart:n]))
+
+def encodeDelta(delta, maxLiteralSize=BLOCK_SIZE):
+    """Encode a delta in the binary format understood by the remote script.
+
+    Args:
+        delta (iterable): the delta as returned by computeDelta
+        maxLiteralSize (int): the maximum size of a literal record
+
+    Yields:
+        bytes: the encoded records
+    """
+
+    for op in delta:
+        if op[0] == 'C':
+            yield b'C' + struct.pack('>QI',op[1],op[2])
+        else:
+            literal = op[1]
+            for i in range(0,len(literal),maxLiteralSize):
+                chunk = literal[i:i+maxLiteralSize]
+                yield b'D' + struct.pack('>I',len(chunk)) + chunk
+    yield b'E'
+
+def remoteSignatures(sshSession, serverNode, path, blockSize=BLOCK_SIZE):
+    """Compute remotely the block signatures of a file.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        path (pathlib.PurePosixPath): the path to the remote file
+        blockSize (int): the size of the blocks
+
+    Returns:
+        tuple: the size of the file and the list of (weak,strong) checksums of its blocks. None if the signatures
+        could not be computed.
+    """
+
+    output, error = runRemoteCmd(sshSession,serverNode,_remoteScriptCmd('signatures',path,blockSize))
+    if error:
+        logging.warning(error)
+        return None
+
+    try:
+        return parseSignatures(output)
+    except (IndexError, ValueError):
+        return None
+
+def uploadDelta(sshSession, serverNode, localPath, remotePath, tempPath, blockSize=BLOCK_SIZE):
+    """Rebuild a local file on a remote server from an older remote version of it by sending only the blocks which
+    differ.
+
+    The file is rebuilt in a temporary file which is kept only if its checksum matches the one of the local file. The
+    remote file itself is left untouched. Python 3 must be available on the remote server.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        localPath (pathlib.Path): the path to the local file
+        remotePath (pathlib.PurePosixPath): the path to the remote file
+        tempPath (pathlib.PurePosixPath): the path to the remote file to rebuild
+        blockSize (int): the size of the blocks
+
+    Returns:
+        int: the number of bytes sent. None if the delta transfer could not be performed, in which case the file
+        must be fully uploaded to the temporary file.
+    """
+
+    if os.path.getsize(str(localPath)) < MINIMUM_DELTA_SIZE:
+        return None
+
+    result = remoteSignatures(sshSession,serverNode,remotePath,blockSize)
+    if result is None:
+        return None
+    remoteSize, signatures = result
+    lastBlockSize = remoteSize - blockSize*(len(signatures) - 1) if signatures else blockSize
+
+    with open(str(localPath),'rb') as fin, mmap.mmap(fin.fileno(),0,access=mmap.ACCESS_READ) as data:
+        checksum = hashlib.md5(data).hexdigest()
+
+        cmd = _remoteScriptCmd('patch',remotePath,blockSize,tempPath,checksum)
+
+        sentBytes = 0
+        stdin, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+        for record in encodeDelta(computeDelta(data,signatures,blockSize,lastBlockSize)):
+            stdin.write(record)
+            sentBytes += len(record)
+        stdin.channel.shutdown_write()
+
+    # The remote script checks the checksum of the rebuilt file and removes it in case of failure
+    error = stderr.read().decode().replace(serverNode.stderrMotd(),'').strip()
+    if stdout.channel.recv_exit_status() != 0:
+        logging.error(error)
+        return None
+
+    return sentBytes
@@ -0,0 +1,134 @@
+import concurrent.futures
+import logging
+import os
+import pathlib
+import re
+import shlex
+import threading
+
+from passhfiles.kernel.Singleton import SingletonMeta
+
+class DirectorySizesCache(metaclass=SingletonMeta):
+    """This class implements a structure for caching in memory the size of directories.
+
+    The sizes are keyed by a (host,path) tuple, the host identifying the server through its bastion (see
+    passhfiles.kernel.Sessions.ServerNode.host), and are only valid for the modification time of the directory
+    they were computed for.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._sizes = {}
+
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Clear the cache.
+        """
+
+        with self._lock:
+            self._sizes.clear()
+
+    def getSize(self, host, path, mtime):
+        """Returns the cached size of a directory.
+
+        Args:
+            host (str): the host of the directory (None for the local file system)
+            path (pathlib.PurePath): the path to the directory
+            mtime (str): the modification time of the directory
+
+        Returns:
+            int: the size of the directory. None if the directory is not cached or if its cached size is outdated.
+        """
+
+        with self._lock:
+            cachedMtime, size = self._sizes.get((host,str(path)),(None,None))
+
+        return size if cachedMtime == mtime else None
+
+    def setSize(self, host, path, mtime, size):
+        """Cache the size of a directory.
+
+        Args:
+            host (str): the host of the directory (None for the local file system)
+            path (pathlib.PurePath): the path to the directory
+            mtime (str): the modification time of the directory
+            size (int): the size of the directory
+        """
+
+        with self._lock:
+            self._sizes[(host,str(path))] = (mtime,size)
+
+DIRECTORY_SIZES_CACHE = DirectorySizesCache()
+
+def localDirectorySize(directory):
+    """Compute the size of a local directory.
+
+    The directory is walked iteratively with os.scandir. Symbolic links are not followed and entries which
+    can not be accessed are skipped.
+
+    Args:
+        directory (pathlib.Path): the directory
+
+    Returns:
+        int: the size of the directory in bytes
+    """
+
+    size = 0
+    directories = [str(directory)]
+    while directories:
+        current = directories.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            directories.append(entry.path)
+                        else:
+                            size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning(str(e))
+            continue
+
+    return size
+
+def computeLocalDirectorySizes(directories, callback, maxWorkers=None):
+    """Compute the size of several local directories in parallel.
+
+    Args:
+        directories (list of pathlib.Path): the directories
+        callback (callable): called with the directory and its size as soon as the size of a directory is computed
+        maxWorkers (int): the maximum number of walkers running in parallel
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {executor.submit(localDirectorySize,d) : d for d in directories}
+        for future in concurrent.futures.as_completed(futures):
+            callback(futures[future],future.result())
+
+def computeRemoteDirectorySizes(sshSession, serverNode, directory, callback):
+    """Compute the size of all the subdirectories of a remote directory.
+
+    The sizes are computed in a single remote du command whose output is parsed while it is produced.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        directory (pathlib.PurePosixPath): the directory
+        callback (callable): called with the subdirectory and its size as soon as the size of a subdirectory is computed
+    """
+
+    _, stdout, _ = sshSession.exec_command('{} du -b --max-depth=1 {}'.format(serverNode.name(),shlex.quote(str(directory))))
+
+    for line in stdout:
+        match = re.match(r'^(\d+)\t(.*)$',line.rstrip('\n'))
+        if match is None:
+            continue
+        path = pathlib.PurePosixPath(match.group(2))
+        if path == directory:
+            continue
+        callback(path,int(match.group(1)))
@@ -0,0 +1,430 @@
+import base64
+import fnmatch
+import hashlib
+import hmac
+import logging
+import pathlib
+import threading
+
+from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.kernel.SSHAgent import fingerprint
+
+# The default port of SSH, for which the host keys are stored under the bare host name
+SSH_PORT = 22
+
+# The prefix of the host names hashed by ssh-keygen -H (HashKnownHosts)
+HASHED_HOSTNAME_PREFIX = '|1|'
+
+# The marker of the revoked keys in a known_hosts file
+REVOKED_MARKER = '@revoked'
+
+# The host key algorithms which can be negotiated for a host key of a given type
+HOST_KEY_ALGORITHMS = {'ssh-rsa' : ['ssh-rsa','rsa-sha2-256','rsa-sha2-512']}
+
+def defaultKnownHostsPath():
+    """Returns the path to the known_hosts file of OpenSSH of the user.
+
+    Returns:
+        pathlib.Path: the path
+    """
+
+    return pathlib.Path.home().joinpath('.ssh','known_hosts')
+
+def hostKeyName(address, port=SSH_PORT):
+    """Returns the name under which the host keys of a server are stored, as in the known_hosts file of OpenSSH.
+
+    Args:
+        address (str): the address of the server
+        port (int): the port of the server
+
+    Returns:
+        str: the name of the server
+    """
+
+    port = int(port)
+
+    return address if port == SSH_PORT else '[{}]:{}'.format(address,port)
+
+def loadHostKeys(sshSession, hostname, knownKeys):
+    """Register the known keys of a server in a SSH client, so that paramiko checks them on connection.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH client
+        hostname (str): the name of the server as returned by hostKeyName
+        knownKeys (dict): the base64 encoded keys per key type
+    """
+
+    import paramiko
+
+    hostKeys = sshSession.get_host_keys()
+    for keyType, key in knownKeys.items():
+        try:
+            hostKeys.add(hostname,keyType,paramiko.PKey.from_type_string(keyType,base64.b64decode(key)))
+        except Exception as e:
+            logging.warning('Skipping the {} key of {}: {}'.format(keyType,hostname,e))
+
+def pinnedAlgorithms(knownKeys, preferredAlgorithms):
+    """Returns the host key algorithms to disable so that only the types of the known host keys of a server can be
+    negotiated.
+
+    Otherwise the server could offer a type of key which is not known yet, which would be reported as a changed key.
+
+    Args:
+        knownKeys (dict): the base64 encoded known keys of the server per key type
+        preferredAlgorithms (list of str): the host key algorithms supported by the client
+
+    Returns:
+        list of str: the algorithms to disable. Empty if none of the known key types is supported.
+    """
+
+    allowed = set()
+    for keyType in knownKeys:
+        allowed.update(HOST_KEY_ALGORITHMS.get(keyType,[keyType]))
+
+    if not allowed.intersection(preferredAlgorithms):
+        return []
+
+    return [a for a in preferredAlgorithms if a not in allowed]
+
+class HostKeyStore(metaclass=SingletonMeta):
+    """This class implements a persistent store of the keys of the SSH servers the application connected to.
+
+    The keys are stored in a file using the format of the known_hosts file of OpenSSH, so that entries can be imported
+    from ~/.ssh/known_hosts. The file is indexed in memory on its first use: the plain host names are looked up in a
+    dictionary and the hashed host names (ssh-keygen -H) and the wildcard patterns are only scanned once per host, the
+    result being cached. The keys of the @revoked entries are rejected whatever the host names of the entry. The
+    @cert-authority entries are ignored.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._path = None
+
+        self._mtime = None
+
+        self._plain = {}
+
+        self._hashed = []
+
+        self._patterns = []
+
+        self._known = set()
+
+        self._revoked = set()
+
+        self._cache = {}
+
+        self._lock = threading.RLock()
+
+    def add(self, hostname, keyType, key):
+        """Add the key of a server to the store.
+
+        Args:
+            hostname (str): the name of the server as returned by hostKeyName
+            keyType (str): the type of the key (e.g. 'ssh-ed25519')
+            key (str): the base64 encoded key
+        """
+
+        with self._lock:
+            self._load()
+            if self.lookup(hostname).get(keyType) == key:
+                return
+            self._append(['{} {} {}'.format(hostname,keyType,key)])
+            self._index(hostname,keyType,key)
+            self._cache.pop(hostname,None)
+
+    def _append(self, lines):
+        """Append some entries to the file of the store.
+
+        Args:
+            lines (list of str): the entries
+        """
+
+        path = self.path()
+        path.parent.mkdir(parents=True,exist_ok=True)
+        with open(str(path),'a') as fout:
+            for line in lines:
+                fout.write(line + '\n')
+
+        self._mtime = path.stat().st_mtime_ns
+
+    def clear(self):
+        """Drop the in-memory index of the store. The file is indexed again on its next use.
+        """
+
+        with self._lock:
+            self._mtime = None
+            self._plain.clear()
+            self._hashed.clear()
+            self._patterns.clear()
+            self._known.clear()
+            self._revoked.clear()
+            self._cache.clear()
+
+    def importKnownHosts(self, knownHostsFile):
+        """Import the entries of a known_hosts file of OpenSSH which are not yet in the store.
+
+        Args:
+            knownHostsFile (pathlib.Path): the known_hosts file
+
+        Returns:
+            int: the number of imported entries
+        """
+
+        try:
+            with open(str(knownHostsFile),'r') as fin:
+                lines = fin.read().splitlines()
+        except OSError as e:
+            logging.error(str(e))
+            return 0
+
+        with self._lock:
+            self._load()
+
+            newLines = []
+            for line in lines:
+                fields = self._parseLine(line)
+                if fields is None:
+                    continue
+                revoked, hostnames, keyType, key = fields
+                if revoked:
+                    if (REVOKED_MARKER,hostnames,keyType,key) not in self._known:
+                        newLines.append(' '.join((REVOKED_MARKER,hostnames,keyType,key)))
+                        self._revoke(hostnames,keyType,key)
+                    continue
+                for entry in self._entries(hostnames,keyType,key):
+                    if entry not in self._known:
+                        newLines.append(' '.join(entry))
+                        self._index(*entry)
+
+            if newLines:
+                self._append(newLines)
+                self._cache.clear()
+
+        logging.info('Imported {} host key(s) from {}'.format(len(newLines),knownHostsFile))
+
+        return len(newLines)
+
+    def _entries(self, hostnames, keyType, key):
+        """Split an entry of a known_hosts file per host name. The hashed host names and the patterns are kept as is.
+
+        Args:
+            hostnames (str): the comma-separated host names of the entry
+            keyType (str): the type of the key
+            key (str): the base64 encoded key
+
+        Returns:
+            list of tuple: the host name, the type of the key and the key of each entry
+        """
+
+        if hostnames.startswith(HASHED_HOSTNAME_PREFIX) or any(c in hostnames for c in '*?!'):
+            return [(hostnames,keyType,key)]
+
+        return [(h,keyType,key) for h in hostnames.split(',') if h]
+
+    def _index(self, hostname, keyType, key):
+        """Add an entry to the in-memory index.
+
+        Args:
+            hostname (str): the host name of the entry (plain, hashed or patterns)
+            keyType (str): the type of the key
+            key (str): the base64 encoded key
+        """
+
+        self._known.add((hostname,keyType,key))
+
+        if hostname.startswith(HASHED_HOSTNAME_PREFIX):
+            try:
+                salt, digest = hostname[len(HASHED_HOSTNAME_PREFIX):].split('|')
+                self._hashed.append((base64.b64decode(salt),base64.b64decode(digest),keyType,key))
+            except ValueError:
+                logging.warning('Invalid hashed host name {}'.format(hostname))
+        elif any(c in hostname for c in '*?!'):
+            self._patterns.append((hostname.split(','),keyType,key))
+        else:
+            self._plain.setdefault(hostname,{})[keyType] = key
+
+    def isRevoked(self, keyType, key):
+        """Returns whether a key was revoked.
+
+        Args:
+            keyType (str): the type of the key
+            key (str): the base64 encoded key
+
+        Returns:
+            bool: True if the key is part of a @revoked entry
+        """
+
+        with self._lock:
+            self._load()
+
+            return (keyType,key) in self._revoked
+
+    def _load(self):
+        """Index the file of the store if it was not indexed yet or if it was modified since.
+        """
+
+        path = self.path()
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime is not None and mtime == self._mtime:
+            return
+
+        self.clear()
+        self._mtime = mtime
+        if mtime is None:
+            return
+
+        with open(str(path),'r') as fin:
+            for line in fin:
+                fields = self._parseLine(line)
+                if fields is None:
+                    continue
+                revoked, hostnames, keyType, key = fields
+                if revoked:
+                    self._revoke(hostnames,keyType,key)
+                else:
+                    for entry in self._entries(hostnames,keyType,key):
+                        self._index(*entry)
+
+    def lookup(self, hostname):
+        """Returns the known keys of a server.
+
+        Args:
+            hostname (str): the name of the server as returned by hostKeyName
+
+        Returns:
+            dict: the base64 encoded keys per key type, the revoked keys excepted. Empty if the server is unknown.
+        """
+
+        with self._lock:
+            self._load()
+
+            keys = self._cache.get(hostname)
+            if keys is not None:
+                return dict(keys)
+
+            keys = dict(self._plain.get(hostname,{}))
+
+            for salt, digest, keyType, key in self._hashed:
+                if hmac.compare_digest(hmac.new(salt,hostname.encode(),hashlib.sha1).digest(),digest):
+                    keys.setdefault(keyType,key)
+
+            for patterns, keyType, key in self._patterns:
+                negated = any(p.startswith('!') and fnmatch.fnmatch(hostname,p[1:]) for p in patterns)
+                if not negated and any(not p.startswith('!') and fnmatch.fnmatch(hostname,p) for p in patterns):
+                    keys.setdefault(keyType,key)
+
+            # A revoked key is not known anymore, so that paramiko hands it to the missing host key policy
+            keys = {k : v for k, v in keys.items() if (k,v) not in self._revoked}
+
+            self._cache[hostname] = keys
+
+            return dict(keys)
+
+    def _parseLine(self, line):
+        """Parse an entry of a known_hosts file.
+
+        Args:
+            line (str): the line
+
+        Returns:
+            tuple: whether the key is revoked, the host names, the type of the key and the base64 encoded key. None for
+            the comments, the @cert-authority entries and the invalid lines.
+        """
+
+        line = line.strip()
+        if not line or line.startswith('#'):
+            return None
+
+        fields = line.split()
+        revoked = fields[0] == REVOKED_MARKER
+        if revoked:
+            fields = fields[1:]
+        elif fields[0].startswith('@'):
+            return None
+
+        if len(fields) < 3:
+            return None
+
+        return revoked, fields[0], fields[1], fields[2]
+
+    def path(self):
+        """Returns the path to the file of the store.
+
+        Returns:
+            pathlib.Path: the path
+        """
+
+        if self._path is None:
+            from passhfiles.utils.Platform import knownHostsPath
+            self._path = knownHostsPath()
+
+        return self._path
+
+    def _revoke(self, hostnames, keyType, key):
+        """Add a @revoked entry to the in-memory index.
+
+        Args:
+            hostnames (str): the host names of the entry
+            keyType (str): the type of the key
+            key (str): the base64 encoded key
+        """
+
+        self._known.add((REVOKED_MARKER,hostnames,keyType,key))
+        self._revoked.add((keyType,key))
+
+    def setPath(self, path):
+        """Set the file of the store.
+
+        Args:
+            path (pathlib.Path): the path
+        """
+
+        with self._lock:
+            self._path = path
+            self.clear()
+
+class TrustOnFirstUsePolicy:
+    """Missing host key policy of paramiko which stores the key of the servers connected to for the first time.
+
+    The servers whose key changed since are rejected by paramiko itself (BadHostKeyException), as are the servers
+    presenting a revoked key.
+    """
+
+    def __init__(self, hostKeyStore):
+        """Constructor.
+
+        Args:
+            hostKeyStore (HostKeyStore): the store where to record the keys
+        """
+
+        self._hostKeyStore = hostKeyStore
+
+    def missing_host_key(self, client, hostname, key):
+        """Called by paramiko when the key of a server is not known.
+
+        Args:
+            client (paramiko.client.SSHClient): the SSH client
+            hostname (str): the name of the server
+            key (paramiko.PKey): the key of the server
+
+        Raises:
+            paramiko.BadHostKeyException: if the key of the server was revoked
+        """
+
+        if self._hostKeyStore.isRevoked(key.get_name(),key.get_base64()):
+            import paramiko
+            logging.error('The {} key {} of host {} was revoked'.format(key.get_name(),fingerprint(key.asbytes()),hostname))
+            raise paramiko.BadHostKeyException(hostname,key,key)
+
+        self._hostKeyStore.add(hostname,key.get_name(),key.get_base64())
+        logging.warning('Unknown host {}: its {} key {} was added to {}'.format(hostname,key.get_name(),fingerprint(key.asbytes()),self._hostKeyStore.path()))
+
+# Create an instance of the host key store (singleton)
+HOST_KEYS = HostKeyStore()
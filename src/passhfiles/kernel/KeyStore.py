@@ -1,9 +1,37 @@
+import concurrent.futures
 import logging
+import threading
+import time
 
 from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.kernel.SSHAgent import readOpenSSHKeyHeader
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.Security import checkAndGetSSHKey
+
+def keyDerivation(keyfile):
+    """Returns a description of the key derivation protecting a private key, for reporting the cost of its unlocking.
+
+    Args:
+        keyfile (pathlib.Path): the path to the private key
+
+    Returns:
+        str: the description (e.g. 'bcrypt, 16 rounds')
+    """
+
+    header = readOpenSSHKeyHeader(keyfile)
+    if header is None:
+        return 'PEM'
+
+    if header['rounds'] is None:
+        return header['kdf']
+
+    return '{}, {} rounds'.format(header['kdf'],header['rounds'])
 
 class KeyStore(metaclass=SingletonMeta):
     """This class implements a structure for storing in memory the ssh keys alongside with their passwords
+
+    The keys are kept for the lifetime of the process unless a timeout is set, in which case the keys which have not
+    been used for that long are evicted and must be unlocked again.
     """
 
     def __init__(self):
@@ -12,6 +40,10 @@ class KeyStore(metaclass=SingletonMeta):
 
         self._keys = {}
 
+        self._timeout = None
+
+        self._lock = threading.RLock()
+
     def addKey(self, keyfile, key, password):
         """Add a key to the store.
 
@@ -21,11 +53,12 @@ class KeyStore(metaclass=SingletonMeta):
             password (str): the password (if any)
         """
 
-        if keyfile in self._keys:
-            logging.warning('The key store already contains {} key'.format(keyfile))
-            return
+        with self._lock:
+            if keyfile in self._keys:
+                logging.warning('The key store already contains {} key'.format(keyfile))
+                return
 
-        self._keys[keyfile] = (key,password)
+            self._keys[keyfile] = [key,password,time.monotonic()]
 
     def hasKey(self, keyfile):
         """Returns whether or not the store contains a key.
@@ -37,7 +70,9 @@ class KeyStore(metaclass=SingletonMeta):
             bool: True if the store contains that key. False otherwise.
         """
 
-        return (keyfile in self._keys)
+        with self._lock:
+            self._evictExpiredKeys()
+            return (keyfile in self._keys)
 
     def delKey(self, keyfile):
         """Remove a key from the store.
@@ -46,12 +81,25 @@ class KeyStore(metaclass=SingletonMeta):
             keyfile (pathlib.Path): the path to the key
         """
 
-        try:
-            del self._keys[keyfile]
-        except KeyError:
-            logging.warning('The key {} is not stored in the key store'.format(keyfile))
+        with self._lock:
+            try:
+                del self._keys[keyfile]
+            except KeyError:
+                logging.warning('The key {} is not stored in the key store'.format(keyfile))
+                return
+
+    def _evictExpiredKeys(self):
+        """Remove the keys which have not been used for longer than the timeout.
+        """
+
+        if self._timeout is None:
             return
 
+        now = time.monotonic()
+        for keyfile in [k for k, v in self._keys.items() if now - v[2] > self._timeout]:
+            del self._keys[keyfile]
+            logging.info('The {} key was evicted from the key store after {} s of inactivity'.format(keyfile,self._timeout))
+
     def getKey(self, keyfile):
         """Returns the key from the store.
 
@@ -62,7 +110,11 @@ class KeyStore(metaclass=SingletonMeta):
             paramiko key: the key
         """
 
-        return self._keys[keyfile][0]
+        with self._lock:
+            self._evictExpiredKeys()
+            entry = self._keys[keyfile]
+            entry[2] = time.monotonic()
+            return entry[0]
 
     def getPassword(self, keyfile):
         """Returns the key from the store.
@@ -74,7 +126,9 @@ class KeyStore(metaclass=SingletonMeta):
             str: the password
         """
 
-        return self._keys[keyfile][1]
+        with self._lock:
+            self._evictExpiredKeys()
+            return self._keys[keyfile][1]
 
     def keys(self):
         """Return the keys stored in the store.
@@ -83,6 +137,77 @@ class KeyStore(metaclass=SingletonMeta):
             list of pathlib.Path: the keys
         """
 
-        return list(self._keys.keys())
+        with self._lock:
+            self._evictExpiredKeys()
+            return list(self._keys.keys())
+
+    def setTimeout(self, timeout):
+        """Set the time after which an unused key is evicted from the store.
+
+        Args:
+            timeout (float): the timeout in seconds. If None, the keys are kept for the lifetime of the process.
+        """
+
+        with self._lock:
+            self._timeout = timeout
+            self._evictExpiredKeys()
+
+    def unlockKey(self, keyfile, keytype, password):
+        """Unlock a key with its password and add it to the store.
+
+        Args:
+            keyfile (pathlib.Path): the path to the key
+            keytype (str): the type of the key ('RSA', 'ECDSA' or 'ED25519')
+            password (str): the password (if any)
+
+        Returns:
+            bool: True if the key could be unlocked. False otherwise.
+        """
+
+        if self.hasKey(keyfile):
+            return True
+
+        # Most of the time is spent in the key derivation function, whose cost is reported for tuning its rounds
+        kdf = keyDerivation(keyfile)
+        start = time.perf_counter()
+        with TRACER.span('unlockKey','key',keyfile=str(keyfile),kdf=kdf):
+            success,key = checkAndGetSSHKey(keyfile,keytype,password)
+        duration = time.perf_counter() - start
+
+        if not success:
+            logging.error('Invalid password for unlocking {} key'.format(keyfile))
+            return False
+
+        self.addKey(keyfile,key,password)
+        logging.info('Successfully unlocked {} key in {:.3f} s ({})'.format(keyfile,duration,kdf))
+
+        return True
+
+    def unlockKeys(self, keys, maxWorkers=None):
+        """Unlock several keys concurrently and add them to the store.
+
+        The key derivation functions run in a pool of threads, so that unlocking several keys takes about as long as
+        unlocking the most expensive one.
+
+        Args:
+            keys (list of tuple): the path, the type and the password of each key
+            maxWorkers (int): the maximum number of keys unlocked at the same time. If None, all the keys are unlocked
+            at once.
+
+        Returns:
+            dict: whether each key (indexed by its path) could be unlocked
+        """
+
+        if not keys:
+            return {}
+
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers or len(keys)) as executor:
+            futures = {keyfile : executor.submit(self.unlockKey,keyfile,keytype,password) for keyfile, keytype, password in keys}
+        results = {keyfile : future.result() for keyfile, future in futures.items()}
+
+        logging.info('Unlocked {} key(s) out of {} in {:.3f} s'.format(sum(results.values()),len(keys),time.perf_counter() - start))
+
+        return results
 
 KEYSTORE = KeyStore()
\ No newline at end of file
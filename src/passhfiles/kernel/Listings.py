@@ -0,0 +1,140 @@
+from datetime import datetime
+import shlex
+
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.Platform import findOwner
+from passhfiles.utils.Security import runRemoteCmd
+
+def listLocalDirectory(directory, showHiddenFiles=False):
+    """List the contents of a local directory.
+
+    Args:
+        directory (pathlib.Path): the directory
+        showHiddenFiles (bool): if True, the hidden files are listed
+
+    Returns:
+        list of list: the name, the size in bytes (None for the directories), the type ('Folder' or 'File'), the owner
+        and the modification time of each entry, the directories first
+
+    Raises:
+        PermissionError: if the directory can not be read
+    """
+
+    with TRACER.span('scan','listing',directory=str(directory)) as args:
+        contents = [v.name for v in directory.iterdir()]
+        args['entries'] = len(contents)
+
+    if not showHiddenFiles:
+        contents = [c for c in contents if not c.startswith('.')]
+
+    # Sort the contents of the directory (first the sorted directories and then the sorted files)
+    with TRACER.span('sort','listing'):
+        sortedDirectories = sorted([c for c in contents if directory.joinpath(c).is_dir()],key=str.casefold)
+        sortedDirectories = [(c,True) for c in sortedDirectories]
+        sortedFiles = sorted([c for c in contents if not directory.joinpath(c).is_dir()],key=str.casefold)
+        sortedFiles = [(c,False) for c in sortedFiles]
+        sortedContents = sortedDirectories + sortedFiles
+
+    with TRACER.span('parse','listing'):
+        entries = []
+        for (name,isDirectory) in sortedContents:
+            absPath = directory.joinpath(name)
+            stat = absPath.lstat()
+            typ = 'Folder' if isDirectory else 'File'
+            modificationTime = str(datetime.fromtimestamp(stat.st_mtime)).split('.')[0]
+            size = None if isDirectory else stat.st_size
+            owner = findOwner(absPath)
+            entries.append([name,size,typ,owner,modificationTime])
+
+    return entries
+
+def listRemoteDirectory(sshSession, serverNode, directory, showHiddenFiles=False, token=None):
+    """List the contents of a directory of a server behind the bastion.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        directory (pathlib.PurePosixPath): the directory
+        showHiddenFiles (bool): if True, the hidden files are listed
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the listing is interrupted when the
+        token is cancelled
+
+    Returns:
+        list of list: the name, the size in bytes (None for the directories), the type ('Folder' or 'File'), the owner
+        and the modification time of each entry, the directories first
+
+    Raises:
+        IOError: if the directory can not be listed
+    """
+
+    output, error = runRemoteCmd(sshSession,serverNode,remoteListingCommand(directory,showHiddenFiles),token,idempotent=True)
+    if error:
+        raise IOError(error)
+
+    return sortEntries(parseRemoteListing(output,showHiddenFiles))
+
+def remoteListingCommand(directory, showHiddenFiles=False):
+    """Returns the remote command which lists the contents of a directory.
+
+    Args:
+        directory (pathlib.PurePosixPath): the directory
+        showHiddenFiles (bool): if True, the hidden files are listed
+
+    Returns:
+        str: the command
+    """
+
+    return 'ls --full-time -{}lpL {}'.format('a' if showHiddenFiles else '',shlex.quote(str(directory)))
+
+def parseRemoteListing(output, showHiddenFiles=False):
+    """Parse the output of the remote listing command.
+
+    Args:
+        output (str): the output of the command returned by remoteListingCommand
+        showHiddenFiles (bool): True if the hidden files were listed
+
+    Returns:
+        list of list: the name, the size in bytes (None for the directories), the type ('Folder' or 'File'), the owner
+        and the modification time of each entry
+    """
+
+    with TRACER.span('parse','listing') as args:
+        contents = [l.strip() for l in output.split('\n')]
+
+        # The 1st element of contents is always the total count of entries output by the ls command. It is not used.
+        # For ls -a command the 2nd and 3rd entries are for . and .. directories. It is not used.
+        if showHiddenFiles:
+            contents = contents[3:] if len(contents) >= 4 else []
+        else:
+            contents = contents[1:] if len(contents) >= 2 else []
+
+        entries = []
+        for c in contents:
+            words = [v.strip() for v in c.split()]
+            typ = 'Folder' if words[-1].endswith('/') else 'File'
+            owner = words[2]
+            date = words[5]
+            time = words[6].split('.')[0]
+            modificationTime = '{} {}'.format(date,time)
+            name = words[-1][:-1] if typ=='Folder' else words[-1]
+            size = int(words[4]) if typ == 'File' else None
+            entries.append([name,size,typ,owner,modificationTime])
+        args['entries'] = len(entries)
+
+    return entries
+
+def sortEntries(entries):
+    """Sort the entries of a directory, the directories first, by case-insensitive name.
+
+    Args:
+        entries (list of list): the entries whose 1st and 3rd items are the name and the type of the entry
+
+    Returns:
+        list of list: the sorted entries
+    """
+
+    with TRACER.span('sort','listing'):
+        sortedDirectories = sorted([v for v in entries if v[2]=='Folder'],key= lambda s : s[0].lower())
+        sortedFiles = sorted([v for v in entries if v[2]=='File'],key= lambda s : s[0].lower())
+
+    return sortedDirectories + sortedFiles
@@ -0,0 +1,328 @@
+import concurrent.futures
+import errno
+import os
+import shutil
+import threading
+
+from passhfiles.kernel.Cancellation import JobCancelledError
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# The ioctl request for cloning a file (reflink) on the filesystems which support it (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+# The size of the chunks copied by the kernel in a single call
+KERNEL_CHUNK_SIZE = 64*1024*1024
+
+# The size of the chunks copied when falling back to plain reads and writes
+BUFFER_SIZE = 1024*1024
+
+# The period in seconds at which the progress of a copy is reported
+PROGRESS_PERIOD = 0.1
+
+# The small files are copied by batches of at most that number of files and that size to limit the overhead per file
+BATCH_FILES = 256
+
+BATCH_SIZE = 8*1024*1024
+
+# The errors which mean that a copy method is not supported for a given pair of files
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ETXTBSY}
+
+class LocalCopyReport:
+    """This class stores the outcome of a local copy.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self.nCopiedFiles = 0
+
+        self.copiedBytes = 0
+
+        self.errors = []
+
+        self.cancelled = False
+
+    def __str__(self):
+
+        s = '{} files copied ({} bytes), {} errors'.format(self.nCopiedFiles,self.copiedBytes,len(self.errors))
+        if self.cancelled:
+            s += ' (cancelled)'
+
+        return s
+
+def _reflink(fin, fout):
+    """Clone a file by sharing its blocks with the copy.
+
+    Args:
+        fin (file): the source file
+        fout (file): the destination file
+
+    Returns:
+        bool: True if the file could be cloned
+    """
+
+    if fcntl is None:
+        return False
+
+    try:
+        fcntl.ioctl(fout.fileno(),FICLONE,fin.fileno())
+    except OSError:
+        return False
+
+    return True
+
+def _copyFileRangeChunk(inFd, outFd):
+    """Copy a chunk of a file with copy_file_range.
+
+    Args:
+        inFd (int): the file descriptor of the source file
+        outFd (int): the file descriptor of the destination file
+
+    Returns:
+        int: the number of bytes copied
+    """
+
+    return os.copy_file_range(inFd,outFd,KERNEL_CHUNK_SIZE)
+
+def _sendfileChunk(inFd, outFd):
+    """Copy a chunk of a file with sendfile.
+
+    Args:
+        inFd (int): the file descriptor of the source file
+        outFd (int): the file descriptor of the destination file
+
+    Returns:
+        int: the number of bytes copied
+    """
+
+    return os.sendfile(outFd,inFd,None,KERNEL_CHUNK_SIZE)
+
+def _readWriteChunk(inFd, outFd):
+    """Copy a chunk of a file with a read and a write.
+
+    Args:
+        inFd (int): the file descriptor of the source file
+        outFd (int): the file descriptor of the destination file
+
+    Returns:
+        int: the number of bytes copied
+    """
+
+    data = os.read(inFd,BUFFER_SIZE)
+    view = memoryview(data)
+    while view:
+        view = view[os.write(outFd,view):]
+    return len(data)
+
+def copyFileData(source, destination, progress=None, unsupported=None, token=None):
+    """Copy the contents of a file using the fastest method supported by the system and the filesystems.
+
+    The methods are tried in that order: reflink (no data copied at all), copy_file_range and sendfile (the data stay
+    in the kernel) and plain reads and writes.
+
+    Args:
+        source (str): the path to the source file
+        destination (str): the path to the destination file
+        progress (callable): if not None, called with the number of bytes copied after each chunk
+        unsupported (set): if not None, the methods known not to be supported. Updated with those which fail so
+        that they are not tried again for the next files.
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the copy stops at the next chunk once
+        the token is cancelled
+
+    Returns:
+        int: the number of bytes copied
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled. The partial copy is left in place.
+    """
+
+    if unsupported is None:
+        unsupported = set()
+
+    with open(source,'rb') as fin, open(destination,'wb') as fout:
+        size = os.fstat(fin.fileno()).st_size
+        if size == 0:
+            return 0
+
+        if _reflink not in unsupported:
+            if _reflink(fin,fout):
+                if progress is not None:
+                    progress(size)
+                return size
+            unsupported.add(_reflink)
+
+        methods = []
+        if hasattr(os,'copy_file_range'):
+            methods.append(_copyFileRangeChunk)
+        if hasattr(os,'sendfile'):
+            methods.append(_sendfileChunk)
+        methods = [m for m in methods if m not in unsupported]
+        methods.append(_readWriteChunk)
+
+        inFd, outFd = fin.fileno(), fout.fileno()
+        copied = 0
+        for method in methods:
+            try:
+                while True:
+                    n = method(inFd,outFd)
+                    if n == 0:
+                        return copied
+                    copied += n
+                    if progress is not None:
+                        progress(n)
+                    if token is not None:
+                        token.raiseIfCancelled()
+            except OSError as e:
+                # Fall back to the next method only if nothing was copied yet
+                if copied > 0 or e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                unsupported.add(method)
+
+    return copied
+
+def _plan(entries, report):
+    """List the directories and files to copy.
+
+    Args:
+        entries (list of tuple): the (source,destination) paths of the entries to copy
+        report (passhfiles.kernel.LocalCopy.LocalCopyReport): the report where to store the errors
+
+    Returns:
+        tuple: the list of the (source,destination) paths of the directories and the list of the
+        (source,destination,size) of the files
+    """
+
+    directories = []
+    files = []
+    destinations = set()
+    for source, destination in entries:
+        source, destination = str(source), str(destination)
+        try:
+            if os.path.isdir(source):
+                # Same behaviour as shutil.copytree
+                if os.path.exists(destination) or destination in destinations:
+                    raise FileExistsError(errno.EEXIST,'File exists',destination)
+                destinations.add(destination)
+                for root, _, filenames in os.walk(source,followlinks=True):
+                    target = os.path.normpath(os.path.join(destination,os.path.relpath(root,source)))
+                    directories.append((root,target))
+                    for f in filenames:
+                        path = os.path.join(root,f)
+                        files.append((path,os.path.join(target,f),os.path.getsize(path)))
+            else:
+                files.append((source,destination,os.path.getsize(source)))
+        except OSError as e:
+            report.errors.append(str(e))
+
+    return directories, files
+
+def copyEntries(entries, progress=None, maxWorkers=8, token=None):
+    """Copy local files and directories.
+
+    The directories are created first. The files are then copied in parallel by a pool of threads, the largest ones
+    first and the small ones by batches, each with its permissions and times. The times of the directories are set at
+    the end, once their contents do not change anymore.
+
+    When the copy is cancelled, the file being copied by each thread is removed as well as the directories left empty
+    so that only complete files remain.
+
+    Args:
+        entries (list of tuple): the (source,destination) paths of the entries to copy
+        progress (callable): if not None, called from the calling thread with the number of bytes copied so far and
+        the total number of bytes to copy
+        maxWorkers (int): the maximum number of threads
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the copy stops once the token is
+        cancelled
+
+    Returns:
+        passhfiles.kernel.LocalCopy.LocalCopyReport: the report of the copy
+    """
+
+    report = LocalCopyReport()
+
+    directories, files = _plan(entries,report)
+
+    totalBytes = sum([size for _,_,size in files])
+
+    for _, target in directories:
+        try:
+            os.makedirs(target,exist_ok=True)
+        except OSError as e:
+            report.errors.append(str(e))
+
+    lock = threading.Lock()
+
+    def addBytes(n):
+        with lock:
+            report.copiedBytes += n
+
+    unsupported = set()
+
+    def copyBatch(batch):
+        nCopiedFiles = 0
+        errors = []
+        for source, destination, _ in batch:
+            if token is not None and token.isCancelled():
+                break
+            try:
+                copyFileData(source,destination,addBytes,unsupported,token)
+                shutil.copystat(source,destination)
+            except JobCancelledError:
+                try:
+                    os.remove(destination)
+                except OSError:
+                    pass
+                break
+            except Exception as e:
+                errors.append('{}: {}'.format(source,e))
+            else:
+                nCopiedFiles += 1
+        return nCopiedFiles, errors
+
+    files.sort(key=lambda f : f[2],reverse=True)
+
+    batches = []
+    batch = []
+    batchSize = 0
+    for f in files:
+        batch.append(f)
+        batchSize += f[2]
+        if len(batch) >= BATCH_FILES or batchSize >= BATCH_SIZE:
+            batches.append(batch)
+            batch = []
+            batchSize = 0
+    if batch:
+        batches.append(batch)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        pending = {executor.submit(copyBatch,batch) for batch in batches}
+        while pending:
+            done, pending = concurrent.futures.wait(pending,timeout=PROGRESS_PERIOD)
+            for future in done:
+                nCopiedFiles, errors = future.result()
+                report.nCopiedFiles += nCopiedFiles
+                report.errors.extend(errors)
+            if progress is not None:
+                with lock:
+                    copiedBytes = report.copiedBytes
+                progress(copiedBytes,totalBytes)
+
+    report.cancelled = token is not None and token.isCancelled()
+
+    # The deepest directories first as setting the times of a directory must come after the changes of its contents
+    for source, target in sorted(directories,key=lambda d : d[1].count(os.sep),reverse=True):
+        try:
+            if report.cancelled:
+                if not os.listdir(target):
+                    os.rmdir(target)
+            else:
+                shutil.copystat(source,target)
+        except OSError as e:
+            report.errors.append(str(e))
+
+    return report
@@ -0,0 +1,301 @@
+import mmap
+import os
+import pathlib
+
+# The size of the chunks in which a document is written
+WRITE_CHUNK_SIZE = 1024*1024
+
+# Above that size, the modified region of a document is not rewritten in place but the whole document is rewritten
+# to a temporary file
+MAXIMUM_IN_PLACE_SIZE = 64*1024*1024
+
+class PieceTable:
+    """This class implements a piece table document over a memory-mapped file.
+
+    The document is a sequence of pieces which refer either to a range of the original file or to a range of an
+    in-memory buffer where the inserted data are appended. The original file is never loaded entirely in memory and
+    an edit costs a few pieces whatever the size of the file.
+    """
+
+    ORIGINAL = 0
+
+    ADD = 1
+
+    def __init__(self, path):
+        """Constructor.
+
+        Args:
+            path (pathlib.Path): the path to the file
+        """
+
+        self._path = pathlib.Path(path)
+
+        self._file = None
+
+        self._original = b''
+
+        self._open()
+
+    def _open(self):
+        """Map the file in memory and reset the pieces.
+        """
+
+        self._file = open(str(self._path),'rb')
+
+        size = os.fstat(self._file.fileno()).st_size
+
+        # Empty files can not be mapped
+        self._original = mmap.mmap(self._file.fileno(),0,access=mmap.ACCESS_READ) if size > 0 else b''
+
+        self._add = bytearray()
+
+        self._pieces = [(PieceTable.ORIGINAL,0,size)] if size > 0 else []
+
+        self._size = size
+
+        self._originalSize = size
+
+    def _buffer(self, source):
+        """Returns the buffer a piece refers to.
+
+        Args:
+            source (int): PieceTable.ORIGINAL or PieceTable.ADD
+
+        Returns:
+            bytes-like: the buffer
+        """
+
+        return self._original if source == PieceTable.ORIGINAL else self._add
+
+    def _split(self, offset):
+        """Split the pieces at a given offset of the document.
+
+        Args:
+            offset (int): the offset
+
+        Returns:
+            int: the index of the piece starting at that offset
+        """
+
+        pos = 0
+        for i, (source, start, length) in enumerate(self._pieces):
+            if pos == offset:
+                return i
+            if pos + length > offset:
+                cut = offset - pos
+                self._pieces[i:i+1] = [(source,start,cut),(source,start+cut,length-cut)]
+                return i + 1
+            pos += length
+
+        return len(self._pieces)
+
+    def _writeRange(self, fout, offset, length):
+        """Write a range of the document to a file.
+
+        Args:
+            fout (file): the file
+            offset (int): the offset of the range
+            length (int): the length of the range
+        """
+
+        end = offset + length
+        pos = 0
+        for source, start, pieceLength in self._pieces:
+            if pos >= end:
+                break
+            if pos + pieceLength > offset:
+                first = max(offset - pos,0)
+                last = min(end - pos,pieceLength)
+                view = memoryview(self._buffer(source))
+                for i in range(start + first,start + last,WRITE_CHUNK_SIZE):
+                    fout.write(view[i:min(i + WRITE_CHUNK_SIZE,start + last)])
+                view.release()
+            pos += pieceLength
+
+    def close(self):
+        """Unmap the file.
+        """
+
+        if isinstance(self._original,mmap.mmap):
+            self._original.close()
+        self._original = b''
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def delete(self, offset, length):
+        """Delete a range of the document.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+        """
+
+        self.replace(offset,length,b'')
+
+    def insert(self, offset, data):
+        """Insert some data in the document.
+
+        Args:
+            offset (int): the offset where to insert the data
+            data (bytes): the data
+        """
+
+        self.replace(offset,0,data)
+
+    def modifiedRange(self):
+        """Returns the range of the document which differs from the original file.
+
+        Returns:
+            tuple: the offset and the end of the modified range. None if the document is unchanged.
+        """
+
+        first = last = None
+        pos = 0
+        for source, start, length in self._pieces:
+            if source != PieceTable.ORIGINAL or start != pos:
+                if first is None:
+                    first = pos
+                last = pos + length
+            pos += length
+
+        if self._size != self._originalSize:
+            if first is None:
+                first = self._size
+            last = max(self._size,self._originalSize)
+
+        return None if first is None else (first,last)
+
+    def path(self):
+        """Returns the path to the file.
+
+        Returns:
+            pathlib.Path: the path
+        """
+
+        return self._path
+
+    def read(self, offset, length):
+        """Read a range of the document.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+
+        Returns:
+            bytes: the data
+        """
+
+        end = min(offset + length,self._size)
+        chunks = []
+        pos = 0
+        for source, start, pieceLength in self._pieces:
+            if pos >= end:
+                break
+            if pos + pieceLength > offset:
+                first = max(offset - pos,0)
+                last = min(end - pos,pieceLength)
+                chunks.append(self._buffer(source)[start+first:start+last])
+            pos += pieceLength
+
+        return b''.join(chunks)
+
+    def readLines(self, offset, size):
+        """Read a range of the document which ends at a line boundary.
+
+        Args:
+            offset (int): the offset of the range
+            size (int): the approximate size of the range. The range is shortened to the last newline it contains or
+            extended to the next one if it contains none.
+
+        Returns:
+            bytes: the data
+        """
+
+        data = self.read(offset,size)
+        while offset + len(data) < self._size:
+            index = data.rfind(b'\n')
+            if index >= 0:
+                return data[:index+1]
+            data += self.read(offset + len(data),size)
+
+        return data
+
+    def replace(self, offset, length, data):
+        """Replace a range of the document with some data.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+            data (bytes): the data
+        """
+
+        if offset < 0 or offset + length > self._size:
+            raise IndexError('Range out of the document')
+
+        first = self._split(offset)
+        last = self._split(offset + length)
+
+        pieces = []
+        if data:
+            pieces.append((PieceTable.ADD,len(self._add),len(data)))
+            self._add.extend(data)
+
+        self._pieces[first:last] = pieces
+
+        self._size += len(data) - length
+
+    def save(self, path=None):
+        """Save the document.
+
+        When the document is saved to its own file, only the modified range is rewritten in place if the size of the
+        document did not change. Otherwise, the document is written to a temporary file which then replaces the
+        original one. In both cases, the document is then reloaded from the saved file.
+
+        Args:
+            path (pathlib.Path): the path to the output file. If None, the document is saved to its own file.
+
+        Returns:
+            int: the number of bytes written
+        """
+
+        if path is not None and pathlib.Path(path).resolve() != self._path.resolve():
+            with open(str(path),'wb') as fout:
+                self._writeRange(fout,0,self._size)
+            return self._size
+
+        modifiedRange = self.modifiedRange()
+        if modifiedRange is None:
+            return 0
+
+        first, last = modifiedRange
+        if self._size == self._originalSize and last - first <= MAXIMUM_IN_PLACE_SIZE:
+            # The data are read before writing as they may come from the region of the file being overwritten
+            data = self.read(first,last - first)
+            with open(str(self._path),'r+b') as fout:
+                fout.seek(first)
+                fout.write(data)
+            written = len(data)
+        else:
+            tempPath = self._path.with_name('.{}.passhfiles'.format(self._path.name))
+            with open(str(tempPath),'wb') as fout:
+                self._writeRange(fout,0,self._size)
+            os.chmod(str(tempPath),os.stat(str(self._path)).st_mode & 0o7777)
+            self.close()
+            os.replace(str(tempPath),str(self._path))
+            written = self._size
+
+        self.close()
+        self._open()
+
+        return written
+
+    def size(self):
+        """Returns the size of the document.
+
+        Returns:
+            int: the size in bytes
+        """
+
+        return self._size
@@ -0,0 +1,194 @@
+import abc
+import collections
+import os
+import shlex
+import threading
+
+from passhfiles.utils.Security import readRemoteBytes, runRemoteCmd
+
+class IRangeReader(metaclass=abc.ABCMeta):
+    """Interface for reading byte ranges of a file without loading it entirely.
+
+    The last read pages are cached so that the memory used stays bounded whatever the size of the file.
+    """
+
+    def __init__(self, path, pageSize=256*1024, maxCachedPages=8):
+        """Constructor.
+
+        Args:
+            path (pathlib.PurePath): the path to the file
+            pageSize (int): the size of the pages
+            maxCachedPages (int): the maximum number of pages kept in memory
+        """
+
+        self._path = path
+
+        self._pageSize = pageSize
+
+        self._maxCachedPages = maxCachedPages
+
+        self._pages = collections.OrderedDict()
+
+        self._lock = threading.Lock()
+
+    @abc.abstractmethod
+    def _readRange(self, offset, length):
+        """Read a range of bytes from the file.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+
+        Returns:
+            bytes: the data
+        """
+
+        pass
+
+    def clearCache(self):
+        """Clear the cached pages.
+        """
+
+        with self._lock:
+            self._pages.clear()
+
+    def page(self, index):
+        """Returns a page of the file.
+
+        Args:
+            index (int): the index of the page
+
+        Returns:
+            bytes: the contents of the page
+        """
+
+        with self._lock:
+            if index in self._pages:
+                self._pages.move_to_end(index)
+                return self._pages[index]
+
+        data = self._readRange(index*self._pageSize,self._pageSize)
+
+        with self._lock:
+            self._pages[index] = data
+            while len(self._pages) > self._maxCachedPages:
+                self._pages.popitem(last=False)
+
+        return data
+
+    def pageSize(self):
+        """Returns the size of the pages.
+
+        Returns:
+            int: the size of the pages
+        """
+
+        return self._pageSize
+
+    def path(self):
+        """Returns the path to the file.
+
+        Returns:
+            pathlib.PurePath: the path
+        """
+
+        return self._path
+
+    def read(self, offset, length):
+        """Read a range of bytes from the file bypassing the cache.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+
+        Returns:
+            bytes: the data
+        """
+
+        return self._readRange(offset,length)
+
+    @abc.abstractmethod
+    def size(self):
+        """Returns the current size of the file.
+
+        Returns:
+            int: the size of the file in bytes
+        """
+
+        pass
+
+class LocalRangeReader(IRangeReader):
+    """Implements the IRangeReader interface in case of a local file.
+    """
+
+    def _readRange(self, offset, length):
+        """Read a range of bytes from the file.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+
+        Returns:
+            bytes: the data
+        """
+
+        with open(str(self._path),'rb') as fin:
+            fin.seek(offset)
+            return fin.read(length)
+
+    def size(self):
+        """Returns the current size of the file.
+
+        Returns:
+            int: the size of the file in bytes
+        """
+
+        return os.path.getsize(str(self._path))
+
+class RemoteRangeReader(IRangeReader):
+    """Implements the IRangeReader interface in case of a file stored on a server behind the bastion.
+    """
+
+    def __init__(self, sshSession, serverNode, *args, **kwargs):
+        """Constructor.
+
+        Args:
+            sshSession (paramiko.client.SSHClient): the SSH session
+            serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        """
+
+        super(RemoteRangeReader,self).__init__(*args,**kwargs)
+
+        self._sshSession = sshSession
+
+        self._serverNode = serverNode
+
+    def _readRange(self, offset, length):
+        """Read a range of bytes from the file.
+
+        Only the requested range is sent by the remote server. tail seeks directly to the offset on regular files.
+
+        Args:
+            offset (int): the offset of the range
+            length (int): the length of the range
+
+        Returns:
+            bytes: the data
+        """
+
+        cmd = 'tail -c +{} {} | head -c {}'.format(offset+1,shlex.quote(str(self._path)),length)
+
+        return readRemoteBytes(self._sshSession,self._serverNode,cmd)
+
+    def size(self):
+        """Returns the current size of the file.
+
+        Returns:
+            int: the size of the file in bytes
+        """
+
+        output, error = runRemoteCmd(self._sshSession,self._serverNode,'stat -L -c %s {}'.format(shlex.quote(str(self._path))),idempotent=True)
+        if error:
+            raise IOError(error)
+
+        return int(output)
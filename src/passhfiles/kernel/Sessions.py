@@ -0,0 +1,892 @@
+import logging
+import os
+import pathlib
+import shutil
+import threading
+
+from passhfiles.kernel.HostKeys import HOST_KEYS, TrustOnFirstUsePolicy, hostKeyName, loadHostKeys, pinnedAlgorithms
+from passhfiles.kernel.KeyStore import KEYSTORE
+from passhfiles.kernel.SSHAgent import agentKey
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.Security import runRemoteCmd
+
+# The default interval in seconds between the keepalive messages sent on the idle connections (0 for none)
+DEFAULT_KEEPALIVE = 30
+
+class RootNode:
+    """Implements the root object of the SessionsModel.
+    """
+
+    __slots__ = ('_children',)
+    
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._children = []
+
+    def addChild(self, child):
+        """Add a child.
+        
+        The child must be a SessionNode.
+        """
+        
+        if not isinstance(child,SessionNode):
+            return
+
+        child._parent = self
+        child._row = len(self._children)
+        self._children.append(child)
+
+    def child(self, row):
+        """Return the child for a given row.
+
+        Args:
+            row (int): the row
+
+        Returns:
+            SessionNode: the child
+        """
+
+        if row >= 0 and row < self.childCount():
+            return self._children[row]
+
+    def childCount(self):
+        """Return the number of children of the root node.
+
+        Returns:
+            int: the number of children
+        """
+
+        return len(self._children)
+
+    def childRow(self, child):
+        """Return the row of a child.
+
+        Args:
+            child (SessionNode): the child
+
+        Returns:
+            int: the row or -1 if the node is not a child of this node
+        """
+
+        return _childRow(self._children,child)
+
+    def clear(self):
+        """Clear the root node.
+        """
+
+        for child in self._children:
+            child._row = -1
+        self._children = []
+
+    def columnCount(self):
+        """Returns the number of columns of the root node.
+
+        Returns:
+            int: the number of columns
+        """
+        
+        return 1
+
+    def data(self, column):
+        """Returns the data stored in the node.
+
+        Returns:
+            None: the data
+        """
+        
+        return None
+
+    def parent(self):
+        """Return the parent of the root node.
+
+            None: the parent
+        """
+        
+        return None
+
+    def removeChild(self, child):
+        """Remove a child from the children list.
+
+        Args:
+            SessionNode: the child to be removed
+        """
+
+        _removeChild(self._children,child)
+
+    def row(self):
+        """Returns the row of this node regarding its parent.
+
+        Returns:
+            int: the row
+        """
+
+        return 0
+
+class SessionNode:
+    """Implements a session node of the SessionsModel.
+    """
+
+    __slots__ = ('_children','_childrenByName','_data','_parent','_row','_sshSession')
+    
+    def __init__(self, data, parent):
+        """Constructor.
+
+        Args:
+            data (dict): the session data
+            parent (RootNode): the root node
+        """
+        
+        self._data = data
+
+        self._children = []
+        self._childrenByName = {}
+        self._parent = parent
+        self._row = -1
+        self._sshSession = None
+
+    def addChild(self, child):
+        """Add a child.
+        
+        The child must be a ServerNode.
+        """
+        
+        if not isinstance(child,ServerNode):
+            return
+
+        child._parent = self
+        child._row = len(self._children)
+        self._children.append(child)
+        self._childrenByName[child.name()] = child
+
+    def child(self, row):
+        """Return the child for a given row.
+
+        Args:
+            row (int): the row
+
+        Returns:
+            ServerNode: the child
+        """
+
+        if row >= 0 and row < self.childCount():
+            return self._children[row]
+
+    def childByName(self, name):
+        """Return the child for a given server name.
+
+        Args:
+            name (str): the name of the server
+
+        Returns:
+            ServerNode: the child or None if the session has no server with that name
+        """
+
+        return self._childrenByName.get(name)
+
+    def childCount(self):
+        """Return the number of children of the root node.
+
+        Returns:
+            int: the number of children
+        """
+
+        return len(self._children)
+
+    def childRow(self, child):
+        """Return the row of a child.
+
+        Args:
+            child (ServerNode): the child
+
+        Returns:
+            int: the row or -1 if the node is not a child of this node
+        """
+
+        return _childRow(self._children,child)
+
+    def columnCount(self):
+        """Returns the number of columns of the root node.
+
+        Returns:
+            int: the number of columns
+        """
+
+        return 1
+
+    def data(self, column):
+        """Returns the data stored in the node.
+
+        Returns:
+            dict: the data
+        """
+
+        return self._data
+
+    def insertChildren(self, row, children):
+        """Insert children at a given row.
+
+        The children must be ServerNode.
+
+        Args:
+            row (int): the row of the first child
+            children (list of ServerNode): the children
+        """
+
+        children = [c for c in children if isinstance(c,ServerNode)]
+        for child in children:
+            child._parent = self
+            self._childrenByName[child.name()] = child
+
+        self._children[row:row] = children
+        for i in range(row,len(self._children)):
+            self._children[i]._row = i
+
+    def parent(self):
+        """Return the parent of the session node.
+
+            RootNode: the parent
+        """
+
+        return self._parent
+
+    def removeChild(self, child):
+        """Remove a child from the children list.
+
+        Args:
+            ServerNode: the child to be removed
+        """
+
+        if _removeChild(self._children,child) and self._childrenByName.get(child.name()) is child:
+            del self._childrenByName[child.name()]
+
+    def removeChildren(self, row, count):
+        """Remove contiguous children from the children list.
+
+        Args:
+            row (int): the row of the first child to be removed
+            count (int): the number of children to be removed
+        """
+
+        removed = self._children[row:row+count]
+        del self._children[row:row+count]
+        for child in removed:
+            child._row = -1
+            if self._childrenByName.get(child.name()) is child:
+                del self._childrenByName[child.name()]
+
+        for i in range(row,len(self._children)):
+            self._children[i]._row = i
+
+    def row(self):
+        """Returns the row of this node regarding its parent.
+
+        Returns:
+            int: the row
+        """
+
+        return self._row
+
+    def setData(self, data):
+        """Sets the data for this session node.
+
+        Args:
+            data (dict): the data
+        """
+
+        self._data = data
+
+    def setSSHSession(self, sshSession):
+        """Set the SSH session.
+
+        Args:
+            sshSession (paramiko.client.SSHClient): the SSH session
+        """
+
+        self._sshSession = sshSession
+
+    def sshSession(self):
+        """Returns the SSH session.
+
+        Returns:
+            paramiko.client.SSHClient: the SSH session. None if not connected.
+        """
+
+        return self._sshSession
+
+class ServerNode:
+    """Implements a server node of the SessionsModel.
+    """
+
+    __slots__ = ('_favorites','_name','_parent','_row','_stderrMotd','_stdoutMotd')
+
+    def __init__(self, name, parent):
+        """Constructor.
+
+        Args:
+            name: the name of the server.
+            parent (SessionNode): the parent
+        """
+
+        self._name = name
+
+        self._parent = parent
+
+        self._row = -1
+
+        self._stderrMotd = ''
+
+        self._stdoutMotd = ''
+
+        self._favorites = {'local': [], 'remote': []}
+
+    def addChild(self, child):
+        """Add a child.
+        """
+
+        pass
+
+    def addFavorite(self, fileSystemType, path):
+        """Add a favorite path to the favorites.
+
+        Args:
+            fileSystemType: either 'local' or 'remote'
+            path (pathlib.Path): the path to be added to favorites
+        """
+
+        if not fileSystemType in ('local','remote'):
+            return
+
+        if not path in self._favorites[fileSystemType]:
+            self._favorites[fileSystemType].append(path)
+
+    def child(self, row):
+        """Return the child for a given row.
+
+        Args:
+            row (int): the row
+
+        Returns:
+            None
+        """
+
+        return None
+
+    def childCount(self):
+        """Return the number of children of the root node.
+
+        Returns:
+            int: the number of children
+        """
+
+        return 0
+
+    def columnCount(self):
+        return 1
+
+    def data(self, column):
+        """Returns the data stored in the node.
+
+        Returns:
+            dict: the data
+        """
+
+        return self._favorites
+
+    def host(self):
+        """Return the identifier of the server across the sessions.
+
+        Servers with the same name behind different bastions are different hosts.
+
+        Returns:
+            str: the user, the address and the port of the bastion followed by the name of the server
+        """
+
+        if self._parent is None:
+            return self._name
+
+        sessionData = self._parent.data(0)
+
+        return '{}@{}:{}/{}'.format(sessionData['user'],sessionData['address'],sessionData['port'],self._name)
+
+    def name(self):
+        """Return the name of the server.
+
+        Returns:
+            str: the server's name
+        """
+        
+        return self._name
+
+    def parent(self):
+        """Return the parent of the server node.
+
+            SessionNode: the parent
+        """
+
+        return self._parent
+
+    def removeChild(self, child):
+        """Remove a child from the children list.
+        """
+
+        pass
+
+    def row(self):
+        """Returns the row of this node regarding its parent.
+
+        Returns:
+            int: the row
+        """
+
+        return self._row
+
+    def setStderrMotd(self,stderrMotd):
+        """Set the stderr motd for this server.
+
+        Args:
+            stderrMotd (str): the stderr motd
+        """
+
+        self._stderrMotd = stderrMotd
+
+    def setStdoutMotd(self,stdoutMotd):
+        """Set the stdout motd for this server.
+
+        Args:
+            stdoutMotd (str): the stdout motd
+        """
+
+        self._stdoutMotd = stdoutMotd
+
+    def stderrMotd(self):
+        """Returns the stderr motd for this server.
+
+        Returns:
+            str: the stderr motd
+        """
+
+        return self._stderrMotd
+
+    def stdoutMotd(self):
+        """Returns the stdout motd for this server.
+
+        Returns:
+            str: the stdout motd
+        """
+
+        return self._stdoutMotd
+
+class ReconnectingSession:
+    """This class implements a SSH session to a bastion which reconnects by itself when its connection was lost.
+
+    It wraps the paramiko client of the connection. The connection is checked before each use and is reopened with the
+    key of the session found in the key store or in the SSH agent. A remote command is never run again by the session
+    itself: whether it can be repeated once the connection was lost is up to the caller (see
+    passhfiles.utils.Security.runRemoteCmd). The other methods of the paramiko client are forwarded as is.
+    """
+
+    def __init__(self, sessionData, sshClient, pinHostKeyAlgorithms=True):
+        """Constructor.
+
+        Args:
+            sessionData (dict): the session data
+            sshClient (paramiko.client.SSHClient): the connected client
+            pinHostKeyAlgorithms (bool): whether the host key algorithms are pinned when reconnecting
+        """
+
+        self._sessionData = sessionData
+
+        self._client = sshClient
+
+        self._pinHostKeyAlgorithms = pinHostKeyAlgorithms
+
+        self._closed = False
+
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+
+        return getattr(self._client,name)
+
+    def close(self):
+        """Close the session. It will not reconnect afterwards.
+        """
+
+        self._closed = True
+        self._client.close()
+
+    def _ensureAlive(self):
+        """Reconnect if the connection was lost.
+
+        Raises:
+            IOError: if the session was closed
+        """
+
+        if self._closed:
+            raise IOError('The session to {} is closed'.format(self._sessionData['address']))
+
+        if not self.isAlive():
+            self.reconnect()
+
+    def exec_command(self, command, *args, **kwargs):
+        """Run a command on the bastion, reconnecting first if the connection was lost.
+
+        The command is run once. If the connection drops while the command is being started, the error is raised as
+        the command may have been started anyway.
+
+        Args:
+            command (str): the command
+            args: the positional arguments of paramiko.client.SSHClient.exec_command
+            kwargs: the keyword arguments of paramiko.client.SSHClient.exec_command
+
+        Returns:
+            tuple: the stdin, stdout and stderr of the command
+        """
+
+        self._ensureAlive()
+
+        return self._client.exec_command(command,*args,**kwargs)
+
+    def get_transport(self):
+        """Returns the transport of the connection, reconnecting first if it was lost.
+
+        Returns:
+            paramiko.Transport: the transport
+        """
+
+        self._ensureAlive()
+
+        return self._client.get_transport()
+
+    def isAlive(self):
+        """Returns whether the connection is up.
+
+        Returns:
+            bool: True if the transport of the connection is active
+        """
+
+        transport = self._client.get_transport()
+
+        return transport is not None and transport.is_active()
+
+    def reconnect(self):
+        """Reopen the connection if it was lost.
+
+        Raises:
+            IOError: if the key of the session is not available anymore
+        """
+
+        with self._lock:
+            # Another thread may have reconnected in the meantime
+            if self.isAlive():
+                return
+
+            client = _openClient(self._sessionData,sessionKey(self._sessionData),self._pinHostKeyAlgorithms)
+            self._client.close()
+            self._client = client
+
+        logging.info('Reconnected to {}'.format(self._sessionData['address']))
+
+def _childRow(children, child):
+    """Returns the row of a node in a list of children.
+
+    The row is the one stored in the node, which is checked against the list.
+
+    Args:
+        children (list): the children
+        child (SessionNode|ServerNode): the node
+
+    Returns:
+        int: the row or -1 if the node is not in the list
+    """
+
+    row = child._row
+
+    return row if 0 <= row < len(children) and children[row] is child else -1
+
+def connectSession(sessionData, key=None, pinHostKeyAlgorithms=True):
+    """Open the SSH session to the bastion of a session.
+
+    The key of the bastion is checked against the host key store. The key of a bastion connected to for the first
+    time is added to the store. The returned session reconnects by itself when its connection was lost.
+
+    Args:
+        sessionData (dict): the session data
+        key (paramiko.PKey): the key used for the authentication
+        pinHostKeyAlgorithms (bool): if True and the bastion is known, only the types of its known keys are negotiated
+
+    Returns:
+        ReconnectingSession: the SSH session
+
+    Raises:
+        paramiko.BadHostKeyException: if the key of the bastion changed
+    """
+
+    return ReconnectingSession(sessionData,_openClient(sessionData,key,pinHostKeyAlgorithms),pinHostKeyAlgorithms)
+
+def createSessionNode(sessionData, parent):
+    """Create the node of a session and the nodes of its servers.
+
+    Args:
+        sessionData (dict): the session data
+        parent (RootNode): the root node
+
+    Returns:
+        SessionNode: the session node
+    """
+
+    sessionNode = SessionNode(sessionData, parent)
+    for server in sorted(sessionData.get('servers',[])):
+        serverNode = ServerNode(server,sessionNode)
+        for fsType, files in sessionData['servers'][server].items():
+            for f in files:
+                serverNode.addFavorite(fsType,f)
+        sessionNode.addChild(serverNode)
+
+    return sessionNode
+
+def dumpSessions(sessionsFile, sessions):
+    """Write the data of some sessions to a sessions file.
+
+    The data are written next to the file which is then atomically replaced by a rename, so that the file is never
+    left half written.
+
+    Args:
+        sessionsFile (pathlib.Path): the YAML file where to store the sessions
+        sessions (list of dict): the data of each session as returned by sessionsData
+    """
+
+    import yaml
+
+    savedFile = sessionsFile.parent.joinpath('.{}.passhfiles'.format(sessionsFile.name))
+    with open(str(savedFile),'w') as fout:
+        yaml.dump(sessions,fout,Dumper=getattr(yaml,'CSafeDumper',yaml.SafeDumper),default_flow_style=False,sort_keys=False)
+        fout.flush()
+        os.fsync(fout.fileno())
+
+    os.replace(str(savedFile),str(sessionsFile))
+
+def _legacySessionsLoader():
+    """Returns the YAML loader of the sessions files written by the former versions.
+
+    Only the python objects those files contain (the ordered dictionaries of the servers and the paths) are
+    constructed, as plain types.
+
+    Returns:
+        type: the loader
+    """
+
+    import yaml
+
+    class LegacySessionsLoader(yaml.SafeLoader):
+        pass
+
+    def constructPath(loader, node):
+        return str(pathlib.PurePath(*loader.construct_sequence(node)))
+
+    def constructOrderedDict(loader, node):
+        items = loader.construct_sequence(node,deep=True)
+        return dict((k,v) for k, v in items[0]) if items else {}
+
+    for pathClass in ('Path','PosixPath','WindowsPath','PurePath','PurePosixPath','PureWindowsPath'):
+        LegacySessionsLoader.add_constructor('tag:yaml.org,2002:python/object/apply:pathlib.{}'.format(pathClass),constructPath)
+    LegacySessionsLoader.add_constructor('tag:yaml.org,2002:python/object/apply:collections.OrderedDict',constructOrderedDict)
+
+    return LegacySessionsLoader
+
+def _openClient(sessionData, key, pinHostKeyAlgorithms):
+    """Open a SSH client to the bastion of a session.
+
+    Args:
+        sessionData (dict): the session data
+        key (paramiko.PKey): the key used for the authentication
+        pinHostKeyAlgorithms (bool): if True and the bastion is known, only the types of its known keys are negotiated
+
+    Returns:
+        paramiko.client.SSHClient: the SSH client
+    """
+
+    # Deferred to the first connection (see checkAndGetSSHKey)
+    import paramiko
+
+    hostname = hostKeyName(sessionData['address'],sessionData['port'])
+    knownKeys = HOST_KEYS.lookup(hostname)
+
+    sshSession = paramiko.SSHClient()
+    loadHostKeys(sshSession,hostname,knownKeys)
+    sshSession.set_missing_host_key_policy(TrustOnFirstUsePolicy(HOST_KEYS))
+
+    disabledAlgorithms = None
+    if pinHostKeyAlgorithms and knownKeys:
+        disabledAlgorithms = {'keys' : pinnedAlgorithms(knownKeys,paramiko.Transport._preferred_keys)}
+
+    with TRACER.span('connect','ssh',address=sessionData['address']):
+        sshSession.connect(sessionData['address'], username=sessionData['user'], pkey=key, port=sessionData['port'], compress=(sessionData.get('compression') == 'zlib'), disabled_algorithms=disabledAlgorithms)
+
+    # Some traffic is sent on idle connections so that they are not dropped by the firewalls
+    keepalive = sessionData.get('keepalive',DEFAULT_KEEPALIVE)
+    if keepalive:
+        sshSession.get_transport().set_keepalive(keepalive)
+
+    return sshSession
+
+def reachServer(sshSession, serverNode):
+    """Reach a server behind the bastion, fetching its message of the day.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (ServerNode): the server
+
+    Returns:
+        str: the directory where the remote commands start (the home directory of the user on the server)
+
+    Raises:
+        IOError: if the server can not be reached
+    """
+
+    # Fetch the result of echo -n remote command for setting the stdout and stderr motd (if any)
+    _, stdout, stderr = sshSession.exec_command('{} echo -n'.format(serverNode.name()))
+    output = stdout.read().decode()
+    error = stderr.read().decode()
+
+    # Case where the host is not reachable
+    if 'No route to host' in error:
+        raise IOError(error)
+
+    serverNode.setStdoutMotd(output)
+    serverNode.setStderrMotd(error)
+
+    # Fetch the result of pwd remote command for starting the remote file system at a default location
+    remoteCurrentDirectory, error = runRemoteCmd(sshSession,serverNode,'pwd',idempotent=True)
+    if error:
+        raise IOError(error)
+
+    return remoteCurrentDirectory
+
+def readSessions(sessionsFile):
+    """Read the sessions stored in a sessions file.
+
+    The sessions files written by the former versions, which store python objects, are read with a loader restricted
+    to those objects and are rewritten in plain YAML (the former file is kept as a .bak file).
+
+    Args:
+        sessionsFile (pathlib.Path): the YAML file containing the sessions
+
+    Returns:
+        list of dict: the data of each session. None if the file could not be read.
+    """
+
+    if not sessionsFile.exists():
+        logging.error('The session file {} does not exist'.format(sessionsFile))
+        return None
+
+    import yaml
+
+    try:
+        with open(str(sessionsFile),'r') as fin:
+            contents = fin.read()
+        try:
+            sessions = yaml.load(contents,Loader=getattr(yaml,'CSafeLoader',yaml.SafeLoader))
+            legacy = False
+        except yaml.constructor.ConstructorError:
+            sessions = yaml.load(contents,Loader=_legacySessionsLoader())
+            legacy = True
+    except Exception as e:
+        logging.error(str(e))
+        return None
+
+    sessions = sessions or []
+
+    if legacy:
+        try:
+            shutil.copyfile(str(sessionsFile),'{}.bak'.format(sessionsFile))
+            dumpSessions(sessionsFile,sessions)
+        except Exception as e:
+            logging.error(str(e))
+        else:
+            logging.info('The sessions file {} was migrated to plain YAML'.format(sessionsFile))
+
+    for session in sessions:
+        if session.get('key'):
+            session['key'] = pathlib.Path(session['key'])
+        for favorites in session.get('servers',{}).values():
+            favorites['local'] = [pathlib.Path(f) for f in favorites.get('local',[])]
+            favorites['remote'] = [pathlib.PurePosixPath(f) for f in favorites.get('remote',[])]
+
+    return sessions
+
+def _removeChild(children, child):
+    """Remove a node from a list of children.
+
+    The rows of the following children are shifted, so that the row stored in each node stays valid.
+
+    Args:
+        children (list): the children
+        child (SessionNode|ServerNode): the node
+
+    Returns:
+        bool: True if the node was in the list
+    """
+
+    row = _childRow(children,child)
+    if row < 0:
+        return False
+
+    del children[row]
+    for i in range(row,len(children)):
+        children[i]._row = i
+    child._row = -1
+
+    return True
+
+def sessionKey(sessionData):
+    """Returns the key of a session which was already unlocked or which is held by the SSH agent.
+
+    Args:
+        sessionData (dict): the session data
+
+    Returns:
+        paramiko.PKey: the key. None if the session has no key.
+
+    Raises:
+        IOError: if the key is neither in the key store nor in the SSH agent
+    """
+
+    keyfile = sessionData.get('key')
+    if keyfile is None:
+        return None
+
+    if KEYSTORE.hasKey(keyfile):
+        return KEYSTORE.getKey(keyfile)
+
+    key = agentKey(keyfile)
+    if key is None:
+        raise IOError('The {} key is not unlocked anymore, please reconnect the session'.format(keyfile))
+
+    return key
+
+def sessionsData(rootNode):
+    """Returns a copy of the data of the sessions and of their servers as plain YAML types.
+
+    Args:
+        rootNode (RootNode): the root node of the sessions
+
+    Returns:
+        list of dict: the data of each session
+    """
+
+    sessions = []
+    for i in range(rootNode.childCount()):
+        sessionNode = rootNode.child(i)
+        data = dict(sessionNode.data(0))
+        if data.get('key') is not None:
+            data['key'] = str(data['key'])
+        data['servers'] = {}
+        for j in range(sessionNode.childCount()):
+            serverNode = sessionNode.child(j)
+            data['servers'][serverNode.name()] = {k : [str(f) for f in v] for k, v in serverNode.data(0).items()}
+        sessions.append(data)
+
+    return sessions
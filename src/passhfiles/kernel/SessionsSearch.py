@@ -0,0 +1,120 @@
+def fuzzyMatch(pattern, text):
+    """Returns whether the characters of a pattern appear in a text in the same order, not necessarily contiguously.
+
+    Args:
+        pattern (str): the pattern
+        text (str): the text
+
+    Returns:
+        bool: True if the text matches the pattern
+    """
+
+    chars = iter(text)
+
+    return all(c in chars for c in pattern)
+
+def searchKey(text):
+    """Returns the normalized form of a text used for searching: case folded and without whitespaces.
+
+    Args:
+        text (str): the text
+
+    Returns:
+        str: the normalized text
+    """
+
+    return ''.join(text.casefold().split())
+
+class SessionsIndex:
+    """This class implements a search index of the sessions and of their servers.
+
+    The normalized names of the nodes are computed once when the index is built. A session is found when its name or
+    the name of one of its servers matches the pattern, all its servers being found in the former case. When the
+    pattern extends the previous one, as when typing, only the matches of the previous pattern are searched again.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._entries = None
+
+        self._lastPattern = None
+
+        self._lastMatches = None
+
+    def build(self, rootNode):
+        """Index the sessions of a root node.
+
+        Args:
+            rootNode (passhfiles.kernel.Sessions.RootNode): the root node
+        """
+
+        self._entries = []
+        for i in range(rootNode.childCount()):
+            sessionNode = rootNode.child(i)
+            servers = []
+            for j in range(sessionNode.childCount()):
+                serverNode = sessionNode.child(j)
+                servers.append((serverNode,searchKey(serverNode.name())))
+            self._entries.append((sessionNode,searchKey(sessionNode.data(0)['name']),servers))
+
+        self._lastPattern = None
+        self._lastMatches = None
+
+    def invalidate(self):
+        """Drop the index. It will be built again on the next search.
+        """
+
+        self._entries = None
+        self._lastPattern = None
+        self._lastMatches = None
+
+    def isValid(self):
+        """Returns whether the index was built since it was last invalidated.
+
+        Returns:
+            bool: True if the index is up to date
+        """
+
+        return self._entries is not None
+
+    def search(self, pattern):
+        """Search the sessions and the servers matching a pattern.
+
+        The index must have been built.
+
+        Args:
+            pattern (str): the pattern
+
+        Returns:
+            set: the matching session and server nodes. A session is also part of the set when one of its servers is.
+        """
+
+        pattern = searchKey(pattern)
+
+        if self._lastPattern is not None and pattern.startswith(self._lastPattern):
+            # A text matching the new pattern matches the previous one, so only the previous matches are searched
+            candidates = [(s,key if matched else None,servers) for s, key, matched, servers in self._lastMatches]
+        else:
+            candidates = [(s,key,servers) for s, key, servers in self._entries]
+
+        matches = []
+        for sessionNode, key, servers in candidates:
+            sessionMatched = key is not None and fuzzyMatch(pattern,key)
+            matchedServers = [(n,k) for n, k in servers if fuzzyMatch(pattern,k)]
+            if sessionMatched or matchedServers:
+                matches.append((sessionNode,key,sessionMatched,matchedServers))
+
+        self._lastPattern = pattern
+        self._lastMatches = matches
+
+        found = set()
+        for sessionNode, _, sessionMatched, matchedServers in matches:
+            found.add(sessionNode)
+            if sessionMatched:
+                found.update(sessionNode.child(j) for j in range(sessionNode.childCount()))
+            else:
+                found.update(n for n, _ in matchedServers)
+
+        return found
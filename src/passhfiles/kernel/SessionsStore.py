@@ -0,0 +1,103 @@
+import logging
+import threading
+import time
+
+from passhfiles.kernel.Sessions import dumpSessions
+from passhfiles.kernel.Singleton import SingletonMeta
+
+# The delay in seconds during which the changes of the sessions are gathered before being written
+DEFAULT_DELAY = 0.5
+
+class SessionsStore(metaclass=SingletonMeta):
+    """This class implements a write-behind store of the sessions file.
+
+    The sessions are written by a background thread. The changes requested within a short delay are coalesced, only
+    the most recent data of the sessions being written, and each write atomically replaces the file.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._delay = DEFAULT_DELAY
+
+        self._pending = None
+
+        self._due = 0.0
+
+        self._writing = False
+
+        self._condition = threading.Condition()
+
+        self._thread = None
+
+    def flush(self, timeout=None):
+        """Write the pending changes right now and wait for them to be written.
+
+        Args:
+            timeout (float): the maximum time to wait in seconds. If None, wait until the changes are written.
+
+        Returns:
+            bool: True if all the changes were written
+        """
+
+        with self._condition:
+            self._due = 0.0
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda : self._pending is None and not self._writing,timeout)
+
+    def _run(self):
+        """Write the sessions whenever some changes are due.
+        """
+
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda : self._pending is not None)
+                while True:
+                    remaining = self._due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                sessionsFile, sessions = self._pending
+                self._pending = None
+                self._writing = True
+
+            try:
+                dumpSessions(sessionsFile,sessions)
+            except Exception as e:
+                logging.error(str(e))
+            else:
+                logging.info('Sessions successfully saved to {}'.format(sessionsFile))
+            finally:
+                with self._condition:
+                    self._writing = False
+                    self._condition.notify_all()
+
+    def save(self, sessionsFile, sessions):
+        """Request the writing of the sessions.
+
+        Args:
+            sessionsFile (pathlib.Path): the YAML file where to store the sessions
+            sessions (list of dict): the data of each session as returned by passhfiles.kernel.Sessions.sessionsData
+        """
+
+        with self._condition:
+            self._pending = (sessionsFile,sessions)
+            self._due = time.monotonic() + self._delay
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,name='SessionsStore',daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def setDelay(self, delay):
+        """Set the delay during which the changes are gathered before being written.
+
+        Args:
+            delay (float): the delay in seconds
+        """
+
+        with self._condition:
+            self._delay = delay
+
+# Create an instance of the sessions store (singleton)
+SESSIONS_STORE = SessionsStore()
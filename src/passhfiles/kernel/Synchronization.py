@@ -0,0 +1,485 @@
+import concurrent.futures
+import hashlib
+import logging
+import mmap
+import os
+import pathlib
+import shlex
+import shutil
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+from passhfiles.kernel.Cancellation import JobCancelledError
+from passhfiles.kernel.Transfers import download, upload
+from passhfiles.utils.Numbers import sizeOf
+from passhfiles.utils.Security import runRemoteCmd
+
+# The maximum number of files whose checksums are computed in a single remote command
+CHECKSUMS_BATCH_SIZE = 500
+
+# The remote commands used for computing the checksums for each supported algorithm
+REMOTE_CHECKSUM_COMMANDS = {'sha256' : 'sha256sum', 'xxh64' : 'xxhsum'}
+
+class SynchronizationReport:
+    """This class implements the summary of a synchronization.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self.nTransferredFiles = 0
+
+        self.nSkippedFiles = 0
+
+        self.transferredBytes = 0
+
+        self.savedBytes = 0
+
+        self.errors = []
+
+        self.cancelled = False
+
+    def __str__(self):
+        """Returns the string representation of the report.
+
+        Returns:
+            str: the report
+        """
+
+        s = '{} file(s) transferred ({}), {} unchanged file(s) skipped ({} saved)'.format(self.nTransferredFiles,
+                                                                                          sizeOf(self.transferredBytes),
+                                                                                          self.nSkippedFiles,
+                                                                                          sizeOf(self.savedBytes))
+        if self.cancelled:
+            s += ' before cancellation'
+
+        return s
+
+def _newHash(algorithm):
+    """Returns a new hash object for a given algorithm.
+
+    Args:
+        algorithm (str): 'sha256' or 'xxh64'
+
+    Returns:
+        hash object: the hash object
+    """
+
+    if algorithm == 'xxh64':
+        return xxhash.xxh64()
+    else:
+        return hashlib.sha256()
+
+def localChecksum(path, algorithm='sha256'):
+    """Compute the checksum of a local file.
+
+    The file is memory-mapped so that it is hashed without being copied in memory.
+
+    Args:
+        path (pathlib.Path): the path to the file
+        algorithm (str): 'sha256' or 'xxh64'
+
+    Returns:
+        str: the hexadecimal checksum
+    """
+
+    h = _newHash(algorithm)
+    with open(str(path),'rb') as fin:
+        if os.fstat(fin.fileno()).st_size > 0:
+            with mmap.mmap(fin.fileno(),0,access=mmap.ACCESS_READ) as m:
+                h.update(m)
+
+    return h.hexdigest()
+
+def localChecksums(root, relativePaths, algorithm='sha256', maxWorkers=None):
+    """Compute in parallel the checksums of a set of local files.
+
+    Args:
+        root (pathlib.Path): the root path of the files
+        relativePaths (list of str): the paths of the files relative to the root path
+        algorithm (str): 'sha256' or 'xxh64'
+        maxWorkers (int): the maximum number of files hashed in parallel
+
+    Returns:
+        dict: the checksums of the files keyed by their relative path
+    """
+
+    checksums = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        futures = {executor.submit(localChecksum,root.joinpath(p),algorithm) : p for p in relativePaths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                checksums[futures[future]] = future.result()
+            except OSError as e:
+                logging.error(str(e))
+
+    return checksums
+
+def localFilesInfo(root):
+    """Returns the size and the modification time of the files stored under a local path.
+
+    Args:
+        root (pathlib.Path): the path. Can be a file or a directory.
+
+    Returns:
+        dict: the size and the modification time of the files keyed by their path relative to the root path.
+        Empty if the path does not exist.
+    """
+
+    root = pathlib.Path(root)
+
+    if root.is_file():
+        st = root.stat()
+        return {'' : (st.st_size,st.st_mtime)}
+
+    info = {}
+    directories = [root]
+    while directories:
+        current = directories.pop()
+        try:
+            with os.scandir(str(current)) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        directories.append(pathlib.Path(entry.path))
+                    elif entry.is_file():
+                        st = entry.stat()
+                        info[pathlib.Path(entry.path).relative_to(root).as_posix()] = (st.st_size,st.st_mtime)
+        except OSError:
+            continue
+
+    return info
+
+def remoteChecksums(sshSession, serverNode, root, relativePaths, algorithm='sha256', token=None):
+    """Compute the checksums of a set of remote files.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        root (pathlib.PurePosixPath): the root path of the files
+        relativePaths (list of str): the paths of the files relative to the root path
+        algorithm (str): 'sha256' or 'xxh64'
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the commands are aborted when the token
+        is cancelled
+
+    Returns:
+        dict: the checksums of the files keyed by their relative path
+    """
+
+    relativePaths = list(relativePaths)
+
+    checksums = {}
+    for i in range(0,len(relativePaths),CHECKSUMS_BATCH_SIZE):
+        batch = {str(root.joinpath(p)) : p for p in relativePaths[i:i+CHECKSUMS_BATCH_SIZE]}
+        cmd = '{} -- {}'.format(REMOTE_CHECKSUM_COMMANDS[algorithm],' '.join([shlex.quote(p) for p in batch]))
+        output, error = runRemoteCmd(sshSession,serverNode,cmd,token)
+        if error:
+            logging.error(error)
+        for line in output.splitlines():
+            words = line.split(maxsplit=1)
+            if len(words) != 2:
+                continue
+            path = words[1][1:] if words[1].startswith('*') else words[1]
+            if path in batch:
+                checksums[batch[path]] = words[0]
+
+    return checksums
+
+def remoteFilesInfo(sshSession, serverNode, root, token=None):
+    """Returns the size and the modification time of the files stored under a remote path.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        root (pathlib.PurePosixPath): the path. Can be a file or a directory.
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the command is aborted when the token is
+        cancelled
+
+    Returns:
+        dict: the size and the modification time of the files keyed by their path relative to the root path.
+        Empty if the path does not exist.
+    """
+
+    # The relative path is output last as it is empty when the root path is a file
+    output, _ = runRemoteCmd(sshSession,serverNode,"find {} -type f -printf '%s\\t%T@\\t%P\\n'".format(shlex.quote(str(root))),token,idempotent=True)
+
+    info = {}
+    for line in output.splitlines():
+        words = line.split('\t',2)
+        if len(words) < 2:
+            continue
+        try:
+            info[words[2] if len(words) == 3 else ''] = (int(words[0]),float(words[1]))
+        except ValueError:
+            continue
+
+    return info
+
+def remoteChecksumAlgorithm(sshSession, serverNode):
+    """Returns the fastest checksum algorithm available both locally and on a remote server.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+
+    Returns:
+        str: 'xxh64' or 'sha256'
+    """
+
+    if xxhash is None:
+        return 'sha256'
+
+    output, _ = runRemoteCmd(sshSession,serverNode,'command -v xxhsum')
+
+    return 'xxh64' if output else 'sha256'
+
+def filesToTransfer(sourceInfo, targetInfo, sourceChecksums=None, targetChecksums=None):
+    """Returns the files of the source which differ from the target.
+
+    Files with different sizes are always considered as different. Files with the same size are compared through
+    their checksums if provided or through their modification times otherwise.
+
+    Args:
+        sourceInfo (dict): the size and modification time of the source files keyed by their relative paths
+        targetInfo (dict): the size and modification time of the target files keyed by their relative paths
+        sourceChecksums (dict): the checksums of the source files keyed by their relative paths
+        targetChecksums (dict): the checksums of the target files keyed by their relative paths
+
+    Returns:
+        list of str: the relative paths of the files to transfer
+    """
+
+    files = []
+    for path, (size, mtime) in sourceInfo.items():
+        if path not in targetInfo:
+            files.append(path)
+            continue
+
+        targetSize, targetMtime = targetInfo[path]
+        if size != targetSize:
+            files.append(path)
+        elif sourceChecksums is not None and targetChecksums is not None:
+            if sourceChecksums.get(path) is None or sourceChecksums.get(path) != targetChecksums.get(path):
+                files.append(path)
+        # The scp protocol only preserves the modification times with a precision of one second
+        elif abs(mtime - targetMtime) >= 1.0:
+            files.append(path)
+
+    return files
+
+def _sameSizeFiles(sourceInfo, targetInfo):
+    """Returns the files which exist in both the source and the target with the same size.
+
+    Args:
+        sourceInfo (dict): the size and modification time of the source files keyed by their relative paths
+        targetInfo (dict): the size and modification time of the target files keyed by their relative paths
+
+    Returns:
+        list of str: the relative paths of the files
+    """
+
+    return [p for p, (size, _) in sourceInfo.items() if p in targetInfo and targetInfo[p][0] == size]
+
+def _transferFiles(files, transfer, sourceInfo, report, token=None, maxWorkers=1, progress=None):
+    """Transfer the files which differ, possibly several at once, and fill the report.
+
+    Args:
+        files (list of str): the relative paths of the files to transfer
+        transfer (callable): called with the relative path of a file for transferring it
+        sourceInfo (dict): the size and the modification time of the source files keyed by their relative path
+        report (SynchronizationReport): the report
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the files not started yet are skipped
+        once the token is cancelled
+        maxWorkers (int): the maximum number of files transferred simultaneously through the session
+        progress (callable): if not None, called with the relative path and the size of each transferred file
+    """
+
+    def transferFile(path):
+        if token is not None:
+            token.raiseIfCancelled()
+        transfer(path)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(maxWorkers,1)) as executor:
+        futures = [(path,executor.submit(transferFile,path)) for path in files]
+        for path, future in futures:
+            try:
+                future.result()
+            except JobCancelledError:
+                report.cancelled = True
+            except Exception as e:
+                report.errors.append(str(e))
+            else:
+                report.nTransferredFiles += 1
+                report.transferredBytes += sourceInfo[path][0]
+                if progress is not None:
+                    progress(path,sourceInfo[path][0])
+
+def _report(sourceInfo, files):
+    """Initializes the report of a synchronization.
+
+    Args:
+        sourceInfo (dict): the size and modification time of the source files keyed by their relative paths
+        files (list of str): the relative paths of the files to transfer
+
+    Returns:
+        SynchronizationReport: the report
+    """
+
+    report = SynchronizationReport()
+    files = set(files)
+    for path, (size, _) in sourceInfo.items():
+        if path not in files:
+            report.nSkippedFiles += 1
+            report.savedBytes += size
+
+    return report
+
+def synchronizeFromRemote(sshSession, serverNode, remoteRoot, localRoot, checksum=False, token=None, maxWorkers=1, progress=None):
+    """Synchronize a local path with a remote one by downloading only the files which differ.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        remoteRoot (pathlib.PurePosixPath): the remote source. Can be a file or a directory.
+        localRoot (pathlib.Path): the local target
+        checksum (bool): if True, the files with the same size are compared through their checksums
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the synchronization stops once the token
+        is cancelled. The file being transferred is then removed if it did not exist before.
+        maxWorkers (int): the maximum number of files downloaded simultaneously
+        progress (callable): if not None, called with the relative path and the size of each downloaded file
+
+    Returns:
+        SynchronizationReport: the report. Flagged as cancelled if the synchronization was cancelled while transferring
+        the files.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled before the files to transfer were
+        known
+    """
+
+    sourceInfo = remoteFilesInfo(sshSession,serverNode,remoteRoot,token)
+    targetInfo = localFilesInfo(localRoot) if os.path.exists(str(localRoot)) else {}
+
+    sourceChecksums = targetChecksums = None
+    if checksum:
+        algorithm = remoteChecksumAlgorithm(sshSession,serverNode)
+        candidates = _sameSizeFiles(sourceInfo,targetInfo)
+        sourceChecksums = remoteChecksums(sshSession,serverNode,remoteRoot,candidates,algorithm,token)
+        targetChecksums = localChecksums(localRoot,candidates,algorithm)
+
+    files = filesToTransfer(sourceInfo,targetInfo,sourceChecksums,targetChecksums)
+
+    report = _report(sourceInfo,files)
+
+    def transfer(path):
+        target = localRoot.joinpath(path)
+        target.parent.mkdir(parents=True,exist_ok=True)
+        download(sshSession,serverNode,remoteRoot.joinpath(path),target,recursive=False,preserveTimes=True,
+                 token=token,removeOnCancel=path not in targetInfo)
+
+    _transferFiles(files,transfer,sourceInfo,report,token,maxWorkers,progress)
+
+    return report
+
+def synchronizeLocal(sourceRoot, targetRoot, checksum=False, token=None):
+    """Synchronize a local path with another local one by copying only the files which differ.
+
+    Args:
+        sourceRoot (pathlib.Path): the source. Can be a file or a directory.
+        targetRoot (pathlib.Path): the target
+        checksum (bool): if True, the files with the same size are compared through their checksums
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the synchronization stops once the token
+        is cancelled. The file being transferred is then removed if it did not exist before.
+
+    Returns:
+        SynchronizationReport: the report. Flagged as cancelled if the synchronization was cancelled while transferring
+        the files.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled before the files to transfer were
+        known
+    """
+
+    sourceInfo = localFilesInfo(sourceRoot)
+    targetInfo = localFilesInfo(targetRoot) if os.path.exists(str(targetRoot)) else {}
+
+    sourceChecksums = targetChecksums = None
+    if checksum:
+        algorithm = 'xxh64' if xxhash is not None else 'sha256'
+        candidates = _sameSizeFiles(sourceInfo,targetInfo)
+        sourceChecksums = localChecksums(sourceRoot,candidates,algorithm)
+        targetChecksums = localChecksums(targetRoot,candidates,algorithm)
+
+    files = filesToTransfer(sourceInfo,targetInfo,sourceChecksums,targetChecksums)
+
+    report = _report(sourceInfo,files)
+    for path in files:
+        if token is not None and token.isCancelled():
+            report.cancelled = True
+            break
+        target = targetRoot.joinpath(path)
+        try:
+            target.parent.mkdir(parents=True,exist_ok=True)
+            shutil.copy2(str(sourceRoot.joinpath(path)),str(target))
+        except Exception as e:
+            report.errors.append(str(e))
+        else:
+            report.nTransferredFiles += 1
+            report.transferredBytes += sourceInfo[path][0]
+
+    return report
+
+def synchronizeToRemote(sshSession, serverNode, localRoot, remoteRoot, checksum=False, token=None, maxWorkers=1, progress=None):
+    """Synchronize a remote path with a local one by uploading only the files which differ.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        localRoot (pathlib.Path): the local source. Can be a file or a directory.
+        remoteRoot (pathlib.PurePosixPath): the remote target
+        checksum (bool): if True, the files with the same size are compared through their checksums
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the synchronization stops once the token
+        is cancelled. The file being transferred is then removed if it did not exist before.
+        maxWorkers (int): the maximum number of files uploaded simultaneously
+        progress (callable): if not None, called with the relative path and the size of each uploaded file
+
+    Returns:
+        SynchronizationReport: the report. Flagged as cancelled if the synchronization was cancelled while transferring
+        the files.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled before the files to transfer were
+        known
+    """
+
+    sourceInfo = localFilesInfo(localRoot)
+    targetInfo = remoteFilesInfo(sshSession,serverNode,remoteRoot,token)
+
+    sourceChecksums = targetChecksums = None
+    if checksum:
+        algorithm = remoteChecksumAlgorithm(sshSession,serverNode)
+        candidates = _sameSizeFiles(sourceInfo,targetInfo)
+        sourceChecksums = localChecksums(localRoot,candidates,algorithm)
+        targetChecksums = remoteChecksums(sshSession,serverNode,remoteRoot,candidates,algorithm,token)
+
+    files = filesToTransfer(sourceInfo,targetInfo,sourceChecksums,targetChecksums)
+
+    report = _report(sourceInfo,files)
+
+    # Create all the missing remote directories in a single command
+    directories = sorted(set([str(remoteRoot.joinpath(p).parent) for p in files if p]))
+    if directories:
+        _, error = runRemoteCmd(sshSession,serverNode,'mkdir -p {}'.format(' '.join([shlex.quote(d) for d in directories])),token)
+        if error:
+            report.errors.append(error)
+
+    def transfer(path):
+        upload(sshSession,serverNode,localRoot.joinpath(path),remoteRoot.joinpath(path),recursive=False,preserveTimes=True,
+               token=token,removeOnCancel=path not in targetInfo)
+
+    _transferFiles(files,transfer,sourceInfo,report,token,maxWorkers,progress)
+
+    return report
@@ -0,0 +1,209 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+from passhfiles.kernel.Singleton import SingletonMeta
+
+class Span:
+    """This class stores a timed operation (e.g. a remote command, the parsing of a listing, a transfer ...).
+    """
+
+    __slots__ = ('name','category','start','duration','threadId','threadName','args')
+
+    def __init__(self, name, category, start, duration, threadId, threadName, args):
+        """Constructor.
+
+        Args:
+            name (str): the name of the operation
+            category (str): the category of the operation (e.g. 'ssh', 'listing', 'transfer' ...)
+            start (float): the start of the operation in seconds relative to the start of the tracer
+            duration (float): the duration of the operation in seconds
+            threadId (int): the identifier of the thread which ran the operation
+            threadName (str): the name of that thread
+            args (dict): additional information about the operation
+        """
+
+        self.name = name
+
+        self.category = category
+
+        self.start = start
+
+        self.duration = duration
+
+        self.threadId = threadId
+
+        self.threadName = threadName
+
+        self.args = args
+
+    def toChromeEvent(self, pid):
+        """Returns the span as a complete event of the Chrome trace format.
+
+        Args:
+            pid (int): the process identifier of the event
+
+        Returns:
+            dict: the event
+        """
+
+        return {'name' : self.name,
+                'cat' : self.category,
+                'ph' : 'X',
+                'ts' : round(self.start*1.0e6,3),
+                'dur' : round(self.duration*1.0e6,3),
+                'pid' : pid,
+                'tid' : self.threadId,
+                'args' : {k : str(v) for k, v in self.args.items()}}
+
+class Tracer(metaclass=SingletonMeta):
+    """This class implements a tracer which records the duration of the operations in a ring buffer.
+
+    The spans are recorded from any thread. Only the most recent ones are kept so that the tracer can stay enabled
+    with a bounded memory footprint. They can be exported in the Chrome trace format (chrome://tracing, Perfetto) for
+    an offline analysis.
+    """
+
+    # The default number of spans kept in the ring buffer
+    CAPACITY = 10000
+
+    # The maximum length of the string arguments of a span (e.g. a remote command)
+    MAXIMUM_ARGUMENT_LENGTH = 200
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self.enabled = True
+
+        self._spans = collections.deque(maxlen=Tracer.CAPACITY)
+
+        self._origin = time.perf_counter()
+
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Remove all the recorded spans.
+        """
+
+        with self._lock:
+            self._spans.clear()
+
+    def exportChromeTrace(self, path):
+        """Export the recorded spans in the Chrome trace format.
+
+        Args:
+            path (str): the path to the output JSON file
+        """
+
+        pid = os.getpid()
+
+        spans = self.spans()
+
+        events = []
+        threadNames = {}
+        for span in spans:
+            threadNames[span.threadId] = span.threadName
+            events.append(span.toChromeEvent(pid))
+
+        for threadId, threadName in threadNames.items():
+            events.append({'name' : 'thread_name', 'ph' : 'M', 'pid' : pid, 'tid' : threadId, 'args' : {'name' : threadName}})
+
+        with open(str(path),'w') as fout:
+            json.dump({'traceEvents' : events, 'displayTimeUnit' : 'ms'},fout)
+
+    def record(self, name, category, start, duration, args=None):
+        """Record a span.
+
+        Args:
+            name (str): the name of the operation
+            category (str): the category of the operation
+            start (float): the start of the operation as returned by time.perf_counter
+            duration (float): the duration of the operation in seconds
+            args (dict): additional information about the operation
+        """
+
+        if not self.enabled:
+            return
+
+        args = {k : (v[:Tracer.MAXIMUM_ARGUMENT_LENGTH] if isinstance(v,str) else v) for k, v in (args or {}).items()}
+
+        thread = threading.current_thread()
+        span = Span(name,category,start - self._origin,duration,thread.ident,thread.name,args)
+
+        with self._lock:
+            self._spans.append(span)
+
+    def setCapacity(self, capacity):
+        """Change the number of spans kept in the ring buffer. The most recent spans are kept.
+
+        Args:
+            capacity (int): the capacity
+        """
+
+        with self._lock:
+            self._spans = collections.deque(self._spans,maxlen=capacity)
+
+    @contextlib.contextmanager
+    def span(self, name, category='', **args):
+        """Time a block of code and record it as a span.
+
+        The block receives the arguments of the span as a dictionary which it can complete with information only known
+        once it ran (e.g. the number of bytes transferred). If the block raises, the error is added to the arguments.
+
+        Args:
+            name (str): the name of the operation
+            category (str): the category of the operation
+            args: additional information about the operation
+
+        Yields:
+            dict: the arguments of the span
+        """
+
+        if not self.enabled:
+            yield args
+            return
+
+        start = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = str(e) or type(e).__name__
+            raise
+        finally:
+            self.record(name,category,start,time.perf_counter() - start,args)
+
+    def spans(self):
+        """Returns the recorded spans.
+
+        Returns:
+            list of passhfiles.kernel.Tracing.Span: the spans from the oldest to the most recent one
+        """
+
+        with self._lock:
+            return list(self._spans)
+
+    def summary(self):
+        """Returns the statistics of the recorded spans per operation.
+
+        Returns:
+            list of tuple: the name, the category, the number of calls, the total, mean and maximum durations in seconds
+            of each operation sorted by decreasing total duration
+        """
+
+        stats = collections.OrderedDict()
+        for span in self.spans():
+            key = (span.name,span.category)
+            count, total, maximum = stats.get(key,(0,0.0,0.0))
+            stats[key] = (count + 1,total + span.duration,max(maximum,span.duration))
+
+        summary = [(name,category,count,total,total/count,maximum) for (name,category), (count,total,maximum) in stats.items()]
+        summary.sort(key=lambda s : s[3],reverse=True)
+
+        return summary
+
+# Create an instance of the tracer (singleton)
+TRACER = Tracer()
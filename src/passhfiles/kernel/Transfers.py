@@ -0,0 +1,536 @@
+import logging
+import os
+import pathlib
+import shlex
+import shutil
+import tarfile
+import threading
+import time
+
+import scp
+
+from passhfiles.kernel.Cancellation import JobCancelledError, interruptOnCancel
+from passhfiles.kernel.Compression import (REMOTE_COMPRESS_COMMANDS, REMOTE_DECOMPRESS_COMMANDS, SAMPLE_SIZE, TRANSFER_METRICS,
+                                           chooseCodec, compressor, decompressedStream)
+from passhfiles.kernel.DirectorySizes import localDirectorySize
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.Security import runRemoteCmd
+
+# The size of the chunks read from or written to the SSH channels
+CHUNK_SIZE = 256*1024
+
+# Cache of the availability of zstd on the remote servers
+_remoteZstd = {}
+
+_remoteZstdLock = threading.Lock()
+
+class _CompressingWriter:
+    """Implements a file-like object which compresses the data written to it and sends them through a SSH channel.
+    """
+
+    def __init__(self, channelFile, codec):
+        """Constructor.
+
+        Args:
+            channelFile (paramiko.channel.ChannelStdinFile): the channel stdin
+            codec (str): 'gzip' or 'zstd'
+        """
+
+        self._channelFile = channelFile
+
+        self._compressor = compressor(codec)
+
+        self.rawBytes = 0
+
+        self.wireBytes = 0
+
+    def close(self):
+        """Flush the compressor and close the channel for writing.
+        """
+
+        data = self._compressor.flush()
+        self._channelFile.write(data)
+        self.wireBytes += len(data)
+        self._channelFile.channel.shutdown_write()
+
+    def write(self, data):
+        """Write some data.
+
+        Args:
+            data (bytes): the data
+        """
+
+        self.rawBytes += len(data)
+        compressedData = self._compressor.compress(data)
+        if compressedData:
+            self._channelFile.write(compressedData)
+            self.wireBytes += len(compressedData)
+
+        return len(data)
+
+class _CountingReader:
+    """Implements a file-like object which reads the data received through a SSH channel and counts them.
+    """
+
+    def __init__(self, channelFile):
+        """Constructor.
+
+        Args:
+            channelFile (paramiko.channel.ChannelFile): the channel stdout
+        """
+
+        self._channelFile = channelFile
+
+        self.nBytes = 0
+
+    def read(self, size=-1):
+        """Read some data.
+
+        Args:
+            size (int): the number of bytes to read. If negative, read until the end of the stream.
+
+        Returns:
+            bytes: the data
+        """
+
+        data = self._channelFile.read(size)
+        self.nBytes += len(data)
+
+        return data
+
+class _DecompressingReader:
+    """Implements a file-like object which reads and decompresses the data received through a SSH channel.
+
+    Each read only decompresses the requested size, so that highly compressible data are never inflated at once.
+    """
+
+    def __init__(self, channelFile, codec):
+        """Constructor.
+
+        Args:
+            channelFile (paramiko.channel.ChannelFile): the channel stdout
+            codec (str): 'gzip' or 'zstd'
+        """
+
+        self._wire = _CountingReader(channelFile)
+
+        self._stream = decompressedStream(codec,self._wire)
+
+        self.rawBytes = 0
+
+    def read(self, size=-1):
+        """Read some data.
+
+        Args:
+            size (int): the number of bytes to read. If negative, read until the end of the stream.
+
+        Returns:
+            bytes: the data
+        """
+
+        data = self._stream.read(size)
+        self.rawBytes += len(data)
+
+        return data
+
+    @property
+    def wireBytes(self):
+        """Returns the number of compressed bytes received so far.
+
+        Returns:
+            int: the number of bytes
+        """
+
+        return self._wire.nBytes
+
+def _checkExitStatus(serverNode, stdout, stderr):
+    """Raise an error if the remote command of a compressed transfer failed.
+
+    Args:
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        stdout (paramiko.channel.ChannelFile): the stdout of the command
+        stderr (paramiko.channel.ChannelStderrFile): the stderr of the command
+    """
+
+    if stdout.channel.recv_exit_status() != 0:
+        error = stderr.read().decode().replace(serverNode.stderrMotd(),'').strip()
+        raise IOError(error or 'Compressed transfer with {} failed'.format(serverNode.name()))
+
+def _closeSCPChannel(scpClient):
+    """Close the channel of a scp transfer, which aborts it.
+
+    Args:
+        scpClient (scp.SCPClient): the scp client
+    """
+
+    if scpClient.channel is not None:
+        scpClient.channel.close()
+
+def _compressionMode(serverNode):
+    """Returns the compression mode of the session of a server.
+
+    Args:
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+
+    Returns:
+        str: the compression mode
+    """
+
+    return serverNode.parent().data(0).get('compression','none')
+
+def _hasRemoteZstd(sshSession, serverNode):
+    """Returns whether or not zstd is available on a remote server.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+
+    Returns:
+        bool: True if zstd is available
+    """
+
+    with _remoteZstdLock:
+        if serverNode.name() in _remoteZstd:
+            return _remoteZstd[serverNode.name()]
+
+    output, _ = runRemoteCmd(sshSession,serverNode,'command -v zstd')
+
+    with _remoteZstdLock:
+        _remoteZstd[serverNode.name()] = bool(output)
+
+    return bool(output)
+
+def _localSample(localPath):
+    """Returns the first chunk of the first non-empty file stored under a local path.
+
+    Args:
+        localPath (pathlib.Path): the path. Can be a file or a directory.
+
+    Returns:
+        bytes: the sample
+    """
+
+    localPath = pathlib.Path(localPath)
+
+    if localPath.is_file():
+        files = [localPath]
+    else:
+        files = (p for p in localPath.rglob('*') if p.is_file() and p.stat().st_size > 0)
+
+    for f in files:
+        with open(str(f),'rb') as fin:
+            return fin.read(SAMPLE_SIZE)
+
+    return b''
+
+def _localSize(localPath):
+    """Returns the size of a local file or directory.
+
+    Args:
+        localPath (pathlib.Path): the path
+
+    Returns:
+        int: the size in bytes
+    """
+
+    if os.path.isdir(str(localPath)):
+        return localDirectorySize(localPath)
+    else:
+        return os.path.getsize(str(localPath))
+
+def _readLine(channelFile):
+    """Read a line from a binary channel without reading any byte beyond it.
+
+    Args:
+        channelFile (paramiko.channel.ChannelFile): the channel file
+
+    Returns:
+        bytes: the line without its end of line character
+    """
+
+    line = b''
+    while True:
+        c = channelFile.read(1)
+        if not c or c == b'\n':
+            return line
+        line += c
+
+def _remoteSample(sshSession, serverNode, remotePath):
+    """Returns the first chunk of the first non-empty file stored under a remote path.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        remotePath (pathlib.PurePosixPath): the path. Can be a file or a directory.
+
+    Returns:
+        bytes: the sample
+    """
+
+    cmd = 'find {} -type f -size +0 | head -n 1 | xargs -r -d "\\n" head -c {}'.format(shlex.quote(str(remotePath)),SAMPLE_SIZE)
+    _, stdout, _ = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+    sample = stdout.read()
+
+    motd = serverNode.stdoutMotd().encode()
+    if motd and sample.startswith(motd):
+        sample = sample[len(motd):]
+
+    return sample
+
+def _removeLocalPath(path):
+    """Remove a local file or directory, logging the errors.
+
+    Args:
+        path (pathlib.Path): the path
+    """
+
+    try:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(str(path))
+        elif path.exists() or path.is_symlink():
+            path.unlink()
+    except OSError as e:
+        logging.error(str(e))
+
+def _scpClient(sshSession, token):
+    """Returns a scp client whose transfer stops at the next chunk once a token is cancelled.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        token (passhfiles.kernel.Cancellation.CancellationToken): the token. Can be None.
+
+    Returns:
+        scp.SCPClient: the client
+    """
+
+    if token is None:
+        return scp.SCPClient(sshSession.get_transport())
+
+    return scp.SCPClient(sshSession.get_transport(),progress=lambda *args : token.raiseIfCancelled())
+
+def downloadCompressed(sshSession, serverNode, remotePath, localPath, codec, token=None):
+    """Download a file or a directory through a compressed pipe.
+
+    Directories are transferred as a tar archive. The modification times are preserved.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        remotePath (pathlib.PurePosixPath): the path of the file or directory to download
+        localPath (pathlib.Path): the local destination. If it is an existing directory, the data are downloaded into it.
+        codec (str): 'gzip' or 'zstd'
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the channel is closed when the token is
+        cancelled
+
+    Returns:
+        tuple: the number of raw bytes and the number of bytes received through the channel
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled. The data already downloaded are
+        left in place.
+    """
+
+    remotePath = pathlib.PurePosixPath(remotePath)
+
+    localPath = pathlib.Path(localPath)
+    if localPath.is_dir():
+        localPath = localPath.joinpath(remotePath.name)
+
+    compressCmd = REMOTE_COMPRESS_COMMANDS[codec]
+    cmd = 'if [ -d {0} ]; then echo D; tar -cf - -C {1} {2} | {3}; else echo F $(stat -c %Y {0}); {3} < {0}; fi'.format(shlex.quote(str(remotePath)),
+                                                                                                  shlex.quote(str(remotePath.parent)),
+                                                                                                  shlex.quote(remotePath.name),
+                                                                                                  compressCmd)
+    _, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+
+    with interruptOnCancel(token,stdout.channel.close):
+        motd = serverNode.stdoutMotd().encode()
+        if motd:
+            stdout.read(len(motd))
+        header = _readLine(stdout).split()
+        isDirectory = header == [b'D']
+
+        reader = _DecompressingReader(stdout,codec)
+
+        if isDirectory:
+            with tarfile.open(fileobj=reader,mode='r|') as tar:
+                for member in tar:
+                    parts = pathlib.PurePosixPath(member.name).parts
+                    if not parts or member.name.startswith('/') or '..' in parts or member.issym() or member.islnk():
+                        continue
+                    # The top directory of the archive is renamed after the local destination
+                    member.name = str(pathlib.PurePosixPath(localPath.name,*parts[1:]))
+                    tar.extract(member,str(localPath.parent))
+        else:
+            with open(str(localPath),'wb') as fout:
+                while True:
+                    data = reader.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    fout.write(data)
+            if len(header) == 2:
+                mtime = int(header[1])
+                os.utime(str(localPath),(mtime,mtime))
+
+        _checkExitStatus(serverNode,stdout,stderr)
+
+    return reader.rawBytes, reader.wireBytes
+
+def uploadCompressed(sshSession, serverNode, localPath, remotePath, codec, token=None):
+    """Upload a file or a directory through a compressed pipe.
+
+    Directories are transferred as a tar archive. The modification times are preserved.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        localPath (pathlib.Path): the path of the file or directory to upload
+        remotePath (pathlib.PurePosixPath): the remote destination
+        codec (str): 'gzip' or 'zstd'
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the channel is closed when the token is
+        cancelled
+
+    Returns:
+        tuple: the number of raw bytes and the number of bytes sent through the channel
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled. The data already uploaded are
+        left in place.
+    """
+
+    localPath = pathlib.Path(localPath)
+    remotePath = pathlib.PurePosixPath(remotePath)
+
+    decompressCmd = REMOTE_DECOMPRESS_COMMANDS[codec]
+    if localPath.is_dir():
+        cmd = '{} | tar -xf - -C {}'.format(decompressCmd,shlex.quote(str(remotePath.parent)))
+    else:
+        cmd = '{0} > {1} && touch -m -d @{2} {1}'.format(decompressCmd,shlex.quote(str(remotePath)),int(localPath.stat().st_mtime))
+
+    stdin, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+
+    with interruptOnCancel(token,stdout.channel.close):
+        writer = _CompressingWriter(stdin,codec)
+        if localPath.is_dir():
+            with tarfile.open(fileobj=writer,mode='w|') as tar:
+                tar.add(str(localPath),arcname=remotePath.name)
+            # The tarfile only flushes the file object
+            rawBytes = _localSize(localPath)
+        else:
+            with open(str(localPath),'rb') as fin:
+                while True:
+                    data = fin.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    writer.write(data)
+            rawBytes = writer.rawBytes
+        writer.close()
+
+        _checkExitStatus(serverNode,stdout,stderr)
+
+    return rawBytes, writer.wireBytes
+
+def download(sshSession, serverNode, remotePath, localPath, recursive=True, preserveTimes=False, token=None, removeOnCancel=False):
+    """Download a file or a directory from a server behind the bastion.
+
+    Depending on the compression mode of the session, the data are transferred through scp or through a compressed pipe.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        remotePath (pathlib.PurePosixPath): the path of the file or directory to download
+        localPath (pathlib.Path): the local destination
+        recursive (bool): if True, directories are downloaded recursively
+        preserveTimes (bool): if True, the modification times of the remote files are preserved
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the transfer is aborted when the token is
+        cancelled
+        removeOnCancel (bool): if True, the partial local copy is removed when the transfer is cancelled. Must be set
+        only when the local destination did not exist before the transfer.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled
+    """
+
+    with TRACER.span('download','transfer',server=serverNode.name(),path=str(remotePath)) as args:
+        mode = _compressionMode(serverNode)
+
+        codec = None
+        if mode in ('gzip','zstd','auto'):
+            with TRACER.span('choose codec','transfer',mode=mode):
+                sample = _remoteSample(sshSession,serverNode,remotePath) if mode == 'auto' else b''
+                remoteZstd = _hasRemoteZstd(sshSession,serverNode) if mode in ('zstd','auto') else False
+                codec = chooseCodec(mode,sample,TRANSFER_METRICS.throughput(serverNode.name()),remoteZstd)
+        args['codec'] = codec or 'none'
+
+        target = pathlib.Path(localPath)
+        if target.is_dir():
+            target = target.joinpath(pathlib.PurePosixPath(remotePath).name)
+
+        start = time.perf_counter()
+        try:
+            if codec is None:
+                cmd = _scpClient(sshSession,token)
+                with interruptOnCancel(token,lambda : _closeSCPChannel(cmd)):
+                    cmd.get('{}/{}'.format(serverNode.name(),remotePath),str(localPath),recursive=recursive,preserve_times=preserveTimes)
+                rawBytes = wireBytes = _localSize(target)
+            else:
+                rawBytes, wireBytes = downloadCompressed(sshSession,serverNode,remotePath,localPath,codec,token)
+        except JobCancelledError:
+            if removeOnCancel:
+                _removeLocalPath(target)
+            raise
+        TRANSFER_METRICS.record(serverNode.name(),codec,rawBytes,wireBytes,time.perf_counter() - start)
+        args['rawBytes'] = rawBytes
+        args['wireBytes'] = wireBytes
+
+def upload(sshSession, serverNode, localPath, remotePath, recursive=True, preserveTimes=False, token=None, removeOnCancel=False):
+    """Upload a file or a directory to a server behind the bastion.
+
+    Depending on the compression mode of the session, the data are transferred through scp or through a compressed pipe.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session to the bastion
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        localPath (pathlib.Path): the path of the file or directory to upload
+        remotePath (pathlib.PurePosixPath): the remote destination
+        recursive (bool): if True, directories are uploaded recursively
+        preserveTimes (bool): if True, the modification times of the local files are preserved
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the transfer is aborted when the token is
+        cancelled
+        removeOnCancel (bool): if True, the partial remote copy is removed when the transfer is cancelled. Must be set
+        only when the remote destination did not exist before the transfer.
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled
+    """
+
+    with TRACER.span('upload','transfer',server=serverNode.name(),path=str(localPath)) as args:
+        mode = _compressionMode(serverNode)
+
+        codec = None
+        if mode in ('gzip','zstd','auto'):
+            with TRACER.span('choose codec','transfer',mode=mode):
+                sample = _localSample(localPath) if mode == 'auto' else b''
+                remoteZstd = _hasRemoteZstd(sshSession,serverNode) if mode in ('zstd','auto') else False
+                codec = chooseCodec(mode,sample,TRANSFER_METRICS.throughput(serverNode.name()),remoteZstd)
+        args['codec'] = codec or 'none'
+
+        start = time.perf_counter()
+        try:
+            if codec is None:
+                cmd = _scpClient(sshSession,token)
+                with interruptOnCancel(token,lambda : _closeSCPChannel(cmd)):
+                    cmd.put(str(localPath),remote_path='{}/{}'.format(serverNode.name(),remotePath),recursive=recursive,preserve_times=preserveTimes)
+                rawBytes = wireBytes = _localSize(localPath)
+            else:
+                rawBytes, wireBytes = uploadCompressed(sshSession,serverNode,localPath,remotePath,codec,token)
+        except JobCancelledError:
+            if removeOnCancel:
+                try:
+                    runRemoteCmd(sshSession,serverNode,'rm -rf {}'.format(shlex.quote(str(remotePath))))
+                except Exception as e:
+                    logging.error(str(e))
+            raise
+        TRANSFER_METRICS.record(serverNode.name(),codec,rawBytes,wireBytes,time.perf_counter() - start)
+        args['rawBytes'] = rawBytes
+        args['wireBytes'] = wireBytes
@@ -1,9 +1,15 @@
 import abc
+import logging
 import pathlib
 
-from PyQt5 import QtCore, QtGui
+from PyQt5 import QtCore
 
-from passhfiles.utils.Platform import iconsDirectory
+from passhfiles.kernel.AtomicSave import SaveConflictError
+from passhfiles.kernel.DirectorySizes import DIRECTORY_SIZES_CACHE
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.Icons import ICON_REGISTRY
+from passhfiles.utils.Jobs import JOB_MANAGER
+from passhfiles.utils.Numbers import sizeOf
 
 class MyMeta(abc.ABCMeta, type(QtCore.QAbstractTableModel)):
     pass
@@ -20,6 +26,8 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
     dataCopiedSignal = QtCore.pyqtSignal(tuple)
 
+    directorySizeComputedSignal = QtCore.pyqtSignal(pathlib.PurePath, str, object)
+
     def __init__(self, serverIndex, startingDirectory, *args, **kwargs):
         """Constructor.
 
@@ -30,17 +38,26 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         super(IFileSystemModel,self).__init__(*args, **kwargs)
 
-        self._directoryIcon = QtGui.QIcon(str(iconsDirectory().joinpath('directory.png')))
-        self._fileIcon = QtGui.QIcon(str(iconsDirectory().joinpath('file.png')))
-
         self._entries = []
 
         self._serverIndex = serverIndex
 
         self._showHiddenFiles = True
 
+        self._synchronize = False
+
+        self._checksum = False
+
         self._currentDirectory = None
 
+        # The versions of the files opened for edition keyed by their path
+        self._openedVersions = {}
+
+        # The files being saved keyed by their path, with the arguments of the save requested in the meantime if any
+        self._pendingSaves = {}
+
+        self.directorySizeComputedSignal.connect(self.onDirectorySizeComputed)
+
         self.setDirectory(startingDirectory)
 
     def addToFavorites(self, selectedRow):
@@ -63,6 +80,15 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
         
         return 5
 
+    @abc.abstractmethod
+    def computeDirectorySizes(self):
+        """Compute in the background the size of the directories of the current directory.
+
+        The sizes are sent through the directorySizeComputedSignal as soon as they are computed.
+        """
+
+        pass
+
     def copyData(self, selectedRows):
         """Copy the data.
 
@@ -95,15 +121,26 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
         pass
 
     @abc.abstractmethod
-    def createTemporaryFile(self,index):
-        """Copy the selected file to a temporary file on the local file system and returns both 
-        temporary and actual file names.
+    def createRangeReader(self, index):
+        """Returns a reader for reading byte ranges of the selected file without copying it entirely.
 
         Args:
             index (PyQt5.QtCore.QModelIndex): the index of the file
 
         Returns:
-            2-tuple: respectively the path to the temporary and actual file names
+            passhfiles.kernel.RangeReaders.IRangeReader: the reader
+        """
+
+        pass
+
+    @abc.abstractmethod
+    def createTemporaryFile(self, index, onCreated):
+        """Copy in the background the selected file to a temporary file on the local file system.
+
+        Args:
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onCreated (callable): called in the main thread with respectively the path to the temporary and actual
+            files once the file is copied
         """
 
         pass
@@ -136,11 +173,38 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         elif role == QtCore.Qt.DecorationRole:
             if col == 0:
-                return self._entries[row][-1]
+                entry = self._entries[row]
+                return ICON_REGISTRY.directoryIcon() if entry[2] == 'Folder' else ICON_REGISTRY.fileIcon(entry[0])
 
         elif role == QtCore.Qt.ToolTipRole:
             return self._currentDirectory
 
+    def _displayEntries(self, host, directory, entries):
+        """Converts the entries of a listed directory for their display.
+
+        The sizes are displayed in human format, the ones of the directories being taken from the directory sizes
+        cache. A parent directory entry is inserted first.
+
+        Args:
+            host (str): the host of the directory as returned by passhfiles.kernel.Sessions.ServerNode.host. None for the
+            local file system.
+            directory (pathlib.PurePath): the listed directory
+            entries (list of list): the name, the size in bytes, the type, the owner and the modification time of each
+            entry as returned by the functions of passhfiles.kernel.Listings
+
+        Returns:
+            list of list: the entries to display
+        """
+
+        displayedEntries = [['..',None,'Folder',None,None]]
+        for name, size, typ, owner, modificationTime in entries:
+            if typ == 'Folder':
+                size = DIRECTORY_SIZES_CACHE.getSize(host,directory.joinpath(name),modificationTime)
+            size = None if size is None else sizeOf(size)
+            displayedEntries.append([name,size,typ,owner,modificationTime])
+
+        return displayedEntries
+
     @abc.abstractmethod
     def dropData(self, data):
         """Drop some data (directories and/or files).
@@ -212,6 +276,35 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         return (entry[2] == 'Folder')
 
+    def maxBackups(self):
+        """Returns the number of backups kept when saving an edited file.
+
+        Returns:
+            int: the number of backups
+        """
+
+        return self._serverIndex.parent().internalPointer().data(0).get('backups',1)
+
+    def onDirectorySizeComputed(self, directory, name, size):
+        """Called when the size of a directory has been computed.
+
+        Args:
+            directory (pathlib.PurePath): the directory for which the sizes were computed
+            name (str): the name of the subdirectory
+            size (int): the size of the subdirectory
+        """
+
+        # The user may have left the directory in the meantime
+        if directory != self._currentDirectory:
+            return
+
+        for row, entry in enumerate(self._entries):
+            if entry[0] == name and entry[2] == 'Folder':
+                entry[1] = sizeOf(size)
+                index = self.index(row,1)
+                self.dataChanged.emit(index,index)
+                break
+
     def onOpenEntry(self, index):
         """Called when the user double clicks on a model's entry. 
         
@@ -224,6 +317,39 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         pass
     
+    @abc.abstractmethod
+    def listDirectory(self, directory, changeDirectory=False):
+        """List the contents of a directory.
+
+        Called from a worker thread: the model must not be modified here.
+
+        Args:
+            directory (pathlib.PurePath): the directory
+            changeDirectory (bool): True if case of change of directory
+
+        Returns:
+            tuple: the listed directory and its entries. None if the directory could not be listed.
+        """
+
+        pass
+
+    def onDirectoryListed(self, listing):
+        """Called when a directory has been listed. Updates the model with its entries.
+
+        Args:
+            listing (tuple): the listed directory and its entries. None if the directory could not be listed.
+        """
+
+        if listing is None:
+            return
+
+        with TRACER.span('emit','listing',entries=len(listing[1])):
+            self._currentDirectory, self._entries = listing
+
+            self.layoutChanged.emit()
+
+            self.currentDirectoryChangedSignal.emit(self._currentDirectory)
+
     @abc.abstractmethod
     def openFile(self, path):
         """Open the file using its default application.
@@ -277,6 +403,22 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         pass
 
+    def _runJob(self, kind, description, function):
+        """Run an operation on the file system in the background and reload the current directory once it is over.
+
+        The directory is reloaded even if the operation failed or was cancelled as it may have been partially applied.
+
+        Args:
+            kind (str): the kind of job
+            description (str): the description of the job
+            function (callable): the operation, called in a worker thread with the job as its only argument
+
+        Returns:
+            passhfiles.utils.Jobs.Job: the job
+        """
+
+        return JOB_MANAGER.submit(kind,description,function,onDone=lambda _ : self.reloadDirectory())
+
     def rowCount(self, parent=None):
         """Returns the number of rows of the model.
 
@@ -289,13 +431,68 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
         
         return len(self._entries)
 
+    def saveFile(self, tempFile, actualFile, overwrite=False, onConflict=None):
+        """Save in the background a file that was opened for edition.
+
+        The saves of a file are run one after the other: a save requested while the file is being saved is run once
+        the current one is over, against the version it wrote.
+
+        Args:
+            tempFile (pathlib.Path): the temporary file that contains the saved data
+            actualFile (pathlib.PurePath): the actual path to which the file should be saved
+            overwrite (bool): if True, the file is saved even if it was modified since it was opened
+            onConflict (callable): if not None, called in the main thread with the
+            passhfiles.kernel.AtomicSave.SaveConflictError raised when the file was modified since it was opened
+        """
+
+        if actualFile in self._pendingSaves:
+            self._pendingSaves[actualFile] = (tempFile,overwrite,onConflict)
+            return
+
+        save = self._saveOperation(tempFile,actualFile,None if overwrite else self._openedVersions.get(actualFile))
+        if save is None:
+            return
+
+        self._pendingSaves[actualFile] = None
+
+        def run(job):
+            # A conflict is a result rather than a failure so that the user can be asked what to do
+            try:
+                return save(job), None
+            except SaveConflictError as e:
+                return None, e
+
+        def onSaved(result):
+            version, conflict = result
+            if conflict is None:
+                self._openedVersions[actualFile] = version
+                self.setDirectory(self._currentDirectory)
+            elif onConflict is not None:
+                onConflict(conflict)
+            else:
+                logging.warning(str(conflict))
+
+        def onDone(job):
+            pending = self._pendingSaves.pop(actualFile,None)
+            if pending is not None:
+                self.saveFile(pending[0],actualFile,pending[1],pending[2])
+
+        JOB_MANAGER.submit('save','Save {}'.format(actualFile),run,onSaved,onDone=onDone)
+
     @abc.abstractmethod
-    def saveFile(tempFile,actualFile):
-        """Save a file that was opened for edition.
+    def _saveOperation(self, tempFile, actualFile, expectedVersion):
+        """Returns the operation saving a file that was opened for edition.
 
         Args:
             tempFile (pathlib.Path): the temporary file that contains the saved data
             actualFile (pathlib.PurePath): the actual path to which the file should be saved
+            expectedVersion (tuple): the version the file must still have. If None, the file is saved whatever its
+            version.
+
+        Returns:
+            callable: the operation, called in a worker thread with the job as its only argument. It returns the
+            version of the saved file and raises passhfiles.kernel.AtomicSave.SaveConflictError if the file was
+            modified since it was opened. None if the file can not be saved.
         """
 
         pass
@@ -309,18 +506,38 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         return self._serverIndex
 
-    @abc.abstractmethod
     def setDirectory(self, directory, changeDirectory=False):
         """Sets a directory.
 
-        This will trigger a full update of the model.
+        The directory is listed in the background and the model is fully updated once the listing is over. A listing
+        still running for the same model is cancelled.
 
         Args:
             directory (str): the directory
             changeDirectory (bool): True if case of change of directory
         """
 
-        pass
+        JOB_MANAGER.submit('listing',
+                           'List {}'.format(directory),
+                           lambda job : self.listDirectory(directory,changeDirectory),
+                           self.onDirectoryListed,
+                           key=('listing',id(self)))
+
+    def setSynchronize(self, synchronize, checksum=False):
+        """Set the transfer mode of the model.
+
+        In synchronization mode, the dropped or pasted data overwrite the existing entries and only the files which 
+        differ from those of the current directory are transferred.
+
+        Args:
+            synchronize (bool): if True, the transfers are performed in synchronization mode
+            checksum (bool): if True, the files with the same size are compared through their checksums rather than 
+            through their modification times
+        """
+
+        self._synchronize = synchronize
+
+        self._checksum = checksum
 
     def showHiddenFiles(self, show):
         """Show or hide the hidden files. 
@@ -330,6 +547,18 @@ class IFileSystemModel(QtCore.QAbstractTableModel, metaclass=MyMeta):
 
         self.setDirectory(self._currentDirectory)
 
+    @abc.abstractmethod
+    def sniffFile(self, index, onSniffed):
+        """Guess in the background the contents of the selected file without copying it entirely.
+
+        Args:
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onSniffed (callable): called in the main thread with the passhfiles.kernel.ContentSniffer.ContentInfo of
+            the file once it could be read
+        """
+
+        pass
+
     def sort(self, col, order):
         """Sort the model.
 
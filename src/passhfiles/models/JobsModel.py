@@ -0,0 +1,141 @@
+from PyQt5 import QtCore
+
+from passhfiles.utils.Jobs import JOB_MANAGER
+
+class JobsModel(QtCore.QAbstractTableModel):
+    """Implements a model for the jobs run in the background.
+    """
+
+    sections = ['Job','Type','Status','Progress','Duration']
+
+    def __init__(self, *args, **kwargs):
+        """Constructor.
+        """
+
+        super(JobsModel,self).__init__(*args, **kwargs)
+
+        JOB_MANAGER.jobAddedSignal.connect(self.onJobAdded)
+        JOB_MANAGER.jobChangedSignal.connect(self.onJobChanged)
+        JOB_MANAGER.jobRemovedSignal.connect(self.onJobRemoved)
+
+        self._jobs = list(JOB_MANAGER.jobs())
+
+    def columnCount(self, parent=None):
+        """Return the number of columns of the table.
+
+        Returns:
+            int: the number of columns
+        """
+
+        return len(JobsModel.sections)
+
+    def data(self, index, role):
+        """Returns the data for a given index and role.
+
+        Args:
+            index (QtCore.QModelIndex): the index
+            role (int): the role
+        """
+
+        if not index.isValid():
+            return QtCore.QVariant()
+
+        job = self._jobs[index.row()]
+        col = index.column()
+
+        if role == QtCore.Qt.DisplayRole:
+            if col == 0:
+                return job.description
+            elif col == 1:
+                return job.kind
+            elif col == 2:
+                return job.status
+            elif col == 3:
+                if job.progress is None or job.progress[1] <= 0:
+                    return None
+                return '{:d} %'.format(int(100*job.progress[0]/job.progress[1]))
+            elif col == 4:
+                duration = job.duration()
+                return None if duration is None else '{:.1f} s'.format(duration)
+
+        elif role == QtCore.Qt.ToolTipRole:
+            return job.error
+
+    def headerData(self, section, orientation, role):
+        """Return the header data for a given section, orientation and role.
+
+        Args:
+            section (int): the section
+            orientation (QtCore.Qt.Horizontal or QtCore.Qt.Vertical): the orientation
+            role (int): the role
+        """
+
+        if role == QtCore.Qt.DisplayRole:
+            if orientation == QtCore.Qt.Horizontal:
+                return JobsModel.sections[section]
+
+    def job(self, row):
+        """Returns the job displayed at a given row.
+
+        Args:
+            row (int): the row
+
+        Returns:
+            passhfiles.utils.Jobs.Job: the job. None if the row is out of range.
+        """
+
+        if row < 0 or row >= len(self._jobs):
+            return None
+
+        return self._jobs[row]
+
+    def onJobAdded(self, job):
+        """Called when a job is submitted.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        self.beginInsertRows(QtCore.QModelIndex(),len(self._jobs),len(self._jobs))
+        self._jobs.append(job)
+        self.endInsertRows()
+
+    def onJobChanged(self, job):
+        """Called when the status or the progress of a job changes.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        if job not in self._jobs:
+            return
+
+        row = self._jobs.index(job)
+        self.dataChanged.emit(self.index(row,0),self.index(row,self.columnCount()-1))
+
+    def onJobRemoved(self, job):
+        """Called when a job is removed from the history.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        if job not in self._jobs:
+            return
+
+        row = self._jobs.index(job)
+        self.beginRemoveRows(QtCore.QModelIndex(),row,row)
+        del self._jobs[row]
+        self.endRemoveRows()
+
+    def rowCount(self, parent=None):
+        """Returns the number of rows of the model.
+
+        Args:
+            parent (QtCore.QModelIndex): the parent index
+
+        Returns:
+            int: the number of rows
+        """
+
+        return len(self._jobs)
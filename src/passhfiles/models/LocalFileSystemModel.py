@@ -1,4 +1,3 @@
-from datetime import datetime
 import logging
 import os
 import pathlib
@@ -8,17 +7,80 @@ import shutil
 import subprocess
 import tempfile
 
-import scp
-
+from passhfiles.kernel.AtomicSave import backupNames, localVersion, saveLocal
+from passhfiles.kernel.Cancellation import JobCancelledError
+from passhfiles.kernel.ContentSniffer import CONTENT_SNIFFER
+from passhfiles.kernel.Deletions import removeLocalEntries
+from passhfiles.kernel.DirectorySizes import DIRECTORY_SIZES_CACHE, computeLocalDirectorySizes
+from passhfiles.kernel.Listings import listLocalDirectory
+from passhfiles.kernel.LocalCopy import copyEntries
+from passhfiles.kernel.RangeReaders import LocalRangeReader
+from passhfiles.kernel.Synchronization import synchronizeFromRemote, synchronizeLocal
+from passhfiles.kernel.Transfers import download
 from passhfiles.models.IFileSystemModel import IFileSystemModel
-from passhfiles.utils.Numbers import sizeOf
+from passhfiles.utils.Jobs import JOB_MANAGER
 from passhfiles.utils.Platform import findOwner
-from passhfiles.utils.ProgressBar import progressBar
 
 class LocalFileSystemModel(IFileSystemModel):
     """Implements the IFileSystemModel interface in case of a local file system.
     """
 
+    def computeDirectorySizes(self):
+        """Compute in the background the size of the directories of the current directory.
+
+        The directories are walked in parallel and their sizes are sent through the directorySizeComputedSignal as 
+        soon as they are computed.
+        """
+
+        # Case of the Windows drives list
+        if self._currentDirectory == pathlib.Path():
+            return
+
+        directory = self._currentDirectory
+
+        mtimes = {}
+        for entry in self._entries:
+            if entry[2] != 'Folder' or entry[0] == '..':
+                continue
+            path = directory.joinpath(entry[0])
+            size = DIRECTORY_SIZES_CACHE.getSize(None,path,entry[4])
+            if size is None:
+                mtimes[path] = entry[4]
+            else:
+                self.directorySizeComputedSignal.emit(directory,entry[0],size)
+
+        if not mtimes:
+            return
+
+        def onSizeComputed(path, size):
+            DIRECTORY_SIZES_CACHE.setSize(None,path,mtimes[path],size)
+            self.directorySizeComputedSignal.emit(directory,path.name,size)
+
+        JOB_MANAGER.submit('sizes',
+                           'Compute the folder sizes of {}'.format(directory),
+                           lambda job : computeLocalDirectorySizes(list(mtimes.keys()),onSizeComputed))
+
+    def _copyLocalEntries(self, entries, job):
+        """Copy local files and directories, the files being copied in parallel.
+
+        The progress of the copy is reported in KiB. The copy stops when the job is cancelled.
+
+        Args:
+            entries (list of tuple): the (source,destination) paths of the entries to copy
+            job (passhfiles.utils.Jobs.Job): the job running the copy
+        """
+
+        if not entries:
+            return
+
+        def onProgress(copiedBytes, totalBytes):
+            job.setProgress(copiedBytes//1024,max(totalBytes//1024,1))
+
+        report = copyEntries(entries,onProgress,token=job.token)
+        for error in report.errors:
+            logging.error(error)
+        logging.info('Local copy: {}'.format(report))
+
     def createDirectory(self, directoryName):
         """Creates a directory.
 
@@ -29,12 +91,7 @@ class LocalFileSystemModel(IFileSystemModel):
         if not directoryName.is_absolute():
             directoryName = self._currentDirectory.joinpath(directoryName)
 
-        try:
-            directoryName.mkdir()
-        except Exception as e:
-            logging.error(str(e))
-        else:
-            self.setDirectory(self._currentDirectory)
+        self._runJob('create','Create {}'.format(directoryName),lambda job : directoryName.mkdir())
 
     def createNewFile(self, path):
         """Create a new file.
@@ -44,24 +101,34 @@ class LocalFileSystemModel(IFileSystemModel):
         """
 
         newFilePath = self._currentDirectory.joinpath(path)
-        try:
-            fout = open(str(newFilePath),'w')
-        except Exception as e:
-            logging.error(str(e))
-        else:
-            fout.close()
 
-        self.setDirectory(self._currentDirectory)
+        def create(job):
+            with open(str(newFilePath),'w'):
+                pass
+
+        self._runJob('create','Create {}'.format(newFilePath),create)
 
-    def createTemporaryFile(self,index):
-        """Copy the selected file to a temporary file on the local file system and returns both 
-        temporary and actual file names.
+    def createRangeReader(self, index):
+        """Returns a reader for reading byte ranges of the selected file without copying it entirely.
 
         Args:
             index (PyQt5.QtCore.QModelIndex): the index of the file
 
         Returns:
-            2-tuple: respectively the path to the temporary and actual file names
+            passhfiles.kernel.RangeReaders.LocalRangeReader: the reader
+        """
+
+        entry = self._entries[index.row()]
+
+        return LocalRangeReader(self._currentDirectory.joinpath(entry[0]))
+
+    def createTemporaryFile(self, index, onCreated):
+        """Copy in the background the selected file to a temporary file.
+
+        Args:
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onCreated (callable): called in the main thread with respectively the path to the temporary and actual
+            files once the file is copied
         """
 
         row = index.row()
@@ -72,9 +139,16 @@ class LocalFileSystemModel(IFileSystemModel):
 
         tempFile = pathlib.Path(tempfile.mktemp(suffix=actualFile.suffix))
 
-        shutil.copy(str(actualFile),str(tempFile))
+        def create(job):
+            version = localVersion(actualFile)
+            shutil.copy(str(actualFile),str(tempFile))
+            return version
 
-        return tempFile, actualFile
+        def onCopied(version):
+            self._openedVersions[actualFile] = version
+            onCreated(tempFile,actualFile)
+
+        JOB_MANAGER.submit('edit','Copy {} for edition'.format(actualFile),create,onCopied)
 
     def dropData(self, data):
         """Drop some data (directories and/or files) from a remote host to the local file system.
@@ -85,23 +159,39 @@ class LocalFileSystemModel(IFileSystemModel):
 
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
 
-        progressBar.reset(len(data))
-        for i, (d,isDirectory,isLocal) in enumerate(data):
-            try:
-                if isLocal:
-                    if isDirectory:
-                        shutil.copytree(d,str(self._currentDirectory.joinpath(d.name)))
-                    else:
-                        shutil.copy(d,self._currentDirectory)
+        if self._synchronize:
+            self._synchronizeData(data)
+            return
+
+        serverNode = self._serverIndex.internalPointer()
+
+        currentDirectory = self._currentDirectory
+
+        localEntries = [(d,currentDirectory.joinpath(pathlib.PurePath(d).name)) for d,_,isLocal in data if isLocal]
+
+        remoteEntries = [d for d,_,isLocal in data if not isLocal]
+
+        def transfer(job):
+            self._copyLocalEntries(localEntries,job)
+
+            nDownloaded = 0
+            for i, d in enumerate(remoteEntries):
+                # Only a destination created by this transfer can be removed when it is cancelled
+                target = currentDirectory.joinpath(pathlib.PurePosixPath(d).name)
+                try:
+                    download(sshSession,serverNode,d,currentDirectory,token=job.token,removeOnCancel=not target.exists())
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
                 else:
-                    cmd = scp.SCPClient(sshSession.get_transport())
-                    cmd.get('{}/{}'.format(self._serverIndex.internalPointer().name(), d),str(self._currentDirectory), recursive=True)
-            except Exception as e:
-                logging.error(str(e))
-                pass
-            progressBar.update(i+1)
+                    nDownloaded += 1
+                job.setProgress(i+1,len(remoteEntries))
 
-        self.setDirectory(self._currentDirectory)
+            if remoteEntries and job.token.isCancelled():
+                logging.info('Drop to {} cancelled: {} of {} entries downloaded'.format(currentDirectory,nDownloaded,len(remoteEntries)))
+
+        self._runJob('transfer','Drop to {}'.format(currentDirectory),transfer)
 
     def favorites(self):
         """Return the favorites paths.
@@ -133,6 +223,50 @@ class LocalFileSystemModel(IFileSystemModel):
 
         return entries
 
+    def listDirectory(self, directory, changeDirectory=False):
+        """List the contents of a directory.
+
+        Called from a worker thread: the model must not be modified here.
+
+        Args:
+            directory (pathlib.Path): the directory
+            changeDirectory (bool): True if case of change of directory
+
+        Returns:
+            tuple: the listed directory and its entries. None if the directory could not be listed.
+        """
+
+        if not directory.is_absolute():
+            directory = directory.absolute()
+        
+        # If the input argument was a filename, get its base directory
+        if directory.is_file():
+            directory = directory.parent
+
+        # Case where on Windows the directory is the root of a given drive.
+        # Display all the drives available on the machine
+        if platform.system() == 'Windows' and changeDirectory and self._currentDirectory == directory:
+            from passhfiles.utils.Platform import getDrives
+            availableDrives = getDrives()
+
+            entries = []
+            for drive in availableDrives:
+                size = None
+                typ = 'Folder'
+                modificationTime = ''
+                owner = findOwner(drive)
+                entries.append([drive,size,typ,owner,modificationTime])
+
+            return pathlib.Path(), entries
+
+        try:
+            entries = listLocalDirectory(directory,self._showHiddenFiles)
+        except PermissionError as e:
+            logging.error(str(e))
+            return None
+
+        return directory, self._displayEntries(None,directory,entries)
+
     def onOpenEntry(self, index):
         """Called when the user double clicks on a model's entry. 
         
@@ -195,10 +329,17 @@ class LocalFileSystemModel(IFileSystemModel):
         if server != self._serverIndex.internalPointer().name():
             return
 
+        if self._synchronize:
+            self._synchronizeData(entries)
+            return
+
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
 
-        progressBar.reset(len(entries))
-        for i, (d,isDirectory,isLocal) in enumerate(entries):
+        serverNode = self._serverIndex.internalPointer()
+
+        localEntries = []
+        remoteEntries = []
+        for d,isDirectory,isLocal in entries:
             target = self._currentDirectory.joinpath(d.stem+d.suffix)
             num = 1
             while target.exists():
@@ -208,21 +349,32 @@ class LocalFileSystemModel(IFileSystemModel):
                     base = match.groups(0)[0].strip()
                 target = target.parent.joinpath('{}_{}{}'.format(base,num,target.suffix))
                 num += 1                
-            try:
-                if isLocal:
-                    if isDirectory:
-                        shutil.copytree(d,target)
-                    else:
-                        shutil.copy(d,target)
+            if isLocal:
+                localEntries.append((d,target))
+            else:
+                remoteEntries.append((d,target))
+
+        currentDirectory = self._currentDirectory
+
+        def transfer(job):
+            self._copyLocalEntries(localEntries,job)
+
+            nDownloaded = 0
+            for i, (d,target) in enumerate(remoteEntries):
+                try:
+                    download(sshSession,serverNode,d,target,token=job.token,removeOnCancel=True)
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
                 else:
-                    cmd = scp.SCPClient(sshSession.get_transport())
-                    cmd.get('{}/{}'.format(self._serverIndex.internalPointer().name(), d),str(target), recursive=True)
-            except Exception as e:
-                logging.error(str(e))
-                pass
-            progressBar.update(i+1)
+                    nDownloaded += 1
+                job.setProgress(i+1,len(remoteEntries))
 
-        self.setDirectory(self._currentDirectory)
+            if remoteEntries and job.token.isCancelled():
+                logging.info('Paste to {} cancelled: {} of {} entries downloaded'.format(currentDirectory,nDownloaded,len(remoteEntries)))
+
+        self._runJob('transfer','Paste to {}'.format(currentDirectory),transfer)
 
     def removeEntries(self, selectedRows):
         """Remove some entries of the model.
@@ -231,14 +383,18 @@ class LocalFileSystemModel(IFileSystemModel):
             selectedRows (list of int): the list of indexes of the entries to be removed
         """
 
-        for row in selectedRows[::-1]:
-            selectedPath = self._currentDirectory.joinpath(self._entries[row][0])
-            if selectedPath.is_dir():
-                shutil.rmtree(str(selectedPath))
-            else:
-                selectedPath.unlink()
+        currentDirectory = self._currentDirectory
+
+        selectedPaths = [currentDirectory.joinpath(self._entries[row][0]) for row in selectedRows[::-1]]
+
+        def remove(job):
+            report = removeLocalEntries(selectedPaths,job.token,lambda n : job.setProgress(n,len(selectedPaths)))
+            for error in report.errors:
+                logging.error(error)
+            if report.cancelled:
+                logging.info('Deletion in {} cancelled: {}'.format(currentDirectory,report))
 
-        self.setDirectory(self._currentDirectory)
+        self._runJob('delete','Delete {} entries in {}'.format(len(selectedPaths),currentDirectory),remove)
 
     def renameEntry(self, selectedRow, newName):
         """Rename a given entry.
@@ -257,104 +413,83 @@ class LocalFileSystemModel(IFileSystemModel):
             logging.info('{} already exists'.format(newName))
             return
         
-        self._entries[selectedRow][0] = newName
-
         oldName = self._currentDirectory.joinpath(oldName)
         newName = self._currentDirectory.joinpath(newName)
-        
-        shutil.move(str(oldName),str(newName))
 
-        self.layoutChanged.emit()
+        self._runJob('rename','Rename {} to {}'.format(oldName,newName.name),lambda job : shutil.move(str(oldName),str(newName)))
 
-    def saveFile(self, tempFile, actualFile):
-        """Save a file that was opened for edition.
+    def _saveOperation(self, tempFile, actualFile, expectedVersion):
+        """Returns the operation saving a file that was opened for edition (see IFileSystemModel._saveOperation).
+
+        The file is replaced atomically once its version has been checked against the one it had when it was opened.
 
         Args:
             tempFile (pathlib.Path): the temporary file that contains the saved data
             actualFile (pathlib.Path): the actual path to which the file should be saved
-        """
+            expectedVersion (tuple): the version the file must still have. If None, the file is saved whatever its
+            version.
 
-        savedFile = actualFile
-        num = 1
-        while os.path.exists(str(savedFile)):
-            base = str(savedFile.parent.joinpath(savedFile.stem))
-            match = re.search('(.*)_\d+',base)
-            if match is not None:
-                base = match.groups(0)[0].strip()
-            savedFile = savedFile.parent.joinpath('{}_{}{}'.format(base,num,savedFile.suffix))
-            num += 1
+        Returns:
+            callable: the operation
+        """
 
-        shutil.copy(str(actualFile),str(savedFile))
-        shutil.move(str(tempFile),str(actualFile))
+        maxBackups = self.maxBackups()
 
-        self.setDirectory(self._currentDirectory)
+        def save(job):
+            backupName, obsoleteNames = backupNames(os.listdir(str(actualFile.parent)),actualFile.name,maxBackups)
+            return saveLocal(tempFile,actualFile,expectedVersion,backupName,obsoleteNames)
 
-    def setDirectory(self, directory, changeDirectory=False):
-        """Sets a directory.
+        return save
 
-        This will trigger a full update of the model.
+    def sniffFile(self, index, onSniffed):
+        """Guess in the background the contents of the selected file without reading it entirely.
 
         Args:
-            directory (str): the directory
-            changeDirectory (bool): True if case of change of directory
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onSniffed (callable): called in the main thread with the passhfiles.kernel.ContentSniffer.ContentInfo of
+            the file once it could be read
         """
 
-        if not directory.is_absolute():
-            directory = directory.absolute()
-        
-        # If the input argument was a filename, get its base directory
-        if directory.is_file():
-            directory = directory.parent
+        path = self._currentDirectory.joinpath(self._entries[index.row()][0])
 
-        # Case where on Windows the directory is the root of a given drive.
-        # Display all the drives available on the machine
-        if platform.system() == 'Windows' and changeDirectory and self._currentDirectory == directory:
-            from passhfiles.utils.Platform import getDrives
-            availableDrives = getDrives()
+        JOB_MANAGER.submit('edit','Inspect {}'.format(path),lambda job : CONTENT_SNIFFER.sniffLocal(path),onSniffed)
 
-            self._entries = []
-            for drive in availableDrives:
-                size = None
-                typ = 'Folder'
-                modificationTime = ''
-                icon = self._directoryIcon
-                owner = findOwner(drive)
-                self._entries.append([drive,size,typ,owner,modificationTime,icon])
-
-            self._currentDirectory = pathlib.Path()
-
-            self.layoutChanged.emit()
-            self.currentDirectoryChangedSignal.emit(self._currentDirectory)
-            return
+    def _synchronizeData(self, data):
+        """Synchronize the current directory with some data (directories and/or files).
 
-        try:
-            contents = [v.name for v in directory.iterdir()]
-        except PermissionError as e:
-            logging.error(str(e))
-            return
+        Only the files which differ from those of the current directory are transferred.
 
-        if not self._showHiddenFiles:
-            contents = [c for c in contents if not c.startswith('.')]
+        Args:
+            data (list): the list of data to be synchronized
+        """
 
-        self._currentDirectory = directory
+        sshSession = self._serverIndex.parent().internalPointer().sshSession()
 
-        # Sort the contents of the directory (first the sorted directories and then the sorted files)
-        sortedDirectories = sorted([c for c in contents if self._currentDirectory.joinpath(c).is_dir()],key=str.casefold)
-        sortedDirectories = [(c,True) for c in sortedDirectories]
-        sortedFiles = sorted([c for c in contents if not self._currentDirectory.joinpath(c).is_dir()],key=str.casefold)
-        sortedFiles = [(c,False) for c in sortedFiles]
-        sortedContents = sortedDirectories + sortedFiles
+        serverNode = self._serverIndex.internalPointer()
 
-        self._entries = [['..',None,'Folder',None,None,self._directoryIcon]]
-        for (name,isDirectory) in sortedContents:
-            absPath = self._currentDirectory.joinpath(name)
-            size = None if isDirectory else sizeOf(absPath.lstat().st_size)
-            typ = 'Folder' if isDirectory else 'File'
-            modificationTime = str(datetime.fromtimestamp(absPath.lstat().st_mtime)).split('.')[0]
-            icon = self._directoryIcon if isDirectory else self._fileIcon
-            owner = findOwner(absPath)
-            self._entries.append([name,size,typ,owner,modificationTime,icon])
+        currentDirectory = self._currentDirectory
 
-        self.layoutChanged.emit()
+        checksum = self._checksum
 
-        self.currentDirectoryChangedSignal.emit(self._currentDirectory)
+        def synchronize(job):
+            for i, (d,_,isLocal) in enumerate(data):
+                d = pathlib.PurePath(d)
+                target = currentDirectory.joinpath(d.name)
+                try:
+                    if isLocal:
+                        report = synchronizeLocal(pathlib.Path(d),target,checksum,job.token)
+                    else:
+                        report = synchronizeFromRemote(sshSession,serverNode,pathlib.PurePosixPath(d),target,checksum,job.token)
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
+                else:
+                    for error in report.errors:
+                        logging.error(error)
+                    logging.info('Synchronization of {}: {}'.format(target,report))
+                    if report.cancelled:
+                        break
+                job.setProgress(i+1,len(data))
+
+        self._runJob('transfer','Synchronize {}'.format(currentDirectory),synchronize)
@@ -5,17 +5,64 @@ import re
 import subprocess
 import tempfile
 
-import scp
-
+from passhfiles.kernel.AtomicSave import backupNames, commitRemoteSave, remoteTempPath, remoteVersion
+from passhfiles.kernel.Cancellation import JobCancelledError
+from passhfiles.kernel.ContentSniffer import CONTENT_SNIFFER
+from passhfiles.kernel.Deletions import removeRemoteEntries
+from passhfiles.kernel.DeltaTransfer import uploadDelta
+from passhfiles.kernel.DirectorySizes import DIRECTORY_SIZES_CACHE, computeRemoteDirectorySizes
+from passhfiles.kernel.Listings import listRemoteDirectory
+from passhfiles.kernel.RangeReaders import RemoteRangeReader
+from passhfiles.kernel.Synchronization import synchronizeToRemote
+from passhfiles.kernel.Transfers import download, upload
 from passhfiles.models.IFileSystemModel import IFileSystemModel
+from passhfiles.utils.Jobs import JOB_MANAGER
 from passhfiles.utils.Numbers import sizeOf
-from passhfiles.utils.ProgressBar import progressBar
 from passhfiles.utils.Security import runRemoteCmd
 
 class RemoteFileSystemModel(IFileSystemModel):
     """Implements the IFileSystemModel interface in case of a remote file system.
     """
 
+    def computeDirectorySizes(self):
+        """Compute in the background the size of the directories of the current directory.
+
+        The sizes are computed in a single remote command and are sent through the directorySizeComputedSignal 
+        as soon as they are computed.
+        """
+
+        sshSession = self._serverIndex.parent().internalPointer().sshSession()
+        if sshSession is None:
+            return
+
+        serverNode = self._serverIndex.internalPointer()
+
+        directory = self._currentDirectory
+
+        mtimes = {}
+        for entry in self._entries:
+            if entry[2] != 'Folder' or entry[0] == '..':
+                continue
+            path = directory.joinpath(entry[0])
+            size = DIRECTORY_SIZES_CACHE.getSize(serverNode.host(),path,entry[4])
+            if size is None:
+                mtimes[path] = entry[4]
+            else:
+                self.directorySizeComputedSignal.emit(directory,entry[0],size)
+
+        if not mtimes:
+            return
+
+        def onSizeComputed(path, size):
+            if path not in mtimes:
+                return
+            DIRECTORY_SIZES_CACHE.setSize(serverNode.host(),path,mtimes[path],size)
+            self.directorySizeComputedSignal.emit(directory,path.name,size)
+
+        JOB_MANAGER.submit('sizes',
+                           'Compute the folder sizes of {}'.format(directory),
+                           lambda job : computeRemoteDirectorySizes(sshSession,serverNode,directory,onSizeComputed))
+
     def createDirectory(self, directoryName):
         """Creates a directory.
 
@@ -29,12 +76,12 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         serverNode = self._serverIndex.internalPointer()
 
-        _, error = runRemoteCmd(sshSession,serverNode,'mkdir {}'.format(directoryName))
-        if error:
-            logging.error(error)
-            return
-        else:
-            self.setDirectory(self._currentDirectory)
+        def create(job):
+            _, error = runRemoteCmd(sshSession,serverNode,'mkdir {}'.format(directoryName))
+            if error:
+                raise IOError(error)
+
+        self._runJob('create','Create {}'.format(directoryName),create)
 
     def createNewFile(self, path):
         """Create a new file.
@@ -49,22 +96,41 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         serverNode = self._serverIndex.internalPointer()
 
-        _, error = runRemoteCmd(sshSession,serverNode,'touch {}'.format(newFilePath))
-        if error:
-            logging.error(error)
-            return
-        else:
-            self.setDirectory(self._currentDirectory)
+        def create(job):
+            _, error = runRemoteCmd(sshSession,serverNode,'touch {}'.format(newFilePath))
+            if error:
+                raise IOError(error)
 
-    def createTemporaryFile(self,index):
-        """Copy the selected file to a temporary file on the local file system and returns both 
-        temporary and actual file names.
+        self._runJob('create','Create {}'.format(newFilePath),create)
+
+    def createRangeReader(self, index):
+        """Returns a reader for reading byte ranges of the selected file without downloading it entirely.
 
         Args:
             index (PyQt5.QtCore.QModelIndex): the index of the file
 
         Returns:
-            2-tuple: respectively the path to the temporary and actual file names
+            passhfiles.kernel.RangeReaders.RemoteRangeReader: the reader
+        """
+
+        sshSession = self._serverIndex.parent().internalPointer().sshSession()
+
+        if sshSession is None:
+            return None
+
+        entry = self._entries[index.row()]
+
+        actualFile = pathlib.PurePosixPath(self._currentDirectory.joinpath(entry[0]))
+
+        return RemoteRangeReader(sshSession,self._serverIndex.internalPointer(),actualFile)
+
+    def createTemporaryFile(self, index, onCreated):
+        """Download in the background the selected file to a temporary file on the local file system.
+
+        Args:
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onCreated (callable): called in the main thread with respectively the path to the temporary and actual
+            files once the file is downloaded
         """
 
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
@@ -72,6 +138,8 @@ class RemoteFileSystemModel(IFileSystemModel):
         if sshSession is None:
             return
 
+        serverNode = self._serverIndex.internalPointer()
+
         row = index.row()
 
         entry = self._entries[row]
@@ -79,10 +147,18 @@ class RemoteFileSystemModel(IFileSystemModel):
         actualFile = pathlib.PurePosixPath(self._currentDirectory.joinpath(entry[0]))
 
         tempFile = pathlib.Path(tempfile.mktemp(suffix=actualFile.suffix))
-        cmd = scp.SCPClient(sshSession.get_transport())
-        cmd.get('{}/{}'.format(self._serverIndex.internalPointer().name(),actualFile),str(tempFile), recursive=True)
 
-        return tempFile, actualFile
+        def create(job):
+            # The version is read before the download so that a modification made during the download is detected on save
+            version = remoteVersion(sshSession,serverNode,actualFile)
+            download(sshSession,serverNode,actualFile,tempFile)
+            return version
+
+        def onDownloaded(version):
+            self._openedVersions[actualFile] = version
+            onCreated(tempFile,actualFile)
+
+        JOB_MANAGER.submit('edit','Download {}:{} for edition'.format(serverNode.name(),actualFile),create,onDownloaded)
 
     def dropData(self, data):
         """Drop some data (directories and/or files) from a local file system to the remote host.
@@ -91,29 +167,44 @@ class RemoteFileSystemModel(IFileSystemModel):
             data (list): the list of data to be transfered
         """
 
+        if self._synchronize:
+            self._synchronizeData(data)
+            return
+
         sshSession = self._serverIndex.parent().internalPointer().sshSession()        
 
-        progressBar.reset(len(data))
-        for i, (d,_,_) in enumerate(data):
+        serverNode = self._serverIndex.internalPointer()
+
+        currentDirectory = self._currentDirectory
 
-            currentSubEntries = [entry[0] for entry in self._entries]
-            base = d.stem + d.suffix
-            num = 1
-            while base in currentSubEntries:
-                base = '{}_{}{}'.format(d.stem,num,d.suffix)
-                num += 1
+        currentSubEntries = [entry[0] for entry in self._entries]
 
-            targetFile = self._currentDirectory.joinpath(base)
+        def transfer(job):
+            nUploaded = 0
+            for i, (d,_,_) in enumerate(data):
 
-            try:
-                cmd = scp.SCPClient(sshSession.get_transport())
-                cmd.put(str(d), remote_path='{}/{}'.format(self._serverIndex.internalPointer().name(),targetFile), recursive=True)
-            except Exception as e:
-                logging.error(str(e))
-                pass
-            progressBar.update(i+1)
+                base = d.stem + d.suffix
+                num = 1
+                while base in currentSubEntries:
+                    base = '{}_{}{}'.format(d.stem,num,d.suffix)
+                    num += 1
+
+                targetFile = currentDirectory.joinpath(base)
 
-        self.setDirectory(self._currentDirectory)
+                try:
+                    upload(sshSession,serverNode,d,targetFile,token=job.token,removeOnCancel=True)
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
+                else:
+                    nUploaded += 1
+                job.setProgress(i+1,len(data))
+
+            if job.token.isCancelled():
+                logging.info('Upload to {}:{} cancelled: {} of {} entries uploaded'.format(serverNode.name(),currentDirectory,nUploaded,len(data)))
+
+        self._runJob('transfer','Upload to {}:{}'.format(serverNode.name(),currentDirectory),transfer)
 
     def favorites(self):
         """Return the favorites paths.
@@ -145,6 +236,30 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         return entries
 
+    def listDirectory(self, directory, changeDirectory=False):
+        """List the contents of a directory.
+
+        Called from a worker thread: the model must not be modified here.
+
+        Args:
+            directory (pathlib.PurePosixPath): the directory
+            changeDirectory (bool): True if case of change of directory
+
+        Returns:
+            tuple: the listed directory and its entries. None if the directory could not be listed.
+        """
+
+        sshSession = self._serverIndex.parent().internalPointer().sshSession()
+
+        serverNode = self._serverIndex.internalPointer()
+        try:
+            entries = listRemoteDirectory(sshSession,serverNode,directory,self._showHiddenFiles)
+        except IOError as e:
+            logging.error(str(e))
+            return None
+
+        return directory, self._displayEntries(serverNode.host(),directory,entries)
+
     def onOpenEntry(self, index):
         """Called when the user double clicks on a model's entry. 
         
@@ -180,11 +295,12 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         if sshSession is None:
             return
-                
-        try:
+
+        serverNode = self._serverIndex.internalPointer()
+
+        def downloadAndOpen(job):
             tempFile = tempfile.mktemp(suffix=path.suffix)
-            cmd = scp.SCPClient(sshSession.get_transport())
-            cmd.get('{}/{}'.format(self._serverIndex.internalPointer().name(),str(path)),tempFile, recursive=True)
+            download(sshSession,serverNode,path,tempFile)
             system = platform.system()
             if system == 'Linux':
                 subprocess.call(['xdg-open',tempFile])
@@ -192,8 +308,8 @@ class RemoteFileSystemModel(IFileSystemModel):
                 subprocess.call(['open',tempFile])
             elif system == 'Windows':
                 subprocess.call(['start',tempFile],shell=True)
-        except Exception as e:
-            logging.error(str(e))
+
+        JOB_MANAGER.submit('open','Open {}:{}'.format(serverNode.name(),path),downloadAndOpen)
 
     def pasteData(self, data):
         """Paste data to this model.
@@ -210,28 +326,43 @@ class RemoteFileSystemModel(IFileSystemModel):
         if server != self._serverIndex.internalPointer().name():
             return
 
+        if self._synchronize:
+            self._synchronizeData(entries)
+            return
+
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
 
+        serverNode = self._serverIndex.internalPointer()
+
+        currentDirectory = self._currentDirectory
+
         currentSubEntries = [entry[0] for entry in self._entries]
-        progressBar.reset(len(entries))
-        for i, (d,_,_) in enumerate(entries):
 
-            target = d.name
-            ext = d.suffix
-            num = 1
-            while target in currentSubEntries:
-                target = '{}_{}{}'.format(d.stem,num,ext)
-                num += 1
+        def transfer(job):
+            nUploaded = 0
+            for i, (d,_,_) in enumerate(entries):
 
-            try:
-                cmd = scp.SCPClient(sshSession.get_transport())
-                cmd.put(d, remote_path='{}/{}'.format(self._serverIndex.internalPointer().name(),str(self._currentDirectory.joinpath(target))), recursive=True)
-            except Exception as e:
-                logging.error(str(e))
-                pass
-            progressBar.update(i+1)
+                target = d.name
+                ext = d.suffix
+                num = 1
+                while target in currentSubEntries:
+                    target = '{}_{}{}'.format(d.stem,num,ext)
+                    num += 1
 
-        self.setDirectory(self._currentDirectory)
+                try:
+                    upload(sshSession,serverNode,d,currentDirectory.joinpath(target),token=job.token,removeOnCancel=True)
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
+                else:
+                    nUploaded += 1
+                job.setProgress(i+1,len(entries))
+
+            if job.token.isCancelled():
+                logging.info('Paste to {}:{} cancelled: {} of {} entries uploaded'.format(serverNode.name(),currentDirectory,nUploaded,len(entries)))
+
+        self._runJob('transfer','Paste to {}:{}'.format(serverNode.name(),currentDirectory),transfer)
 
     def removeEntries(self, selectedRow):
         """Remove some entries of the model.
@@ -244,14 +375,19 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         serverNode = self._serverIndex.internalPointer()
 
-        for row in selectedRow[::-1]:
-            selectedPath = self._currentDirectory.joinpath(re.escape(self._entries[row][0]))
-            _, error = runRemoteCmd(sshSession,serverNode,'rm -rf {}'.format(selectedPath))
-            if error:
+        currentDirectory = self._currentDirectory
+
+        # The paths are quoted by removeRemoteEntries
+        selectedPaths = [currentDirectory.joinpath(self._entries[row][0]) for row in selectedRow[::-1]]
+
+        def remove(job):
+            report = removeRemoteEntries(sshSession,serverNode,selectedPaths,job.token,lambda n : job.setProgress(n,len(selectedPaths)))
+            for error in report.errors:
                 logging.error(error)
-                continue
+            if report.cancelled:
+                logging.info('Deletion in {}:{} cancelled: {}'.format(serverNode.name(),currentDirectory,report))
 
-        self.setDirectory(self._currentDirectory)
+        self._runJob('delete','Delete {} entries in {}:{}'.format(len(selectedPaths),serverNode.name(),currentDirectory),remove)
 
     def renameEntry(self, selectedRow, newName):
         """Rename a given entry.
@@ -277,100 +413,120 @@ class RemoteFileSystemModel(IFileSystemModel):
 
         serverNode = self._serverIndex.internalPointer()
 
-        _, error = runRemoteCmd(sshSession,serverNode,'mv {} {}'.format(oldName,newName))
-        if error:
-            logging.error(error)
-            return
+        def rename(job):
+            _, error = runRemoteCmd(sshSession,serverNode,'mv {} {}'.format(oldName,newName))
+            if error:
+                raise IOError(error)
 
-        self._entries[selectedRow][0] = newName
+        self._runJob('rename','Rename {} to {}'.format(oldName,newName.name),rename)
 
-        self.setDirectory(self._currentDirectory)
+    def _saveOperation(self, tempFile, actualFile, expectedVersion):
+        """Returns the operation saving a file that was opened for edition (see IFileSystemModel._saveOperation).
 
-    def saveFile(self, tempFile, actualFile):
-        """Save a file that was opened for edition.
+        The file is first uploaded to a temporary file next to the remote file, by sending only the blocks which
+        changed when possible. A single remote command then checks that the remote file was not modified since it was
+        opened, backs it up and replaces it atomically by the temporary file.
 
         Args:
             tempFile (pathlib.Path): the temporary file that contains the saved data
             actualFile (pathlib.Path): the actual path to which the file should be saved
+            expectedVersion (tuple): the version the remote file must still have. If None, the file is saved whatever
+            its version.
+
+        Returns:
+            callable: the operation. None if the session is not connected.
         """
 
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
         if sshSession is None:
-            return
+            return None
 
-        currentSubEntries = [entry[0] for entry in self._entries]
+        serverNode = self._serverIndex.internalPointer()
 
-        base = actualFile.stem + actualFile.suffix
-    
-        num = 1
-        while base in currentSubEntries:
-            base = '{}_{}{}'.format(actualFile.stem,num,actualFile.suffix)
-            num += 1
+        tempPath = remoteTempPath(actualFile)
 
-        serverNode = self._serverIndex.internalPointer()
+        backupName, obsoleteNames = backupNames([entry[0] for entry in self._entries],actualFile.name,self.maxBackups())
 
-        backupFile = self._currentDirectory.joinpath(base)
-        _, error = runRemoteCmd(sshSession,serverNode,'mv {} {}'.format(actualFile,backupFile))
-        if error:
-            logging.error(error)
-            return
+        def save(job):
+            # First try to send only the blocks which changed
+            try:
+                sentBytes = uploadDelta(sshSession,serverNode,tempFile,actualFile,tempPath)
+            except Exception as e:
+                logging.warning(str(e))
+                sentBytes = None
+            if sentBytes is not None:
+                logging.info('{} sent by delta transfer ({} sent for {})'.format(actualFile,sizeOf(sentBytes),sizeOf(tempFile.stat().st_size)))
+            else:
+                upload(sshSession,serverNode,tempFile,tempPath,recursive=False)
 
-        try:
-            cmd = scp.SCPClient(sshSession.get_transport())
-            cmd.put(str(tempFile), remote_path='{}/{}'.format(self._serverIndex.internalPointer().name(),actualFile), recursive=True)
-        except Exception as e:
-            logging.error(str(e))
+            return commitRemoteSave(sshSession,serverNode,actualFile,expectedVersion,backupName,obsoleteNames)
 
-        self.setDirectory(self._currentDirectory)
+        return save
 
-    def setDirectory(self, directory, changeDirectory=False):
-        """Sets a directory.
+    def sniffFile(self, index, onSniffed):
+        """Guess in the background the contents of the selected file without downloading it.
 
-        This will trigger a full update of the model.
+        Only the first bytes of the file are transferred. The result is cached as long as the modification time and
+        the size of the file shown in the listing do not change.
 
         Args:
-            directory (str): the directory
-            changeDirectory (bool): True if case of change of directory
+            index (PyQt5.QtCore.QModelIndex): the index of the file
+            onSniffed (callable): called in the main thread with the passhfiles.kernel.ContentSniffer.ContentInfo of
+            the file once it could be read
         """
 
-        self._currentDirectory = directory
-
         sshSession = self._serverIndex.parent().internalPointer().sshSession()
 
-        char = 'a' if self._showHiddenFiles else ''
+        if sshSession is None:
+            return
 
         serverNode = self._serverIndex.internalPointer()
-        output,error = runRemoteCmd(sshSession,serverNode,'ls --full-time -{}lpL {}'.format(char,self._currentDirectory))
-        if error:
-            logging.error(error)
-            return
-        
-        self._entries = [['..',None,'Folder',None,None,self._directoryIcon]]
-        contents = [l.strip() for l in output.split('\n')]
 
-        # The 1st element of contents is always the total count of entries output by the ls command. It is not used.
-        # For ls -a command the 2nd and 3rd entries are for . and .. directories. It is not used.
-        if self._showHiddenFiles:
-            contents = contents[3:] if len(contents) >= 4 else []
-        else:
-            contents = contents[1:] if len(contents) >= 2 else []
-
-        for c in contents:
-            words = [v.strip() for v in c.split()]
-            typ = 'Folder' if words[-1].endswith('/') else 'File'
-            size = sizeOf(int(words[4])) if typ == 'File' else None
-            icon = self._directoryIcon if typ=='Folder' else self._fileIcon
-            owner = words[2]
-            date = words[5]
-            time = words[6].split('.')[0]
-            modificationTime = '{} {}'.format(date,time)
-            name = words[-1][:-1] if typ=='Folder' else words[-1]
-            self._entries.append([name,size,typ,owner,modificationTime,icon])
-
-        sortedDirectories = sorted([v for v in self._entries if v[2]=='Folder'],key= lambda s : s[0].lower())
-        sortedFiles = sorted([v for v in self._entries if v[2]=='File'],key= lambda s : s[0].lower())
-        self._entries = sortedDirectories + sortedFiles
-
-        self.layoutChanged.emit()
-
-        self.currentDirectoryChangedSignal.emit(self._currentDirectory)
\ No newline at end of file
+        entry = self._entries[index.row()]
+
+        actualFile = pathlib.PurePosixPath(self._currentDirectory.joinpath(entry[0]))
+
+        JOB_MANAGER.submit('edit',
+                           'Inspect {}:{}'.format(serverNode.name(),actualFile),
+                           lambda job : CONTENT_SNIFFER.sniffRemote(sshSession,serverNode,actualFile,(entry[4],entry[1])),
+                           onSniffed)
+
+    def _synchronizeData(self, data):
+        """Synchronize the current directory with some local data (directories and/or files).
+
+        Only the files which differ from those of the current directory are transferred.
+
+        Args:
+            data (list): the list of data to be synchronized
+        """
+
+        sshSession = self._serverIndex.parent().internalPointer().sshSession()
+
+        serverNode = self._serverIndex.internalPointer()
+
+        currentDirectory = self._currentDirectory
+
+        checksum = self._checksum
+
+        def synchronize(job):
+            for i, (d,_,isLocal) in enumerate(data):
+                if not isLocal:
+                    logging.error('{} is not a local entry. Can not synchronize'.format(d))
+                    continue
+                d = pathlib.Path(d)
+                target = currentDirectory.joinpath(d.name)
+                try:
+                    report = synchronizeToRemote(sshSession,serverNode,d,target,checksum,job.token)
+                except JobCancelledError:
+                    break
+                except Exception as e:
+                    logging.error(str(e))
+                else:
+                    for error in report.errors:
+                        logging.error(error)
+                    logging.info('Synchronization of {}: {}'.format(target,report))
+                    if report.cancelled:
+                        break
+                job.setProgress(i+1,len(data))
+
+        self._runJob('transfer','Synchronize {}:{}'.format(serverNode.name(),currentDirectory),synchronize)
\ No newline at end of file
@@ -0,0 +1,108 @@
+from PyQt5 import QtCore
+
+from passhfiles.kernel.SessionsSearch import SessionsIndex
+
+class SessionsFilterModel(QtCore.QSortFilterProxyModel):
+    """Implements a proxy model filtering the sessions and the servers of a SessionsModel with a fuzzy search.
+
+    The matching nodes are computed once per pattern from a search index of the names of the nodes, so that filtering
+    a row is a set lookup. The index is built again on first use after the source model changed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Constructor.
+        """
+
+        super(SessionsFilterModel,self).__init__(*args, **kwargs)
+
+        self._index = SessionsIndex()
+
+        self._pattern = ''
+
+        self._found = None
+
+    def filterAcceptsRow(self, sourceRow, sourceParent):
+        """Returns whether a row of the source model is shown.
+
+        Args:
+            sourceRow (int): the row
+            sourceParent (PyQt5.QtCore.QModelIndex): the parent index of the row in the source model
+
+        Returns:
+            bool: True if the row matches the pattern
+        """
+
+        if not self._pattern:
+            return True
+
+        if self._found is None:
+            self._found = self._search()
+
+        parentNode = sourceParent.internalPointer() if sourceParent.isValid() else self.sourceModel().root()
+
+        return parentNode.child(sourceRow) in self._found
+
+    def onSourceChanged(self, *args):
+        """Called when the source model changed. Drop the search index.
+        """
+
+        self._index.invalidate()
+        self._found = None
+
+    def onSourceRowsRemoved(self, *args):
+        """Called once the proxy model handled the removal of rows of the source model.
+
+        The sessions whose last matching server was removed are hidden.
+        """
+
+        if self._pattern:
+            self.invalidateFilter()
+
+    def pattern(self):
+        """Returns the search pattern.
+
+        Returns:
+            str: the pattern
+        """
+
+        return self._pattern
+
+    def _search(self):
+        """Search the nodes matching the current pattern, building the search index if needed.
+
+        Returns:
+            set: the matching nodes
+        """
+
+        if not self._index.isValid():
+            self._index.build(self.sourceModel().root())
+
+        return self._index.search(self._pattern)
+
+    def setPattern(self, pattern):
+        """Set the search pattern and filter the model accordingly.
+
+        Args:
+            pattern (str): the pattern. Empty for showing all the sessions and servers.
+        """
+
+        self._pattern = pattern.strip()
+        self._found = self._search() if self._pattern else None
+        self.invalidateFilter()
+
+    def setSourceModel(self, sourceModel):
+        """Set the source model.
+
+        The search index is invalidated before the proxy model handles the changes of the source model.
+
+        Args:
+            sourceModel (passhfiles.models.SessionsModel.SessionsModel): the source model
+        """
+
+        # Connected first so that the proxy model filters the changed rows against an up to date index
+        for signal in (sourceModel.dataChanged,sourceModel.layoutChanged,sourceModel.modelReset,sourceModel.rowsInserted,sourceModel.rowsRemoved):
+            signal.connect(self.onSourceChanged)
+
+        super(SessionsFilterModel,self).setSourceModel(sourceModel)
+
+        sourceModel.rowsRemoved.connect(self.onSourceRowsRemoved)
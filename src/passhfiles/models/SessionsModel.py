@@ -4,379 +4,17 @@ import platform
 import pathlib
 import subprocess
 import tempfile
-import time
 
-import paramiko
-
-import yaml
-
-from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
+from passhfiles.kernel.Bastion import listServers
 from passhfiles.kernel.KeyStore import KEYSTORE
-from passhfiles.utils.Platform import iconsDirectory, sessionsDatabasePath
-from passhfiles.utils.Security import checkAndGetSSHKey
-
-class RootNode:
-    """Implements the root object of the SessionsModel.
-    """
-    
-    def __init__(self):
-        """Constructor.
-        """
-
-        self._children = []
-
-    def addChild(self, child):
-        """Add a child.
-        
-        The child must be a SessionNode.
-        """
-        
-        if not isinstance(child,SessionNode):
-            return
-
-        child._parent = self
-        self._children.append(child)
-
-    def child(self, row):
-        """Return the child for a given row.
-
-        Args:
-            row (int): the row
-
-        Returns:
-            SessionNode: the child
-        """
-
-        if row >= 0 and row < self.childCount():
-            return self._children[row]
-
-    def childCount(self):
-        """Return the number of children of the root node.
-
-        Returns:
-            int: the number of children
-        """
-
-        return len(self._children)
-
-    def clear(self):
-        """Clear the root node.
-        """
-
-        self._children = []
-
-    def columnCount(self):
-        """Returns the number of columns of the root node.
-
-        Returns:
-            int: the number of columns
-        """
-        
-        return 1
-
-    def data(self, column):
-        """Returns the data stored in the node.
-
-        Returns:
-            None: the data
-        """
-        
-        return None
-
-    def parent(self):
-        """Return the parent of the root node.
-
-            None: the parent
-        """
-        
-        return None
-
-    def removeChild(self, child):
-        """Remove a child from the children list.
-
-        Args:
-            SessionNode: the child to be removed
-        """
-
-        if child in self._children:
-            del self._children[self._children.index(child)]
-
-    def row(self):
-        """Returns the row of this node regarding its parent.
-
-        Returns:
-            int: the row
-        """
-
-        return 0
-
-class SessionNode:
-    """Implements a session node of the SessionsModel.
-    """
-    
-    def __init__(self, data, parent):
-        """Constructor.
-
-        Args:
-            data (dict): the session data
-            parent (RootNode): the root node
-        """
-        
-        self._data = data
-
-        self._children = []
-        self._parent = parent
-        self._sshSession = None
-
-    def addChild(self, child):
-        """Add a child.
-        
-        The child must be a ServerNode.
-        """
-        
-        if not isinstance(child,ServerNode):
-            return
-
-        child._parent = self
-        self._children.append(child)
-
-    def child(self, row):
-        """Return the child for a given row.
-
-        Args:
-            row (int): the row
-
-        Returns:
-            ServerNode: the child
-        """
-
-        if row >= 0 and row < self.childCount():
-            return self._children[row]
-
-    def childCount(self):
-        """Return the number of children of the root node.
-
-        Returns:
-            int: the number of children
-        """
-
-        return len(self._children)
-
-    def columnCount(self):
-        """Returns the number of columns of the root node.
-
-        Returns:
-            int: the number of columns
-        """
-
-        return 1
-
-    def data(self, column):
-        """Returns the data stored in the node.
-
-        Returns:
-            dict: the data
-        """
-
-        return self._data
-
-    def parent(self):
-        """Return the parent of the session node.
-
-            RootNode: the parent
-        """
-
-        return self._parent
-
-    def removeChild(self, child):
-        """Remove a child from the children list.
-
-        Args:
-            SessionNode: the child to be removed
-        """
-
-        if child in self._children:
-            del self._children[self._children.index(child)]
-
-    def row(self):
-        """Returns the row of this node regarding its parent.
-
-        Returns:
-            int: the row
-        """
-
-        return self._parent._children.index(self)
-
-    def setData(self, data):
-        """Sets the data for this session node.
-
-        Args:
-            data (dict): the data
-        """
-
-        self._data = data
-
-    def setSSHSession(self, sshSession):
-        """Set the SSH session.
-
-        Args:
-            sshSession (paramiko.client.SSHClient): the SSH session
-        """
-
-        self._sshSession = sshSession
-
-    def sshSession(self):
-        """Returns the SSH session.
-
-        Returns:
-            paramiko.client.SSHClient: the SSH session. None if not connected.
-        """
-
-        return self._sshSession
-
-class ServerNode:
-    """Implements a server node of the SessionsModel.
-    """
-
-    def __init__(self, name, parent):
-        """Constructor.
-
-        Args:
-            name: the name of the server.
-            parent (SessionNode): the parent
-        """
-
-        self._name = name
-
-        self._parent = parent
-
-        self._stderrMotd = ''
-
-        self._stdoutMotd = ''
-
-        self._favorites = {'local': [], 'remote': []}
-
-    def addChild(self, child):
-        """Add a child.
-        """
-
-        pass
-
-    def addFavorite(self, fileSystemType, path):
-        """Add a favorite path to the favorites.
-
-        Args:
-            fileSystemType: either 'local' or 'remote'
-            path (pathlib.Path): the path to be added to favorites
-        """
-
-        if not fileSystemType in ('local','remote'):
-            return
-
-        if not path in self._favorites[fileSystemType]:
-            self._favorites[fileSystemType].append(path)
-
-    def child(self, row):
-        """Return the child for a given row.
-
-        Args:
-            row (int): the row
-
-        Returns:
-            None
-        """
-
-        return None
-
-    def childCount(self):
-        """Return the number of children of the root node.
-
-        Returns:
-            int: the number of children
-        """
-
-        return 0
-
-    def columnCount(self):
-        return 1
-
-    def data(self, column):
-        """Returns the data stored in the node.
-
-        Returns:
-            dict: the data
-        """
-
-        return self._favorites
-
-    def name(self):
-        """Return the name of the server.
-
-        Returns:
-            str: the server's name
-        """
-        
-        return self._name
-
-    def parent(self):
-        """Return the parent of the server node.
-
-            SessionNode: the parent
-        """
-
-        return self._parent
-
-    def removeChild(self, child):
-        """Remove a child from the children list.
-        """
-
-        pass
-
-    def row(self):
-        """Returns the row of this node regarding its parent.
-
-        Returns:
-            int: the row
-        """
-
-        return self._parent._children.index(self)
-
-    def setStderrMotd(self,stderrMotd):
-        """Set the stderr motd for this server.
-
-        Args:
-            stderrMotd (str): the stderr motd
-        """
-
-        self._stderrMotd = stderrMotd
-
-    def setStdoutMotd(self,stdoutMotd):
-        """Set the stdout motd for this server.
-
-        Args:
-            stdoutMotd (str): the stdout motd
-        """
-
-        self._stdoutMotd = stdoutMotd
-
-    def stderrMotd(self):
-        """Returns the stderr motd for this server.
-
-        Returns:
-            str: the stderr motd
-        """
-
-        return self._stderrMotd
-
-    def stdoutMotd(self):
-        """Returns the stdout motd for this server.
-
-        Returns:
-            str: the stdout motd
-        """
-
-        return self._stdoutMotd
+from passhfiles.kernel.Sessions import RootNode, ServerNode, SessionNode, connectSession, createSessionNode, readSessions, sessionsData
+from passhfiles.kernel.SessionsStore import SESSIONS_STORE
+from passhfiles.kernel.SSHAgent import agentKey
+from passhfiles.utils.Icons import ICON_REGISTRY
+from passhfiles.utils.Jobs import JOB_MANAGER
+from passhfiles.utils.Platform import sessionsDatabasePath
 
 class SessionsModel(QtCore.QAbstractItemModel):
     """Implements a model for storing the SSH sessions.
@@ -418,13 +56,14 @@ class SessionsModel(QtCore.QAbstractItemModel):
             sessionNode (SessionNode): the session node
         """
 
-        servers = [sessionNode.child(i).name() for i in range(sessionNode.childCount())]
-        if serverName in servers:
+        if sessionNode.childByName(serverName) is not None:
             logging.error('A server with name {} already exists'.format(serverName))
             return
 
+        row = sessionNode.childCount()
+        self.beginInsertRows(self.index(sessionNode.row(),0),row,row)
         sessionNode.addChild(ServerNode(serverName,sessionNode))
-        self.layoutChanged.emit()
+        self.endInsertRows()
 
     def addSession(self,data):
         """Add a new session to the model.
@@ -433,15 +72,10 @@ class SessionsModel(QtCore.QAbstractItemModel):
             data (dict): the session data
         """
 
-        sessionNode = SessionNode(data, self._root)
-        for server in sorted(data.get('servers',[])):
-            serverNode = ServerNode(server,sessionNode)
-            for fsType, files in data['servers'][server].items():
-                for f in files:
-                    serverNode.addFavorite(fsType,f)
-            sessionNode.addChild(serverNode)
-        self._root.addChild(sessionNode)
-        self.layoutChanged.emit()
+        row = self._root.childCount()
+        self.beginInsertRows(QtCore.QModelIndex(),row,row)
+        self._root.addChild(createSessionNode(data,self._root))
+        self.endInsertRows()
 
     def addToFavorites(self, serverIndex, fileSystemType, currentDirectory):
         """Add a favorite to a server.
@@ -471,11 +105,13 @@ class SessionsModel(QtCore.QAbstractItemModel):
             sessionIndex (PyQt5.QtCore.QModelIndex): the session index
         """
 
-        for i in range(self.rowCount(sessionIndex))[::-1]:
-            serverIndex = self.index(i,0,sessionIndex)
-            self.removeRow(serverIndex,sessionIndex)
+        nServers = self.rowCount(sessionIndex)
+        if nServers == 0:
+            return
 
-        self.layoutChanged.emit()
+        self.beginRemoveRows(sessionIndex,0,nServers-1)
+        sessionIndex.internalPointer().removeChildren(0,nServers)
+        self.endRemoveRows()
 
     def columnCount(self, index):
         """Return the column count of the model for a given index.
@@ -488,30 +124,43 @@ class SessionsModel(QtCore.QAbstractItemModel):
             return self._root.columnCount()
         return index.internalPointer().columnCount()
 
-    def connect(self, sessionIndex, key=None):
+    def connect(self, sessionIndex, key=None, onConnected=None):
         """Connect a given session.
 
+        The connection is established in the background.
+
         Args:
             sessionIndex (PyQt5.QtCore.QModelIndex): the index of the session
+            key (paramiko.PKey): the key used for the authentication
+            onConnected (callable): if not None, called without argument once the session is connected
         """
 
         sessionNode = sessionIndex.internalPointer()
 
-        if sessionNode.sshSession() is not None:
-            return
+        sshSession = sessionNode.sshSession()
+        if sshSession is not None:
+            if sshSession.isAlive():
+                if onConnected is not None:
+                    onConnected()
+                return
+            sshSession.close()
 
         data = sessionNode.data(0)
 
-        sshSession = paramiko.SSHClient()
-        sshSession.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        def connect(job):
+            sshSession = connectSession(data,key)
+            # The connection was superseded in the meantime
+            if job.token.isCancelled():
+                sshSession.close()
+            return sshSession
 
-        try:
-            sshSession.connect(data['address'], username=data['user'], pkey=key, port=data['port'])
-        except Exception as e:
-            logging.error(str(e))
-        else:
+        def onFinished(sshSession):
             sessionNode.setSSHSession(sshSession)
             logging.info('Successfully connected to {}'.format(data['address']))
+            if onConnected is not None:
+                onConnected()
+
+        JOB_MANAGER.submit('connect','Connect to {}'.format(data['address']),connect,onFinished,key=('connect',id(sessionNode)))
 
     def data(self, index, role):
         """Return the data for a given index and role.
@@ -534,9 +183,9 @@ class SessionsModel(QtCore.QAbstractItemModel):
                 return None
         elif role == QtCore.Qt.DecorationRole:
             if isinstance(node,SessionNode):
-                return QtGui.QIcon(str(iconsDirectory().joinpath('session.png')))
+                return ICON_REGISTRY.icon('session.png')
             elif isinstance(node,ServerNode):
-                return QtGui.QIcon(str(iconsDirectory().joinpath('server.png')))
+                return ICON_REGISTRY.icon('server.png')
             else:
                 return None
         elif role == QtCore.Qt.ToolTipRole:
@@ -581,43 +230,37 @@ class SessionsModel(QtCore.QAbstractItemModel):
             sshSession.close()
             sessionNode.setSSHSession(None)
 
-    def findServers(self, sessionIndex):
-        """Find the servers bound to a bastion session and add them to the model.
+    def findServers(self, sessionIndex, onFound=None):
+        """Find the servers bound to a bastion session and update the model accordingly.
+
+        The servers are listed in the background.
 
         Args:
             sessionIndex (PyQt5.QtCore.QModelIndex): the session index
+            onFound (callable): if not None, called without argument once the servers were added to the model
         """
 
-        self.clearServers(sessionIndex)
-
         sessionNode = sessionIndex.internalPointer()
         sshSession = sessionNode.sshSession()
         if sshSession is None:
             logging.error('Not connected to bastion server')
             return
 
-        shell = sshSession.invoke_shell()
-
-        out = ''
-        time.sleep(1)
-
-        while shell.recv_ready():
-            out += shell.recv(2048).decode()
-        out = out.split('\n')
+        def discover(job):
+            return listServers(sshSession)
 
-        comp = 0
-        for line in out:
-            if line.startswith('Here is the list of servers you can access'):
-                break
-            comp += 1
+        def onFinished(servers):
+            # The session may have been removed in the meantime
+            row = self._root.childRow(sessionNode)
+            if row < 0:
+                return
 
-        out = out[comp+1:-1]
-        servers = sorted([l.split()[1].strip() for l in out])
+            self.updateServers(self.index(row,0),servers)
 
-        for server in servers:
-            sessionNode.addChild(ServerNode(server,sessionNode))
+            if onFound is not None:
+                onFound()
 
-        self.layoutChanged.emit()
+        JOB_MANAGER.submit('discover','Find the servers of {}'.format(sessionNode.data(0)['name']),discover,onFinished,key=('discover',id(sessionNode)))
 
     def index(self, row, column, parentIndex=QtCore.QModelIndex()):
         """Return the index from a row and a column regarding to a given parent.
@@ -642,6 +285,21 @@ class SessionsModel(QtCore.QAbstractItemModel):
         else:
             return QtCore.QModelIndex()
 
+    def _insertServers(self, sessionIndex, row, serverNames):
+        """Insert new servers at a given row of a session.
+
+        Args:
+            sessionIndex (PyQt5.QtCore.QModelIndex): the session index
+            row (int): the row of the first server
+            serverNames (list of str): the names of the servers
+        """
+
+        sessionNode = sessionIndex.internalPointer()
+
+        self.beginInsertRows(sessionIndex,row,row+len(serverNames)-1)
+        sessionNode.insertChildren(row,[ServerNode(name,sessionNode) for name in serverNames])
+        self.endInsertRows()
+
     def loadSessions(self, sessionsFile):
         """Load existing sessions from a session file.
 
@@ -649,21 +307,15 @@ class SessionsModel(QtCore.QAbstractItemModel):
             sessionsFile: the YAML file containing the sessions
         """
 
-        if not sessionsFile.exists():
-            logging.error('The session file {} does not exist'.format(sessionsFile))
+        sessions = readSessions(sessionsFile)
+        if sessions is None:
             return
 
-        try:
-            with open(str(sessionsFile),'r') as fin:
-                sessions = yaml.unsafe_load(fin)
-        except Exception as e:
-            logging.error(str(e))
-            return
-
-        self.clear()
-
+        self.beginResetModel()
+        self._root.clear()
         for session in sessions:
-            self.addSession(session)
+            self._root.addChild(createSessionNode(session,self._root))
+        self.endResetModel()
 
         logging.info('Sessions successfully loaded from {}'.format(sessionsFile))
 
@@ -702,15 +354,22 @@ class SessionsModel(QtCore.QAbstractItemModel):
                 user = sessionData['user']
                 address = sessionData['address']
                 keyfile = sessionData['key']
-                ppkFile = keyfile.parent.joinpath(keyfile.stem +'.ppk')
-                if not ppkFile.exists():
-                    logging.error('Can not find the {} ppk file'.format(ppkFile))
-                    return
-                password = KEYSTORE.getPassword(keyfile)
                 cmdFile = pathlib.Path(tempfile.mktemp()).resolve()
                 with open(cmdFile,'w') as fout:
                     fout.write(serverName)
-                puttyCmd = ['putty','-l',user,'-i',ppkFile,'-m',cmdFile,'-pw',password,address]
+                puttyCmd = ['putty','-l',user,'-m',cmdFile]
+                # Without a key file, putty authenticates through the agent (Pageant)
+                if keyfile is not None:
+                    ppkFile = keyfile.parent.joinpath(keyfile.stem +'.ppk')
+                    if not ppkFile.exists():
+                        logging.error('Can not find the {} ppk file'.format(ppkFile))
+                        return
+                    puttyCmd.extend(['-i',ppkFile])
+                    # The password may not be stored (agent keys) or may have been evicted from the store, putty
+                    # prompts for it then
+                    if KEYSTORE.hasKey(keyfile):
+                        puttyCmd.extend(['-pw',KEYSTORE.getPassword(keyfile)])
+                puttyCmd.append(address)
                 subprocess.Popen(puttyCmd,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
         except Exception as e:
             logging.error(str(e))
@@ -724,16 +383,20 @@ class SessionsModel(QtCore.QAbstractItemModel):
         
         if index.isValid():
             p = index.internalPointer().parent()
-            if p:
+            # The sessions are top-level items
+            if p is not None and p is not self._root:
                 return QtCore.QAbstractItemModel.createIndex(self, p.row(), 0, p)
         return QtCore.QModelIndex()
 
-    def registerSSHKey(self, sessionIndex, connect=True):
+    def registerSSHKey(self, sessionIndex, connect=True, onConnected=None):
         """Register a ssh key in the key store.
 
+        When the key is held by a running SSH agent, the agent key is used and the key file is not decrypted.
+
         Args:
             sessionIndex (PyQt5.QtCore.QModelIndex): the session index
             connect (bool): if True establish the connection
+            onConnected (callable): if not None, called without argument once the session is connected
         """
 
         node = sessionIndex.internalPointer()
@@ -744,24 +407,25 @@ class SessionsModel(QtCore.QAbstractItemModel):
             key = None
         else:
             keytype = sessionData['keytype']
-            if not KEYSTORE.hasKey(keyfile):
+            key = KEYSTORE.getKey(keyfile) if KEYSTORE.hasKey(keyfile) else agentKey(keyfile)
+            if key is None:
                 password, ok = QtWidgets.QInputDialog.getText(None, "Password prompt", "Please enter SSH key password:", QtWidgets.QLineEdit.Password)
                 if not ok:
                     return                
-                
-                password = password.strip()
-                success,key = checkAndGetSSHKey(keyfile,keytype,password)
-                if success:
-                    KEYSTORE.addKey(keyfile,key,password)
-                    logging.info('Successfully unlocked {} key'.format(keyfile))
-                else:
-                    logging.error('Invalid password for unlocking {} key'.format(keyfile))
-                    return
-
-            key = KEYSTORE.getKey(keyfile)
+
+                # The key derivation function can take seconds, so the key is unlocked in the background
+                def onUnlocked(unlocked):
+                    if unlocked and connect:
+                        self.connect(sessionIndex,KEYSTORE.getKey(keyfile),onConnected)
+
+                JOB_MANAGER.submit('unlock',
+                                   'Unlock {} key'.format(keyfile),
+                                   lambda job : KEYSTORE.unlockKey(keyfile,keytype,password.strip()),
+                                   onUnlocked)
+                return
 
         if connect:
-            self.connect(sessionIndex,key)
+            self.connect(sessionIndex,key,onConnected)
 
     def removeRow(self, index, parentIndex):
         """Remove a row from the model.
@@ -771,9 +435,12 @@ class SessionsModel(QtCore.QAbstractItemModel):
             parentIndex (PyQt5.QtCore.QModelIndex): the parent index of the index to remove
         """
 
+        if not index.isValid():
+            return
+
         node = index.internalPointer()
-        parentNode = parentIndex.internalPointer()
-        if parentNode is None:
+        parentNode = parentIndex.internalPointer() if parentIndex.isValid() else self._root
+        if parentNode.childRow(node) < 0:
             return
 
         self.beginRemoveRows(parentIndex,index.row(),index.row())
@@ -804,32 +471,52 @@ class SessionsModel(QtCore.QAbstractItemModel):
     def saveSessions(self, sessionsFile):
         """Save the current sessions to a YAML file.
 
+        The file is written in the background by the sessions store, the changes made in a short delay being written
+        at once.
+
         Args:
             sessionsFile (pathlib.Path): the path to the sessions file
         """
 
-        sessionNodes = [self._root.child(i) for i in range(self._root.childCount())]
-
-        sessionsData = []
-        for sessionNode in sessionNodes:
-            data = sessionNode.data(0)
-            serverNodes = [sessionNode.child(i) for i in range(sessionNode.childCount())]
-            serverNames = [serverNode.name() for serverNode in serverNodes]
-            serverFavorites = [serverNode.data(0) for serverNode in serverNodes]
-            data['servers'] = collections.OrderedDict()
-            for server,favorites in zip(serverNames,serverFavorites):
-                data['servers'][server] = favorites
-            sessionsData.append(data)
+        SESSIONS_STORE.save(sessionsFile,sessionsData(self._root))
         
-        try:
-            with open(str(sessionsFile),'w') as fout:
-                yaml.dump(sessionsData,fout)
-        except Exception as e:
-            logging.error(str(e))
+    def unlockKeys(self, onUnlocked=None):
+        """Unlock up front the keys of all the sessions.
+
+        The passwords of the keys which are neither in the key store nor held by the SSH agent are prompted, then the
+        keys are unlocked concurrently in the background.
+
+        Args:
+            onUnlocked (callable): if not None, called with whether each key (indexed by its path) could be unlocked
+        """
+
+        keys = collections.OrderedDict()
+        for i in range(self._root.childCount()):
+            sessionData = self._root.child(i).data(0)
+            keyfile = sessionData.get('key')
+            if keyfile is None or keyfile in keys or KEYSTORE.hasKey(keyfile) or agentKey(keyfile) is not None:
+                continue
+            keys[keyfile] = sessionData['keytype']
+
+        if not keys:
+            logging.info('All the keys of the sessions are already unlocked')
             return
-        else:
-            logging.info('Session successfully saved to {}'.format(sessionsFile))
-        
+
+        requests = []
+        for keyfile, keytype in keys.items():
+            password, ok = QtWidgets.QInputDialog.getText(None, "Password prompt", "Please enter the password of {} SSH key:".format(keyfile), QtWidgets.QLineEdit.Password)
+            if not ok:
+                continue
+            requests.append((keyfile,keytype,password.strip()))
+
+        if not requests:
+            return
+
+        JOB_MANAGER.submit('unlock',
+                           'Unlock {} key(s)'.format(len(requests)),
+                           lambda job : KEYSTORE.unlockKeys(requests),
+                           onUnlocked)
+
     def updateSession(self, sessionIndex, newSessionData):
         """Update a given session with new data.
 
@@ -843,5 +530,44 @@ class SessionsModel(QtCore.QAbstractItemModel):
 
         sessionNode = sessionIndex.internalPointer()
         sessionNode.setData(newSessionData)
-        self.layoutChanged.emit()
+        self.dataChanged.emit(sessionIndex,sessionIndex)
+
+    def updateServers(self, sessionIndex, serverNames):
+        """Update the servers of a session with the servers found on its bastion.
+
+        Only the rows of the servers which were not found anymore and of the new servers are changed, in as few
+        notifications as possible. The other servers are kept along with their favorites.
+
+        Args:
+            sessionIndex (PyQt5.QtCore.QModelIndex): the session index
+            serverNames (list of str): the names of the servers
+        """
+
+        sessionNode = sessionIndex.internalPointer()
+
+        serverNames = list(dict.fromkeys(serverNames))
+        found = set(serverNames)
+
+        # The runs of contiguous rows are removed from the last one, so that the rows of the others stay valid
+        rows = [i for i in range(sessionNode.childCount()) if sessionNode.child(i).name() not in found]
+        while rows:
+            last = first = rows.pop()
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(sessionIndex,first,last)
+            sessionNode.removeChildren(first,last-first+1)
+            self.endRemoveRows()
+
+        # The new servers are inserted before the next known server of the list, contiguous ones at once
+        newServers = []
+        for name in serverNames:
+            serverNode = sessionNode.childByName(name)
+            if serverNode is None:
+                newServers.append(name)
+            elif newServers:
+                self._insertServers(sessionIndex,serverNode.row(),newServers)
+                newServers = []
+
+        if newServers:
+            self._insertServers(sessionIndex,sessionNode.childCount(),newServers)
 
@@ -1,4 +1,33 @@
-from PyQt5 import QtWidgets
+from PyQt5 import QtGui, QtWidgets
+
+from passhfiles.utils.Platform import iconsDirectory
+
+def loadIcon(name):
+    """Load an icon of the application from its file.
+
+    Each call reads the file again: the models and views get their icons from passhfiles.utils.Icons.ICON_REGISTRY
+    which shares them.
+
+    Args:
+        name (str): the name of the icon file in the icons directory
+
+    Returns:
+        PyQt5.QtGui.QIcon: the icon
+    """
+
+    return QtGui.QIcon(str(iconsDirectory().joinpath(name)))
+
+def loadPixmap(name):
+    """Load a pixmap of the application from its file (see loadIcon).
+
+    Args:
+        name (str): the name of the image file in the icons directory
+
+    Returns:
+        PyQt5.QtGui.QPixmap: the pixmap
+    """
+
+    return QtGui.QPixmap(str(iconsDirectory().joinpath(name)))
 
 def mainWindow(widget):
     """Returns the mainwindow from a given subwidget.
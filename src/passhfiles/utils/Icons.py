@@ -0,0 +1,131 @@
+import threading
+
+from PyQt5 import QtCore, QtGui
+
+from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.utils.Gui import loadIcon, loadPixmap
+
+class IconRegistry(metaclass=SingletonMeta):
+    """This class implements a registry of the icons and pixmaps of the application.
+
+    The resources are loaded on their first use and shared afterwards by all the models and views, so that painting a
+    row does not resolve a path nor read an image file. The files are decorated by the icon of the desktop theme
+    matching their MIME type, resolved once per extension. The icon of the application is used when the theme has
+    none.
+    """
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        self._icons = {}
+
+        self._fileIcons = {}
+
+        self._pixmaps = {}
+
+        self._mimeDatabase = None
+
+        self._lock = threading.Lock()
+
+    def clear(self):
+        """Drop the loaded resources. They will be loaded again on their next use.
+        """
+
+        with self._lock:
+            self._icons.clear()
+            self._fileIcons.clear()
+            self._pixmaps.clear()
+
+    def directoryIcon(self):
+        """Returns the icon of the directories.
+
+        Returns:
+            PyQt5.QtGui.QIcon: the icon
+        """
+
+        return self.icon('directory.png')
+
+    def fileIcon(self, filename):
+        """Returns the icon of a file according to its extension.
+
+        Args:
+            filename (str): the name of the file
+
+        Returns:
+            PyQt5.QtGui.QIcon: the icon
+        """
+
+        _, dot, extension = filename.rpartition('.')
+        extension = extension.lower() if dot else ''
+
+        icon = self._fileIcons.get(extension)
+        if icon is not None:
+            return icon
+
+        defaultIcon = self.icon('file.png')
+        if not extension:
+            icon = defaultIcon
+        else:
+            if self._mimeDatabase is None:
+                self._mimeDatabase = QtCore.QMimeDatabase()
+            mimeType = self._mimeDatabase.mimeTypeForFile('file.' + extension,QtCore.QMimeDatabase.MatchExtension)
+            icon = defaultIcon
+            if not mimeType.isDefault():
+                for iconName in (mimeType.iconName(),mimeType.genericIconName()):
+                    if QtGui.QIcon.hasThemeIcon(iconName):
+                        icon = QtGui.QIcon.fromTheme(iconName)
+                        break
+
+        with self._lock:
+            self._fileIcons[extension] = icon
+
+        return icon
+
+    def icon(self, name):
+        """Returns an icon of the application.
+
+        Args:
+            name (str): the name of the icon file in the icons directory
+
+        Returns:
+            PyQt5.QtGui.QIcon: the icon
+        """
+
+        icon = self._icons.get(name)
+        if icon is None:
+            icon = loadIcon(name)
+            with self._lock:
+                self._icons[name] = icon
+
+        return icon
+
+    def pixmap(self, name):
+        """Returns a pixmap of the application.
+
+        Args:
+            name (str): the name of the image file in the icons directory
+
+        Returns:
+            PyQt5.QtGui.QPixmap: the pixmap
+        """
+
+        pixmap = self._pixmaps.get(name)
+        if pixmap is None:
+            pixmap = loadPixmap(name)
+            with self._lock:
+                self._pixmaps[name] = pixmap
+
+        return pixmap
+
+    def size(self):
+        """Returns the number of loaded resources.
+
+        Returns:
+            int: the number of icons, file type icons and pixmaps loaded so far
+        """
+
+        return len(self._icons) + len(self._fileIcons) + len(self._pixmaps)
+
+# Create an instance of the icon registry (singleton)
+ICON_REGISTRY = IconRegistry()
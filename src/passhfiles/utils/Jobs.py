@@ -0,0 +1,371 @@
+import itertools
+import logging
+import time
+
+from PyQt5 import QtCore
+
+from passhfiles.kernel.Cancellation import CancellationToken, JobCancelledError
+from passhfiles.kernel.Singleton import SingletonMeta
+from passhfiles.kernel.Tracing import TRACER
+from passhfiles.utils.ProgressBar import progressBar
+
+# The priorities of the jobs. The interactive jobs (listings, renames, connections ...) are run ahead of the bulk ones.
+INTERACTIVE_PRIORITY = 10
+
+NORMAL_PRIORITY = 0
+
+BULK_PRIORITY = -10
+
+# The default priority of each kind of job
+PRIORITIES = {'listing' : INTERACTIVE_PRIORITY,
+              'create' : INTERACTIVE_PRIORITY,
+              'rename' : INTERACTIVE_PRIORITY,
+              'connect' : INTERACTIVE_PRIORITY,
+              'discover' : INTERACTIVE_PRIORITY,
+              'agent' : NORMAL_PRIORITY,
+              'unlock' : INTERACTIVE_PRIORITY,
+              'open' : NORMAL_PRIORITY,
+              'view' : INTERACTIVE_PRIORITY,
+              'edit' : INTERACTIVE_PRIORITY,
+              'save' : INTERACTIVE_PRIORITY,
+              'transfer' : BULK_PRIORITY,
+              'delete' : BULK_PRIORITY,
+              'sizes' : BULK_PRIORITY}
+
+class Job(QtCore.QRunnable):
+    """This class implements an operation run in the background by the job manager.
+
+    The operation is a callable which receives the job as its only argument. It can check the job's cancellation
+    token and report its progress through the job. Its result is delivered to the main thread through the
+    finishedSignal of the job's signals.
+    """
+
+    QUEUED = 'Queued'
+
+    RUNNING = 'Running'
+
+    FINISHED = 'Finished'
+
+    FAILED = 'Failed'
+
+    CANCELLED = 'Cancelled'
+
+    class Signals(QtCore.QObject):
+        """The signals of a job. A QRunnable being not a QObject, they are held by a separate object.
+        """
+
+        finishedSignal = QtCore.pyqtSignal(object)
+
+        progressChangedSignal = QtCore.pyqtSignal(object)
+
+        statusChangedSignal = QtCore.pyqtSignal(object,str)
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind, description, function, priority=None, key=None):
+        """Constructor.
+
+        Args:
+            kind (str): the kind of job (e.g. 'listing', 'transfer', 'delete' ...)
+            description (str): the description of the job displayed to the user
+            function (callable): the operation, called with the job as its only argument
+            priority (int): the priority of the job. If None, the default priority for its kind is used.
+            key (hashable): if not None, submitting a job with the same key cancels this one
+        """
+
+        super(Job,self).__init__()
+
+        self.setAutoDelete(False)
+
+        self.id = next(Job._ids)
+
+        self.kind = kind
+
+        self.description = description
+
+        self.priority = PRIORITIES.get(kind,NORMAL_PRIORITY) if priority is None else priority
+
+        self.key = key
+
+        self.token = CancellationToken()
+
+        self.status = Job.QUEUED
+
+        self.error = None
+
+        self.progress = None
+
+        self.submissionTime = time.time()
+
+        self.startTime = None
+
+        self.endTime = None
+
+        self.signals = Job.Signals()
+
+        self._function = function
+
+    def cancel(self):
+        """Request the cancellation of the job.
+        """
+
+        self.token.cancel()
+
+    def duration(self):
+        """Returns the time spent running the job.
+
+        Returns:
+            float: the duration in seconds. None if the job has not started yet.
+        """
+
+        if self.startTime is None:
+            return None
+
+        return (self.endTime or time.time()) - self.startTime
+
+    def isDone(self):
+        """Returns whether the job is over.
+
+        Returns:
+            bool: True if the job is finished, failed or was cancelled
+        """
+
+        return self.status in (Job.FINISHED,Job.FAILED,Job.CANCELLED)
+
+    def run(self):
+        """Run the job. Called by the thread pool.
+        """
+
+        if self.token.isCancelled():
+            self._setStatus(Job.CANCELLED)
+            return
+
+        self.startTime = time.time()
+        self._setStatus(Job.RUNNING)
+
+        with TRACER.span(self.kind,'job',description=self.description,queueDelay=self.startTime - self.submissionTime) as args:
+            try:
+                result = self._function(self)
+            except JobCancelledError:
+                status = Job.CANCELLED
+            except Exception as e:
+                self.error = str(e)
+                status = Job.FAILED
+            else:
+                if self.token.isCancelled():
+                    status = Job.CANCELLED
+                else:
+                    self.signals.finishedSignal.emit(result)
+                    status = Job.FINISHED
+            args['status'] = status
+
+        self.endTime = time.time()
+        self._setStatus(status)
+
+    def _setStatus(self, status):
+        """Set the status of the job and notify it.
+
+        Args:
+            status (str): the status
+        """
+
+        self.status = status
+        self.signals.statusChangedSignal.emit(self,status)
+
+    def setProgress(self, value, maximum):
+        """Report the progress of the job.
+
+        Args:
+            value (int): the progress
+            maximum (int): the value of the progress when the job is over
+        """
+
+        self.progress = (value,maximum)
+        self.signals.progressChangedSignal.emit(self)
+
+class _JobManagerMeta(SingletonMeta, type(QtCore.QObject)):
+    pass
+
+class JobManager(QtCore.QObject, metaclass=_JobManagerMeta):
+    """This class implements the manager of the jobs run in the background.
+
+    The interactive jobs are queued by priority in a first thread pool. The bulk jobs (transfers, deletions ...) run
+    in a second one so that they can never hold up the interactive jobs. The manager keeps the running jobs and a
+    short history of the jobs which are over.
+    """
+
+    # The number of jobs which are over kept in the history
+    HISTORY_SIZE = 50
+
+    jobAddedSignal = QtCore.pyqtSignal(object)
+
+    jobChangedSignal = QtCore.pyqtSignal(object)
+
+    jobRemovedSignal = QtCore.pyqtSignal(object)
+
+    def __init__(self):
+        """Constructor.
+        """
+
+        super(JobManager,self).__init__()
+
+        self._interactivePool = QtCore.QThreadPool()
+        self._interactivePool.setMaxThreadCount(max(QtCore.QThread.idealThreadCount(),4))
+
+        self._bulkPool = QtCore.QThreadPool()
+        self._bulkPool.setMaxThreadCount(4)
+
+        self._jobs = []
+
+    def cancel(self, job):
+        """Cancel a job.
+
+        A queued job is removed from its pool. A running job is notified through its cancellation token.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        if job.isDone():
+            return
+
+        job.cancel()
+
+        if job.status == Job.QUEUED and self._pool(job).tryTake(job):
+            job._setStatus(Job.CANCELLED)
+
+    def cancelAll(self):
+        """Cancel all the jobs.
+        """
+
+        for job in list(self._jobs):
+            self.cancel(job)
+
+    def clearHistory(self):
+        """Remove the jobs which are over.
+        """
+
+        for job in [j for j in self._jobs if j.isDone()]:
+            self._removeJob(job)
+
+    def jobs(self):
+        """Returns the jobs.
+
+        Returns:
+            list of passhfiles.utils.Jobs.Job: the running and queued jobs and the history
+        """
+
+        return self._jobs
+
+    def onJobProgressChanged(self, job):
+        """Called when a job reports its progress.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        value, maximum = job.progress
+        progressBar.reset(maximum)
+        progressBar.update(value)
+
+        self.jobChangedSignal.emit(job)
+
+    def onJobStatusChanged(self, job, status):
+        """Called when the status of a job changes.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+            status (str): the new status of the job
+        """
+
+        if status == Job.FAILED:
+            logging.error('{}: {}'.format(job.description,job.error))
+        # The jobs with a key are mostly cancelled because they were superseded which is not worth a message
+        elif status == Job.CANCELLED and job.key is None:
+            logging.info('{}: cancelled'.format(job.description))
+
+        self.jobChangedSignal.emit(job)
+
+        if status in (Job.FINISHED,Job.FAILED,Job.CANCELLED):
+            doneJobs = [j for j in self._jobs if j.isDone()]
+            for j in doneJobs[:max(len(doneJobs) - JobManager.HISTORY_SIZE,0)]:
+                self._removeJob(j)
+
+    def _pool(self, job):
+        """Returns the thread pool in which a job runs.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+
+        Returns:
+            PyQt5.QtCore.QThreadPool: the pool
+        """
+
+        return self._bulkPool if job.priority < NORMAL_PRIORITY else self._interactivePool
+
+    def _removeJob(self, job):
+        """Remove a job from the list of jobs.
+
+        Args:
+            job (passhfiles.utils.Jobs.Job): the job
+        """
+
+        self._jobs.remove(job)
+        self.jobRemovedSignal.emit(job)
+
+    def shutdown(self, timeout=3000):
+        """Cancel all the jobs and wait for them to stop.
+
+        Args:
+            timeout (int): the maximum time to wait in ms
+        """
+
+        self.cancelAll()
+        self._interactivePool.waitForDone(timeout)
+        self._bulkPool.waitForDone(timeout)
+
+    def submit(self, kind, description, function, onFinished=None, priority=None, key=None, onDone=None):
+        """Run an operation in the background.
+
+        Must be called from the main thread.
+
+        Args:
+            kind (str): the kind of job (e.g. 'listing', 'transfer', 'delete' ...)
+            description (str): the description of the job displayed to the user
+            function (callable): the operation, called in a worker thread with the job as its only argument
+            onFinished (callable): if not None, called in the main thread with the result of the operation when it
+            completes successfully
+            priority (int): the priority of the job. If None, the default priority for its kind is used.
+            key (hashable): if not None, the jobs submitted before with the same key are cancelled (e.g. the listing
+            of a directory which was left)
+            onDone (callable): if not None, called in the main thread with the job when it is over whatever its
+            outcome (e.g. for refreshing a view after a transfer which was cancelled half way)
+
+        Returns:
+            passhfiles.utils.Jobs.Job: the job
+        """
+
+        job = Job(kind,description,function,priority,key)
+
+        if key is not None:
+            for j in self._jobs:
+                if j.key == key:
+                    self.cancel(j)
+
+        # The signals are emitted from the worker thread and delivered in the main thread
+        job.signals.statusChangedSignal.connect(self.onJobStatusChanged)
+        job.signals.progressChangedSignal.connect(self.onJobProgressChanged)
+        if onFinished is not None:
+            job.signals.finishedSignal.connect(onFinished)
+        if onDone is not None:
+            job.signals.statusChangedSignal.connect(lambda j, status : onDone(j) if status in (Job.FINISHED,Job.FAILED,Job.CANCELLED) else None)
+
+        self._jobs.append(job)
+        self.jobAddedSignal.emit(job)
+
+        self._pool(job).start(job,job.priority)
+
+        return job
+
+# Create an instance of the job manager (singleton)
+JOB_MANAGER = JobManager()
@@ -203,6 +203,15 @@ def iconsDirectory():
 
     return applicationDirectory().joinpath('icons')
 
+def knownHostsPath():
+    """Returns the path to the file where the keys of the SSH servers are stored.
+
+    Returns:
+        pathlib.Path: the path to the known hosts file
+    """
+
+    return applicationSettingsDirectory().joinpath('known_hosts')
+
 def sessionsDatabasePath():
     """Returns the path to the sessions file.
 
@@ -1,7 +1,8 @@
 import io
 import logging
 
-import paramiko
+from passhfiles.kernel.Cancellation import interruptOnCancel
+from passhfiles.kernel.Tracing import TRACER
 
 def checkAndGetSSHKey(keyfile,keytype,password):
     """Check and returns the SSH key.
@@ -11,6 +12,9 @@ def checkAndGetSSHKey(keyfile,keytype,password):
         password (str): the password (if any)
     """
 
+    # paramiko is only needed once a key is unlocked, which keeps it out of the startup of the application
+    import paramiko
+
     if keytype == 'RSA':
         paramikoKeyModule = paramiko.RSAKey
     elif keytype == 'ECDSA':
@@ -33,11 +37,126 @@ def checkAndGetSSHKey(keyfile,keytype,password):
     else:
         return (True,key)
 
-def runRemoteCmd(sshSession,serverNode,cmd):
+def _connectionLost(sshSession):
+    """Returns whether the connection of a session which can reconnect was lost.
+
+    Args:
+        sshSession (passhfiles.kernel.Sessions.ReconnectingSession): the SSH session
+
+    Returns:
+        bool: True if the session can reconnect and its connection is down
+    """
+
+    return hasattr(sshSession,'reconnect') and not sshSession.isAlive()
 
-    _, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+def _retryOnConnectionLost(sshSession,cmd,run):
+    """Run a remote operation and run it again on a new connection if the connection was lost while it ran.
+
+    Only the operations which can be safely repeated (e.g. listings, reads) must be retried.
+
+    Args:
+        sshSession (passhfiles.kernel.Sessions.ReconnectingSession): the SSH session
+        cmd (str): the command run by the operation
+        run (callable): the operation
+
+    Returns:
+        the result of the operation
+    """
 
-    stdout = stdout.read().decode().replace(serverNode.stdoutMotd(),'').strip()
-    stderr = stderr.read().decode().replace(serverNode.stderrMotd(),'').strip()
+    try:
+        result = run()
+    except Exception:
+        if not _connectionLost(sshSession):
+            raise
+    else:
+        # The channels of a dropped connection are closed, so that the output read so far looks complete
+        if not _connectionLost(sshSession):
+            return result
+
+    logging.warning('The connection was lost while running {}, running it again'.format(cmd))
+    sshSession.reconnect()
+
+    return run()
+
+def runRemoteCmd(sshSession,serverNode,cmd,token=None,idempotent=False):
+    """Run a remote command and returns its output.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        cmd (str): the command
+        token (passhfiles.kernel.Cancellation.CancellationToken): if not None, the channel of the command is closed when
+        the token is cancelled, which makes the bastion hang up the remote process
+        idempotent (bool): if True, the command is run again on a new connection if the connection was lost while it
+        ran
+
+    Returns:
+        tuple: the stdout and the stderr of the command
+
+    Raises:
+        passhfiles.kernel.Cancellation.JobCancelledError: if the token was cancelled
+    """
+
+    if idempotent:
+        return _retryOnConnectionLost(sshSession,cmd,lambda : _runRemoteCmd(sshSession,serverNode,cmd,token))
+
+    return _runRemoteCmd(sshSession,serverNode,cmd,token)
+
+def _runRemoteCmd(sshSession,serverNode,cmd,token):
+    """Run a remote command and returns its output (see runRemoteCmd).
+    """
+
+    # The time spent opening the channel through the bastion, waiting for the remote command and stripping the
+    # message of the day are traced separately
+    with TRACER.span('runRemoteCmd','ssh',server=serverNode.name(),cmd=cmd):
+        with TRACER.span('exec_command','ssh'):
+            _, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+
+        with interruptOnCancel(token,stdout.channel.close):
+            with TRACER.span('read output','ssh') as args:
+                stdout = stdout.read()
+                stderr = stderr.read()
+                args['bytes'] = len(stdout) + len(stderr)
+
+        with TRACER.span('strip motd','ssh'):
+            stdout = stdout.decode().replace(serverNode.stdoutMotd(),'').strip()
+            stderr = stderr.decode().replace(serverNode.stderrMotd(),'').strip()
 
     return stdout,stderr
+
+def readRemoteBytes(sshSession,serverNode,cmd):
+    """Run a remote command and returns its raw output.
+
+    Unlike runRemoteCmd, the output is neither decoded nor stripped so that binary data can be read safely. Only the
+    message of the day printed by the bastion before the output is removed. The command must only read, as it is run
+    again on a new connection if the connection was lost while it ran.
+
+    Args:
+        sshSession (paramiko.client.SSHClient): the SSH session
+        serverNode (passhfiles.kernel.Sessions.ServerNode): the server
+        cmd (str): the command
+
+    Returns:
+        bytes: the output of the command
+    """
+
+    return _retryOnConnectionLost(sshSession,cmd,lambda : _readRemoteBytes(sshSession,serverNode,cmd))
+
+def _readRemoteBytes(sshSession,serverNode,cmd):
+    """Run a remote command and returns its raw output (see readRemoteBytes).
+    """
+
+    with TRACER.span('readRemoteBytes','ssh',server=serverNode.name(),cmd=cmd) as args:
+        _, stdout, stderr = sshSession.exec_command('{} {}'.format(serverNode.name(),cmd))
+
+        data = stdout.read()
+        motd = serverNode.stdoutMotd().encode()
+        if motd and data.startswith(motd):
+            data = data[len(motd):]
+
+        error = stderr.read().decode().replace(serverNode.stderrMotd(),'').strip()
+        args['bytes'] = len(data)
+    if error:
+        raise IOError(error)
+
+    return data
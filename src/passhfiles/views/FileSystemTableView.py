@@ -4,9 +4,10 @@ import pathlib
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from passhfiles.dialogs.FileEditorDialog import FileEditorDialog
+from passhfiles.dialogs.FileViewerDialog import FileViewerDialog
 from passhfiles.models.IFileSystemModel import IFileSystemModel
 from passhfiles.utils.Gui import mainWindow
-from passhfiles.utils.String import isBinaryString
+from passhfiles.utils.Numbers import sizeOf
 
 class FileSystemTableView(QtWidgets.QTableView):
     """Implements a view to the file system (local or remote). The view is implemented as a table view with four 
@@ -35,6 +36,10 @@ class FileSystemTableView(QtWidgets.QTableView):
 
         self._showHiddenFiles = True
 
+        self._synchronize = False
+
+        self._checksum = False
+
     def dragEnterEvent(self, event):
         event.accept()
 
@@ -128,6 +133,25 @@ class FileSystemTableView(QtWidgets.QTableView):
 
         self.model().addToFavorites(selectedRow)
 
+    def onCompareChecksums(self, checksum):
+        """Enable/disable the comparison of the files through their checksums when synchronizing transfers.
+
+        Args:
+            checksum (bool): indicates whether or not the checksums have to be compared
+        """
+
+        self._checksum = checksum
+        self.model().setSynchronize(self._synchronize, self._checksum)
+
+    def onComputeDirectorySizes(self):
+        """Called when the user computes the size of the directories of the current directory.
+        """
+
+        if self.model() is None:
+            return
+
+        self.model().computeDirectorySizes()
+
     def onCopyData(self):
         """Copy data.
         """
@@ -173,17 +197,36 @@ class FileSystemTableView(QtWidgets.QTableView):
             index (PyQt5.QtCore.QModelIndex): the index of the selected file
         """
 
-        tempFile, actualFile = self.model().createTemporaryFile(index)
+        model = self.model()
 
-        if isBinaryString(open(str(tempFile),'rb').read(1024)):
-            logging.error('The file is a binary. Can not edit')
-            return
+        row = index.row()
 
-        dialog = FileEditorDialog(tempFile, actualFile)
+        path = model.getEntries([row])[0][0]
 
-        dialog.fileSaved.connect(self.onSaveFile)
+        def onSniffed(info):
+            # The directory may have been listed again or sorted while the file was inspected
+            if self.model() is not model or row >= model.rowCount() or model.getEntries([row])[0][0] != path:
+                logging.info('{} moved in the meantime. Edit it again'.format(path))
+                return
 
-        dialog.exec_()
+            if info.isBinary:
+                logging.error('The file is a binary. Can not edit')
+                return
+
+            # Large files are shown in the streaming viewer rather than downloaded for being edited
+            if not info.isEditable():
+                logging.warning('The file is too large for being edited ({}). Open it in the viewer'.format(sizeOf(info.size)))
+                self.onViewFile(index)
+                return
+
+            model.createTemporaryFile(index,onCreated)
+
+        def onCreated(tempFile, actualFile):
+            dialog = FileEditorDialog(tempFile, actualFile)
+            dialog.fileSaved.connect(lambda tempFile, actualFile : self.onSaveFile(tempFile,actualFile,model))
+            dialog.exec_()
+
+        model.sniffFile(index,onSniffed)
 
     def onGoToFavorite(self, path):
         """Called when the user select one path among the favorites.
@@ -239,15 +282,29 @@ class FileSystemTableView(QtWidgets.QTableView):
         if ok and text.strip():
             self.model().renameEntry(selectedRow, text.strip())
 
-    def onSaveFile(self, tempFile, actualFile):
-        """Save a file that was opened for edition.
+    def onSaveFile(self, tempFile, actualFile, model):
+        """Save in the background a file that was opened for edition.
+
+        The user is asked whether the changes made by someone else in the meantime should be overwritten.
 
         Args:
             tempFile (pathlib.Path): the temporary file that contains the saved data
             actualFile (pathlib.PurePath): the actual path to which the file should be saved
+            model (passhfiles.models.IFileSystemModel.IFileSystemModel): the model of the file system of the file
         """
 
-        self.model().saveFile(tempFile, actualFile)
+        def onConflict(error):
+            reply = QtWidgets.QMessageBox.question(self,
+                                                   'Save conflict',
+                                                   '{}\n\nOverwrite the changes made by someone else?'.format(error),
+                                                   QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
+                                                   QtWidgets.QMessageBox.No)
+            if reply == QtWidgets.QMessageBox.Yes:
+                model.saveFile(tempFile, actualFile, overwrite=True, onConflict=onConflict)
+            else:
+                logging.warning('{} was not saved'.format(actualFile))
+
+        model.saveFile(tempFile, actualFile, onConflict=onConflict)
 
     def onShowContextualMenu(self, point):
         """Pops up a contextual menu when the user right-clicks on the file system.
@@ -269,11 +326,25 @@ class FileSystemTableView(QtWidgets.QTableView):
         showHiddenFilesAction.setChecked(self._showHiddenFiles)
         showHiddenFilesAction.triggered.connect(self.onShowHiddenFiles)
 
+        synchronizeAction = menu.addAction('Synchronize transfers')
+        synchronizeAction.setCheckable(True)
+        synchronizeAction.setChecked(self._synchronize)
+        synchronizeAction.triggered.connect(self.onSynchronize)
+
+        checksumAction = menu.addAction('Compare checksums')
+        checksumAction.setCheckable(True)
+        checksumAction.setChecked(self._checksum)
+        checksumAction.setEnabled(self._synchronize)
+        checksumAction.triggered.connect(self.onCompareChecksums)
+
         menu.addSeparator()
 
         reloadAction = menu.addAction('Reload')
         reloadAction.triggered.connect(self.onReloadDirectory)
 
+        computeDirectorySizesAction = menu.addAction('Compute folder sizes')
+        computeDirectorySizesAction.triggered.connect(self.onComputeDirectorySizes)
+
         menu.addSeparator()
 
         createDirectoryAction = menu.addAction('Create Directory')
@@ -299,6 +370,9 @@ class FileSystemTableView(QtWidgets.QTableView):
                 editAction = menu.addAction('Edit')
                 editAction.triggered.connect(lambda item, index=selectedIndex : self.onEditFile(index))
 
+                viewAction = menu.addAction('View')
+                viewAction.triggered.connect(lambda item, index=selectedIndex : self.onViewFile(index))
+
             menu.addSeparator()
 
             copyAction = menu.addAction('Copy')
@@ -335,6 +409,31 @@ class FileSystemTableView(QtWidgets.QTableView):
         self.model().showHiddenFiles(show)
         self._showHiddenFiles = show
 
+    def onSynchronize(self, synchronize):
+        """Enable/disable the synchronization mode for the transfers.
+
+        Args:
+            synchronize (bool): indicates whether or not the transfers have to be synchronized
+        """
+
+        self._synchronize = synchronize
+        self.model().setSynchronize(self._synchronize, self._checksum)
+
+    def onViewFile(self, index):
+        """View a given file without copying it entirely.
+
+        Args:
+            index (PyQt5.QtCore.QModelIndex): the index of the selected file
+        """
+
+        reader = self.model().createRangeReader(index)
+        if reader is None:
+            return
+
+        dialog = FileViewerDialog(reader, self)
+
+        dialog.exec_()
+
     def setModel(self, model):
         """Set the model.
 
@@ -344,4 +443,6 @@ class FileSystemTableView(QtWidgets.QTableView):
 
         super(FileSystemTableView,self).setModel(model)
 
+        model.setSynchronize(self._synchronize, self._checksum)
+
         self.doubleClicked.connect(self.model().onOpenEntry)
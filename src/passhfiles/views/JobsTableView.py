@@ -0,0 +1,80 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from passhfiles.models.JobsModel import JobsModel
+from passhfiles.utils.Jobs import JOB_MANAGER
+
+class JobsTableView(QtWidgets.QTableView):
+    """Implements a view showing the status of the jobs run in the background.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Constructor.
+        """
+
+        super(JobsTableView,self).__init__(*args, **kwargs)
+
+        self.setModel(JobsModel(self))
+
+        self.setShowGrid(False)
+        self.setSelectionBehavior(QtWidgets.QTableView.SelectRows)
+        self.setContextMenuPolicy(QtCore.Qt.CustomContextMenu)
+        self.horizontalHeader().setSectionResizeMode(0,QtWidgets.QHeaderView.Stretch)
+        self.verticalHeader().hide()
+
+        self.customContextMenuRequested.connect(self.onShowContextualMenu)
+
+    def keyPressEvent(self, event):
+        """Event triggered when user press a key of the keyboard.
+
+        Args:
+            PyQt5.QtGui.QKeyEvent: the key press event
+        """
+
+        if event.key() == QtCore.Qt.Key_Delete:
+            self.onCancelJobs()
+
+        return super(JobsTableView,self).keyPressEvent(event)
+
+    def onCancelAllJobs(self):
+        """Cancel all the jobs.
+        """
+
+        JOB_MANAGER.cancelAll()
+
+    def onCancelJobs(self):
+        """Cancel the selected jobs.
+        """
+
+        for index in self.selectionModel().selectedRows():
+            job = self.model().job(index.row())
+            if job is not None:
+                JOB_MANAGER.cancel(job)
+
+    def onClearHistory(self):
+        """Remove the jobs which are over.
+        """
+
+        JOB_MANAGER.clearHistory()
+
+    def onShowContextualMenu(self, point):
+        """Pops up a contextual menu when the user right-clicks on the view.
+
+        Args:
+            point (PyQt5.QtCore.QPoint): the point where the user right-clicked
+        """
+
+        menu = QtWidgets.QMenu()
+
+        cancelAction = menu.addAction('Cancel')
+        cancelAction.setEnabled(bool(self.selectionModel().selectedRows()))
+        cancelAction.triggered.connect(self.onCancelJobs)
+
+        cancelAllAction = menu.addAction('Cancel all')
+        cancelAllAction.triggered.connect(self.onCancelAllJobs)
+
+        menu.addSeparator()
+
+        clearHistoryAction = menu.addAction('Clear finished jobs')
+        clearHistoryAction.triggered.connect(self.onClearHistory)
+
+        menu.exec_(QtGui.QCursor.pos())
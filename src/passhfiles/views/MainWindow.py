@@ -1,19 +1,21 @@
 import logging
 import pathlib
 import platform
-import subprocess
 import sys
 
-from PyQt5 import QtGui, QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
 from passhfiles.__pkginfo__ import __version__
-from passhfiles.dialogs.AboutDialog import AboutDialog
-from passhfiles.models.LocalFileSystemModel import LocalFileSystemModel
-from passhfiles.models.RemoteFileSystemModel import RemoteFileSystemModel
-from passhfiles.utils.Platform import homeDirectory, iconsDirectory, sessionsDatabasePath
+from passhfiles.kernel.HostKeys import HOST_KEYS, defaultKnownHostsPath
+from passhfiles.kernel.Sessions import reachServer
+from passhfiles.kernel.SessionsStore import SESSIONS_STORE
+from passhfiles.kernel.SSHAgent import agentSocket, runningAgents
+from passhfiles.utils.Icons import ICON_REGISTRY
+from passhfiles.utils.Jobs import JOB_MANAGER
+from passhfiles.utils.Platform import homeDirectory, sessionsDatabasePath
 from passhfiles.utils.ProgressBar import progressBar
-from passhfiles.utils.Security import runRemoteCmd
 from passhfiles.views.FileSystemTableView import FileSystemTableView
+from passhfiles.views.JobsTableView import JobsTableView
 from passhfiles.views.SessionsTreeView import SessionsTreeView
 from passhfiles.widgets.LoggerWidget import LoggerWidget
 
@@ -30,13 +32,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
         super(MainWindow, self).__init__(parent)
 
-        self._initUi()
-
-        self.loadSessions()
+        self._copiedData = None
 
-        self.checkSSHAgent()
+        self._initUi()
 
-        self._copiedData = None
+        # The sessions are loaded and the SSH agent looked for once the window has been painted
+        QtCore.QTimer.singleShot(0,self.loadSessions)
+        QtCore.QTimer.singleShot(0,self.checkSSHAgent)
 
     def onReloadFileSystems(self):
 
@@ -52,15 +54,25 @@ class MainWindow(QtWidgets.QMainWindow):
         fileMenu = menubar.addMenu('&Session')
 
         addSessionAction = QtWidgets.QAction('&Add Session', self)
-        addSessionAction.setIcon(QtGui.QIcon(str(iconsDirectory().joinpath('new_session.png'))))
+        addSessionAction.setIcon(ICON_REGISTRY.icon('new_session.png'))
         addSessionAction.setStatusTip('Open ssh session dialog')
         addSessionAction.triggered.connect(self._sessionsTreeView.onAddSession)
         fileMenu.addAction(addSessionAction)
 
+        unlockKeysAction = QtWidgets.QAction('&Unlock keys', self)
+        unlockKeysAction.setStatusTip('Unlock the SSH keys of all the sessions')
+        unlockKeysAction.triggered.connect(self._sessionsTreeView.onUnlockKeys)
+        fileMenu.addAction(unlockKeysAction)
+
+        importKnownHostsAction = QtWidgets.QAction('&Import known hosts', self)
+        importKnownHostsAction.setStatusTip('Import the keys of the servers trusted by OpenSSH ({})'.format(defaultKnownHostsPath()))
+        importKnownHostsAction.triggered.connect(self.onImportKnownHosts)
+        fileMenu.addAction(importKnownHostsAction)
+
         fileMenu.addSeparator()
 
         exitAction = QtWidgets.QAction('&Exit', self)
-        exitAction.setIcon(QtGui.QIcon(str(iconsDirectory().joinpath('exit.png'))))
+        exitAction.setIcon(ICON_REGISTRY.icon('exit.png'))
         exitAction.setShortcut('Ctrl+Q')
         exitAction.setStatusTip('Exit')
         exitAction.triggered.connect(self.onQuitApplication)
@@ -68,32 +80,36 @@ class MainWindow(QtWidgets.QMainWindow):
 
         helpMenu = menubar.addMenu('&Help')
 
+        diagnosticsAction = QtWidgets.QAction('Diagnostics',self)
+        diagnosticsAction.setStatusTip('Show the durations of the operations')
+        diagnosticsAction.triggered.connect(self.onLaunchDiagnosticsDialog)
+
+        helpMenu.addAction(diagnosticsAction)
+
         aboutAction = QtWidgets.QAction('About',self)
-        aboutAction.setIcon(QtGui.QIcon(str(iconsDirectory().joinpath('about.png'))))
+        aboutAction.setIcon(ICON_REGISTRY.icon('about.png'))
         aboutAction.triggered.connect(self.onLaunchAboutDialog)
 
         helpMenu.addAction(aboutAction)
 
     def checkSSHAgent(self):
         """Check for a running SSH agent (On Unix) and log some info in cas where one is found.
+
+        The agent advertised through SSH_AUTH_SOCK is checked first. Otherwise the processes are listed in the
+        background.
         """
 
         if platform.system() not in ['Linux','Darwin']:
             return
 
-        p1 = subprocess.Popen(['ps','ax'],stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-        p2 = subprocess.Popen(['grep', '[s]sh-agent'],stdin=p1.stdout,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-        p3 = subprocess.Popen(['wc', '-l'],stdin=p2.stdout,stdout=subprocess.PIPE,stderr=subprocess.PIPE)
-        out,err = p3.communicate()
-
-        err = err.decode().strip()
-        if err:
-            logging.error(err)
+        if agentSocket() is not None:
+            self.onSSHAgentChecked(1)
             return
 
-        nAgents = int(out.decode().strip())
-        if nAgents > 0:
-            logging.info('A SSH agent is running. Please check that your keys are registered before opening a session.')
+        JOB_MANAGER.submit('agent',
+                           'Look for a running SSH agent',
+                           lambda job : runningAgents(),
+                           self.onSSHAgentChecked)
 
     def closeEvent(self, event):
         """Called when the user quit the application by closing the main window.
@@ -104,6 +120,10 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.disconnectAll()
 
+        SESSIONS_STORE.flush()
+
+        JOB_MANAGER.shutdown()
+
         return super(MainWindow,self).closeEvent(event)
 
     def copiedData(self):
@@ -119,7 +139,7 @@ class MainWindow(QtWidgets.QMainWindow):
         """Disconnects all SSH session established so far.
         """
 
-        sessionsModel = self._sessionsTreeView.model()
+        sessionsModel = self._sessionsTreeView.sessionsModel()
 
         for i in range(sessionsModel.rowCount()):
             index = sessionsModel.index(i,0)
@@ -132,6 +152,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self._mainFrame = QtWidgets.QFrame(self)
         
         self._sessionsTreeView = SessionsTreeView()
+        self._sessionsSearch = QtWidgets.QLineEdit()
+        self._sessionsSearch.setPlaceholderText('Search sessions and servers')
+        self._sessionsSearch.setClearButtonEnabled(True)
         self._progressBar = QtWidgets.QProgressBar()
         progressBar.setProgressWidget(self._progressBar)
         self.statusBar().addPermanentWidget(QtWidgets.QLabel('Progress'))
@@ -159,6 +182,7 @@ class MainWindow(QtWidgets.QMainWindow):
         leftPanelWidget = QtWidgets.QWidget()
         leftPaneLayout = QtWidgets.QVBoxLayout()
         leftPaneLayout.addWidget(QtWidgets.QLabel('SSH sessions'))
+        leftPaneLayout.addWidget(self._sessionsSearch)
         leftPaneLayout.addWidget(self._sessionsTreeView)
         leftPanelWidget.setLayout(leftPaneLayout)
 
@@ -175,12 +199,18 @@ class MainWindow(QtWidgets.QMainWindow):
         logging.getLogger().addHandler(self._logger)
         logging.getLogger().setLevel(logging.INFO)
 
+        self._jobsTableView = JobsTableView(self)
+
+        self._bottomTabs = QtWidgets.QTabWidget()
+        self._bottomTabs.addTab(self._logger.widget(),'Log')
+        self._bottomTabs.addTab(self._jobsTableView,'Jobs')
+
         self.setCentralWidget(self._mainFrame)
 
         mainLayout = QtWidgets.QVBoxLayout()
 
         mainLayout.addWidget(self._splitter, stretch=4)
-        mainLayout.addWidget(self._logger.widget(), stretch=1)
+        mainLayout.addWidget(self._bottomTabs, stretch=1)
 
         self.setGeometry(0, 0, 1400, 800)
 
@@ -188,13 +218,15 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._buildMenu()
 
-        self.setWindowIcon(QtGui.QIcon(str(iconsDirectory().joinpath('passhfiles.png'))))
+        self.setWindowIcon(ICON_REGISTRY.icon('passhfiles.png'))
         self.setWindowTitle("passhfiles ({})".format(__version__))
 
         self.show()
 
         self._sessionsTreeView.openBrowsersSignal.connect(self.onOpenBrowsers)
 
+        self._sessionsSearch.textChanged.connect(self._sessionsTreeView.onSearch)
+
         self._logger.sendLog.connect(self.onDisplayLogMessage)
 
     def loadSessions(self):
@@ -203,7 +235,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         sessionsPath = sessionsDatabasePath()
 
-        sessionsModel = self._sessionsTreeView.model()
+        sessionsModel = self._sessionsTreeView.sessionsModel()
         sessionsModel.loadSessions(sessionsPath)
 
     def onAddToFavorites(self, fileSystemType, path):
@@ -214,14 +246,14 @@ class MainWindow(QtWidgets.QMainWindow):
             path (pathlib.Path): the path to add to the favorites
         """
 
-        sessionsModel = self._sessionsTreeView.model()
-        sessionsModel.addToFavorites(self._sessionsTreeView.currentIndex(),fileSystemType, path)
+        sessionsModel = self._sessionsTreeView.sessionsModel()
+        sessionsModel.addToFavorites(self._sessionsTreeView.currentSessionsIndex(),fileSystemType, path)
 
     def onClearSessions(self):
         """Removed all the loaded sessions.
         """
 
-        sessionsModel = self._sessionsTreeView.model()
+        sessionsModel = self._sessionsTreeView.sessionsModel()
         sessionsModel.clear()
 
     def onDisplayLogMessage(self, msg):
@@ -233,13 +265,34 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self._logger.widget().appendPlainText(msg)
 
+    def onImportKnownHosts(self):
+        """Event called when the user imports the known_hosts file of OpenSSH in the host key store.
+        """
+
+        knownHostsFile = defaultKnownHostsPath()
+
+        JOB_MANAGER.submit('hostkeys',
+                           'Import the host keys of {}'.format(knownHostsFile),
+                           lambda job : HOST_KEYS.importKnownHosts(knownHostsFile))
+
     def onLaunchAboutDialog(self):
         """Pops up the information dialog about the application.
         """
 
+        from passhfiles.dialogs.AboutDialog import AboutDialog
+
         dialog = AboutDialog(self)
         dialog.exec_()
 
+    def onLaunchDiagnosticsDialog(self):
+        """Pops up the diagnostics dialog showing the durations of the traced operations.
+        """
+
+        from passhfiles.dialogs.DiagnosticsDialog import DiagnosticsDialog
+
+        dialog = DiagnosticsDialog(self)
+        dialog.exec_()
+
     def onLoadSessions(self):
         """Load the sessions.
         """
@@ -249,6 +302,8 @@ class MainWindow(QtWidgets.QMainWindow):
     def onOpenBrowsers(self, serverIndex):
         """Opens the local and remote file system browsers for a given server.
 
+        The server is reached in the background. The browsers are opened once it answered.
+
         Args:
             serverIndex (PyQt5.QtCore.QModelIndex): the index of the server
         """
@@ -262,34 +317,35 @@ class MainWindow(QtWidgets.QMainWindow):
 
         logging.info('Establishing connection to {}'.format(serverName))
 
-        # Fetch the result of echo -n remote command for setting the stdout and stderr motd (if any)
-        _, stdout, stderr = sshSession.exec_command('{} echo -n'.format(serverName))
-        output = stdout.read().decode()
-        error = stderr.read().decode()
+        JOB_MANAGER.submit('connect',
+                           'Connect to {}'.format(serverName),
+                           lambda job : reachServer(sshSession,serverNode),
+                           lambda remoteCurrentDirectory : self._setBrowsers(serverIndex,remoteCurrentDirectory),
+                           key=('browse',))
 
-        # Case where the host is not reachable
-        if 'No route to host' in error:
-            logging.error(error)
-            return
+    def _setBrowsers(self, serverIndex, remoteCurrentDirectory):
+        """Set the models of the local and remote file system browsers for a given server.
 
-        serverNode.setStdoutMotd(output)
-        serverNode.setStderrMotd(error)
-        
-        # Fetch the result of pwd remote command for starting the remote file system at a default location
-        remoteCurrentDirectory, error = runRemoteCmd(sshSession,serverNode,'pwd')
-        if error:
-            logging.error(error)
-            return
+        Args:
+            serverIndex (PyQt5.QtCore.QModelIndex): the index of the server
+            remoteCurrentDirectory (str): the starting directory of the remote file system
+        """
+
+        # The file system models pull the transfer modules in, which are only needed once a server is browsed
+        from passhfiles.models.LocalFileSystemModel import LocalFileSystemModel
+        from passhfiles.models.RemoteFileSystemModel import RemoteFileSystemModel
+
+        serverName = serverIndex.internalPointer().name()
 
         localFileSystemModel = LocalFileSystemModel(serverIndex, homeDirectory())
         self._localFileSystem.setModel(localFileSystemModel)
         self._localFileSystem.horizontalHeader().setSectionResizeMode(3,QtWidgets.QHeaderView.ResizeToContents)
-        self._localFileSystemLabel.setText('Local filesystem ({})'.format(localFileSystemModel.currentDirectory()))
+        self._localFileSystemLabel.setText('Local filesystem ({})'.format(homeDirectory()))
 
         remoteFileSystemModel = RemoteFileSystemModel(serverIndex, pathlib.PurePosixPath(remoteCurrentDirectory))
         self._remoteFileSystem.setModel(remoteFileSystemModel)
         self._remoteFileSystem.horizontalHeader().setSectionResizeMode(3,QtWidgets.QHeaderView.ResizeToContents)
-        self._remoteFileSystemLabel.setText('Remote filesystem on {} ({})'.format(serverName,remoteFileSystemModel.currentDirectory()))
+        self._remoteFileSystemLabel.setText('Remote filesystem on {} ({})'.format(serverName,remoteCurrentDirectory))
 
         localFileSystemModel.addToFavoritesSignal.connect(lambda path : self.onAddToFavorites('local',path))
         remoteFileSystemModel.addToFavoritesSignal.connect(lambda path : self.onAddToFavorites('remote',path))
@@ -308,8 +364,20 @@ class MainWindow(QtWidgets.QMainWindow):
             self, 'Quit', "Do you really want to quit?", QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
         if choice == QtWidgets.QMessageBox.Yes:
             self.disconnectAll()
+            SESSIONS_STORE.flush()
+            JOB_MANAGER.shutdown()
             sys.exit()
 
+    def onSSHAgentChecked(self, nAgents):
+        """Event called when the running SSH agents have been counted.
+
+        Args:
+            nAgents (int): the number of running SSH agents
+        """
+
+        if nAgents > 0:
+            logging.info('A SSH agent is running. The keys registered in it will be used without prompting for their password.')
+
     def onSetCopiedData(self,data):
         """Setter for the copid data.
 
@@ -4,12 +4,17 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 
 from passhfiles.dialogs.SessionDialog import SessionDialog
 from passhfiles.kernel.KeyStore import KEYSTORE
-from passhfiles.models.SessionsModel import ServerNode, SessionNode, SessionsModel
+from passhfiles.kernel.Sessions import ServerNode, SessionNode
+from passhfiles.models.SessionsFilterModel import SessionsFilterModel
+from passhfiles.models.SessionsModel import SessionsModel
 from passhfiles.utils.Platform import sessionsDatabasePath
 from passhfiles.utils.Security import checkAndGetSSHKey
 
 class SessionsTreeView(QtWidgets.QTreeView):
     """Implements a view for the loaded SSH sessions. The view is implemented a tree view.
+
+    The view shows the sessions model through a SessionsFilterModel. The indexes of the view are mapped to the
+    sessions model before being passed to it.
     """
 
     openBrowsersSignal = QtCore.pyqtSignal(QtCore.QModelIndex)
@@ -20,9 +25,12 @@ class SessionsTreeView(QtWidgets.QTreeView):
 
         super(SessionsTreeView,self).__init__(*args,**kwargs)
 
-        model = SessionsModel()
+        self._sessionsModel = SessionsModel()
+
+        self._filterModel = SessionsFilterModel(self)
+        self._filterModel.setSourceModel(self._sessionsModel)
 
-        self.setModel(model)
+        self.setModel(self._filterModel)
 
         self.setHeaderHidden(True)
 
@@ -31,6 +39,25 @@ class SessionsTreeView(QtWidgets.QTreeView):
 
         self.clicked.connect(self.onBrowseFiles)
 
+    def currentSessionsIndex(self):
+        """Returns the current index mapped to the sessions model.
+
+        Returns:
+            PyQt5.QtCore.QModelIndex: the index
+        """
+
+        return self._filterModel.mapToSource(self.currentIndex())
+
+    def _findServers(self, sessionIndex):
+        """Find the servers of a session in the background and save the sessions once they are found.
+
+        Args:
+            sessionIndex (PyQt5.QtCore.QModelIndex): the session index
+        """
+
+        sessionsModel = self._sessionsModel
+        sessionsModel.findServers(sessionIndex,lambda : sessionsModel.saveSessions(sessionsDatabasePath()))
+
     def keyPressEvent(self, event):
         """Event triggered when user press a key of the keyboard.
 
@@ -42,8 +69,8 @@ class SessionsTreeView(QtWidgets.QTreeView):
 
         if key == QtCore.Qt.Key_Delete:
 
-            selectedIndex = self.currentIndex()
-            sessionsModel = self.model()
+            selectedIndex = self.currentSessionsIndex()
+            sessionsModel = self._sessionsModel
             sessionsModel.removeRow(selectedIndex,selectedIndex.parent())
             sessionsModel.saveSessions(sessionsDatabasePath())
             
@@ -70,9 +97,10 @@ class SessionsTreeView(QtWidgets.QTreeView):
             self.clearSelection()
             return
 
+        index = self._filterModel.mapToSource(index)
         node = index.internalPointer()
         if isinstance(node,SessionNode):
-            sessionsModel = self.model()
+            sessionsModel = self._sessionsModel
             sessionsModel.registerSSHKey(index,True)
 
     def onAddSession(self):
@@ -83,23 +111,22 @@ class SessionsTreeView(QtWidgets.QTreeView):
 
         if sessionDialog.exec_():
             sessionData = sessionDialog.data()
-            sessionsModel = self.model()
+            sessionsModel = self._sessionsModel
             sessionsModel.addSession(sessionData)
             sessionIndex = sessionsModel.index(sessionsModel.rowCount()-1,0)
-            sessionsModel.registerSSHKey(sessionIndex,True)
-            sessionsModel.findServers(sessionIndex)
             sessionsModel.saveSessions(sessionsDatabasePath())
+            sessionsModel.registerSSHKey(sessionIndex,True,lambda : self._findServers(sessionIndex))
 
     def onBrowseFiles(self):
         """Called when the user left-clicks on a server node. Opens the local and remote file browsers.
         """
 
-        currentIndex = self.currentIndex()
+        currentIndex = self.currentSessionsIndex()
         node = currentIndex.internalPointer()
         if not isinstance(node,ServerNode):
             return
 
-        sessionsModel = self.model()
+        sessionsModel = self._sessionsModel
         sshSession = sessionsModel.data(currentIndex.parent(), SessionsModel.SSHSession)
         if sshSession is None:
             logging.error('The ssh connection is not established')
@@ -112,8 +139,8 @@ class SessionsTreeView(QtWidgets.QTreeView):
         Establishes the SSH connection for the selected session.
         """
 
-        sessionIndex = self.currentIndex()
-        sessionsModel = self.model()
+        sessionIndex = self.currentSessionsIndex()
+        sessionsModel = self._sessionsModel
         sessionsModel.connect(sessionIndex)
 
     def onDeleteSession(self):
@@ -121,9 +148,9 @@ class SessionsTreeView(QtWidgets.QTreeView):
         Delete the selected session.
         """
 
-        sessionsModel = self.model()
+        sessionsModel = self._sessionsModel
 
-        selectedIndex = self.currentIndex()
+        selectedIndex = self.currentSessionsIndex()
 
         sessionsModel.removeRow(selectedIndex,selectedIndex.parent())
 
@@ -134,9 +161,9 @@ class SessionsTreeView(QtWidgets.QTreeView):
         Edit the selected session.
         """
 
-        sessionsModel = self.model()
+        sessionsModel = self._sessionsModel
 
-        selectedIndex = self.currentIndex()
+        selectedIndex = self.currentSessionsIndex()
         currentSessionData = sessionsModel.data(selectedIndex,QtCore.Qt.UserRole)
         sessionDialog = SessionDialog(self,False,currentSessionData)
 
@@ -147,30 +174,42 @@ class SessionsTreeView(QtWidgets.QTreeView):
             else:
                 sessionsModel.moveSession(selectedIndex, newSessionData)
 
-            sessionsModel.registerSSHKey(selectedIndex,True)
-            sessionsModel.findServers(selectedIndex)
             sessionsModel.saveSessions(sessionsDatabasePath())
+            sessionsModel.registerSSHKey(selectedIndex,True,lambda : self._findServers(selectedIndex))
 
     def onFindServers(self):
         """Called when the user clicks on 'Find servers' contextual menu item. This will find automatically 
         all the servers behind the bastion for a given user.
         """
 
-        sessionsModel = self.model()
-        sessionIndex = self.currentIndex()
-
-        sessionsModel.findServers(sessionIndex)
-        sessionsModel.saveSessions(sessionsDatabasePath())
+        self._findServers(self.currentSessionsIndex())
 
     def onOpenTerminal(self):
         """Called when the user clicks on 'Open terminal' contextual menu item. It opens a 
         terminal on the remote location. 
         """
 
-        sessionsModel = self.model()
-        serverIndex = self.currentIndex()
+        sessionsModel = self._sessionsModel
+        serverIndex = self.currentSessionsIndex()
         sessionsModel.openTerminal(serverIndex)
 
+    def onSearch(self, pattern):
+        """Called when the user types in the search box. Shows only the sessions and servers matching the pattern.
+
+        Args:
+            pattern (str): the pattern
+        """
+
+        self._filterModel.setPattern(pattern)
+        if self._filterModel.pattern():
+            self.expandAll()
+
+    def onUnlockKeys(self):
+        """Called when the user clicks on 'Unlock keys' menu item. Unlocks the keys of all the sessions.
+        """
+
+        self._sessionsModel.unlockKeys()
+
     def onShowContextualMenu(self, point):
         """Pops up a contextual menu when the user right-clicks on the sessions view.
 
@@ -180,7 +219,7 @@ class SessionsTreeView(QtWidgets.QTreeView):
 
         menu = QtWidgets.QMenu()
 
-        selectedItems = self.selectionModel().selectedRows()
+        selectedItems = [self._filterModel.mapToSource(index) for index in self.selectionModel().selectedRows()]
         if not selectedItems:
             action = menu.addAction('Add ssh session')
             action.triggered.connect(self.onAddSession)
@@ -203,3 +242,12 @@ class SessionsTreeView(QtWidgets.QTreeView):
                 openTerminalAction.triggered.connect(self.onOpenTerminal)
                 menu.addAction(openTerminalAction)
                 menu.exec_(QtGui.QCursor.pos())
+
+    def sessionsModel(self):
+        """Returns the sessions model shown by the view.
+
+        Returns:
+            passhfiles.models.SessionsModel.SessionsModel: the model
+        """
+
+        return self._sessionsModel
@@ -0,0 +1,8 @@
+import os
+import pathlib
+import sys
+
+# Run the tests against the sources and without any display
+sys.path.insert(0,str(pathlib.Path(__file__).resolve().parent.parent.joinpath('src')))
+
+os.environ.setdefault('QT_QPA_PLATFORM','offscreen')
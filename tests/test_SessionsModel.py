@@ -0,0 +1,197 @@
+import pathlib
+
+import pytest
+
+from PyQt5 import QtCore, QtTest, QtWidgets
+
+from passhfiles.models.SessionsModel import SessionsModel
+
+class _CountingSessionsModel(SessionsModel):
+    """The sessions model counting the data() and layout (index(), parent() and rowCount()) calls made by the views.
+    """
+
+    def __init__(self):
+
+        super(_CountingSessionsModel,self).__init__()
+
+        self.resetCounters()
+
+    def data(self, index, role):
+
+        self.queries += 1
+        if index.isValid():
+            self.queriedRows.add(id(index.internalPointer()))
+
+        return super(_CountingSessionsModel,self).data(index,role)
+
+    def index(self, row, column, parentIndex=QtCore.QModelIndex()):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).index(row,column,parentIndex)
+
+    def parent(self, index):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).parent(index)
+
+    def resetCounters(self):
+
+        self.layoutQueries = 0
+        self.queries = 0
+        self.queriedRows = set()
+
+    def rowCount(self, index=None):
+
+        self.layoutQueries += 1
+
+        return super(_CountingSessionsModel,self).rowCount(index)
+
+def _addSessions(model):
+    """Add 3 sessions of 20 servers to a model.
+    """
+
+    for i in range(3):
+        servers = {'server{:02d}'.format(j) : {'local' : [pathlib.Path('/tmp/{}'.format(j))], 'remote' : []} for j in range(20)}
+        model.addSession({'name' : 'session{}'.format(i),'address' : 'localhost','port' : 22,'user' : 'user','key' : None,'keytype' : 'RSA','servers' : servers})
+
+    return model
+
+@pytest.fixture(scope='module')
+def app():
+
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+@pytest.fixture
+def model(app):
+
+    return _addSessions(SessionsModel())
+
+@pytest.fixture
+def modelWarnings(model):
+    """Check the model with QAbstractItemModelTester and returns the failures it reported.
+    """
+
+    messages = []
+
+    def handler(msgType, context, message):
+        if msgType != QtCore.QtDebugMsg:
+            messages.append(message)
+
+    previousHandler = QtCore.qInstallMessageHandler(handler)
+    tester = QtTest.QAbstractItemModelTester(model,QtTest.QAbstractItemModelTester.FailureReportingMode.Warning)
+    yield messages
+    del tester
+    QtCore.qInstallMessageHandler(previousHandler)
+
+def _spies(model):
+    """Record the arguments of each change notification of a model.
+    """
+
+    spies = {}
+    for name in ('rowsInserted','rowsRemoved','layoutChanged','modelReset','dataChanged'):
+        spies[name] = []
+        getattr(model,name).connect(lambda *args, spy=spies[name] : spy.append(args))
+
+    return spies
+
+def test_updateServers_contiguous_changes(model, modelWarnings):
+
+    sessionIndex = model.index(1,0,QtCore.QModelIndex())
+    sessionNode = sessionIndex.internalPointer()
+    kept = {sessionNode.child(j).name() : sessionNode.child(j) for j in range(sessionNode.childCount())}
+    for name in ('server05','server06','server07'):
+        del kept[name]
+
+    names = sorted(kept)
+    names[7:7] = ['new1','new2']
+
+    spies = _spies(model)
+    model.updateServers(sessionIndex,names)
+
+    assert [(s[1],s[2]) for s in spies['rowsRemoved']] == [(5,7)]
+    assert [(s[1],s[2]) for s in spies['rowsInserted']] == [(7,8)]
+    assert all(s[0] == sessionIndex for s in list(spies['rowsRemoved']) + list(spies['rowsInserted']))
+    assert len(spies['layoutChanged']) == 0
+    assert len(spies['modelReset']) == 0
+
+    assert [sessionNode.child(j).name() for j in range(sessionNode.childCount())] == names
+    for name, serverNode in kept.items():
+        assert sessionNode.childByName(name) is serverNode
+        assert serverNode.data(0)['local'] == [pathlib.Path('/tmp/{}'.format(int(name[-2:])))]
+    assert all(sessionNode.child(j).row() == j for j in range(sessionNode.childCount()))
+
+    assert modelWarnings == []
+
+def test_updateServers_unchanged(model, modelWarnings):
+
+    sessionIndex = model.index(0,0,QtCore.QModelIndex())
+    sessionNode = sessionIndex.internalPointer()
+    names = [sessionNode.child(j).name() for j in range(sessionNode.childCount())]
+
+    spies = _spies(model)
+    model.updateServers(sessionIndex,names)
+
+    assert all(len(spy) == 0 for spy in spies.values())
+    assert modelWarnings == []
+
+def test_row_changes(model, modelWarnings):
+
+    sessionIndex = model.index(2,0,QtCore.QModelIndex())
+
+    spies = _spies(model)
+    model.addServer('server20',sessionIndex.internalPointer())
+    model.removeRow(model.index(0,0,sessionIndex),sessionIndex)
+    model.clearServers(sessionIndex)
+    model.removeRow(sessionIndex,QtCore.QModelIndex())
+
+    assert [(s[1],s[2]) for s in spies['rowsInserted']] == [(20,20)]
+    assert [(s[1],s[2]) for s in spies['rowsRemoved']] == [(0,0),(0,19),(2,2)]
+    assert len(spies['layoutChanged']) == 0
+    assert len(spies['modelReset']) == 0
+    assert model.rowCount(QtCore.QModelIndex()) == 2
+
+    assert modelWarnings == []
+
+def test_updateServers_view_queries(app):
+    """Check that a view only queries the rows it displays when the servers of a session are updated.
+    """
+
+    model = _addSessions(_CountingSessionsModel())
+
+    view = QtWidgets.QTreeView()
+    view.setModel(model)
+    view.expandAll()
+    view.resize(400,200)
+    view.show()
+    app.processEvents()
+
+    visibleRows = {view.indexAt(QtCore.QPoint(5,y)).internalPointer() for y in range(view.viewport().height())}
+    visibleRows.discard(None)
+
+    # Refresh the servers of sessions which are scrolled out of the view, one as the model does, the other as the legacy
+    # model did by removing and adding back all the servers and relayouting the whole tree
+    costs = []
+    for row, update in ((1,model.updateServers),(2,None)):
+        sessionIndex = model.index(row,0,QtCore.QModelIndex())
+        sessionNode = sessionIndex.internalPointer()
+        names = [sessionNode.child(j).name() for j in range(sessionNode.childCount()) if j != 5] + ['new']
+        model.resetCounters()
+        if update is not None:
+            update(sessionIndex,names)
+        else:
+            for i in range(model.rowCount(sessionIndex))[::-1]:
+                model.removeRow(model.index(i,0,sessionIndex),sessionIndex)
+            for name in names:
+                model.addServer(name,sessionNode)
+            model.layoutChanged.emit()
+        app.processEvents()
+        costs.append((model.layoutQueries,model.queriedRows))
+
+    (layoutQueries, queriedRows), (fullLayoutQueries, _) = costs
+
+    assert len(queriedRows) <= len(visibleRows)
+    assert layoutQueries < fullLayoutQueries/2
+
+    view.close()